@@ -43,8 +43,8 @@ def create_app():
         from app.models.meta_avaliacao import MetaAvaliacao
         from app.models.audit_log import AuditLog
         from app.models.feedback import Feedback
-        from app.models.mensagem import Mensagem
-        from app.models.permissao_sistema import PermissaoSistema, PermissaoArea
+        from app.models.mensagem import Mensagem, ConversaResumo
+        from app.models.permissao_sistema import PermissaoSistema, PermissaoArea, PermissaoEfetiva
         from app.models.deliberacao_pagamento import DeliberacaoPagamento
         from app.models.notificacao import Notificacao, NotificacaoVisualizacao
         from app.models.ocorrencias_faturamento import OcorrenciasFaturamento
@@ -62,9 +62,31 @@ def create_app():
         from app.models.cotas_fundos import CotasBBFae2, CotasBBExclusivo, CotasCaixaXXI
         from app.models.indices_anbima import IndiceAnbima
         from app.models.quadro_rentabilidade import QuadroRentabilidade
+        from app.models.processo_job import ProcessoJob
+        from app.models.cubo_dashboard import CuboDashboardDistribuicao
 
         db.create_all()
 
+        # Jobs que estavam rodando quando o servidor caiu não voltam sozinhos
+        from app.utils.processo_jobs import marcar_jobs_interrompidos
+        marcar_jobs_interrompidos()
+
+        # Índices compostos da paginação dos logs de auditoria
+        from app.utils.auditoria_logs import garantir_indices_auditoria
+        garantir_indices_auditoria()
+
+        # Matriz de permissões efetivas (usuário x sistema) recalculada na subida
+        from app.utils.permissoes_efetivas import reconstruir_permissoes
+        reconstruir_permissoes()
+
+        # Resumo das conversas do chat (caixa de entrada) recalculado a partir das mensagens
+        from app.utils.chat_resumo import reconstruir_resumos
+        reconstruir_resumos()
+
+        # Chave numérica normalizada de contrato da AEX_TB002 (Pendência/Cobrado)
+        from app.utils.contrato_analitico import garantir_chave_contrato
+        garantir_chave_contrato()
+
     # Registrar blueprint para a página principal do GEINC
     from app.routes.main_routes import main_bp
     app.register_blueprint(main_bp)
@@ -172,6 +194,12 @@ def create_app():
     from app.routes.notificacoes_routes import notificacoes_bp
     app.register_blueprint(notificacoes_bp)
 
+    # Canal SSE (chat e notificações em tempo real)
+    from app.utils.eventos_tempo_real import configurar_eventos
+    configurar_eventos(app)
+    from app.routes.eventos_routes import eventos_bp
+    app.register_blueprint(eventos_bp)
+
     from app.routes.custo_oportunidade_routes import custo_oportunidade_bp
     app.register_blueprint(custo_oportunidade_bp)
 
@@ -196,6 +224,9 @@ def create_app():
     from app.routes.composicao_fundos_routes import composicao_fundos_bp
     app.register_blueprint(composicao_fundos_bp)
 
+    from app.routes.processo_routes import processo_bp
+    app.register_blueprint(processo_bp)
+
     # Definir rota raiz para redirecionar para o portal GEINC
     @app.route('/')
     def index():
@@ -210,9 +241,8 @@ def create_app():
     @app.context_processor
     def inject_pendentes_reset():
         if current_user.is_authenticated and (current_user.perfil in ['admin', 'moderador']):
-            from app.models.reset_senha import ResetSenha
-            pendentes_count = ResetSenha.query.filter_by(STATUS='PENDENTE', DELETED_AT=None).count()
-            return {'pendentes_count': pendentes_count}
+            from app.auth.cache_acesso import contar_pendentes_reset
+            return {'pendentes_count': contar_pendentes_reset()}
         return {'pendentes_count': 0}
 
 
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+app/auth/cache_acesso.py
+
+Cache do usuário logado (principal) e das suas permissões.
+
+Antes, todo request autenticado fazia Usuario.query.get + busca do Empregado
+no load_user; cada view protegida por sistema_requerido fazia outro
+Usuario.query.get + consulta (e às vezes INSERT/commit) em PermissaoSistema;
+e o context processor contava as solicitações de reset pendentes a cada render.
+
+Aqui cada usuário é carregado UMA vez (usuário, área/cargo do empregado e
+conjunto de permissões efetivas, numa ida ao banco por tabela) e fica em
+memória por TTL_SEGUNDOS. Uma página típica não faz consulta de autenticação.
+
+Invalidação explícita: invalidar_principal(usuario_id) / invalidar_principal()
+nas telas que alteram usuário ou permissões, invalidar_pendentes_reset() nas
+que mudam solicitações de reset. O TTL cobre alterações feitas fora do portal.
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+import threading
+import time
+
+from app import db
+
+TTL_SEGUNDOS = 60
+
+_principais = {}
+_pendentes = [0.0, 0]  # [expira_em, quantidade]
+_lock = threading.Lock()
+
+
+class Principal(object):
+    """Retrato do usuário em memória (não é objeto ORM: pode circular entre threads)."""
+
+    __slots__ = ('id', 'email', 'nome', 'perfil', 'ativo', 'empregado', 'permissoes', 'expira_em')
+
+    def __init__(self, id, email, nome, perfil, ativo, empregado, permissoes, expira_em):
+        self.id = id
+        self.email = email
+        self.nome = nome
+        self.perfil = perfil
+        self.ativo = ativo
+        self.empregado = empregado
+        self.permissoes = permissoes
+        self.expira_em = expira_em
+
+    def tem_acesso(self, sistema):
+        """Mesma regra de PermissaoSistema.verificar_acesso."""
+        # Admins e moderadores sempre têm acesso total
+        if self.perfil in ('admin', 'moderador'):
+            return True
+        # Sem permissão específica: acesso padrão (True)
+        return self.permissoes.get(sistema, True)
+
+
+def _carregar(usuario_id):
+    from app.models.usuario import Usuario, Empregado
+    from app.models.permissao_sistema import PermissaoSistema
+
+    usuario = db.session.get(Usuario, usuario_id)
+    if usuario is None:
+        return None
+
+    empregado = None
+    if usuario.FK_PESSOA:
+        registro = Empregado.query.filter_by(pkPessoa=usuario.FK_PESSOA).first()
+        if registro:
+            empregado = {
+                'area': registro.sgSuperintendencia,
+                'cargo': registro.dsCargo
+            }
+
+    permissoes = {}
+    if usuario.PERFIL not in ('admin', 'moderador'):
+        linhas = db.session.query(PermissaoSistema.SISTEMA, PermissaoSistema.TEM_ACESSO).filter(
+            PermissaoSistema.USUARIO_ID == usuario_id,
+            PermissaoSistema.DELETED_AT == None
+        ).order_by(PermissaoSistema.ID).all()
+        for sistema, tem_acesso in linhas:
+            # Como o .first() de verificar_acesso: vale a primeira linha do sistema
+            permissoes.setdefault(sistema, bool(tem_acesso))
+
+    return Principal(
+        id=usuario.ID,
+        email=usuario.EMAIL,
+        nome=usuario.NOME,
+        perfil=usuario.PERFIL,
+        ativo=bool(usuario.is_active()),
+        empregado=empregado,
+        permissoes=permissoes,
+        expira_em=time.monotonic() + TTL_SEGUNDOS
+    )
+
+
+def obter_principal(usuario_id):
+    """Principal do usuário (do cache ou recém-carregado); None se não existir."""
+    usuario_id = int(usuario_id)
+    with _lock:
+        principal = _principais.get(usuario_id)
+    if principal is not None and principal.expira_em > time.monotonic():
+        return principal
+
+    principal = _carregar(usuario_id)
+    with _lock:
+        if principal is None:
+            _principais.pop(usuario_id, None)
+        else:
+            _principais[usuario_id] = principal
+    return principal
+
+
+def verificar_acesso(usuario_id, sistema):
+    principal = obter_principal(usuario_id)
+    return bool(principal and principal.tem_acesso(sistema))
+
+
+def invalidar_principal(usuario_id=None):
+    """Sem argumento limpa o cache de todos os usuários (ex.: permissões de área)."""
+    with _lock:
+        if usuario_id is None:
+            _principais.clear()
+        else:
+            _principais.pop(int(usuario_id), None)
+
+
+def contar_pendentes_reset():
+    """Solicitações de reset de senha pendentes (badge do menu de admin)."""
+    agora = time.monotonic()
+    with _lock:
+        if _pendentes[0] > agora:
+            return _pendentes[1]
+
+    from app.models.reset_senha import ResetSenha
+    quantidade = ResetSenha.query.filter_by(STATUS='PENDENTE', DELETED_AT=None).count()
+    with _lock:
+        _pendentes[0] = agora + TTL_SEGUNDOS
+        _pendentes[1] = quantidade
+    return quantidade
+
+
+def invalidar_pendentes_reset():
+    with _lock:
+        _pendentes[0] = 0.0
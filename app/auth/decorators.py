@@ -1,7 +1,7 @@
 from functools import wraps
 from flask import flash, redirect, url_for
 from flask_login import current_user
-from app.models.permissao_sistema import PermissaoSistema
+from app.auth.cache_acesso import verificar_acesso
 
 
 def sistema_requerido(sistema):
@@ -15,7 +15,8 @@ def sistema_requerido(sistema):
                 return redirect(url_for('auth.login'))
 
             # Verificar se o usuário tem acesso ao sistema
-            if not PermissaoSistema.verificar_acesso(current_user.id, sistema):
+            # Permissões do cache do usuário (sem ida ao banco na maioria dos requests)
+            if not verificar_acesso(current_user.id, sistema):
                 flash(
                     'Você não tem acesso para esse sistema. Entre em contato com o Administrador para solicitar o acesso.',
                     'warning')
@@ -14,6 +14,8 @@ from app.utils.audit import registrar_log
 import secrets
 import string
 from app.models.reset_senha import ResetSenha
+from app.auth.cache_acesso import verificar_acesso, invalidar_principal, invalidar_pendentes_reset
+from app.utils.permissoes_efetivas import reconstruir_permissoes, permissoes_usuario
 
 
 
@@ -44,6 +46,8 @@ def login():
                     }
 
                 login_user(user_login)
+                # Próximos requests partem de dados recém-carregados
+                invalidar_principal(usuario.ID)
 
                 # Registrar log de login
                 registrar_log(
@@ -201,6 +205,8 @@ def editar_usuario(id):
                 usuario.set_senha(nova_senha)
 
             db.session.commit()
+            invalidar_principal(usuario.ID)
+            reconstruir_permissoes([usuario.ID])
             flash('Usuário atualizado!', 'success')
             return redirect(url_for('auth.lista_usuarios'))
         except Exception as e:
@@ -229,6 +235,7 @@ def excluir_usuario(id):
 
         usuario.DELETED_AT = datetime.utcnow()
         db.session.commit()
+        invalidar_principal(usuario.ID)
         flash('Usuário removido!', 'warning')
     except Exception as e:
         db.session.rollback()
@@ -277,6 +284,8 @@ def gerenciar_permissoes(id):
                     db.session.add(permissao)
 
             db.session.commit()
+            invalidar_principal(usuario.ID)
+            reconstruir_permissoes([usuario.ID])
 
             # Registrar log
             registrar_log(
@@ -293,26 +302,28 @@ def gerenciar_permissoes(id):
             db.session.rollback()
             flash(f'Erro ao atualizar permissões: {str(e)}', 'danger')
 
-    # Buscar permissões atuais em DEV
-    permissoes = {}
-    for sistema in PermissaoSistema.SISTEMAS_DISPONIVEIS.keys():
-        permissao = PermissaoSistema.query.filter_by(
+    # Buscar permissões atuais em DEV (uma consulta; vale a primeira linha de cada sistema)
+    permissoes = {sistema: True for sistema in PermissaoSistema.SISTEMAS_DISPONIVEIS.keys()}
+    vistos = set()
+    for permissao in PermissaoSistema.query.filter_by(
             USUARIO_ID=usuario.ID,
-            SISTEMA=sistema,
             DELETED_AT=None
-        ).first()
-        permissoes[sistema] = permissao.TEM_ACESSO if permissao else True
+    ).order_by(PermissaoSistema.ID).all():
+        if permissao.SISTEMA in permissoes and permissao.SISTEMA not in vistos:
+            permissoes[permissao.SISTEMA] = permissao.TEM_ACESSO
+            vistos.add(permissao.SISTEMA)
 
     return render_template('auth/gerenciar_permissoes.html',
                            usuario=usuario,
                            sistemas=PermissaoSistema.SISTEMAS_DISPONIVEIS,
-                           permissoes=permissoes)
+                           permissoes=permissoes,
+                           efetivas=permissoes_usuario(usuario.ID))
 
 
 @auth_bp.route('/api/verificar-acesso/<sistema>')
 @login_required
 def verificar_acesso_api(sistema):
-    tem_acesso = PermissaoSistema.verificar_acesso(current_user.id, sistema)
+    tem_acesso = verificar_acesso(current_user.id, sistema)
     return {'tem_acesso': tem_acesso}
 
 
@@ -338,6 +349,7 @@ def perfil():
                     return render_template('auth/perfil.html', usuario=usuario)
 
             db.session.commit()
+            invalidar_principal(usuario.ID)
             flash('Perfil atualizado!', 'success')
         except Exception as e:
             db.session.rollback()
@@ -394,18 +406,19 @@ def gerenciar_permissoes_areas():
         # Combinar todas as áreas
         todas_areas = list(setores) + list(superintendencias) + list(diretorias)
 
+        # Permissões de todas as áreas numa única consulta
+        perms_por_area = {}
+        for perm in PermissaoArea.query.filter_by(DELETED_AT=None).all():
+            perms_por_area.setdefault((perm.AREA, perm.TIPO_AREA), []).append(perm)
+
         # Para cada área, buscar suas permissões atuais
         areas_com_permissoes = []
         for area in todas_areas:
             # Inicializar dicionário de permissões
             area_permissoes = {}
 
-            # Buscar permissões existentes no banco
-            perms_db = PermissaoArea.query.filter_by(
-                AREA=area.area,
-                TIPO_AREA=area.tipo_area,
-                DELETED_AT=None
-            ).all()
+            # Permissões existentes no banco
+            perms_db = perms_por_area.get((area.area, area.tipo_area), [])
 
             # Se tem permissões no banco, usar elas
             if perms_db:
@@ -453,6 +466,8 @@ def editar_permissoes_area(tipo_area, area):
 
             # Atualizar permissões
             if PermissaoArea.atualizar_permissoes_area(area, tipo_area, sistemas_permitidos):
+                # Atinge todos os usuários da área
+                invalidar_principal()
                 # Registrar log
                 registrar_log(
                     acao='atualizar',
@@ -483,23 +498,34 @@ def editar_permissoes_area(tipo_area, area):
             for sistema in PermissaoSistema.SISTEMAS_DISPONIVEIS.keys():
                 permissoes[sistema] = True
 
-        # Buscar usuários da área
+        # Buscar usuários da área (empregados + usuários numa única consulta)
         if tipo_area == 'setor':
-            empregados = Empregado.query.filter_by(sgSetor=area).all()
+            filtro_area = Empregado.sgSetor == area
         elif tipo_area == 'superintendencia':
-            empregados = Empregado.query.filter_by(sgSuperintendencia=area).all()
+            filtro_area = Empregado.sgSuperintendencia == area
         else:
-            empregados = Empregado.query.filter_by(sgDiretoria=area).all()
+            filtro_area = Empregado.sgDiretoria == area
 
         usuarios_area = []
-        for emp in empregados:
-            usuario = Usuario.query.filter_by(FK_PESSOA=emp.pkPessoa).first()
-            if usuario:
-                usuarios_area.append({
-                    'nome': usuario.NOME,
-                    'email': usuario.EMAIL,
-                    'cargo': emp.dsCargo or 'Não informado'
-                })
+        vistos = set()
+        for usuario, emp in db.session.query(Usuario, Empregado).join(
+                Empregado, Empregado.pkPessoa == Usuario.FK_PESSOA
+        ).filter(filtro_area).order_by(Usuario.NOME).all():
+            if usuario.ID in vistos:
+                continue
+            vistos.add(usuario.ID)
+            # Acesso efetivo e origem da decisão, da matriz pré-calculada
+            efetivas = permissoes_usuario(usuario.ID)
+            usuarios_area.append({
+                'nome': usuario.NOME,
+                'email': usuario.EMAIL,
+                'cargo': emp.dsCargo or 'Não informado',
+                'excecoes': [
+                    (sistema, tem_acesso, origem)
+                    for sistema, (tem_acesso, origem, area_decisao) in sorted(efetivas.items())
+                    if origem in ('perfil', 'individual') or (origem != 'padrao' and area_decisao != area)
+                ]
+            })
 
         return render_template('auth/editar_permissoes_area.html',
                                area=area,
@@ -605,6 +631,7 @@ def esqueci_senha():
                 )
                 db.session.add(nova_solicitacao)
                 db.session.commit()
+                invalidar_pendentes_reset()
 
                 # Registrar log
                 registrar_log(
@@ -673,6 +700,7 @@ def aprovar_reset(id):
         solicitacao.NOVA_SENHA_TEMPORARIA = senha_temporaria
 
         db.session.commit()
+        invalidar_pendentes_reset()
 
         # Registrar log
         registrar_log(
@@ -708,6 +736,7 @@ def recusar_reset(id):
         solicitacao.APROVADO_AT = datetime.utcnow()
 
         db.session.commit()
+        invalidar_pendentes_reset()
 
         # Registrar log
         registrar_log(
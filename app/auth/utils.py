@@ -23,32 +23,6 @@ class UserLogin(UserMixin):
         """Retorna o cargo do empregado"""
         return self.empregado.get('cargo') if self.empregado else None
 
-
-
-def init_login_manager(app):
-    login_manager.init_app(app)
-    login_manager.login_view = 'auth.login'
-    login_manager.login_message = 'Por favor, faça login para acessar esta página.'
-    login_manager.login_message_category = 'info'
-
-    from app.models.usuario import Usuario, Empregado
-
-    @login_manager.user_loader
-    def load_user(user_id):
-        user = Usuario.query.get(int(user_id))
-        if user and user.is_active():
-            user_login = UserLogin(user.ID, user.EMAIL, user.NOME, user.PERFIL)
-            # Carregar dados do empregado
-            if user.FK_PESSOA:
-                empregado = Empregado.query.filter_by(pkPessoa=user.FK_PESSOA).first()
-                if empregado:
-                    user_login.empregado = {
-                        'area': empregado.sgSuperintendencia,
-                        'cargo': empregado.dsCargo
-                    }
-            return user_login
-        return None
-
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -73,20 +47,16 @@ def init_login_manager(app):
     login_manager.login_message = 'Por favor, faça login para acessar esta página.'
     login_manager.login_message_category = 'info'
 
-    from app.models.usuario import Usuario, Empregado
+    from app.auth.cache_acesso import obter_principal
 
     @login_manager.user_loader
     def load_user(user_id):
-        user = Usuario.query.get(int(user_id))
-        if user and user.is_active():
-            user_login = UserLogin(user.ID, user.EMAIL, user.NOME, user.PERFIL)
-            # Carregar dados do empregado
-            if user.FK_PESSOA:
-                empregado = Empregado.query.filter_by(pkPessoa=user.FK_PESSOA).first()
-                if empregado:
-                    user_login.empregado = {
-                        'area': empregado.sgSuperintendencia,
-                        'cargo': empregado.dsCargo
-                    }
+        # Usuário, empregado e permissões vêm do cache (sem consulta na maioria dos requests)
+        principal = obter_principal(user_id)
+        if principal and principal.ativo:
+            user_login = UserLogin(principal.id, principal.email, principal.nome, principal.perfil)
+            # Dados do empregado
+            if principal.empregado:
+                user_login.empregado = dict(principal.empregado)
             return user_login
         return None
\ No newline at end of file
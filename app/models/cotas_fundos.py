@@ -1,6 +1,6 @@
 from decimal import Decimal
 
-from sqlalchemy import func, text
+from sqlalchemy import func
 
 from app import db
 
@@ -105,21 +105,12 @@ def obter_proxima_data(model):
 
 def e_dia_util(data):
     """
-    Consulta a AUX_TB004_CALENDARIO. Retorna True/False, ou None se a data
-    não existir no calendário. Query em text() para não depender do tipo
-    (BIT/INT) da coluna E_DIA_UTIL.
+    Consulta a AUX_TB004_CALENDARIO (calendário em memória, ver
+    utils/calendario_dias_uteis). Retorna True/False, ou None se a data
+    não existir no calendário.
     """
-    valor = db.session.execute(text("""
-        SELECT TOP 1 E_DIA_UTIL
-        FROM [BDG].[AUX_TB004_CALENDARIO]
-        WHERE DT_REFERENCIA = :dt
-    """), {'dt': data}).scalar()
-    if valor is None:
-        return None
-    try:
-        return bool(int(valor))
-    except (TypeError, ValueError):
-        return bool(valor)
+    from app.utils.calendario_dias_uteis import calendario_aux
+    return calendario_aux().eh_dia_util(data)
 
 
 def calcular_ind_cota(vr_cota_atual, vr_cota_anterior):
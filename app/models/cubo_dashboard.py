@@ -0,0 +1,37 @@
+# app/models/cubo_dashboard.py
+from datetime import datetime
+from app import db
+
+
+class CuboDashboardDistribuicao(db.Model):
+    """
+    Agregado da DCA_TB005 para o dashboard de distribuição (ver utils/cubo_dashboard).
+    NIVEL: DETALHE (empresa x critério x produto), EMPRESA (totais da empresa) e
+    TOTAL (edital/período) - CPFs distintos não se somam entre níveis.
+    """
+    __tablename__ = 'DCA_TB022_CUBO_DASHBOARD'
+    __table_args__ = (
+        db.Index('IX_DCA_TB022_EDITAL_PERIODO', 'ID_EDITAL', 'ID_PERIODO'),
+        {'schema': 'BDG'}
+    )
+
+    NIVEL_DETALHE = 'DETALHE'
+    NIVEL_EMPRESA = 'EMPRESA'
+    NIVEL_TOTAL = 'TOTAL'
+
+    ID = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    ID_EDITAL = db.Column(db.Integer, nullable=False)
+    ID_PERIODO = db.Column(db.Integer, nullable=False)
+    NIVEL = db.Column(db.String(10), nullable=False)
+    COD_EMPRESA_COBRANCA = db.Column(db.Integer, nullable=True)
+    NO_EMPRESA = db.Column(db.String(100), nullable=True)
+    COD_CRITERIO_SELECAO = db.Column(db.Integer, nullable=True)
+    DS_CRITERIO_SELECAO = db.Column(db.String(255), nullable=True)
+    NO_PRODUTO = db.Column(db.String(100), nullable=True)
+    QT_CONTRATOS = db.Column(db.Integer, default=0)
+    QT_CPFS = db.Column(db.Integer, default=0)
+    VR_SALDO = db.Column(db.Numeric(18, 2), default=0)
+    DT_ATUALIZACAO = db.Column(db.DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f'<CuboDashboardDistribuicao {self.ID_EDITAL}/{self.ID_PERIODO} {self.NIVEL} {self.COD_EMPRESA_COBRANCA}>'
@@ -1,7 +1,6 @@
 from app import db
 from datetime import datetime
 from sqlalchemy import text
-from decimal import Decimal
 import os
 import shutil
 
@@ -65,9 +64,14 @@ class FaturaCaixa(db.Model):
 
     @staticmethod
     def importar_dados_txt(arquivo_path, usuario):
-        """Importa dados do arquivo TXT para a tabela - PRESERVANDO DADOS ANTERIORES"""
-        registros_inseridos = 0
-        registros_duplicados = 0
+        """
+        Importa dados do arquivo TXT para a tabela - PRESERVANDO DADOS ANTERIORES
+
+        Carga set-based (app/utils/carga_fatura_caixa): staging em lote +
+        um único INSERT com anti-join pelas chaves de duplicidade.
+        """
+        from app.utils.carga_fatura_caixa import importar_arquivo
+
         nome_arquivo = arquivo_path.split('\\')[-1]
 
         # Verificar se este arquivo já foi processado
@@ -76,97 +80,15 @@ class FaturaCaixa(db.Model):
             return 0, f"Este arquivo ({nome_arquivo}) já foi processado anteriormente com {ja_processado} registros."
 
         try:
-            with open(arquivo_path, 'r', encoding='latin-1') as arquivo:
-                for linha in arquivo:
-                    # Remove espaços e quebras de linha
-                    linha = linha.strip()
-                    if not linha:
-                        continue
-
-                    # Divide a linha por ponto e vírgula
-                    campos = linha.split(';')
-
-                    if len(campos) >= 16:
-                        # Preparar dados para verificar duplicata
-                        num_contrato_terc = Decimal(campos[0]) if campos[0] else None
-                        nr_contrato = int(campos[1]) if campos[1] else None
-                        seq_premio = int(campos[2]) if campos[2] else None
-
-                        # Converter data de início de referência para verificar duplicata
-                        data_ini_ref = None
-                        try:
-                            if campos[8]:
-                                data_ini_ref = datetime.strptime(campos[8], '%Y-%m-%d').date()
-                        except:
-                            pass
-
-                        # Verificar se já existe este registro (evitar duplicatas)
-                        if num_contrato_terc and nr_contrato and seq_premio and data_ini_ref:
-                            duplicata = FaturaCaixa.verificar_duplicata(
-                                num_contrato_terc,
-                                nr_contrato,
-                                seq_premio,
-                                data_ini_ref
-                            )
-
-                            if duplicata:
-                                registros_duplicados += 1
-                                continue  # Pula para o próximo registro
-
-                        # Cria novo registro apenas se não for duplicata
-                        novo_registro = FaturaCaixa()
-
-                        # Mapeia os campos do arquivo para as colunas
-                        novo_registro.NUM_CONTRATO_TERC = num_contrato_terc
-                        novo_registro.NR_CONTRATO = nr_contrato
-                        novo_registro.SEQ_PREMIO = seq_premio
-                        novo_registro.COD_PRODUTO = int(campos[3]) if campos[3] else None
-                        novo_registro.COD_SUBEST = int(campos[4]) if campos[4] else None
-                        novo_registro.MIP_DIF = int(campos[5]) if campos[5] and campos[5] in ['1', '2'] else None
-                        novo_registro.IND_TP_PREMIO = campos[6] if campos[6] else None
-
-                        # Converte datas (formato YYYY-MM-DD)
-                        try:
-                            novo_registro.DTA_ULT_MOVTO = datetime.strptime(campos[7], '%Y-%m-%d').date() if campos[
-                                7] else None
-                        except:
-                            novo_registro.DTA_ULT_MOVTO = None
-
-                        novo_registro.DTA_INI_REFERENCIA = data_ini_ref
-
-                        try:
-                            novo_registro.DTA_FIM_REFERENCIA = datetime.strptime(campos[9], '%Y-%m-%d').date() if \
-                            campos[9] else None
-                        except:
-                            novo_registro.DTA_FIM_REFERENCIA = None
-
-                        # Converte valores decimais (substitui vírgula por ponto)
-                        novo_registro.VR_PREMIO = Decimal(campos[10].replace(',', '.')) if campos[10] else 0
-                        novo_registro.IOF_MIP_DIF = Decimal(campos[11].replace(',', '.')) if campos[11] else 0
-
-                        novo_registro.COD_EVENTO = int(campos[12]) if campos[12] else None
-                        novo_registro.NUM_ORI_CONTRATO = int(campos[13]) if campos[13] else None
-                        novo_registro.SEQ_PREMIO_ORI = int(campos[14]) if campos[14] else None
-                        novo_registro.NUM_ENDOSSO = int(campos[15]) if campos[15] else None
-
-                        # Dados de controle
-                        novo_registro.USUARIO_CARGA = usuario
-                        novo_registro.ARQUIVO_ORIGEM = nome_arquivo
-                        novo_registro.DTA_CARGA = datetime.now()
-
-                        db.session.add(novo_registro)
-                        registros_inseridos += 1
-
-                db.session.commit()
+            registros_inseridos, registros_duplicados, _ = importar_arquivo(arquivo_path, usuario, nome_arquivo)
 
-                mensagem = f"{registros_inseridos} novos registros inseridos"
-                if registros_duplicados > 0:
-                    mensagem += f" ({registros_duplicados} registros já existentes foram ignorados)"
+            mensagem = f"{registros_inseridos} novos registros inseridos"
+            if registros_duplicados > 0:
+                mensagem += f" ({registros_duplicados} registros já existentes foram ignorados)"
 
-                return registros_inseridos, mensagem
+            return registros_inseridos, mensagem
 
         except Exception as e:
-            db.session.rollback()
             return 0, str(e)
 
     @staticmethod
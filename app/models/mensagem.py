@@ -18,4 +18,27 @@ class Mensagem(db.Model):
     destinatario = db.relationship('Usuario', foreign_keys=[DESTINATARIO_ID], backref='mensagens_recebidas')
 
     def __repr__(self):
-        return f'<Mensagem {self.ID} - De: {self.REMETENTE_ID} Para: {self.DESTINATARIO_ID}>'
\ No newline at end of file
+        return f'<Mensagem {self.ID} - De: {self.REMETENTE_ID} Para: {self.DESTINATARIO_ID}>'
+
+class ConversaResumo(db.Model):
+    """
+    Resumo de cada conversa do ponto de vista de um usuário (uma linha por
+    usuário x contato). Mantido por app/utils/chat_resumo a cada mensagem
+    enviada/lida; a caixa de entrada do chat lê só esta tabela.
+    """
+    __tablename__ = 'APK_TB013_CONVERSAS_RESUMO'
+    __table_args__ = (
+        db.Index('IX_APK_TB013_USUARIO_DATA', 'USUARIO_ID', db.text('ULTIMA_DATA DESC')),
+        {'schema': 'BDG'}
+    )
+
+    USUARIO_ID = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    OUTRO_USUARIO_ID = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    ULTIMA_MENSAGEM_ID = db.Column(db.Integer, nullable=False)
+    ULTIMA_DATA = db.Column(db.DateTime, nullable=False)
+    ULTIMO_TRECHO = db.Column(db.String(200))
+    ULTIMO_REMETENTE_ID = db.Column(db.Integer, nullable=False)
+    NAO_LIDAS = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ConversaResumo {self.USUARIO_ID} x {self.OUTRO_USUARIO_ID} ({self.NAO_LIDAS} não lidas)>'
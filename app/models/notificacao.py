@@ -41,6 +41,13 @@ class Notificacao(db.Model):
         ).first()
         return vis is not None
 
+    def esta_vigente(self, agora=None):
+        """Ativa, não excluída e dentro da janela DT_INICIO/DT_FIM"""
+        agora = agora or datetime.utcnow()
+        return (bool(self.ATIVO) and self.DELETED_AT is None
+                and (self.DT_INICIO is None or self.DT_INICIO <= agora)
+                and (self.DT_FIM is None or self.DT_FIM >= agora))
+
     @staticmethod
     def obter_ativas_nao_visualizadas(usuario_id):
         """Retorna notificações ativas que o usuário ainda não visualizou"""
@@ -48,19 +55,13 @@ class Notificacao(db.Model):
 
         agora = datetime.utcnow()
 
-        print(f"DEBUG MODEL - Buscando notificações não visualizadas para usuario {usuario_id}")
-
-        # Buscar IDs das notificações já visualizadas
-        visualizadas_ids = db.session.query(NotificacaoVisualizacao.NOTIFICACAO_ID).filter(
+        # NOT EXISTS correlacionado: uma ida ao banco, sem carregar os IDs já visualizados
+        visualizada = db.session.query(NotificacaoVisualizacao.ID).filter(
+            NotificacaoVisualizacao.NOTIFICACAO_ID == Notificacao.ID,
             NotificacaoVisualizacao.USUARIO_ID == usuario_id
-        ).all()
+        ).exists()
 
-        # Converter para lista simples
-        visualizadas_ids = [v[0] for v in visualizadas_ids]
-        print(f"DEBUG MODEL - Notificações já visualizadas: {visualizadas_ids}")
-
-        # Query principal - excluindo as já visualizadas
-        query = Notificacao.query.filter(
+        return Notificacao.query.filter(
             Notificacao.ATIVO == True,
             Notificacao.DELETED_AT == None,
             or_(
@@ -70,18 +71,9 @@ class Notificacao(db.Model):
             or_(
                 Notificacao.DT_FIM == None,
                 Notificacao.DT_FIM >= agora
-            )
-        )
-
-        # Excluir as já visualizadas
-        if visualizadas_ids:
-            query = query.filter(~Notificacao.ID.in_(visualizadas_ids))
-
-        resultado = query.order_by(Notificacao.CREATED_AT.desc()).all()
-
-        print(f"DEBUG MODEL - Encontradas {len(resultado)} notificações não visualizadas")
-
-        return resultado
+            ),
+            ~visualizada
+        ).order_by(Notificacao.CREATED_AT.desc()).all()
 
 
 class NotificacaoVisualizacao(db.Model):
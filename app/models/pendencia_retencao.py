@@ -76,6 +76,12 @@ class AexAnalitico(db.Model):
     CARTEIRA = db.Column(db.String(50), nullable=True)
     VR_APROPRIADO = db.Column(db.Numeric(18, 2), nullable=True)
     OBSERVACAO = db.Column(db.String(50), nullable=True)
+    # Chave numérica normalizada do contrato (coluna computada PERSISTED + índice,
+    # garantidos por app/utils/contrato_analitico). Só usada em filtros.
+    NU_CONTRATO_NUM = db.deferred(db.Column(
+        db.Numeric(30, 0),
+        db.Computed("TRY_CONVERT(DECIMAL(30, 0), LTRIM(RTRIM([NU_CONTRATO])))", persisted=True)
+    ))
 
     def __repr__(self):
         return f'<AexAnalitico {self.ID} - Contrato: {self.NU_CONTRATO}>'
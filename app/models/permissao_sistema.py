@@ -59,6 +59,10 @@ class PermissaoArea(db.Model):
                     db.session.add(nova_perm)
 
             db.session.commit()
+
+            # Só os usuários da área têm a matriz recalculada
+            from app.utils.permissoes_efetivas import reconstruir_permissoes_area
+            reconstruir_permissoes_area(tipo_area, area)
             return True
         except Exception as e:
             db.session.rollback()
@@ -66,6 +70,30 @@ class PermissaoArea(db.Model):
             return False
 
 
+class PermissaoEfetiva(db.Model):
+    """
+    Matriz pré-calculada usuário x sistema -> acesso efetivo (ver utils/permissoes_efetivas).
+    ORIGEM: perfil, individual, setor, superintendencia, diretoria ou padrao;
+    AREA: sigla da área que decidiu (quando a origem é uma área).
+    """
+    __tablename__ = 'APK_TB007_PERMISSOES_EFETIVAS'
+    __table_args__ = {'schema': 'DEV'}
+
+    ORIGEM_PERFIL = 'perfil'
+    ORIGEM_INDIVIDUAL = 'individual'
+    ORIGEM_PADRAO = 'padrao'
+
+    USUARIO_ID = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    SISTEMA = db.Column(db.String(50), primary_key=True)
+    TEM_ACESSO = db.Column(db.Boolean, nullable=False)
+    ORIGEM = db.Column(db.String(20), nullable=False)
+    AREA = db.Column(db.String(50))
+    ATUALIZADO_EM = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<PermissaoEfetiva {self.USUARIO_ID} - {self.SISTEMA}: {self.TEM_ACESSO} ({self.ORIGEM})>'
+
+
 class PermissaoSistema(db.Model):
     """Modelo para controle de permissões de acesso aos sistemas"""
     __tablename__ = 'APK_TB005_PERMISSOES_SISTEMA'
@@ -202,48 +230,12 @@ class PermissaoSistema(db.Model):
     def verificar_acesso_com_area(usuario_id, sistema):
         """
         Verifica acesso considerando área do usuário
+        (individual -> setor -> superintendência -> diretoria -> padrão).
+        Consulta a matriz pré-calculada de utils/permissoes_efetivas.
         """
-        from app.models.usuario import Usuario
-
-        usuario = Usuario.query.get(usuario_id)
-        if not usuario:
-            return False
-
-        # Admins e moderadores sempre têm acesso total
-        if usuario.PERFIL in ['admin', 'moderador']:
-            return True
-
-        # Verificar permissão individual primeiro
-        permissao_individual = PermissaoSistema.query.filter_by(
-            USUARIO_ID=usuario_id,
-            SISTEMA=sistema,
-            DELETED_AT=None
-        ).first()
+        from app.utils.permissoes_efetivas import permissao_efetiva
 
-        if permissao_individual and permissao_individual.PERMISSAO_INDIVIDUAL:
-            return permissao_individual.TEM_ACESSO
-
-        # Verificar permissão da área
-        empregado = usuario.empregado
-        if empregado:
-            for tipo_area, campo_area in [
-                ('setor', empregado.sgSetor),
-                ('superintendencia', empregado.sgSuperintendencia),
-                ('diretoria', empregado.sgDiretoria)
-            ]:
-                if campo_area:
-                    permissao_area = PermissaoArea.query.filter_by(
-                        AREA=campo_area,
-                        TIPO_AREA=tipo_area,
-                        SISTEMA=sistema,
-                        DELETED_AT=None
-                    ).first()
-
-                    if permissao_area:
-                        return permissao_area.TEM_ACESSO
-
-        # Padrão: permitir acesso
-        return True
+        return permissao_efetiva(usuario_id, sistema)[0]
 
     @staticmethod
     def criar_permissoes_padrao(usuario_id):
@@ -267,6 +259,9 @@ class PermissaoSistema(db.Model):
         except:
             db.session.rollback()
 
+        from app.utils.permissoes_efetivas import reconstruir_permissoes
+        reconstruir_permissoes([usuario_id])
+
     @staticmethod
     def limpar_permissoes_usuario(usuario_id):
         """Remove todas as permissões de um usuário"""
@@ -281,4 +276,7 @@ class PermissaoSistema(db.Model):
         try:
             db.session.commit()
         except:
-            db.session.rollback()
\ No newline at end of file
+            db.session.rollback()
+
+        from app.utils.permissoes_efetivas import reconstruir_permissoes
+        reconstruir_permissoes([usuario_id])
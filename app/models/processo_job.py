@@ -0,0 +1,68 @@
+# app/models/processo_job.py
+import json
+from datetime import datetime
+from app import db
+
+
+class ProcessoJob(db.Model):
+    """Processos longos (distribuição, redistribuição...) executados em segundo plano"""
+    __tablename__ = 'APK_TB012_PROCESSOS_JOB'
+    __table_args__ = {'schema': 'BDG'}
+
+    STATUS_FILA = 'FILA'
+    STATUS_EXECUTANDO = 'EXECUTANDO'
+    STATUS_CONCLUIDO = 'CONCLUIDO'
+    STATUS_ERRO = 'ERRO'
+
+    ID = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    TIPO = db.Column(db.String(50), nullable=False)
+    DESCRICAO = db.Column(db.String(255))
+    STATUS = db.Column(db.String(20), nullable=False, default=STATUS_FILA)
+    ETAPA = db.Column(db.String(200))
+    PARAMETROS = db.Column(db.Text)
+    ETAPAS = db.Column(db.Text)  # JSON: [{nome, status, decorrido, retorno}]
+    RESULTADO = db.Column(db.Text)  # JSON com o retorno do processo
+    ERRO = db.Column(db.Text)
+    QT_REGISTROS = db.Column(db.Integer, default=0)
+    USUARIO_ID = db.Column(db.Integer, nullable=True)  # SEM FOREIGN KEY
+    CREATED_AT = db.Column(db.DateTime, default=datetime.utcnow)
+    STARTED_AT = db.Column(db.DateTime, nullable=True)
+    FINISHED_AT = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<ProcessoJob {self.ID} - {self.TIPO} {self.STATUS}>'
+
+    @property
+    def finalizado(self):
+        return self.STATUS in (self.STATUS_CONCLUIDO, self.STATUS_ERRO)
+
+    @property
+    def decorrido(self):
+        """Tempo de execução em segundos (até agora, se ainda estiver rodando)"""
+        if not self.STARTED_AT:
+            return 0.0
+        fim = self.FINISHED_AT or datetime.utcnow()
+        return round((fim - self.STARTED_AT).total_seconds(), 2)
+
+    @property
+    def resultado(self):
+        return json.loads(self.RESULTADO) if self.RESULTADO else None
+
+    @property
+    def etapas(self):
+        return json.loads(self.ETAPAS) if self.ETAPAS else []
+
+    def to_dict(self):
+        return {
+            'id': self.ID,
+            'tipo': self.TIPO,
+            'descricao': self.DESCRICAO,
+            'status': self.STATUS,
+            'etapa': self.ETAPA,
+            'etapas': self.etapas,
+            'qt_registros': self.QT_REGISTROS or 0,
+            'decorrido': self.decorrido,
+            'erro': self.ERRO,
+            'finalizado': self.finalizado,
+            'criado_em': self.CREATED_AT.strftime('%d/%m/%Y %H:%M:%S') if self.CREATED_AT else None,
+        }
@@ -264,17 +264,10 @@ class Feriado(db.Model):
     def eh_feriado(data):
         """
         Verifica se é feriado (DF ou nacional - SG_UF = NULL)
+        Usa o conjunto de feriados em memória (utils/calendario_dias_uteis).
         """
-        return Feriado.query.filter(
-            Feriado.ANO == data.year,
-            Feriado.MES == data.month,
-            Feriado.DIA == data.day,
-            db.or_(
-                Feriado.SG_UF == 'DF',
-                Feriado.SG_UF.is_(None),
-                Feriado.SG_UF == ''
-            )
-        ).first() is not None
+        from app.utils.calendario_dias_uteis import feriados_df
+        return feriados_df().eh_feriado(data)
 
     @staticmethod
     def eh_dia_util(data):
@@ -361,9 +354,10 @@ class Calendario(db.Model):
         Verifica se a data é dia útil usando a tabela PAR_TB020_CALENDARIO.
         Retorna True se DIA_UTIL = 1, False se DIA_UTIL = 0 ou não encontrado.
         """
-        registro = Calendario.query.filter(Calendario.DIA == data).first()
-        if registro is not None:
-            return registro.DIA_UTIL == 1
+        from app.utils.calendario_dias_uteis import calendario_par
+        eh_util = calendario_par().eh_dia_util(data)
+        if eh_util is not None:
+            return eh_util
         return Feriado.eh_dia_util(data)
 
     @staticmethod
@@ -372,21 +366,8 @@ class Calendario(db.Model):
         Carrega todos os dias do mês e retorna dois sets: úteis e não úteis.
         Usado pelo sorteio automático.
         """
-        registros = Calendario.query.filter(
-            Calendario.DATA_ANO == ano,
-            Calendario.DATA_MES == mes
-        ).all()
-
-        dias_uteis = set()
-        dias_nao_uteis = set()
-
-        for reg in registros:
-            if reg.DIA_UTIL == 1:
-                dias_uteis.add(reg.DIA)
-            else:
-                dias_nao_uteis.add(reg.DIA)
-
-        return dias_uteis, dias_nao_uteis
+        from app.utils.calendario_dias_uteis import calendario_par
+        return calendario_par().dias_do_mes(ano, mes)
 
     @staticmethod
     def carregar_info_mes(ano, mes):
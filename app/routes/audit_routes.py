@@ -1,9 +1,14 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
 from app.models.audit_log import AuditLog
 from flask_login import login_required
 from app.auth.utils import admin_required
 from datetime import datetime, timedelta
 from app.utils.audit_reverter import AuditReverter
+from app.utils.auditoria_logs import (listar_logs, obter_log_arquivado, meses_arquivados, codificar_cursor,
+                                      decodificar_cursor, arquivamento_pendente, arquivar_logs_antigos,
+                                      limite_arquivamento, RECURSO_ARQUIVAMENTO)
+from app.utils.log_seguro import log_erro
+from app.utils.processo_jobs import submeter_job
 
 audit_bp = Blueprint('audit', __name__)
 
@@ -23,34 +28,52 @@ def index():
     usuario_id = request.args.get('usuario_id', '')
     data_inicio = request.args.get('data_inicio', '')
     data_fim = request.args.get('data_fim', '')
+    arquivo = request.args.get('arquivo', '')
 
-    # Consulta base
-    query = AuditLog.query
-
-    # Aplicar filtros
-    if entidade:
-        query = query.filter(AuditLog.ENTIDADE == entidade)
-    if acao:
-        query = query.filter(AuditLog.ACAO == acao)
-    if usuario_id:
-        query = query.filter(AuditLog.USUARIO_ID == usuario_id)
+    filtros = {'entidade': entidade, 'acao': acao}
+    if usuario_id.isdigit():
+        filtros['usuario_id'] = int(usuario_id)
     if data_inicio:
         try:
-            data_inicio_dt = datetime.strptime(data_inicio, '%Y-%m-%d')
-            query = query.filter(AuditLog.DATA >= data_inicio_dt)
-        except:
+            filtros['data_inicio'] = datetime.strptime(data_inicio, '%Y-%m-%d')
+        except ValueError:
             pass
     if data_fim:
         try:
-            data_fim_dt = datetime.strptime(data_fim, '%Y-%m-%d')
-            # Adiciona um dia para incluir no último dia
-            data_fim_dt = data_fim_dt + timedelta(days=1)
-            query = query.filter(AuditLog.DATA <= data_fim_dt)
-        except:
+            # Adiciona um dia para incluir o último dia inteiro
+            filtros['data_fim'] = datetime.strptime(data_fim, '%Y-%m-%d') + timedelta(days=1)
+        except ValueError:
             pass
 
-    # Ordenar por data decrescente (mais recentes primeiro)
-    logs = query.order_by(AuditLog.DATA.desc()).all()
+    # Rollover mensal: na primeira consulta do mês, arquiva os meses antigos em segundo plano
+    try:
+        if arquivamento_pendente():
+            submeter_job('auditoria_arquivamento', arquivar_logs_antigos,
+                         descricao='Arquivamento mensal dos logs de auditoria',
+                         recurso_lock=RECURSO_ARQUIVAMENTO)
+    except Exception as e:
+        log_erro("Erro ao agendar arquivamento da auditoria: {0}".format(repr(e)))
+
+    meses = meses_arquivados()
+    if arquivo not in meses:
+        arquivo = ''
+
+    # Paginação por chave (DATA, ID): cada página parte do último registro exibido
+    logs, tem_mais_antigos, tem_mais_recentes = listar_logs(
+        filtros,
+        mes_arquivo=arquivo or None,
+        antes=decodificar_cursor(request.args.get('antes')) if request.args.get('antes') else None,
+        depois=decodificar_cursor(request.args.get('depois')) if request.args.get('depois') else None
+    )
+
+    parametros = {chave: valor for chave, valor in (
+        ('entidade', entidade), ('acao', acao), ('usuario_id', usuario_id),
+        ('data_inicio', data_inicio), ('data_fim', data_fim), ('arquivo', arquivo)) if valor}
+    url_antigos = url_recentes = None
+    if logs and tem_mais_antigos:
+        url_antigos = url_for('audit.index', antes=codificar_cursor(logs[-1].DATA, logs[-1].ID), **parametros)
+    if logs and tem_mais_recentes:
+        url_recentes = url_for('audit.index', depois=codificar_cursor(logs[0].DATA, logs[0].ID), **parametros)
 
     # Buscar usuários para o filtro
     from app.models.usuario import Usuario
@@ -60,18 +83,45 @@ def index():
     return render_template('auditoria/index.html',
                            logs=logs,
                            usuarios=usuarios,
+                           meses_arquivados=meses,
+                           arquivo=arquivo,
+                           url_antigos=url_antigos,
+                           url_recentes=url_recentes,
+                           url_primeira=url_for('audit.index', **parametros),
                            entidade=entidade or '',
                            acao=acao or '',
                            usuario_id=usuario_id or '',
                            data_inicio=data_inicio or '',
                            data_fim=data_fim or '')
 
+
 @audit_bp.route('/auditoria/<int:id>')
 @login_required
 @admin_required
 def detalhes(id):
-    log = AuditLog.query.get_or_404(id)
-    return render_template('auditoria/detalhes.html', log=log)
+    arquivo = request.args.get('arquivo', '')
+    log = None if arquivo else AuditLog.query.get(id)
+    if log is None:
+        # Não está na tabela viva: procura nos meses arquivados
+        try:
+            log, arquivo = obter_log_arquivado(id, arquivo or None)
+        except ValueError:
+            log = None
+        if log is None:
+            abort(404)
+    return render_template('auditoria/detalhes.html', log=log, arquivo=arquivo or '')
+
+
+@audit_bp.route('/auditoria/arquivar', methods=['POST'])
+@login_required
+@admin_required
+def arquivar():
+    job_id = submeter_job('auditoria_arquivamento', arquivar_logs_antigos,
+                          descricao='Arquivamento dos logs de auditoria',
+                          recurso_lock=RECURSO_ARQUIVAMENTO)
+    flash('Arquivamento dos logs anteriores a {0:%m/%Y} enviado para processamento (job {1}).'.format(
+        limite_arquivamento(), job_id), 'success')
+    return redirect(url_for('audit.index'))
 
 
 @audit_bp.route('/auditoria/<int:id>/reverter', methods=['POST'])
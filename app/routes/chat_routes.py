@@ -3,6 +3,8 @@ from flask_login import login_required, current_user
 from app import db
 from app.models.mensagem import Mensagem
 from app.models.usuario import Usuario
+from app.utils.eventos_tempo_real import publicar_usuario
+from app.utils.chat_resumo import registrar_mensagem, marcar_lidas, listar_conversas
 from datetime import datetime
 
 chat_bp = Blueprint('chat', __name__)
@@ -19,43 +21,8 @@ def index():
     # Obter todos os usuários admins para chat
     admins = Usuario.query.filter_by(PERFIL='admin', DELETED_AT=None).all()
 
-    # Obter conversas recentes
-    conversas = db.session.query(
-        db.func.max(Mensagem.CREATED_AT).label('ultima_data'),
-        Mensagem.REMETENTE_ID,
-        Mensagem.DESTINATARIO_ID
-    ).filter(
-        ((Mensagem.REMETENTE_ID == current_user.id) |
-         (Mensagem.DESTINATARIO_ID == current_user.id))
-    ).group_by(
-        Mensagem.REMETENTE_ID,
-        Mensagem.DESTINATARIO_ID
-    ).order_by(
-        db.desc('ultima_data')
-    ).all()
-
-    # Processar conversas para exibição
-    conversas_exibicao = []
-    usuarios_ids = set()
-
-    for conversa in conversas:
-        outro_usuario_id = conversa.DESTINATARIO_ID if conversa.REMETENTE_ID == current_user.id else conversa.REMETENTE_ID
-        if outro_usuario_id not in usuarios_ids:
-            usuarios_ids.add(outro_usuario_id)
-            usuario = Usuario.query.get(outro_usuario_id)
-            if usuario:
-                # Contar mensagens não lidas
-                nao_lidas = Mensagem.query.filter_by(
-                    REMETENTE_ID=outro_usuario_id,
-                    DESTINATARIO_ID=current_user.id,
-                    LIDO=False
-                ).count()
-
-                conversas_exibicao.append({
-                    'usuario': usuario,
-                    'ultima_data': conversa.ultima_data,
-                    'nao_lidas': nao_lidas
-                })
+    # Conversas recentes: uma consulta no resumo (nome, última mensagem e não lidas)
+    conversas_exibicao = listar_conversas(current_user.id)
 
     return render_template('chat/index.html', admins=admins, conversas=conversas_exibicao)
 
@@ -78,11 +45,14 @@ def conversa(usuario_id):
     ).order_by(Mensagem.CREATED_AT).all()
 
     # Marcar mensagens como lidas
+    lidas_agora = 0
     for mensagem in mensagens:
         if mensagem.DESTINATARIO_ID == current_user.id and not mensagem.LIDO:
             mensagem.LIDO = True
             mensagem.LIDO_AT = datetime.utcnow()
+            lidas_agora += 1
 
+    marcar_lidas(current_user.id, usuario_id, lidas_agora)
     db.session.commit()
 
     return render_template('chat/conversa.html', usuario=usuario, mensagens=mensagens)
@@ -109,6 +79,8 @@ def enviar_mensagem():
         )
 
         db.session.add(mensagem)
+        db.session.flush()
+        registrar_mensagem(mensagem)
         db.session.commit()
 
         # Formatar mensagem para resposta AJAX
@@ -121,6 +93,9 @@ def enviar_mensagem():
             'is_mine': True  # Sempre será verdadeiro para mensagens recém-enviadas
         }
 
+        # Aviso em tempo real ao destinatário (SSE); /chat/novas continua como fallback
+        publicar_usuario(destinatario_id, 'mensagem', dict(mensagem_formatada, is_mine=False))
+
         return jsonify({
             'success': True,
             'message': 'Mensagem enviada com sucesso!',
@@ -145,10 +120,14 @@ def verificar_novas_mensagens(usuario_id):
         ).order_by(Mensagem.CREATED_AT).all()
 
         # Marcar como lidas
+        lidas_agora = 0
         for mensagem in novas_mensagens:
+            if not mensagem.LIDO:
+                lidas_agora += 1
             mensagem.LIDO = True
             mensagem.LIDO_AT = datetime.utcnow()
 
+        marcar_lidas(current_user.id, usuario_id, lidas_agora)
         db.session.commit()
 
         # Formatar mensagens para resposta AJAX
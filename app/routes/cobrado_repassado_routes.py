@@ -10,10 +10,10 @@ from app.models.pendencia_retencao import (
     AexAnalitico,
     PenRelacionaVlrRepassado
 )
-from sqlalchemy import text, or_  # ⚠️ IMPORTANTE: Adicionar o 'or_'
 from decimal import Decimal
-from datetime import datetime
 from app.utils.audit import registrar_log
+from app.utils.contrato_analitico import buscar_analiticos
+from app.utils.vinculacao_pendencias import gravar_vinculacoes, registrar_observacao
 
 cobrado_repassado_bp = Blueprint('cobrado_repassado', __name__, url_prefix='/cobrado-repassado')
 
@@ -70,37 +70,14 @@ def consultar():
                 PenDetalhamento.DEVEDOR == 'CAIXA'  # ✅ NOVO FILTRO
             ).all()
 
-            # Criar variações do número do contrato
-            nu_contrato_int = int(nu_contrato_decimal)
-            variações_contrato = [
-                str(nu_contrato_int),
-                nu_contrato,
-                nu_contrato.zfill(10),
-                nu_contrato.zfill(15),
-                f"{nu_contrato_int:010d}",
-                f"{nu_contrato_int:015d}",
-                str(nu_contrato_decimal),
-            ]
-            variações_contrato = list(dict.fromkeys(variações_contrato))
-
             print(f"🔍 COBRADO VS REPASSADO - Buscando contrato: {nu_contrato} (DEVEDOR=CAIXA)")
             print(f"   Pendências encontradas: {len(pendencias)}")
 
-            # Buscar valores repassados (POSITIVOS)
-            analiticos = AexAnalitico.query.filter(
-                or_(*[AexAnalitico.NU_CONTRATO == var for var in variações_contrato]),
-                AexAnalitico.VALOR > 0
-            ).all()
+            # Buscar valores repassados (POSITIVOS) - seek na chave normalizada do contrato
+            analiticos = buscar_analiticos(nu_contrato, sinal='positivo')
 
             print(f"✅ Encontrados {len(analiticos)} valores repassados (POSITIVOS)")
 
-            if not analiticos:
-                analiticos = AexAnalitico.query.filter(
-                    AexAnalitico.NU_CONTRATO.like(f'%{nu_contrato_int}%'),
-                    AexAnalitico.VALOR > 0
-                ).all()
-                print(f"📊 Encontrados {len(analiticos)} valores repassados com LIKE")
-
             # Buscar vinculações
             ids_pendencias = [p.PenDetalhamento.ID_DETALHAMENTO for p in pendencias]
             vinculacoes_por_pendencia = {}
@@ -281,38 +258,9 @@ def salvar_vinculacao():
         observacao = data.get('observacao', '').strip()
         apenas_observacao = data.get('apenas_observacao', False)
 
-        contador = 0
-
         # Se for apenas observação (sem analíticos disponíveis)
         if apenas_observacao:
-            if ids_pendencias:
-                for id_pendencia in ids_pendencias:
-                    sql_insert = text("""
-                        INSERT INTO BDG.PEN_TB011_RELACIONA_VLR_REPASSADO 
-                        (ID_PENDENCIA, ID_ARREC_EXT_SISTEMA, OBS, NO_RSPONSAVEL, DT_ANALISE)
-                        VALUES (:id_pend, NULL, :obs, :responsavel, :dt_analise)
-                    """)
-
-                    db.session.execute(sql_insert, {
-                        'id_pend': id_pendencia,
-                        'obs': observacao,
-                        'responsavel': current_user.nome,
-                        'dt_analise': datetime.now()
-                    })
-                    contador += 1
-            else:
-                sql_insert = text("""
-                    INSERT INTO BDG.PEN_TB011_RELACIONA_VLR_REPASSADO 
-                    (ID_PENDENCIA, ID_ARREC_EXT_SISTEMA, OBS, NO_RSPONSAVEL, DT_ANALISE)
-                    VALUES (NULL, NULL, :obs, :responsavel, :dt_analise)
-                """)
-
-                db.session.execute(sql_insert, {
-                    'obs': observacao,
-                    'responsavel': current_user.nome,
-                    'dt_analise': datetime.now()
-                })
-                contador = 1
+            contador = registrar_observacao('repassado', ids_pendencias, observacao, current_user.nome)
 
             db.session.commit()
 
@@ -339,60 +287,12 @@ def salvar_vinculacao():
                 'message': 'Selecione ao menos um registro analítico.'
             }), 400
 
-        if ids_pendencias:
-            # Se houver pendências, criar vinculação normal
-            for id_pendencia in ids_pendencias:
-                for id_analitico in ids_analiticos:
-                    # Verificar se já existe
-                    sql_check = text("""
-                        SELECT COUNT(*) FROM BDG.PEN_TB011_RELACIONA_VLR_REPASSADO 
-                        WHERE ID_PENDENCIA = :id_pend AND ID_ARREC_EXT_SISTEMA = :id_arrec
-                    """)
-
-                    result = db.session.execute(sql_check, {
-                        'id_pend': id_pendencia,
-                        'id_arrec': id_analitico
-                    }).scalar()
-
-                    if result == 0:
-                        sql_insert = text("""
-                            INSERT INTO BDG.PEN_TB011_RELACIONA_VLR_REPASSADO 
-                            (ID_PENDENCIA, ID_ARREC_EXT_SISTEMA, OBS, NO_RSPONSAVEL, DT_ANALISE)
-                            VALUES (:id_pend, :id_arrec, :obs, :responsavel, :dt_analise)
-                        """)
-
-                        db.session.execute(sql_insert, {
-                            'id_pend': id_pendencia,
-                            'id_arrec': id_analitico,
-                            'obs': observacao,
-                            'responsavel': current_user.nome,
-                            'dt_analise': datetime.now()
-                        })
-                        contador += 1
-        else:
-            # Se não houver pendências, criar vinculação com ID_PENDENCIA = NULL
-            for id_analitico in ids_analiticos:
-                sql_check = text("""
-                    SELECT COUNT(*) FROM BDG.PEN_TB011_RELACIONA_VLR_REPASSADO 
-                    WHERE ID_PENDENCIA IS NULL AND ID_ARREC_EXT_SISTEMA = :id_arrec
-                """)
-
-                result = db.session.execute(sql_check, {'id_arrec': id_analitico}).scalar()
-
-                if result == 0:
-                    sql_insert = text("""
-                        INSERT INTO BDG.PEN_TB011_RELACIONA_VLR_REPASSADO 
-                        (ID_PENDENCIA, ID_ARREC_EXT_SISTEMA, OBS, NO_RSPONSAVEL, DT_ANALISE)
-                        VALUES (NULL, :id_arrec, :obs, :responsavel, :dt_analise)
-                    """)
-
-                    db.session.execute(sql_insert, {
-                        'id_arrec': id_analitico,
-                        'obs': observacao,
-                        'responsavel': current_user.nome,
-                        'dt_analise': datetime.now()
-                    })
-                    contador += 1
+        # Conjunto desejado de pares gravado de uma vez (sem pendências: ID_PENDENCIA NULL).
+        # substituir=True remove os vínculos dessas pendências que ficaram de fora.
+        contador, removidos = gravar_vinculacoes(
+            'repassado', ids_pendencias, ids_analiticos, observacao, current_user.nome,
+            substituir=bool(data.get('substituir', False))
+        )
 
         db.session.commit()
 
@@ -404,6 +304,7 @@ def salvar_vinculacao():
             dados_novos={
                 'ids_pendencias': ids_pendencias,
                 'ids_analiticos': ids_analiticos,
+                'removidos': removidos,
                 'observacao': observacao
             }
         )
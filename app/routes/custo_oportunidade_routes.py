@@ -23,12 +23,12 @@ from flask_login import login_required, current_user
 from app import db
 from app.models.custo_oportunidade import CustoOportunidade
 from app.utils.audit import registrar_log
+from app.utils.b3_consolidado import baixar_mais_recente, obter_pregao
 from datetime import datetime, date, timedelta
 from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
 from sqlalchemy import text
 import os
 import tempfile
-import requests
 import urllib3
 
 # Desativa warning de SSL (firewall corporativo da EMGEA intercepta certificados)
@@ -346,8 +346,19 @@ def index():
 def executar_bot():
     """Pipeline completa do bot."""
     try:
-        # 1. Baixar CSV
-        caminho_csv, dt_atualizacao = _baixar_csv_b3()
+        # 1. Baixar CSV (dt_pregao opcional: reprocessa um pregão específico)
+        dados = request.get_json(silent=True) or {}
+        dt_pregao = None
+        if dados.get('dt_pregao'):
+            try:
+                dt_pregao = datetime.strptime(dados['dt_pregao'], '%Y-%m-%d').date()
+            except (TypeError, ValueError):
+                return jsonify({
+                    'success': False,
+                    'message': 'dt_pregao inválida (use AAAA-MM-DD).'
+                }), 400
+
+        caminho_csv, dt_atualizacao = _baixar_csv_b3(dt_pregao)
 
         if not caminho_csv or not os.path.exists(caminho_csv):
             return jsonify({
@@ -424,12 +435,6 @@ def executar_bot():
             }
         )
 
-        # 8. Limpar arquivo temp
-        try:
-            os.remove(caminho_csv)
-        except Exception:
-            pass
-
         return jsonify({
             'success': True,
             'message': (
@@ -545,74 +550,17 @@ def marcar_reuniao():
 # =========================================================================
 # DOWNLOAD DO CSV
 # =========================================================================
-def _baixar_csv_b3():
+def _baixar_csv_b3(dt_pregao=None):
     """
-    Baixa CSV de Negócios Consolidados via POST na API da B3. Tenta do
-    dia atual para trás até 10 dias. Retorna (caminho, dt_atualizacao).
+    CSV de Negócios Consolidados da B3 (ver app/utils/b3_consolidado.py).
+    Sem dt_pregao: pregão mais recente dos últimos 10 dias, com as datas
+    consultadas em paralelo. Com dt_pregao: aquele pregão (cache ou rede).
+    Retorna (caminho, dt_atualizacao); o arquivo fica no cache, não apagar.
     """
-    url = 'https://arquivos.b3.com.br/bdi/table/export/csv?lang=pt-BR'
-
-    headers = {
-        'Content-Type': 'application/json',
-        'Accept': 'text/csv, */*',
-        'Origin': 'https://arquivos.b3.com.br',
-        'Referer': 'https://arquivos.b3.com.br/bdi/tabelas?lang=pt-BR',
-        'User-Agent': (
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-            'AppleWebKit/537.36 (KHTML, like Gecko) '
-            'Chrome/120.0.0.0 Safari/537.36'
-        ),
-    }
-
-    hoje = datetime.now().date()
-
-    for dias_atras in range(0, 10):
-        tentativa = hoje - timedelta(days=dias_atras)
-        data_str = tentativa.strftime('%Y-%m-%d')
-
-        payload = {
-            'Name': 'ConsolidatedTradesDerivatives',
-            'ClientId': '',
-            'Date': data_str,
-            'Filters': {},
-            'FinalDate': data_str,
-        }
-
-        try:
-            response = requests.post(
-                url, json=payload, headers=headers,
-                verify=False, timeout=60
-            )
-        except requests.RequestException as e:
-            print(f'[CustoOportunidade] Erro de rede em {data_str}: {e}')
-            continue
-
-        if response.status_code != 200:
-            print(f'[CustoOportunidade] {data_str}: HTTP {response.status_code} - pulando')
-            continue
-
-        conteudo = response.content
-        if len(conteudo) < 2000:
-            continue
-        if b'Instrumento financeiro' not in conteudo:
-            continue
-        if b'\nDI1' not in conteudo and b'\rDI1' not in conteudo:
-            print(f'[CustoOportunidade] {data_str}: sem DI1 (não consolidado) - pulando')
-            continue
-
-        caminho = os.path.join(
-            tempfile.gettempdir(),
-            f'b3_negocios_{data_str}_{datetime.now().strftime("%H%M%S")}.csv'
-        )
-        with open(caminho, 'wb') as f:
-            f.write(conteudo)
-
-        print(f'[CustoOportunidade] CSV VÁLIDO: {caminho} '
-              f'({len(conteudo)} bytes, pregão de {data_str})')
-
-        return caminho, tentativa
-
-    return None, None
+    if dt_pregao is not None:
+        caminho = obter_pregao(dt_pregao)
+        return (caminho, dt_pregao) if caminho else (None, None)
+    return baixar_mais_recente()
 
 
 # =========================================================================
@@ -0,0 +1,96 @@
+# app/routes/eventos_routes.py
+"""
+Canal Server-Sent Events (SSE) do portal.
+
+Cada aba logada abre UMA conexão em /eventos/stream (EventSource, no base.html)
+e recebe os eventos publicados em app/utils/eventos_tempo_real:
+    mensagem     -> nova mensagem de chat para o usuário
+    notificacao  -> notificação ativada para todos
+
+Cada conexão ocupa uma thread do Waitress enquanto está aberta, por isso:
+    - no máximo MAX_CONEXOES conexões simultâneas por processo (o run.py deixa
+      threads de sobra para as páginas); acima disso a rota responde 204 e o
+      navegador fica no polling antigo (fallback);
+    - a conexão dura até DURACAO_MAXIMA segundos e o EventSource reconecta;
+    - um comentário de heartbeat a cada HEARTBEAT_SEGUNDOS derruba rápido as
+      conexões de abas já fechadas.
+O gerador não usa a db.session: nenhuma conexão do pool fica presa no stream.
+"""
+import json
+import threading
+import time
+
+from flask import Blueprint, Response
+from flask_login import login_required, current_user
+
+from app.utils.eventos_tempo_real import assinar, cancelar, canal_usuario, CANAL_TODOS
+
+eventos_bp = Blueprint('eventos', __name__, url_prefix='/eventos')
+
+MAX_CONEXOES = 32
+DURACAO_MAXIMA = 600
+HEARTBEAT_SEGUNDOS = 15
+RECONEXAO_MS = 5000
+
+_conexoes = [0]
+_conexoes_lock = threading.Lock()
+
+
+def _reservar_conexao():
+    with _conexoes_lock:
+        if _conexoes[0] >= MAX_CONEXOES:
+            return False
+        _conexoes[0] += 1
+        return True
+
+
+def _liberar_conexao():
+    with _conexoes_lock:
+        _conexoes[0] -= 1
+
+
+def _formatar(evento):
+    return 'event: {0}\ndata: {1}\n\n'.format(
+        evento['tipo'], json.dumps(evento['dados'], ensure_ascii=False, default=str))
+
+
+def _fluxo(assinatura):
+    yield 'retry: {0}\n\n'.format(RECONEXAO_MS)
+    fim = time.monotonic() + DURACAO_MAXIMA
+    while time.monotonic() < fim:
+        evento = assinatura.proximo(timeout=HEARTBEAT_SEGUNDOS)
+        if evento is None:
+            yield ': ping\n\n'
+        else:
+            yield _formatar(evento)
+
+
+@eventos_bp.route('/stream')
+@login_required
+def stream():
+    """Stream SSE do usuário logado (204 = sem vaga, cliente usa o polling)."""
+    if not _reservar_conexao():
+        return Response(status=204)
+
+    try:
+        assinatura = assinar([canal_usuario(current_user.id), CANAL_TODOS])
+    except Exception:
+        _liberar_conexao()
+        raise
+
+    resposta = Response(
+        _fluxo(assinatura),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+    # Roda no close() do servidor, mesmo se o gerador nunca tiver começado
+    @resposta.call_on_close
+    def _encerrar():
+        cancelar(assinatura)
+        _liberar_conexao()
+
+    return resposta
@@ -15,6 +15,11 @@ import math
 import random
 import logging
 from app.utils.distribuir_contratos import obter_resultados_finais_distribuicao, contar_contratos_serasa
+from app.utils.processo_jobs import submeter_job, obter_job
+from app.models.processo_job import ProcessoJob
+from app.utils.lock_processo import lock_exclusivo
+from app.utils.staging_distribuicao import sql_staging, staging_execucao, recurso_lock, RECURSO_DISTRIBUICAO
+from app.utils.cubo_dashboard import obter_dados_dashboard, atualizar_cubo_seguro
 
 limite_bp = Blueprint('limite', __name__, url_prefix='/credenciamento')
 
@@ -115,6 +120,19 @@ def lista_limites():
 
 
 def selecionar_contratos():
+    """
+    Conta a base do pool das assessorias em um staging próprio (DCA_TB006 da execução),
+    sem truncar o pool global usado por uma distribuição em andamento.
+    """
+    try:
+        with staging_execucao():
+            return _selecionar_contratos_pool()
+    except Exception as e:
+        logging.error(f"Erro: {str(e)}")
+        return 0
+
+
+def _selecionar_contratos_pool():
     """
     Base de contagem para o cálculo dos percentuais das ASSESSORIAS (pool DCA_TB006),
     lendo da COM_TB082_DISTRIBUICAO_SERASA_ASSESSORIA_CRITERIOS.
@@ -130,10 +148,10 @@ def selecionar_contratos():
         with db.engine.connect() as connection:
             try:
                 logging.info("Limpando tabelas...")
-                connection.execute(text("TRUNCATE TABLE [BDG].[DCA_TB006_DISTRIBUIVEIS]"))
-                connection.execute(text("TRUNCATE TABLE [BDG].[DCA_TB007_ARRASTAVEIS]"))
+                connection.execute(text(sql_staging("TRUNCATE TABLE [BDG].[DCA_TB006_DISTRIBUIVEIS]")))
+                connection.execute(text(sql_staging("TRUNCATE TABLE [BDG].[DCA_TB007_ARRASTAVEIS]")))
 
-                insert_sql = text("""
+                insert_sql = text(sql_staging("""
                     -- ================================================================
                     -- PREPARAÇÃO
                     -- ================================================================
@@ -251,12 +269,12 @@ def selecionar_contratos():
 
                     DROP TABLE #CPFsSerasa;
                     DROP TABLE #CPFsComAcordo;
-                """)
+                """))
 
                 connection.execute(insert_sql)
                 logging.info("Inserção concluída")
 
-                count_sql = text("SELECT COUNT(*) FROM [BDG].[DCA_TB006_DISTRIBUIVEIS]")
+                count_sql = text(sql_staging("SELECT COUNT(*) FROM [BDG].[DCA_TB006_DISTRIBUIVEIS]"))
                 num_contratos = connection.execute(count_sql).scalar()
                 logging.info(f"Total (pool assessorias): {num_contratos}")
                 return num_contratos
@@ -1772,8 +1790,33 @@ def distribuir_contratos():
         logging.info(f"Distribuição de contratos - Período: {ultimo_periodo.ID_PERIODO}")
         logging.info(f"Empresas descredenciadas encontradas: {len(empresas_descredenciadas)}")
 
+        # Limites vigentes: base dos cenários de simulação
+        limites_vigentes = LimiteDistribuicao.query.filter(
+            LimiteDistribuicao.ID_EDITAL == ultimo_edital.ID,
+            LimiteDistribuicao.ID_PERIODO == ultimo_periodo.ID_PERIODO,
+            LimiteDistribuicao.DELETED_AT == None
+        ).order_by(LimiteDistribuicao.PERCENTUAL_FINAL.desc()).all()
+        nomes_empresas = {
+            empresa.ID_EMPRESA: empresa.NO_EMPRESA_ABREVIADA or empresa.NO_EMPRESA
+            for empresa in EmpresaParticipante.query.filter(
+                EmpresaParticipante.ID_EDITAL == ultimo_edital.ID,
+                EmpresaParticipante.ID_PERIODO == ultimo_periodo.ID_PERIODO,
+                EmpresaParticipante.DELETED_AT == None
+            ).all()
+        }
+
         resultados = None
 
+        # Distribuição completa roda em segundo plano: a página acompanha o job
+        job = None
+        job_id = request.args.get('job_id', type=int)
+        if job_id:
+            job = obter_job(job_id)
+            if job and job.STATUS == ProcessoJob.STATUS_CONCLUIDO:
+                resultados = job.resultado
+            elif job and job.STATUS == ProcessoJob.STATUS_ERRO:
+                flash(f'Erro ao processar a distribuição: {job.ERRO}', 'danger')
+
         if request.method == 'POST':
             try:
                 edital_id = ultimo_edital.ID
@@ -1781,12 +1824,43 @@ def distribuir_contratos():
 
                 # Importar as funções necessárias do seu arquivo de utils
                 from app.utils.distribuir_contratos import selecionar_contratos_distribuiveis, \
-                    processar_distribuicao_completa
+                    processar_distribuicao_completa, simular_distribuicao
 
                 modo_execucao = request.form.get('modo_execucao', 'selecao')
                 logging.info(f"Modo de execução selecionado: {modo_execucao}")
 
-                if modo_execucao == 'completo':
+                if modo_execucao == 'simulacao':
+                    # Cenário de PERCENTUAL_FINAL informado na tela (campos percentual_<ID_EMPRESA>)
+                    percentuais = {}
+                    for limite in limites_vigentes:
+                        valor = request.form.get(f'percentual_{limite.ID_EMPRESA}', '').strip().replace(',', '.')
+                        if valor:
+                            try:
+                                percentuais[limite.ID_EMPRESA] = float(valor)
+                            except ValueError:
+                                flash(f'Percentual inválido para a empresa {limite.ID_EMPRESA}: {valor}', 'warning')
+                                return redirect(url_for('limite.distribuir_contratos'))
+
+                    parametros = {
+                        'modo': 'simulacao',
+                        'edital_id': edital_id,
+                        'periodo_id': periodo_id,
+                        'percentuais': {str(k): v for k, v in percentuais.items()}
+                    }
+                    # Simulação não grava na DCA_TB005: dispensa o lock da distribuição
+                    job_id = submeter_job(
+                        'simulacao_distribuicao',
+                        simular_distribuicao,
+                        args=(edital_id, periodo_id),
+                        kwargs={'percentuais': percentuais},
+                        descricao=f'Simulação de distribuição - Edital {ultimo_edital.NU_EDITAL}/{ultimo_edital.ANO}',
+                        parametros=parametros
+                    )
+
+                    flash('Simulação enviada para processamento. Nenhum dado de produção será alterado.', 'info')
+                    return redirect(url_for('limite.distribuir_contratos', job_id=job_id))
+
+                elif modo_execucao == 'completo':
                     # Verificar se deve usar distribuição igualitária
                     usar_distribuicao_igualitaria = request.form.get('usar_distribuicao_igualitaria') == '1'
                     empresa_descredenciada_id = None
@@ -1807,49 +1881,52 @@ def distribuir_contratos():
                         logging.info(
                             f"Distribuição igualitária ativada para empresa {empresa_descredenciada_id} com data {data_fim_periodo_anterior}")
 
-                    # Executar o processo completo de distribuição
-                    # MODIFICADO: A chamada agora inclui o parâmetro 'data_fim_periodo_anterior'
-                    resultados = processar_distribuicao_completa(
-                        edital_id,
-                        periodo_id,
-                        usar_distribuicao_igualitaria=usar_distribuicao_igualitaria,
-                        empresa_descredenciada_id=empresa_descredenciada_id,
-                        data_fim_periodo_anterior=data_fim_periodo_anterior
+                    # Executar o processo completo de distribuição em segundo plano
+                    parametros = {
+                        'modo': 'completo',
+                        'edital_id': edital_id,
+                        'periodo_id': periodo_id,
+                        'usou_distribuicao_igualitaria': usar_distribuicao_igualitaria,
+                        'empresa_descredenciada_id': empresa_descredenciada_id,
+                        'data_fim_periodo_anterior': data_fim_periodo_anterior
+                    }
+                    job_id = submeter_job(
+                        'distribuicao',
+                        processar_distribuicao_completa,
+                        args=(edital_id, periodo_id),
+                        kwargs={
+                            'usar_distribuicao_igualitaria': usar_distribuicao_igualitaria,
+                            'empresa_descredenciada_id': empresa_descredenciada_id,
+                            'data_fim_periodo_anterior': data_fim_periodo_anterior,
+                            'staging_isolado': True
+                        },
+                        descricao=f'Distribuição de contratos - Edital {ultimo_edital.NU_EDITAL}/{ultimo_edital.ANO}',
+                        parametros=parametros,
+                        recurso_lock=recurso_lock(edital_id, periodo_id)
                     )
 
-                    logging.info(f"Resultados obtidos: {resultados}")
-
-                    if resultados.get('contratos_distribuiveis', 0) > 0:
-                        mensagem = f'Processo de distribuição concluído. {resultados.get("total_distribuido", 0)} contratos distribuídos.'
-
-                        if usar_distribuicao_igualitaria:
-                            mensagem += f' A distribuição igualitária foi aplicada para a empresa selecionada.'
-
-                        flash(mensagem, 'success')
-
-                        # Registrar log de auditoria
-                        registrar_log(
-                            acao='distribuir',
-                            entidade='distribuicao',
-                            entidade_id=periodo_id,
-                            descricao=f'Distribuição de contratos - Edital {ultimo_edital.NU_EDITAL}/{ultimo_edital.ANO}',
-                            dados_novos={
-                                'modo': 'completo',
-                                'usou_distribuicao_igualitaria': usar_distribuicao_igualitaria,
-                                'empresa_descredenciada_id': empresa_descredenciada_id,
-                                'data_fim_periodo_anterior': data_fim_periodo_anterior,
-                                'resultados': resultados
-                            }
-                        )
-                    else:
-                        flash('Nenhum contrato disponível para distribuição.', 'warning')
+                    # Registrar log de auditoria
+                    registrar_log(
+                        acao='distribuir',
+                        entidade='distribuicao',
+                        entidade_id=periodo_id,
+                        descricao=f'Distribuição de contratos - Edital {ultimo_edital.NU_EDITAL}/{ultimo_edital.ANO}',
+                        dados_novos=dict(parametros, job_id=job_id)
+                    )
+
+                    flash('Distribuição enviada para processamento. Acompanhe o andamento abaixo.', 'info')
+                    return redirect(url_for('limite.distribuir_contratos', job_id=job_id))
 
                 else:  # modo == 'selecao'
                     logging.info("Iniciando seleção de contratos distribuíveis...")
-                    num_contratos = selecionar_contratos_distribuiveis()
+                    with lock_exclusivo(RECURSO_DISTRIBUICAO) as obtido:
+                        num_contratos = selecionar_contratos_distribuiveis() if obtido else None
                     logging.info(f"Contratos selecionados: {num_contratos}")
 
-                    if num_contratos > 0:
+                    if num_contratos is None:
+                        flash('Há uma distribuição em execução. Aguarde a conclusão para selecionar novamente.',
+                              'warning')
+                    elif num_contratos > 0:
                         flash(f'Seleção concluída. {num_contratos} contratos disponíveis.', 'success')
                         resultados = {'contratos_distribuiveis': num_contratos}
                     else:
@@ -1866,7 +1943,10 @@ def distribuir_contratos():
             ultimo_edital=ultimo_edital,
             ultimo_periodo=ultimo_periodo,
             resultados=resultados,
-            empresas_descredenciadas=empresas_descredenciadas
+            empresas_descredenciadas=empresas_descredenciadas,
+            limites_vigentes=limites_vigentes,
+            nomes_empresas=nomes_empresas,
+            job=job
         )
 
     except Exception as e:
@@ -1909,6 +1989,9 @@ def homologar_distribuicao():
             }
         )
 
+        # Dashboard passa a refletir a distribuição homologada
+        atualizar_cubo_seguro(edital_id, periodo_id)
+
         # Redirecionar ou fazer download direto
         if download_arquivo:
             # Gerar o arquivo TXT para download
@@ -2051,6 +2134,18 @@ def redistribuir_contratos():
         # Status da execução
         resultados = None
 
+        # Redistribuição roda em segundo plano: a página acompanha o job
+        job = None
+        job_id = request.args.get('job_id', type=int)
+        if job_id:
+            job = obter_job(job_id)
+            if job and job.STATUS == ProcessoJob.STATUS_CONCLUIDO:
+                resultados = job.resultado
+                if resultados and not resultados.get("success"):
+                    flash('Falha na redistribuição de contratos. Verifique os logs.', 'danger')
+            elif job and job.STATUS == ProcessoJob.STATUS_ERRO:
+                flash(f'Erro ao processar redistribuição: {job.ERRO}', 'danger')
+
         # Se for POST, processar a redistribuição
         if request.method == 'POST':
             try:
@@ -2128,20 +2223,24 @@ def redistribuir_contratos():
                 # Log informações importantes
                 logging.info(f"Iniciando redistribuição - Empresa saindo: {empresa_id}, Empresas receptoras: {len(empresas_receptoras)}")
 
-                # Executar a redistribuição
-                resultados = processar_redistribuicao_contratos(
-                    ultimo_edital.ID,
-                    ultimo_periodo.ID_PERIODO,
-                    empresa_id,
-                    criterio_id
+                # Executar a redistribuição em segundo plano
+                job_id = submeter_job(
+                    'redistribuicao',
+                    processar_redistribuicao_contratos,
+                    args=(ultimo_edital.ID, ultimo_periodo.ID_PERIODO, empresa_id, criterio_id),
+                    kwargs={'staging_isolado': True},
+                    descricao=f'Redistribuição de contratos - Edital {ultimo_edital.NU_EDITAL}/{ultimo_edital.ANO}',
+                    parametros={
+                        'edital_id': ultimo_edital.ID,
+                        'periodo_id': ultimo_periodo.ID_PERIODO,
+                        'empresa_id': empresa_id,
+                        'criterio_id': criterio_id
+                    },
+                    recurso_lock=recurso_lock(ultimo_edital.ID, ultimo_periodo.ID_PERIODO)
                 )
 
-                if resultados["success"]:
-                    flash(
-                        f'Redistribuição concluída. {resultados["contratos_redistribuidos"]} contratos redistribuídos entre {resultados["total_empresas"]} empresas.',
-                        'success')
-                else:
-                    flash('Falha na redistribuição de contratos. Verifique os logs.', 'danger')
+                flash('Redistribuição enviada para processamento. Acompanhe o andamento abaixo.', 'info')
+                return redirect(url_for('limite.redistribuir_contratos', job_id=job_id))
 
             except Exception as e:
                 flash(f'Erro ao processar redistribuição: {str(e)}', 'danger')
@@ -2156,7 +2255,8 @@ def redistribuir_contratos():
             empresas=empresas,
             criterios=criterios,
             resultados=resultados,
-            total_empresas_receptoras=len(empresas_receptoras)  # Passar informação adicional
+            total_empresas_receptoras=len(empresas_receptoras),  # Passar informação adicional
+            job=job
         )
     except Exception as e:
         flash(f'Erro na página de redistribuição: {str(e)}', 'danger')
@@ -2464,186 +2564,45 @@ def gerar_analitico_distribuicao(edital_id, periodo_id, empresa_id):
     """
     Gera o arquivo TXT com o relatório analítico de distribuição para a empresa selecionada.
     Formato de colunas fixas conforme especificado.
+    O arquivo é enviado em streaming, página a página (keyset em NR_CONTRATO).
     """
     try:
-        from flask import Response
+        from flask import Response, stream_with_context
         from datetime import datetime
-        from io import StringIO
-
-        # Buscar dados usando o SQL fornecido
-        with db.engine.connect() as connection:
-            sql = text("""
-                SELECT 
-                    PR.NO_ABREVIADO_PRODUTO,
-                    EM.NO_ABREVIADO_EMPRESA,
-                    DIS.COD_EMPRESA_COBRANCA,
-                    CTR.NR_CONTRATO,
-                    DIS.NR_CPF_CNPJ,
-                    DIS.VR_SD_DEVEDOR,
-                    CR.[DS_CRITERIO_SELECAO],
-                    SIT.QT_DIAS_ATRASO
-                FROM [BDG].[DCA_TB005_DISTRIBUICAO] DIS WITH (NOLOCK)
-                INNER JOIN BDG.PAR_TB002_EMPRESA_RESPONSAVEL_COBRANCA EM WITH (NOLOCK)
-                    ON DIS.COD_EMPRESA_COBRANCA = EM.pkEmpresaResponsavelCobranca
-                INNER JOIN BDG.COM_TB001_CONTRATO CTR WITH (NOLOCK)
-                    ON CTR.fkContratoSISCTR = DIS.fkContratoSISCTR
-                INNER JOIN BDG.PAR_TB001_PRODUTOS PR WITH (NOLOCK)
-                    ON PR.pkSistemaOriginario = CTR.COD_PRODUTO
-                INNER JOIN [BDG].[DCA_TB004_CRITERIO_SELECAO] CR WITH (NOLOCK)
-                    ON CR.COD = DIS.COD_CRITERIO_SELECAO
-                INNER JOIN BDG.COM_TB007_SITUACAO_CONTRATOS SIT WITH (NOLOCK)
-                    ON SIT.fkContratoSISCTR = DIS.fkContratoSISCTR
-                WHERE DIS.ID_PERIODO = :periodo_id 
-                    AND DIS.ID_EDITAL = :edital_id
-                    AND DIS.COD_EMPRESA_COBRANCA = :empresa_id
-                ORDER BY CTR.NR_CONTRATO
-            """)
+        from itertools import chain
+        from app.utils.analitico_distribuicao import paginas_analitico, gerar_texto_analitico, \
+            nome_arquivo_analitico
 
-            # Usar StringIO para construir o arquivo em memória
-            output = StringIO()
-
-            # Definir larguras das colunas baseado no exemplo fornecido
-            col_widths = {
-                'NO_ABREVIADO_PRODUTO': 20,
-                'NO_ABREVIADO_EMPRESA': 20,
-                'COD_EMPRESA_COBRANCA': 20,
-                'NR_CONTRATO': 39,
-                'NR_CPF_CNPJ': 20,
-                'VR_SD_DEVEDOR': 39,
-                'DS_CRITERIO_SELECAO': 100,
-                'QT_DIAS_ATRASO': 14
-            }
-
-            # Escrever cabeçalho
-            header = []
-            header.append('NO_ABREVIADO_PRODUTO'.ljust(col_widths['NO_ABREVIADO_PRODUTO']))
-            header.append('NO_ABREVIADO_EMPRESA'.ljust(col_widths['NO_ABREVIADO_EMPRESA']))
-            header.append('COD_EMPRESA_COBRANCA'.ljust(col_widths['COD_EMPRESA_COBRANCA']))
-            header.append('NR_CONTRATO'.ljust(col_widths['NR_CONTRATO']))
-            header.append('NR_CPF_CNPJ'.ljust(col_widths['NR_CPF_CNPJ']))
-            header.append('VR_SD_DEVEDOR'.ljust(col_widths['VR_SD_DEVEDOR']))
-            header.append('DS_CRITERIO_SELECAO'.ljust(col_widths['DS_CRITERIO_SELECAO']))
-            header.append('QT_DIAS_ATRASO')
-
-            output.write(' '.join(header) + '\n')
-
-            # Escrever linha de separação
-            separator = []
-            separator.append('-' * col_widths['NO_ABREVIADO_PRODUTO'])
-            separator.append('-' * col_widths['NO_ABREVIADO_EMPRESA'])
-            separator.append('-' * col_widths['COD_EMPRESA_COBRANCA'])
-            separator.append('-' * col_widths['NR_CONTRATO'])
-            separator.append('-' * col_widths['NR_CPF_CNPJ'])
-            separator.append('-' * col_widths['VR_SD_DEVEDOR'])
-            separator.append('-' * col_widths['DS_CRITERIO_SELECAO'])
-            separator.append('-' * col_widths['QT_DIAS_ATRASO'])
-
-            output.write(' '.join(separator) + '\n')
-
-            # Processar dados em chunks para melhor performance
-            chunk_size = 10000
-            offset = 0
-            total_registros = 0
-            total_saldo = 0.0
-            nome_empresa_abreviado = ""
-
-            while True:
-                # SQL com paginação
-                sql_paginated = text("""
-                    SELECT 
-                        PR.NO_ABREVIADO_PRODUTO,
-                        EM.NO_ABREVIADO_EMPRESA,
-                        DIS.COD_EMPRESA_COBRANCA,
-                        CTR.NR_CONTRATO,
-                        DIS.NR_CPF_CNPJ,
-                        DIS.VR_SD_DEVEDOR,
-                        CR.[DS_CRITERIO_SELECAO],
-                        SIT.QT_DIAS_ATRASO
-                    FROM [BDG].[DCA_TB005_DISTRIBUICAO] DIS WITH (NOLOCK)
-                    INNER JOIN BDG.PAR_TB002_EMPRESA_RESPONSAVEL_COBRANCA EM WITH (NOLOCK)
-                        ON DIS.COD_EMPRESA_COBRANCA = EM.pkEmpresaResponsavelCobranca
-                    INNER JOIN BDG.COM_TB001_CONTRATO CTR WITH (NOLOCK)
-                        ON CTR.fkContratoSISCTR = DIS.fkContratoSISCTR
-                    INNER JOIN BDG.PAR_TB001_PRODUTOS PR WITH (NOLOCK)
-                        ON PR.pkSistemaOriginario = CTR.COD_PRODUTO
-                    INNER JOIN [BDG].[DCA_TB004_CRITERIO_SELECAO] CR WITH (NOLOCK)
-                        ON CR.COD = DIS.COD_CRITERIO_SELECAO
-                    INNER JOIN BDG.COM_TB007_SITUACAO_CONTRATOS SIT WITH (NOLOCK)
-                        ON SIT.fkContratoSISCTR = DIS.fkContratoSISCTR
-                    WHERE DIS.ID_PERIODO = :periodo_id 
-                        AND DIS.ID_EDITAL = :edital_id
-                        AND DIS.COD_EMPRESA_COBRANCA = :empresa_id
-                    ORDER BY CTR.NR_CONTRATO
-                    OFFSET :offset ROWS
-                    FETCH NEXT :chunk_size ROWS ONLY
-                """)
-
-                result = connection.execute(sql_paginated, {
-                    'edital_id': edital_id,
-                    'periodo_id': periodo_id,
-                    'empresa_id': empresa_id,
-                    'offset': offset,
-                    'chunk_size': chunk_size
-                })
-
-                rows = result.fetchall()
-                if not rows:
-                    break
+        # Conexão fica aberta até o fim do streaming (fechada no gerador)
+        connection = db.engine.connect()
+        try:
+            paginas = paginas_analitico(connection, edital_id, periodo_id, empresa_id)
+            primeira_pagina = next(paginas, None)
+        except Exception:
+            connection.close()
+            raise
+
+        if not primeira_pagina:
+            connection.close()
+            flash('Não foram encontrados dados para a empresa selecionada.', 'warning')
+            return redirect(url_for('limite.analitico_distribuicao'))
+
+        # Nome da empresa do primeiro registro
+        nome_empresa_abreviado = next((row[1] for row in primeira_pagina if row[1]), '') or ''
+
+        # Gerar nome do arquivo conforme especificado
+        data_atual = datetime.now().strftime('%d%m%Y')
+        nome_arquivo = nome_arquivo_analitico(nome_empresa_abreviado, edital_id, periodo_id, data_atual)
+
+        def gerar():
+            totais = {}
+            try:
+                for pedaco in gerar_texto_analitico(chain([primeira_pagina], paginas), totais):
+                    yield pedaco
+            finally:
+                connection.close()
 
-                # Processar cada linha
-                for row in rows:
-                    # Guardar nome da empresa do primeiro registro
-                    if not nome_empresa_abreviado and row[1]:
-                        nome_empresa_abreviado = row[1]
-
-                    # Formatar cada campo com a largura apropriada
-                    linha = []
-                    linha.append((str(row[0]) if row[0] else '').ljust(col_widths['NO_ABREVIADO_PRODUTO']))
-                    linha.append((str(row[1]) if row[1] else '').ljust(col_widths['NO_ABREVIADO_EMPRESA']))
-                    linha.append(str(row[2]).ljust(col_widths['COD_EMPRESA_COBRANCA']))
-                    linha.append((str(row[3]) if row[3] else '').ljust(col_widths['NR_CONTRATO']))
-                    linha.append((str(row[4]) if row[4] else '').ljust(col_widths['NR_CPF_CNPJ']))
-
-                    # Formatar valor com 2 casas decimais
-                    valor = float(row[5]) if row[5] else 0.0
-                    total_saldo += valor
-                    linha.append(f"{valor:.2f}".ljust(col_widths['VR_SD_DEVEDOR']))
-
-                    linha.append((str(row[6]) if row[6] else '').ljust(col_widths['DS_CRITERIO_SELECAO']))
-                    linha.append(str(row[7]) if row[7] else '')
-
-                    output.write(' '.join(linha) + '\n')
-                    total_registros += 1
-
-                offset += chunk_size
-
-                # Log de progresso para grandes volumes
-                if total_registros % 50000 == 0:
-                    logging.info(f"Processados {total_registros} registros...")
-
-            if total_registros == 0:
-                flash('Não foram encontrados dados para a empresa selecionada.', 'warning')
-                return redirect(url_for('limite.analitico_distribuicao'))
-
-            # Adicionar linha de total no final
-            output.write('\n')
-            output.write(' ' * (col_widths['NO_ABREVIADO_PRODUTO'] + 1 +
-                                col_widths['NO_ABREVIADO_EMPRESA'] + 1 +
-                                col_widths['COD_EMPRESA_COBRANCA'] + 1))
-            output.write(f"TOTAL: {total_registros} contratos".ljust(col_widths['NR_CONTRATO']))
-            output.write(' ' * (col_widths['NR_CPF_CNPJ'] + 1))
-            output.write(f"{total_saldo:.2f}".ljust(col_widths['VR_SD_DEVEDOR']))
-            output.write('\n')
-
-            # Gerar nome do arquivo conforme especificado
-            data_atual = datetime.now().strftime('%d%m%Y')
-            nome_arquivo = f"{nome_empresa_abreviado.upper()}_DISTRIBUICAO_{data_atual}_{edital_id}_{periodo_id}.txt"
-
-            # Preparar conteúdo para download
-            content = output.getvalue()
-            output.close()
-
-            # Registrar log
+            # Registrar log ao final do envio, já com os totais
             registrar_log(
                 acao='exportar',
                 entidade='analitico_distribuicao',
@@ -2653,28 +2612,28 @@ def gerar_analitico_distribuicao(edital_id, periodo_id, empresa_id):
                     'edital_id': edital_id,
                     'periodo_id': periodo_id,
                     'empresa_id': empresa_id,
-                    'total_contratos': total_registros,
-                    'valor_total': float(total_saldo)
+                    'total_contratos': totais['total_registros'],
+                    'valor_total': float(totais['total_saldo'])
                 }
             )
 
-            # Retornar arquivo para download
-            response = Response(
-                content,
-                mimetype='text/plain; charset=utf-8',
-                headers={
-                    'Content-Disposition': f'attachment; filename={nome_arquivo}',
-                    'Content-Type': 'text/plain; charset=utf-8',
-                    'Cache-Control': 'no-cache, no-store, must-revalidate',
-                    'Pragma': 'no-cache',
-                    'Expires': '0'
-                }
-            )
+        # Retornar arquivo para download
+        response = Response(
+            stream_with_context(gerar()),
+            mimetype='text/plain; charset=utf-8',
+            headers={
+                'Content-Disposition': f'attachment; filename={nome_arquivo}',
+                'Content-Type': 'text/plain; charset=utf-8',
+                'Cache-Control': 'no-cache, no-store, must-revalidate',
+                'Pragma': 'no-cache',
+                'Expires': '0'
+            }
+        )
 
-            # Adicionar cookie para indicar que o download começou
-            response.set_cookie('downloadStarted', '1', max_age=60)
+        # Adicionar cookie para indicar que o download começou
+        response.set_cookie('downloadStarted', '1', max_age=60)
 
-            return response
+        return response
 
     except Exception as e:
         flash(f'Erro ao gerar relatório: {str(e)}', 'danger')
@@ -3032,24 +2991,31 @@ def gerar_excel_empresas(edital_id, periodo_id):
     - Removida coluna "Faixa Propensão" (FX_PROPENSAO_ATUAL_CREDITO)
     - Mantém JOIN com COM_TB007_SITUACAO_CONTRATOS para buscar QT_DIAS_ATRASO e VR_SD_DEVEDOR
     - Formatação de números longos para evitar notação científica
+    - Uma única leitura para todas as empresas, Excel montado em paralelo e ZIP em streaming
+    """
+    return _responder_zip_analiticos(edital_id, periodo_id, 'xlsx')
+
+
+@limite_bp.route('/limites/gerar-txt-empresas/<int:edital_id>/<int:periodo_id>', methods=['POST'])
+@login_required
+def gerar_txt_empresas(edital_id, periodo_id):
+    """
+    Gera o analítico TXT (colunas fixas) de TODAS as empresas do período num único ZIP.
     """
+    return _responder_zip_analiticos(edital_id, periodo_id, 'txt')
+
+
+def _responder_zip_analiticos(edital_id, periodo_id, formato):
+    """ZIP com o analítico de cada empresa, enviado em streaming (ver analitico_lote)."""
     try:
-        from io import BytesIO
-        from zipfile import ZipFile
-        import openpyxl
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-        from datetime import datetime
+        from flask import Response, stream_with_context
+        from app.utils.analitico_lote import gerar_zip_analiticos
 
         # Buscar empresas que participaram da distribuição e não estão descredenciadas
         with db.engine.connect() as connection:
             sql_empresas = text("""
-                SELECT DISTINCT 
-                    DIS.COD_EMPRESA_COBRANCA,
-                    EM.NO_ABREVIADO_EMPRESA,
-                    EM.nmEmpresaResponsavelCobranca
+                SELECT COUNT(DISTINCT DIS.COD_EMPRESA_COBRANCA)
                 FROM [BDG].[DCA_TB005_DISTRIBUICAO] DIS
-                INNER JOIN BDG.PAR_TB002_EMPRESA_RESPONSAVEL_COBRANCA EM
-                    ON DIS.COD_EMPRESA_COBRANCA = EM.pkEmpresaResponsavelCobranca
                 INNER JOIN [BDG].[DCA_TB002_EMPRESAS_PARTICIPANTES] EP
                     ON DIS.COD_EMPRESA_COBRANCA = EP.ID_EMPRESA
                     AND EP.ID_EDITAL = :edital_id
@@ -3058,196 +3024,42 @@ def gerar_excel_empresas(edital_id, periodo_id):
                     AND DIS.ID_PERIODO = :periodo_id
                     AND DIS.DELETED_AT IS NULL
                     AND EP.DS_CONDICAO <> 'DESCREDENCIADA'
-                ORDER BY EM.NO_ABREVIADO_EMPRESA
             """)
 
-            empresas = connection.execute(sql_empresas, {
+            qtd_empresas = connection.execute(sql_empresas, {
                 'edital_id': edital_id,
                 'periodo_id': periodo_id
-            }).fetchall()
+            }).scalar() or 0
 
-        if not empresas:
+        if not qtd_empresas:
             flash('Não há empresas com distribuição para este período.', 'warning')
             return redirect(url_for('limite.gerar_arquivos_analiticos'))
 
-        # Criar arquivo ZIP para armazenar todos os Excel
-        zip_buffer = BytesIO()
-
-        with ZipFile(zip_buffer, 'w') as zip_file:
-            for empresa in empresas:
-                cod_empresa = empresa.COD_EMPRESA_COBRANCA
-                nome_abreviado = empresa.NO_ABREVIADO_EMPRESA or empresa.nmEmpresaResponsavelCobranca[:20]
-
-                # ✅ QUERY CORRIGIDA: Mantém JOIN com COM_TB007_SITUACAO_CONTRATOS
-                # Mas REMOVE a coluna FX_PROPENSAO_ATUAL_CREDITO
-                with db.engine.connect() as connection:
-                    sql_analitico = text("""
-                        SELECT 
-                            PRO.NO_ABREVIADO_PRODUTO AS Produto,
-                            DIS.[COD_EMPRESA_COBRANCA] AS COD_EMPRESA,
-                            ASS.[NO_ABREVIADO_EMPRESA] AS Assessoria,
-                            CTR.NR_CONTRATO AS Nr_Contrato,
-                            CTR.[NR_CPF_CNPJ] AS CPF,
-                            SIT.QT_DIAS_ATRASO,
-                            SIT.[VR_SD_DEVEDOR],
-                            CRI.DS_CRITERIO_SELECAO
-                        FROM [BDG].[DCA_TB005_DISTRIBUICAO] DIS 
-                        INNER JOIN [BDG].[COM_TB001_CONTRATO] CTR
-                            ON DIS.fkContratoSISCTR = CTR.fkContratoSISCTR
-                        INNER JOIN [BDG].[PAR_TB001_PRODUTOS] PRO
-                            ON CTR.COD_PRODUTO = PRO.pkSistemaOriginario
-                        INNER JOIN [BDG].[PAR_TB002_EMPRESA_RESPONSAVEL_COBRANCA] ASS
-                            ON ASS.pkEmpresaResponsavelCobranca = DIS.[COD_EMPRESA_COBRANCA]
-                        INNER JOIN [BDG].[COM_TB007_SITUACAO_CONTRATOS] SIT
-                            ON DIS.fkContratoSISCTR = SIT.fkContratoSISCTR
-                        INNER JOIN [BDG].[DCA_TB004_CRITERIO_SELECAO] CRI
-                            ON CRI.[COD] = DIS.COD_CRITERIO_SELECAO
-                        WHERE SIT.[fkSituacaoCredito] = 1
-                            AND DIS.[COD_EMPRESA_COBRANCA] = :cod_empresa
-                            AND DIS.[ID_PERIODO] = :periodo_id
-                            AND DIS.[ID_EDITAL] = :edital_id
-                            AND DIS.DELETED_AT IS NULL
-                        ORDER BY PRO.NO_ABREVIADO_PRODUTO, CTR.NR_CONTRATO
-                    """)
-
-                    dados_empresa = connection.execute(sql_analitico, {
-                        'cod_empresa': cod_empresa,
-                        'periodo_id': periodo_id,
-                        'edital_id': edital_id
-                    }).fetchall()
-
-                if not dados_empresa:
-                    continue
-
-                # Criar arquivo Excel para a empresa
-                wb = openpyxl.Workbook()
-                ws = wb.active
-                ws.title = f"Período {periodo_id}"
-
-                # Estilos
-                header_font = Font(bold=True, color="FFFFFF", size=11)
-                header_fill = PatternFill(start_color="5893D4", end_color="5893D4", fill_type="solid")
-                header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-
-                border_style = Border(
-                    left=Side(style='thin'),
-                    right=Side(style='thin'),
-                    top=Side(style='thin'),
-                    bottom=Side(style='thin')
-                )
-
-                # Título
-                ws.merge_cells('A1:H1')  # ✅ 8 colunas (sem Faixa Propensão)
-                cell_titulo = ws['A1']
-                cell_titulo.value = f"Distribuição Analítica - {nome_abreviado} - Período {periodo_id}"
-                cell_titulo.font = Font(bold=True, size=14)
-                cell_titulo.alignment = Alignment(horizontal="center")
-
-                # ✅ Cabeçalhos SEM "Faixa Propensão"
-                headers = ['Produto', 'Cód. Empresa', 'Assessoria', 'Nº Contrato', 'CPF/CNPJ',
-                           'Dias Atraso', 'Saldo Devedor', 'Critério Seleção']
-
-                for col, header in enumerate(headers, start=1):
-                    cell = ws.cell(row=3, column=col)
-                    cell.value = header
-                    cell.font = header_font
-                    cell.fill = header_fill
-                    cell.alignment = header_alignment
-                    cell.border = border_style
-
-                # ✅ Formatar colunas como texto ANTES de inserir dados
-                max_rows = len(dados_empresa) + 10
-
-                for row in range(4, max_rows + 4):
-                    ws.cell(row=row, column=4).number_format = '@'  # Coluna D (Nº Contrato)
-                    ws.cell(row=row, column=5).number_format = '@'  # Coluna E (CPF/CNPJ)
-
-                # Dados
-                row_idx = 4
-                total_saldo = 0
-
-                for row_data in dados_empresa:
-                    ws.cell(row=row_idx, column=1, value=row_data.Produto)
-                    ws.cell(row=row_idx, column=2, value=row_data.COD_EMPRESA)
-                    ws.cell(row=row_idx, column=3, value=row_data.Assessoria)
-
-                    # Inserir como string para garantir formato texto
-                    ws.cell(row=row_idx, column=4, value=str(row_data.Nr_Contrato))
-                    ws.cell(row=row_idx, column=5, value=str(row_data.CPF))
-
-                    ws.cell(row=row_idx, column=6, value=int(row_data.QT_DIAS_ATRASO or 0))
-
-                    # Saldo Devedor formatado
-                    saldo = float(row_data.VR_SD_DEVEDOR or 0)
-                    total_saldo += saldo
-                    cell_saldo = ws.cell(row=row_idx, column=7, value=saldo)
-                    cell_saldo.number_format = 'R$ #,##0.00'
-
-                    # ✅ Coluna H = Critério Seleção (sem Faixa Propensão)
-                    ws.cell(row=row_idx, column=8, value=row_data.DS_CRITERIO_SELECAO)
-
-                    # Aplicar bordas
-                    for col in range(1, 9):  # ✅ 8 colunas
-                        ws.cell(row=row_idx, column=col).border = border_style
-                        ws.cell(row=row_idx, column=col).alignment = Alignment(vertical="center")
-
-                    row_idx += 1
-
-                # Linha de total
-                ws.cell(row=row_idx, column=6, value="TOTAL:")
-                ws.cell(row=row_idx, column=6).font = Font(bold=True)
-                cell_total = ws.cell(row=row_idx, column=7, value=total_saldo)
-                cell_total.font = Font(bold=True)
-                cell_total.number_format = 'R$ #,##0.00'
-                cell_total.fill = PatternFill(start_color="E8F4F8", end_color="E8F4F8", fill_type="solid")
-
-                # ✅ Ajustar largura das colunas (8 colunas - sem Faixa Propensão)
-                column_widths = {
-                    'A': 15,  # Produto
-                    'B': 12,  # Cód. Empresa
-                    'C': 20,  # Assessoria
-                    'D': 18,  # Nº Contrato
-                    'E': 18,  # CPF/CNPJ
-                    'F': 12,  # Dias Atraso
-                    'G': 18,  # Saldo Devedor
-                    'H': 25   # Critério Seleção
-                }
-
-                for col, width in column_widths.items():
-                    ws.column_dimensions[col].width = width
-
-                # Salvar Excel em buffer
-                excel_buffer = BytesIO()
-                wb.save(excel_buffer)
-                excel_buffer.seek(0)
-
-                # Adicionar ao ZIP
-                nome_arquivo_excel = f"analitico_{nome_abreviado.replace(' ', '_')}_periodo_{periodo_id}.xlsx"
-                zip_file.writestr(nome_arquivo_excel, excel_buffer.getvalue())
-
-        # Preparar ZIP para download
-        zip_buffer.seek(0)
-
         # Registrar log
         registrar_log(
             acao='gerar',
-            entidade='relatorio_excel_empresas',
+            entidade='relatorio_excel_empresas' if formato == 'xlsx' else 'relatorio_txt_empresas',
             entidade_id=periodo_id,
-            descricao=f'Arquivos Excel gerados para {len(empresas)} empresas do período {periodo_id} (otimizado)'
+            descricao=f'Arquivos {formato.upper()} gerados para {qtd_empresas} empresas do período {periodo_id} (ZIP único)'
         )
 
-        nome_arquivo_zip = f'analiticos_empresas_periodo_{periodo_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
+        prefixo = 'analiticos_empresas' if formato == 'xlsx' else 'analiticos_txt_empresas'
+        nome_arquivo_zip = f'{prefixo}_periodo_{periodo_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
 
-        return send_file(
-            zip_buffer,
+        response = Response(
+            stream_with_context(gerar_zip_analiticos(edital_id, periodo_id, formato)),
             mimetype='application/zip',
-            as_attachment=True,
-            download_name=nome_arquivo_zip
+            headers={
+                'Content-Disposition': f'attachment; filename={nome_arquivo_zip}',
+                'Cache-Control': 'no-cache, no-store, must-revalidate'
+            }
         )
+        response.set_cookie('downloadStarted', '1', max_age=60)
+        return response
 
     except Exception as e:
-        flash(f'Erro ao gerar arquivos Excel: {str(e)}', 'danger')
-        logging.error(f"Erro ao gerar Excel empresas: {str(e)}")
+        flash(f'Erro ao gerar arquivos {formato.upper()}: {str(e)}', 'danger')
+        logging.error(f"Erro ao gerar ZIP de analíticos ({formato}): {str(e)}")
         import traceback
         logging.error(traceback.format_exc())
         return redirect(url_for('limite.gerar_arquivos_analiticos'))
@@ -3562,6 +3374,7 @@ def api_dashboard_data():
     """
     API para buscar dados do dashboard de forma assíncrona.
     Retorna JSON com KPIs e dados para gráficos.
+    Os dados vêm do cubo do dashboard (ver utils/cubo_dashboard), não da DCA_TB005.
     """
     try:
         edital_id = request.args.get('edital_id', type=int)
@@ -3580,128 +3393,8 @@ def api_dashboard_data():
                 if ultimo_periodo:
                     periodo_id = ultimo_periodo.ID_PERIODO
 
-        with db.engine.connect() as connection:
-            # Construir WHERE clause com filtro de empresa
-            where_empresa = ""
-            params = {
-                'edital_id': edital_id,
-                'periodo_id': periodo_id
-            }
-
-            if empresa_id:
-                where_empresa = "AND DIS.COD_EMPRESA_COBRANCA = :empresa_id"
-                params['empresa_id'] = empresa_id
-
-            # KPIs Gerais
-            sql_kpis = text(f"""
-                SELECT 
-                    COUNT(DISTINCT DIS.fkContratoSISCTR) AS total_contratos,
-                    COUNT(DISTINCT DIS.NR_CPF_CNPJ) AS total_cpfs,
-                    COUNT(DISTINCT DIS.COD_EMPRESA_COBRANCA) AS total_empresas,
-                    SUM(DIS.VR_SD_DEVEDOR) AS valor_total,
-                    COUNT(DISTINCT DIS.COD_CRITERIO_SELECAO) AS total_criterios
-                FROM [BDG].[DCA_TB005_DISTRIBUICAO] DIS
-                WHERE DIS.ID_EDITAL = :edital_id
-                    AND DIS.ID_PERIODO = :periodo_id
-                    {where_empresa}
-                    AND DIS.DELETED_AT IS NULL
-            """)
-
-            kpis = connection.execute(sql_kpis, params).fetchone()
-
-            # Distribuição por Empresa
-            sql_empresas = text(f"""
-                SELECT 
-                    EM.NO_ABREVIADO_EMPRESA AS empresa,
-                    COUNT(DISTINCT DIS.fkContratoSISCTR) AS qtde_contratos,
-                    SUM(DIS.VR_SD_DEVEDOR) AS valor_total
-                FROM [BDG].[DCA_TB005_DISTRIBUICAO] DIS
-                INNER JOIN [BDG].[PAR_TB002_EMPRESA_RESPONSAVEL_COBRANCA] EM
-                    ON DIS.COD_EMPRESA_COBRANCA = EM.pkEmpresaResponsavelCobranca
-                WHERE DIS.ID_EDITAL = :edital_id
-                    AND DIS.ID_PERIODO = :periodo_id
-                    {where_empresa}
-                    AND DIS.DELETED_AT IS NULL
-                GROUP BY EM.NO_ABREVIADO_EMPRESA
-                ORDER BY qtde_contratos DESC
-            """)
-
-            empresas = connection.execute(sql_empresas, params).fetchall()
-
-            # Distribuição por Critério
-            sql_criterios = text(f"""
-                SELECT 
-                    CR.DS_CRITERIO_SELECAO AS criterio,
-                    COUNT(DISTINCT DIS.fkContratoSISCTR) AS qtde_contratos,
-                    SUM(DIS.VR_SD_DEVEDOR) AS valor_total
-                FROM [BDG].[DCA_TB005_DISTRIBUICAO] DIS
-                INNER JOIN [BDG].[DCA_TB004_CRITERIO_SELECAO] CR
-                    ON DIS.COD_CRITERIO_SELECAO = CR.COD
-                WHERE DIS.ID_EDITAL = :edital_id
-                    AND DIS.ID_PERIODO = :periodo_id
-                    {where_empresa}
-                    AND DIS.DELETED_AT IS NULL
-                GROUP BY CR.DS_CRITERIO_SELECAO
-                ORDER BY qtde_contratos DESC
-            """)
-
-            criterios = connection.execute(sql_criterios, params).fetchall()
-
-            # Distribuição por Produto
-            sql_produtos = text(f"""
-                SELECT 
-                    PR.NO_ABREVIADO_PRODUTO AS produto,
-                    COUNT(DISTINCT DIS.fkContratoSISCTR) AS qtde_contratos,
-                    SUM(DIS.VR_SD_DEVEDOR) AS valor_total
-                FROM [BDG].[DCA_TB005_DISTRIBUICAO] DIS
-                INNER JOIN [BDG].[COM_TB001_CONTRATO] CTR
-                    ON DIS.fkContratoSISCTR = CTR.fkContratoSISCTR
-                INNER JOIN [BDG].[PAR_TB001_PRODUTOS] PR
-                    ON CTR.COD_PRODUTO = PR.pkSistemaOriginario
-                WHERE DIS.ID_EDITAL = :edital_id
-                    AND DIS.ID_PERIODO = :periodo_id
-                    {where_empresa}
-                    AND DIS.DELETED_AT IS NULL
-                GROUP BY PR.NO_ABREVIADO_PRODUTO
-                ORDER BY qtde_contratos DESC
-            """)
-
-            produtos = connection.execute(sql_produtos, params).fetchall()
-
-        # Montar resposta JSON
-        response_data = {
-            'kpis': {
-                'total_contratos': kpis[0] if kpis else 0,
-                'total_cpfs': kpis[1] if kpis else 0,
-                'total_empresas': kpis[2] if kpis else 0,
-                'valor_total': float(kpis[3]) if kpis and kpis[3] else 0,
-                'total_criterios': kpis[4] if kpis else 0
-            },
-            'empresas': [
-                {
-                    'nome': row[0],
-                    'qtde_contratos': row[1],
-                    'valor_total': float(row[2]) if row[2] else 0
-                }
-                for row in empresas
-            ],
-            'criterios': [
-                {
-                    'nome': row[0],
-                    'qtde_contratos': row[1],
-                    'valor_total': float(row[2]) if row[2] else 0
-                }
-                for row in criterios
-            ],
-            'produtos': [
-                {
-                    'nome': row[0],
-                    'qtde_contratos': row[1],
-                    'valor_total': float(row[2]) if row[2] else 0
-                }
-                for row in produtos
-            ]
-        }
+        # Painéis montados a partir do cubo pré-agregado (DCA_TB022), com cache em memória
+        response_data = obter_dados_dashboard(edital_id, periodo_id, empresa_id)
 
         return jsonify(response_data)
 
@@ -5,6 +5,7 @@ from app import db
 from app.models.notificacao import Notificacao, NotificacaoVisualizacao
 from app.models.usuario import Usuario
 from app.utils.audit import registrar_log
+from app.utils.eventos_tempo_real import publicar_todos
 from datetime import datetime
 
 notificacoes_bp = Blueprint('notificacoes', __name__, url_prefix='/notificacoes')
@@ -23,6 +24,12 @@ def admin_ou_moderador_required(f):
     return decorated_function
 
 
+def _publicar_se_vigente(notificacao):
+    """Avisa os navegadores conectados (SSE) que há notificação para exibir."""
+    if notificacao.esta_vigente():
+        publicar_todos('notificacao', {'id': notificacao.ID, 'titulo': notificacao.TITULO})
+
+
 @notificacoes_bp.route('/')
 @login_required
 @admin_ou_moderador_required
@@ -65,14 +72,8 @@ def nova():
             dt_inicio_obj = datetime.strptime(dt_inicio, '%Y-%m-%dT%H:%M') if dt_inicio else None
             dt_fim_obj = datetime.strptime(dt_fim, '%Y-%m-%dT%H:%M') if dt_fim else None
 
-            # DEBUG: Verificar current_user
-            print(f"DEBUG - Tipo de current_user: {type(current_user)}")
-            print(f"DEBUG - Atributos de current_user: {dir(current_user)}")
-            print(f"DEBUG - current_user.id: {current_user.id}")
-
             # Pegar o ID do usuário
             usuario_id = current_user.id
-            print(f"DEBUG - usuario_id: {usuario_id}")
 
             # Criar notificação - USANDO APENAS VALORES SIMPLES
             notificacao = Notificacao(
@@ -86,13 +87,9 @@ def nova():
                 ATIVO=True
             )
 
-            print(f"DEBUG - Notificacao criada: {notificacao}")
-
             db.session.add(notificacao)
-
-            print("DEBUG - Antes do commit")
             db.session.commit()
-            print("DEBUG - Depois do commit")
+            _publicar_se_vigente(notificacao)
 
             # Log de auditoria
             registrar_log(
@@ -106,9 +103,7 @@ def nova():
             return redirect(url_for('notificacoes.index'))
 
         except Exception as e:
-            import traceback
-            print("DEBUG - ERRO COMPLETO:")
-            print(traceback.format_exc())
+            print(f"Erro ao criar notificação: {repr(e)}")
             db.session.rollback()
             flash(f'Erro ao criar notificação: {str(e)}', 'danger')
 
@@ -137,6 +132,7 @@ def editar(id):
             notificacao.UPDATED_AT = datetime.utcnow()
 
             db.session.commit()
+            _publicar_se_vigente(notificacao)
 
             # Log
             registrar_log(
@@ -167,6 +163,7 @@ def alternar_status(id):
         notificacao.UPDATED_AT = datetime.utcnow()
 
         db.session.commit()
+        _publicar_se_vigente(notificacao)
 
         status = 'ativada' if notificacao.ATIVO else 'desativada'
         flash(f'Notificação {status} com sucesso!', 'success')
@@ -222,8 +219,6 @@ def marcar_visualizada(id):
         notificacao = Notificacao.query.get_or_404(id)
         usuario_id = current_user.id
 
-        print(f"DEBUG - Marcando notificacao {id} como lida para usuario {usuario_id}")
-
         # Verificar se já foi visualizada
         ja_visualizada = NotificacaoVisualizacao.query.filter_by(
             NOTIFICACAO_ID=id,
@@ -231,7 +226,6 @@ def marcar_visualizada(id):
         ).first()
 
         if ja_visualizada:
-            print(f"DEBUG - Já estava marcada como visualizada")
             return jsonify({'success': True, 'message': 'Já visualizada'})
 
         # Criar novo registro de visualização
@@ -242,14 +236,10 @@ def marcar_visualizada(id):
         db.session.add(visualizacao)
         db.session.commit()
 
-        print(f"DEBUG - Visualização salva com sucesso!")
-
         return jsonify({'success': True, 'message': 'Marcada como lida'})
 
     except Exception as e:
-        import traceback
-        print("ERRO ao marcar como visualizada:")
-        print(traceback.format_exc())
+        print(f"Erro ao marcar notificação como visualizada: {repr(e)}")
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -257,14 +247,13 @@ def marcar_visualizada(id):
 @notificacoes_bp.route('/obter-nao-lidas', methods=['GET'])
 @login_required
 def obter_nao_lidas():
-    """API para buscar notificações não lidas do usuário atual"""
+    """
+    API para buscar notificações não lidas do usuário atual.
+    Com o canal SSE ativo o base.html só chama esta rota no início da sessão e
+    quando chega um evento 'notificacao'; sem SSE, a cada página (fallback).
+    """
     try:
-        # USAR current_user.id MINÚSCULO
-        usuario_id = current_user.id
-        print(f"DEBUG - Buscando notificações para usuario_id: {usuario_id}")
-
-        notificacoes = Notificacao.obter_ativas_nao_visualizadas(usuario_id)
-        print(f"DEBUG - Encontradas {len(notificacoes)} notificações")
+        notificacoes = Notificacao.obter_ativas_nao_visualizadas(current_user.id)
 
         resultado = []
         for notif in notificacoes:
@@ -276,13 +265,10 @@ def obter_nao_lidas():
                 'prioridade': notif.PRIORIDADE
             })
 
-        print(f"DEBUG - Retornando: {resultado}")
         return jsonify({'notificacoes': resultado})
 
     except Exception as e:
-        import traceback
-        print("ERRO em obter_nao_lidas:")
-        print(traceback.format_exc())
+        print(f"Erro em obter_nao_lidas: {repr(e)}")
         return jsonify({'error': str(e)}), 500
 
 
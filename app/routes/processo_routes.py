@@ -0,0 +1,20 @@
+# app/routes/processo_routes.py
+from flask import Blueprint, jsonify
+from flask_login import login_required, current_user
+from app.utils.processo_jobs import obter_job
+
+processo_bp = Blueprint('processo', __name__, url_prefix='/processos')
+
+
+@processo_bp.route('/<int:job_id>/status')
+@login_required
+def status_job(job_id):
+    """Andamento de um processo em segundo plano (consultado por polling)"""
+    job = obter_job(job_id)
+    if not job:
+        return jsonify({'erro': 'Processo não encontrado.'}), 404
+
+    if job.USUARIO_ID and job.USUARIO_ID != current_user.id and current_user.perfil not in ['admin', 'moderador']:
+        return jsonify({'erro': 'Acesso negado.'}), 403
+
+    return jsonify(job.to_dict())
@@ -7,11 +7,16 @@ from app.models.siscalculo import (
     SiscalculoDados,
     SiscalculoCalculos,
     IndicadorEconomico,
-    SiscalculoPrescricoes,
     TipoParcela
 )
-from app.utils.siscalculo_calc import CalculadorSiscalculo
+from app.utils.siscalculo_calc import CalculadorSiscalculo, CalculadorMultiIndice
+from app.utils.siscalculo_importacao import (
+    ler_planilha, preparar_parcelas, gravar_parcelas, limpar_processamento
+)
 from app.utils.audit import registrar_log
+from app.utils.processo_jobs import submeter_job, obter_job
+from app.utils.siscalculo_lote import extrair_planilhas, processar_lote_siscalculo
+from app.models.processo_job import ProcessoJob
 from datetime import datetime, date
 from decimal import Decimal
 from sqlalchemy import text, bindparam
@@ -94,6 +99,7 @@ def processar():
 
     # ✅ Capturar parâmetros de prescrição
     aplicar_prescricao = request.form.get('aplicar_prescricao') == 'on'
+    todos_indices = request.form.get('todos_indices') == 'on'
     mes_ano_prescricao_inicio = request.form.get('mes_ano_prescricao_inicio')
     mes_ano_prescricao_fim = request.form.get('mes_ano_prescricao_fim')
 
@@ -152,32 +158,20 @@ def processar():
     try:
         print("[DEBUG 4.1] Lendo Excel com pandas...")
 
-        # Ler célula B1 (Número do Imóvel)
-        df_imovel = pd.read_excel(arquivo, header=None, nrows=1)
-        numero_imovel = str(int(df_imovel.iloc[0, 1]))
+        # B1 = Número do Imóvel, B2 = Nome do Condomínio, dados a partir da linha 3
+        numero_imovel, nome_condominio, df, tem_coluna_tipo = ler_planilha(arquivo)
         print(f"[DEBUG 4.1] Número do Imóvel: {numero_imovel}")
-
-        # Ler célula B2 (Nome do Condomínio)
-        df_condominio = pd.read_excel(arquivo, header=None, nrows=2)
-        nome_condominio = str(df_condominio.iloc[1, 1]) if pd.notna(df_condominio.iloc[1, 1]) else ''
         print(f"[DEBUG 4.1] Nome do Condomínio: {nome_condominio}")
-
-        # Ler os dados a partir da linha 3
-        df = pd.read_excel(arquivo, header=2)
         print(f"[DEBUG 4.1] Excel lido com sucesso!")
         print(f"[DEBUG 4.1] Colunas encontradas: {list(df.columns)}")
         print(f"[DEBUG 4.1] Total de linhas: {len(df)}")
-
-        # ✅ NOVO: Verificar se tem coluna TIPO DA PARCELA
-        tem_coluna_tipo = 'TIPO DA PARCELA' in df.columns
         print(f"[DEBUG 4.1] ✅ Coluna TIPO DA PARCELA presente: {tem_coluna_tipo}")
 
         if not tem_coluna_tipo:
+            # Coluna criada com o tipo padrão (retrocompatibilidade)
             flash(
                 'ATENÇÃO: Excel não possui a coluna "TIPO DA PARCELA". Usando tipo padrão (1 - Cota Condomínio) para todas as parcelas.',
                 'warning')
-            # Adicionar coluna vazia se não existir (retrocompatibilidade)
-            df['TIPO DA PARCELA'] = 1  # Padrão: Cota Condomínio
 
     except Exception as e:
         print(f"[ERRO 4] Erro ao ler Excel: {str(e)}")
@@ -189,232 +183,56 @@ def processar():
     # ✅ CORREÇÃO PRINCIPAL: Limpar dados anteriores por IMOVEL + DT_ATUALIZACAO + ID_INDICE
     print(
         f"\n[DEBUG 5] Limpando dados anteriores do imóvel {numero_imovel} com dt_atualizacao {dt_atualizacao} e índice {id_indice}...")
+    # Multi-índice grava cálculos de todos os índices: a limpeza cobre todos eles
+    ids_indices = []
+    if todos_indices:
+        ids_indices = [i.ID_INDICE_ECONOMICO for i in ParamIndicesEconomicos.obter_indices_permitidos()]
+    ids_limpeza = sorted(set(ids_indices) | {id_indice})
     try:
-        # ✅ Limpar SiscalculoDados (dados temporários) - APENAS para este imóvel e data
-        deletados_dados = SiscalculoDados.query.filter_by(
-            IMOVEL=numero_imovel,
-            DT_ATUALIZACAO=dt_atualizacao
-        ).delete()
-
-        # ✅ Limpar SiscalculoCalculos (resultados anteriores) - FILTRANDO POR ÍNDICE
-        deletados_calculos = SiscalculoCalculos.query.filter_by(
-            IMOVEL=numero_imovel,
-            DT_ATUALIZACAO=dt_atualizacao,
-            ID_INDICE_ECONOMICO=id_indice
-        ).delete()
-
-        # ✅ NOVO: Limpar prescrições anteriores deste mesmo processamento
-        deletados_prescricoes = SiscalculoPrescricoes.query.filter_by(
-            IMOVEL=numero_imovel,
-            DT_ATUALIZACAO=dt_atualizacao,
-            ID_INDICE_ECONOMICO=id_indice
-        ).delete()
-
+        # Mesma regra de limpeza do processamento em lote
+        limpar_processamento(numero_imovel, dt_atualizacao, ids_limpeza)
         db.session.commit()
-        print(f"[DEBUG 5] ✅ {deletados_dados} registros deletados em SiscalculoDados")
-        print(f"[DEBUG 5] ✅ {deletados_calculos} registros deletados em SiscalculoCalculos (índice {id_indice})")
-        print(f"[DEBUG 5] ✅ {deletados_prescricoes} registros deletados em SiscalculoPrescricoes")
+        print(f"[DEBUG 5] ✅ Dados, cálculos e prescrições anteriores removidos (índices {ids_limpeza})")
     except Exception as e:
         print(f"[ERRO 5] Erro ao limpar dados: {str(e)}")
         db.session.rollback()
 
-    # Importar dados
+    # Importar dados (validação e conversão da planilha inteira + inserção em lote)
     print(f"\n[DEBUG 6] Importando dados das parcelas...")
-    registros_inseridos = 0
-    registros_excluidos_prescricao = 0
-    erros_insercao = 0
-
-    for idx, row in df.iterrows():
-        try:
-            if idx < 3:
-                print(f"  [DEBUG {idx}] Processando linha {idx + 1}/{len(df)}:")
-                print(f"  DATA VENCIMENTO (RAW): {row['DATA VENCIMENTO']} (tipo: {type(row['DATA VENCIMENTO'])})")
-                print(f"  VALOR COTA: {row['VALOR COTA']}")
-                print(f"  TIPO DA PARCELA: {row.get('TIPO DA PARCELA', 1)}")
-
-            # ✅ SOLUÇÃO 1: Converter data com formato específico e validação
-            data_raw = row['DATA VENCIMENTO']
-
-            # Verificar se é NaN/None
-            if pd.isna(data_raw):
-                if idx < 3:
-                    print(f"  [AVISO] Data vazia, pulando linha")
-                continue
-
-            # ✅ SOLUÇÃO 2: Tentar múltiplos formatos de data
-            dt_venc = None
-            formatos_validos = [
-                '%d/%m/%Y',  # 02/10/2022 (FORMATO BRASILEIRO - PRIORIDADE)
-                '%d-%m-%Y',  # 02-10-2022
-                '%m/%d/%Y'  # 10/02/2022 (formato americano como fallback)
-            ]
-
-            # Se for um número (serial do Excel), converter diretamente
-            if isinstance(data_raw, (int, float)):
-                # Excel serial date: número de dias desde 01/01/1900
-                try:
-                    dt_venc = pd.to_datetime('1899-12-30') + pd.Timedelta(days=float(data_raw))
-                    if idx < 3:
-                        print(f"  [INFO] Convertido de serial Excel: {data_raw} → {dt_venc.date()}")
-                except:
-                    if idx < 3:
-                        print(f"  [ERRO] Serial inválido: {data_raw}")
-                    continue
-
-            # Se for timestamp do pandas OU datetime nativo do Python
-            elif isinstance(data_raw, (pd.Timestamp, datetime)):
-                dt_venc = pd.to_datetime(data_raw)
-
-            # Se for string, tentar formatos
-            elif isinstance(data_raw, str):
-                for formato in formatos_validos:
-                    try:
-                        dt_venc = pd.to_datetime(data_raw, format=formato, errors='raise')
-                        if idx < 3:
-                            print(f"  [INFO] Formato detectado: {formato}")
-                        break
-                    except:
-                        continue
-
-                if dt_venc is None:
-                    if idx < 3:
-                        print(f"  [ERRO] Formato de data não reconhecido: {data_raw}")
-                    erros_insercao += 1
-                    continue
-
-            # Se não conseguiu converter
-            if dt_venc is None:
-                if idx < 3:
-                    print(f"  [ERRO] Não foi possível converter data: {data_raw}")
-                erros_insercao += 1
-                continue
-
-            # ✅ SOLUÇÃO 3: VALIDAÇÃO DE ANO RAZOÁVEL
-            ano_vencimento = dt_venc.year
-            ano_atual = datetime.now().year
-
-            # Rejeitar datas muito no futuro (mais de 2 anos) ou muito no passado (antes de 1990)
-            if ano_vencimento > (ano_atual + 2):
-                if idx < 3:
-                    print(f"  [ERRO] ⚠️ Data SUSPEITA no futuro: {dt_venc.date()} (ano {ano_vencimento}) - REJEITADA")
-                erros_insercao += 1
-                continue
-
-            if ano_vencimento < 1990:
-                if idx < 3:
-                    print(f"  [ERRO] ⚠️ Data SUSPEITA no passado: {dt_venc.date()} (ano {ano_vencimento}) - REJEITADA")
-                erros_insercao += 1
-                continue
-
-            if idx < 3:
-                print(f"  ✅ Data válida: {dt_venc.date()} (ano {ano_vencimento})")
-
-            # Validar valor
-            valor = row['VALOR COTA']
-            if pd.isna(valor) or valor <= 0:
-                if idx < 3:
-                    print(f"  [AVISO] Valor inválido ({valor}), pulando linha")
-                continue
-
-            # ✅ CRÍTICO: Ler e validar tipo da parcela - NUNCA PODE SER NULL
-            tipo_parcela = row.get('TIPO DA PARCELA', 1)
-
-            # Validar e garantir que SEMPRE tenha um valor válido
-            try:
-                # Se vier como string ou float
-                if pd.isna(tipo_parcela) or tipo_parcela is None or str(tipo_parcela).strip() == '':
-                    tipo_parcela = 1  # ✅ PADRÃO: Cota Condomínio
-                else:
-                    tipo_parcela = int(float(tipo_parcela))  # Converter para int
-
-                # Validar range (1 a 5)
-                if tipo_parcela not in [1, 2, 3, 4, 5]:
-                    if idx < 3:
-                        print(f"  [AVISO] Tipo inválido ({tipo_parcela}), usando padrão (1 - Cota Condomínio)")
-                    tipo_parcela = 1
-
-            except (ValueError, TypeError) as e:
-                if idx < 3:
-                    print(f"  [AVISO] Erro ao converter tipo ({tipo_parcela}), usando padrão (1 - Cota Condomínio)")
-                tipo_parcela = 1
-
-            # ✅ GARANTIA FINAL: Nunca pode ser None
-            if tipo_parcela is None:
-                tipo_parcela = 1
-
-            # ✅ Verificar prescrição por MÊS/ANO
-            if aplicar_prescricao:
-                data_vencimento = dt_venc.date()
-                ano_venc = data_vencimento.year
-                mes_venc = data_vencimento.month
-
-                chave_venc = ano_venc * 100 + mes_venc
-                chave_inicio = ano_inicio * 100 + mes_inicio
-                chave_fim = ano_fim * 100 + mes_fim
-
-                if chave_inicio <= chave_venc <= chave_fim:
-                    # ✅ SALVAR A PARCELA PRESCRITA NA TABELA ANTES DE EXCLUÍ-LA
-                    parcela_prescrita = SiscalculoPrescricoes(
-                        IMOVEL=numero_imovel,
-                        NOME_CONDOMINIO=nome_condominio,
-                        DT_VENCIMENTO=data_vencimento,
-                        VR_COTA=Decimal(str(valor)),
-                        DT_ATUALIZACAO=dt_atualizacao,
-                        ID_INDICE_ECONOMICO=id_indice,
-                        PERIODO_PRESCRICAO=periodo_prescricao,
-                        USUARIO=current_user.nome,
-                        ID_TIPO=tipo_parcela  # ✅ NOVO
-                    )
-
-                    db.session.add(parcela_prescrita)
-
-                    if idx < 3 or registros_excluidos_prescricao < 5:
-                        print(
-                            f"  [PRESCRIÇÃO] Data {data_vencimento} ({mes_venc:02d}/{ano_venc}) - TIPO {tipo_parcela} - SALVA E EXCLUÍDA DO CÁLCULO")
-
-                    registros_excluidos_prescricao += 1
-                    continue  # ✅ MANTÉM A LÓGICA: NÃO INCLUI NO CÁLCULO
-
-            # Criar registro
-            novo_dado = SiscalculoDados(
-                IMOVEL=numero_imovel,
-                NOME_CONDOMINIO=nome_condominio,
-                DT_VENCIMENTO=dt_venc.date(),
-                VR_COTA=Decimal(str(valor)),
-                DT_ATUALIZACAO=dt_atualizacao,
-                ID_TIPO=tipo_parcela  # ✅ GARANTIDO: Sempre tem valor válido (1-5)
-            )
-
-            db.session.add(novo_dado)
-            registros_inseridos += 1
-
-            if idx < 3:
-                print(f"  [OK] Registro adicionado - Data: {dt_venc.date()} - TIPO: {tipo_parcela}")
-
-        except Exception as e:
-            print(f"  [ERRO] Erro na linha {idx}: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            erros_insercao += 1
-            continue
-
-    print(f"\n[DEBUG 7] Resumo da inserção:")
-    print(f"  Imóvel: {numero_imovel}")
-    print(f"  Condomínio: {nome_condominio}")
-    print(f"  Total linhas Excel: {len(df)}")
-    if aplicar_prescricao:
-        print(f"  ✅ Período prescrição: {periodo_prescricao}")
-    print(f"  ✅ SALVOS NA TABELA PRESCRIÇÕES: {registros_excluidos_prescricao}")
-    print(f"  ✅ INSERIDOS (válidos para cálculo): {registros_inseridos}")
-    print(f"  ❌ Erros/Rejeitados: {erros_insercao}")
-
-    # Commit dos dados importados
-    print("\n[DEBUG 8] Realizando commit...")
     try:
+        parcelas, resumo = preparar_parcelas(
+            df,
+            (ano_inicio, mes_inicio, ano_fim, mes_fim) if aplicar_prescricao else None
+        )
+        registros_inseridos, registros_excluidos_prescricao = gravar_parcelas(
+            db.session.connection(),
+            parcelas,
+            imovel=numero_imovel,
+            nome_condominio=nome_condominio,
+            dt_atualizacao=dt_atualizacao,
+            id_indice=id_indice,
+            periodo_prescricao=periodo_prescricao,
+            usuario=current_user.nome
+        )
+        erros_insercao = resumo['erros']
+
+        print(f"\n[DEBUG 7] Resumo da inserção:")
+        print(f"  Imóvel: {numero_imovel}")
+        print(f"  Condomínio: {nome_condominio}")
+        print(f"  Total linhas Excel: {resumo['total_linhas']}")
+        if aplicar_prescricao:
+            print(f"  ✅ Período prescrição: {periodo_prescricao}")
+        print(f"  ✅ SALVOS NA TABELA PRESCRIÇÕES: {registros_excluidos_prescricao}")
+        print(f"  ✅ INSERIDOS (válidos para cálculo): {registros_inseridos}")
+        print(f"  ❌ Erros/Rejeitados: {erros_insercao}")
+        print(f"  Ignorados (data ou valor vazio): {resumo['ignoradas']}")
+
+        # Commit dos dados importados
+        print("\n[DEBUG 8] Realizando commit...")
         db.session.commit()
         print("[DEBUG 8] ✅ Commit realizado!")
     except Exception as e:
-        print(f"[ERRO 8] Erro no commit: {str(e)}")
+        print(f"[ERRO 8] Erro ao salvar dados: {str(e)}")
         import traceback
         traceback.print_exc()
         db.session.rollback()
@@ -440,6 +258,44 @@ def processar():
             f'⚠️ {erros_insercao} linha(s) com erro foram rejeitadas (datas inválidas ou fora do intervalo razoável).',
             'warning')
 
+    # Todos os índices numa única passada -> página de comparação
+    if todos_indices:
+        print(f"\n[DEBUG 9] Iniciando cálculos multi-índice: {ids_indices}")
+        resultado = CalculadorMultiIndice(
+            dt_atualizacao=dt_atualizacao,
+            ids_indices=ids_indices,
+            perc_honorarios=perc_honorarios,
+            usuario=current_user.nome,
+            imovel=numero_imovel
+        ).calcular()
+
+        if not resultado['sucesso']:
+            flash(f'Erro ao processar cálculos: {resultado.get("erro", "Erro desconhecido")}', 'danger')
+            return redirect(url_for('siscalculo.index'))
+
+        flash(
+            f'✅ Processamento concluído! {resultado["registros_processados"]} parcelas calculadas '
+            f'com {len(ids_indices)} índices.',
+            'success')
+
+        registrar_log(
+            acao='processar_siscalculo',
+            entidade='siscalculo',
+            entidade_id=None,
+            descricao=f'Processamento SISCalculo (todos os índices) - Imóvel: {numero_imovel}',
+            dados_novos={
+                'imovel': numero_imovel,
+                'dt_atualizacao': dt_atualizacao.strftime('%Y-%m-%d'),
+                'ids_indices': ids_indices,
+                'registros_processados': resultado['registros_processados'],
+                'valores_por_indice': {str(k): v['valor_total'] for k, v in resultado['indices'].items()}
+            }
+        )
+
+        return redirect(url_for('siscalculo.comparar_indices',
+                                dt_atualizacao=dt_atualizacao.strftime('%Y-%m-%d'),
+                                imovel=numero_imovel))
+
     # Processar cálculos
     print(f"\n[DEBUG 9] Iniciando cálculos...")
     calculador = CalculadorSiscalculo(
@@ -857,12 +713,15 @@ def comparar_indices():
             db.func.sum(SiscalculoCalculos.ATM).label('total_atualizacao'),
             db.func.sum(SiscalculoCalculos.VR_JUROS).label('total_juros'),
             db.func.sum(SiscalculoCalculos.VR_MULTA).label('total_multa'),
-            db.func.sum(SiscalculoCalculos.VR_TOTAL).label('total_geral')
+            db.func.sum(SiscalculoCalculos.VR_TOTAL).label('total_geral'),
+            db.func.count(SiscalculoCalculos.DT_VENCIMENTO).label('qtd_registros'),
+            db.func.max(SiscalculoCalculos.PERC_HONORARIOS).label('perc_honorarios')
         ).join(
             ParamIndicesEconomicos,
             SiscalculoCalculos.ID_INDICE_ECONOMICO == ParamIndicesEconomicos.ID_INDICE_ECONOMICO
         ).filter(
-            SiscalculoCalculos.DT_ATUALIZACAO == dt_atualizacao
+            SiscalculoCalculos.DT_ATUALIZACAO == dt_atualizacao,
+            SiscalculoCalculos.PRESCRITO == False  # Só válidas (mesmos totais da página de resultados)
         )
 
         # ✅ NOVO: Filtrar por imóvel se fornecido (retrocompatível)
@@ -899,6 +758,189 @@ def comparar_indices():
         return redirect(url_for('siscalculo.index'))
 
 
+@siscalculo_bp.route('/lote', methods=['GET', 'POST'])
+@login_required
+def processar_lote():
+    """
+    Vários imóveis de uma vez: upload de várias planilhas e/ou ZIP com a mesma
+    data de atualização. Roda em segundo plano (job 'siscalculo_lote').
+    """
+    indices = ParamIndicesEconomicos.obter_indices_permitidos()
+
+    if request.method == 'POST':
+        dt_atualizacao = request.form.get('dt_atualizacao')
+        perc_honorarios = request.form.get('perc_honorarios', '10.00')
+        ids_indices = request.form.getlist('ids_indices', type=int)
+        aplicar_prescricao = request.form.get('aplicar_prescricao') == 'on'
+        mes_ano_prescricao_inicio = request.form.get('mes_ano_prescricao_inicio')
+        mes_ano_prescricao_fim = request.form.get('mes_ano_prescricao_fim')
+
+        try:
+            dt_atualizacao = datetime.strptime(dt_atualizacao or '', '%Y-%m-%d').date()
+            perc_honorarios = Decimal(perc_honorarios)
+
+            if not ids_indices:
+                raise ValueError('Selecione ao menos um índice.')
+
+            prescricao = periodo_prescricao = None
+            if aplicar_prescricao:
+                if not mes_ano_prescricao_inicio or not mes_ano_prescricao_fim:
+                    raise ValueError('Informe o período completo da prescrição (mês/ano início e fim).')
+                ano_inicio, mes_inicio = map(int, mes_ano_prescricao_inicio.split('-'))
+                ano_fim, mes_fim = map(int, mes_ano_prescricao_fim.split('-'))
+                prescricao = (ano_inicio, mes_inicio, ano_fim, mes_fim)
+                periodo_prescricao = f"{mes_inicio:02d}/{ano_inicio} - {mes_fim:02d}/{ano_fim}"
+
+            planilhas = extrair_planilhas([
+                (arquivo.filename, arquivo.read())
+                for arquivo in request.files.getlist('arquivos') if arquivo and arquivo.filename
+            ])
+            if not planilhas:
+                raise ValueError('Nenhuma planilha Excel encontrada nos arquivos enviados.')
+
+        except Exception as e:
+            flash(f'Erro nos parâmetros: {str(e)}', 'danger')
+            return redirect(url_for('siscalculo.processar_lote'))
+
+        parametros = {
+            'dt_atualizacao': dt_atualizacao.strftime('%Y-%m-%d'),
+            'ids_indices': ids_indices,
+            'perc_honorarios': perc_honorarios,
+            'periodo_prescricao': periodo_prescricao,
+            'arquivos': [nome for nome, _ in planilhas]
+        }
+        job_id = submeter_job(
+            'siscalculo_lote',
+            processar_lote_siscalculo,
+            args=(planilhas, dt_atualizacao, ids_indices, perc_honorarios, current_user.nome),
+            kwargs={'prescricao': prescricao, 'periodo_prescricao': periodo_prescricao},
+            descricao=f'SISCalculo em lote - {len(planilhas)} planilhas - {dt_atualizacao.strftime("%d/%m/%Y")}',
+            parametros=parametros
+        )
+
+        registrar_log(
+            acao='processar_siscalculo_lote',
+            entidade='siscalculo',
+            entidade_id=None,
+            descricao=f'SISCalculo em lote enviado - {len(planilhas)} planilhas',
+            dados_novos=dict(parametros, job_id=job_id)
+        )
+
+        flash(f'Lote com {len(planilhas)} planilha(s) enviado para processamento.', 'info')
+        return redirect(url_for('siscalculo.processar_lote', job_id=job_id))
+
+    # Acompanhamento do job
+    job = None
+    resultado = None
+    job_id = request.args.get('job_id', type=int)
+    if job_id:
+        job = obter_job(job_id)
+        if job and job.TIPO != 'siscalculo_lote':
+            job = None
+        if job and job.STATUS == ProcessoJob.STATUS_CONCLUIDO:
+            resultado = job.resultado
+        elif job and job.STATUS == ProcessoJob.STATUS_ERRO:
+            flash(f'Erro ao processar o lote: {job.ERRO}', 'danger')
+
+    nomes_indices = {i.ID_INDICE_ECONOMICO: i.DSC_INDICE_ECONOMICO for i in indices}
+
+    return render_template('sumov/siscalculo/lote.html',
+                           indices=indices,
+                           nomes_indices=nomes_indices,
+                           data_atual=date.today(),
+                           job=job,
+                           resultado=resultado)
+
+
+@siscalculo_bp.route('/lote/<int:job_id>/exportar')
+@login_required
+def exportar_lote(job_id):
+    """Excel consolidado do lote: resumo por imóvel e detalhamento de todas as parcelas"""
+    job = obter_job(job_id)
+    if not job or job.TIPO != 'siscalculo_lote' or job.STATUS != ProcessoJob.STATUS_CONCLUIDO:
+        flash('Lote não encontrado ou ainda em processamento.', 'warning')
+        return redirect(url_for('siscalculo.processar_lote'))
+
+    resultado = job.resultado
+    dt_atualizacao = datetime.strptime(resultado['dt_atualizacao'], '%Y-%m-%d').date()
+    ids_indices = resultado['ids_indices']
+    imoveis_ok = [i['imovel'] for i in resultado['imoveis'] if i['status'] == 'OK']
+    nomes_indices = {
+        i.ID_INDICE_ECONOMICO: i.DSC_INDICE_ECONOMICO
+        for i in ParamIndicesEconomicos.query.filter(ParamIndicesEconomicos.ID_INDICE_ECONOMICO.in_(ids_indices))
+    }
+
+    # Resumo por imóvel (inclui os que falharam, com a situação)
+    linhas_resumo = []
+    for item in resultado['imoveis']:
+        linha = {
+            'Arquivo': item['arquivo'],
+            'Imóvel': item['imovel'] or '',
+            'Condomínio': item['condominio'] or '',
+            'Situação': item['status'],
+            'Observação': item['erro'] or '',
+            'Parcelas': item['parcelas'],
+            'Prescritas': item['prescritas'],
+            'Rejeitadas': item['rejeitadas'],
+        }
+        for id_indice in ids_indices:
+            linha[f'Total {nomes_indices.get(id_indice, id_indice)}'] = item['totais'].get(str(id_indice), 0)
+        linhas_resumo.append(linha)
+
+    calculos = []
+    if imoveis_ok:
+        calculos = SiscalculoCalculos.query.filter(
+            SiscalculoCalculos.DT_ATUALIZACAO == dt_atualizacao,
+            SiscalculoCalculos.IMOVEL.in_(imoveis_ok),
+            SiscalculoCalculos.ID_INDICE_ECONOMICO.in_(ids_indices)
+        ).order_by(
+            SiscalculoCalculos.IMOVEL,
+            SiscalculoCalculos.ID_INDICE_ECONOMICO,
+            SiscalculoCalculos.DT_VENCIMENTO
+        ).all()
+
+    df_detalhe = pd.DataFrame([{
+        'Imóvel': calc.IMOVEL or '',
+        'Índice': nomes_indices.get(calc.ID_INDICE_ECONOMICO, str(calc.ID_INDICE_ECONOMICO)),
+        'Vencimento': calc.DT_VENCIMENTO.strftime('%d/%m/%Y'),
+        'Valor Original': float(calc.VR_COTA),
+        'Meses Atraso': calc.TEMPO_ATRASO,
+        '% Atualização': float(calc.PERC_ATUALIZACAO) if calc.PERC_ATUALIZACAO else 0,
+        'Atualização': float(calc.ATM) if calc.ATM else 0,
+        'Juros': float(calc.VR_JUROS) if calc.VR_JUROS else 0,
+        'Multa': float(calc.VR_MULTA) if calc.VR_MULTA else 0,
+        'Desconto': float(calc.VR_DESCONTO) if calc.VR_DESCONTO else 0,
+        'Total': float(calc.VR_TOTAL) if calc.VR_TOTAL else 0,
+        'Prescrita': 'SIM' if calc.PRESCRITO else 'NÃO'
+    } for calc in calculos])
+
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        pd.DataFrame(linhas_resumo).to_excel(writer, sheet_name='Resumo', index=False)
+        df_detalhe.to_excel(writer, sheet_name='Detalhamento', index=False)
+
+        workbook = writer.book
+        money_fmt = workbook.add_format({'num_format': 'R$ #,##0.00'})
+        perc_fmt = workbook.add_format({'num_format': '0.00%'})
+
+        worksheet_res = writer.sheets['Resumo']
+        worksheet_res.set_column('A:E', 22)
+        worksheet_res.set_column(8, 8 + len(ids_indices) - 1, 18, money_fmt)
+
+        worksheet_det = writer.sheets['Detalhamento']
+        worksheet_det.set_column('D:D', 15, money_fmt)
+        worksheet_det.set_column('F:F', 12, perc_fmt)
+        worksheet_det.set_column('G:K', 15, money_fmt)
+
+    output.seek(0)
+    return send_file(
+        output,
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        as_attachment=True,
+        download_name=f'siscalculo_lote_{job_id}_{dt_atualizacao.strftime("%Y%m%d")}.xlsx'
+    )
+
+
 # =====================================================
 # MODIFICAÇÃO NO ARQUIVO: app/routes/siscalculo_routes.py
 # FUNÇÃO MODIFICADA: exportar_pdf()
@@ -8,24 +8,30 @@ Primeira parte (esta versão):
   - Extração de DT_ATUALIZACAO e NU_CONTRATO do nome do arquivo.
   - Leitura da primeira aba (ignora a linha TOTAL e a segunda tabela).
   - Inserção em BDG.FIN_TB006_RESUMO_CVS com MERGE/UPSERT por
-    (DT_ATUALIZACAO, NU_CONTRATO, ATIVO).
+    (DT_ATUALIZACAO, NU_CONTRATO, ATIVO) - app/utils/resumo_cvs_carga.py.
+  - Vários arquivos no mesmo upload são carregados em paralelo.
   - DT_CARGA recebe a data do dia da carga.
 
 Compatível com Python 3.9 e 3.12.
 """
 from flask import (
-    Blueprint, render_template, request, jsonify, make_response
+    Blueprint, render_template, request, jsonify, make_response, url_for
 )
 from flask_login import login_required
 from app import db
 from app.models.titulo_cvs import ResumoCVS, OrigemDestinoCVS, ExtratoCVS
 from app.utils.audit import registrar_log
+from app.utils.resumo_cvs_carga import carregar_resumo, carregar_varios
+from app.utils.extrato_cvs_mensal import (
+    processar_extrato, MAX_MESES_RECUPERACAO,
+    RECURSO_LOCK as RECURSO_LOCK_EXTRATO,
+)
+from app.utils.lock_processo import lock_exclusivo
+from app.utils.processo_jobs import submeter_job, obter_job
 from datetime import datetime
-from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+from decimal import Decimal, InvalidOperation
 from sqlalchemy import text
-import os
 import re
-import tempfile
 from types import SimpleNamespace
 from app.models.titulo_cvs import (
     ResumoCVS, OrigemDestinoCVS, ExtratoCVS, PosicaoEstoqueCVS,
@@ -122,350 +128,186 @@ def index():
 # =========================================================================
 # UPLOAD DE PLANILHA EXCEL
 # =========================================================================
-@titulo_cvs_bp.route('/upload', methods=['POST'])
-@login_required
-def upload_excel():
+def _validar_nome_arquivo(nome_arquivo):
     """
-    Recebe a planilha Excel, extrai DT_ATUALIZACAO e NU_CONTRATO do
-    nome do arquivo, lê a primeira tabela e insere em FIN_TB007_RESUMO_CVS.
+    Valida o nome e extrai (dt_atualizacao, nu_contrato).
+    Levanta ValueError com a mensagem para o usuário.
     """
-    # 1. Validar envio
-    if 'arquivo' not in request.files:
-        return jsonify({
-            'success': False,
-            'message': 'Nenhum arquivo enviado.'
-        }), 400
-
-    arquivo = request.files['arquivo']
-    nome_arquivo = (arquivo.filename or '').strip()
-
     if not nome_arquivo:
-        return jsonify({
-            'success': False,
-            'message': 'Nome do arquivo está vazio.'
-        }), 400
+        raise ValueError('Nome do arquivo está vazio.')
 
     if not nome_arquivo.lower().endswith(('.xlsx', '.xlsm')):
-        return jsonify({
-            'success': False,
-            'message': 'Arquivo deve ser .xlsx ou .xlsm.'
-        }), 400
+        raise ValueError('Arquivo deve ser .xlsx ou .xlsm.')
 
-    # 2. Extrair DT_ATUALIZACAO e NU_CONTRATO do nome
     match = REGEX_NOME_ARQUIVO.match(nome_arquivo)
     if not match:
-        return jsonify({
-            'success': False,
-            'message': (
-                'Nome do arquivo fora do padrão esperado. '
-                'Use: AAAA-MM-DD_Planilhas Resumo CVS - Contrato NNN.xlsx'
-            )
-        }), 400
+        raise ValueError(
+            'Nome do arquivo fora do padrão esperado. '
+            'Use: AAAA-MM-DD_Planilhas Resumo CVS - Contrato NNN.xlsx'
+        )
 
     try:
         dt_atualizacao = datetime.strptime(
             match.group('data'), '%Y-%m-%d'
         ).date()
     except ValueError:
-        return jsonify({
-            'success': False,
-            'message': f'Data inválida no nome: {match.group("data")}.'
-        }), 400
+        raise ValueError(f'Data inválida no nome: {match.group("data")}.')
 
     try:
         nu_contrato = int(match.group('contrato'))
     except ValueError:
+        raise ValueError(
+            f'Número de contrato inválido no nome: '
+            f'{match.group("contrato")}.'
+        )
+
+    return dt_atualizacao, nu_contrato
+
+
+def _registrar_carga(situacao):
+    registrar_log(
+        acao='carga',
+        entidade='titulo_cvs',
+        entidade_id=None,
+        descricao=(
+            f'Upload de Resumo CVS - Contrato: {situacao["nu_contrato"]} - '
+            f'DT_ATUALIZACAO: {situacao["dt_atualizacao"].strftime("%d/%m/%Y")} - '
+            f"EVENTO: E"
+        ),
+        dados_novos={
+            'arquivo': situacao['arquivo'],
+            'nu_contrato': situacao['nu_contrato'],
+            'dt_atualizacao': situacao['dt_atualizacao'].strftime('%Y-%m-%d'),
+            'evento': 'E',
+            'registros_inseridos': situacao['inseridos'],
+            'registros_atualizados': situacao['atualizados'],
+            'registros_ignorados': situacao['ignorados'],
+        }
+    )
+
+
+@titulo_cvs_bp.route('/upload', methods=['POST'])
+@login_required
+def upload_excel():
+    """
+    Recebe uma ou mais planilhas Excel (campo 'arquivo'), extrai
+    DT_ATUALIZACAO e NU_CONTRATO do nome de cada uma, lê a primeira tabela
+    e grava em FIN_TB007_RESUMO_CVS (MERGE, ver app/utils/resumo_cvs_carga.py).
+
+    Vários arquivos são processados em paralelo, cada um na sua transação.
+    """
+    arquivos = [
+        a for a in request.files.getlist('arquivo')
+        if (a.filename or '').strip()
+    ]
+    if not arquivos:
         return jsonify({
             'success': False,
-            'message': (
-                f'Número de contrato inválido no nome: '
-                f'{match.group("contrato")}.'
-            )
+            'message': 'Nenhum arquivo enviado.'
         }), 400
 
-    # 3. Salvar temporariamente
-    caminho_tmp = os.path.join(
-        tempfile.gettempdir(),
-        f'titulo_cvs_{datetime.now().strftime("%Y%m%d_%H%M%S")}_{nome_arquivo}'
-    )
+    # 1. Validar nomes (um único arquivo inválido mantém o 400 de antes)
+    itens = []
+    invalidos = []
+    for arquivo in arquivos:
+        nome_arquivo = arquivo.filename.strip()
+        try:
+            dt_atualizacao, nu_contrato = _validar_nome_arquivo(nome_arquivo)
+        except ValueError as e:
+            invalidos.append({'arquivo': nome_arquivo, 'erro': str(e)})
+            continue
+        itens.append({
+            'arquivo': nome_arquivo,
+            'conteudo': arquivo.read(),
+            'dt_atualizacao': dt_atualizacao,
+            'nu_contrato': nu_contrato,
+        })
+
+    if len(arquivos) == 1 and invalidos:
+        return jsonify({
+            'success': False,
+            'message': invalidos[0]['erro']
+        }), 400
+
+    # 2. Processar planilhas
     try:
-        arquivo.save(caminho_tmp)
+        if len(arquivos) == 1:
+            item = itens[0]
+            situacoes = [dict(
+                arquivo=item['arquivo'],
+                dt_atualizacao=item['dt_atualizacao'],
+                nu_contrato=item['nu_contrato'],
+                erro=None
+            )]
+            (situacoes[0]['inseridos'], situacoes[0]['atualizados'],
+             situacoes[0]['ignorados']) = carregar_resumo(
+                item['conteudo'], item['dt_atualizacao'], item['nu_contrato']
+            )
+        else:
+            situacoes = carregar_varios(itens)
     except Exception as e:
         return jsonify({
             'success': False,
-            'message': f'Falha ao salvar arquivo temporário: {e}'
+            'message': f'Erro ao processar planilha: {str(e)}'
         }), 500
 
-    try:
-        # 4. Processar planilha
-        inseridos, atualizados, ignorados = _processar_excel(
-            caminho_tmp, dt_atualizacao, nu_contrato
-        )
-
-        # 5. Auditoria
-        registrar_log(
-            acao='carga',
-            entidade='titulo_cvs',
-            entidade_id=None,
-            descricao=(
-                f'Upload de Resumo CVS - Contrato: {nu_contrato} - '
-                f'DT_ATUALIZACAO: {dt_atualizacao.strftime("%d/%m/%Y")} - '
-                f"EVENTO: E"
-            ),
-            dados_novos={
-                'arquivo': nome_arquivo,
-                'nu_contrato': nu_contrato,
-                'dt_atualizacao': dt_atualizacao.strftime('%Y-%m-%d'),
-                'evento': 'E',
-                'registros_inseridos': inseridos,
-                'registros_atualizados': atualizados,
-                'registros_ignorados': ignorados,
-            }
-        )
+    # 3. Auditoria
+    for situacao in situacoes:
+        if not situacao['erro']:
+            _registrar_carga(situacao)
 
+    if len(arquivos) == 1:
+        situacao = situacoes[0]
         return jsonify({
             'success': True,
             'message': (
                 f'Planilha carregada com sucesso! '
-                f'{inseridos} inserido(s), '
-                f'{atualizados} atualizado(s), '
-                f'{ignorados} ignorado(s). '
-                f'Contrato: {nu_contrato} - '
-                f'Data: {dt_atualizacao.strftime("%d/%m/%Y")} - '
+                f'{situacao["inseridos"]} inserido(s), '
+                f'{situacao["atualizados"]} atualizado(s), '
+                f'{situacao["ignorados"]} ignorado(s). '
+                f'Contrato: {situacao["nu_contrato"]} - '
+                f'Data: {situacao["dt_atualizacao"].strftime("%d/%m/%Y")} - '
                 f'EVENTO: E.'
             ),
-            'nu_contrato': nu_contrato,
-            'dt_atualizacao': dt_atualizacao.strftime('%d/%m/%Y'),
+            'nu_contrato': situacao['nu_contrato'],
+            'dt_atualizacao': situacao['dt_atualizacao'].strftime('%d/%m/%Y'),
             'evento': 'E',
-            'inseridos': inseridos,
-            'atualizados': atualizados,
-            'ignorados': ignorados,
+            'inseridos': situacao['inseridos'],
+            'atualizados': situacao['atualizados'],
+            'ignorados': situacao['ignorados'],
         })
 
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({
-            'success': False,
-            'message': f'Erro ao processar planilha: {str(e)}'
-        }), 500
-
-    finally:
-        # 6. Limpar arquivo temporário
-        try:
-            if os.path.exists(caminho_tmp):
-                os.remove(caminho_tmp)
-        except Exception:
-            pass
-
-# =========================================================================
-# PROCESSAMENTO DO EXCEL
-# =========================================================================
-def _processar_excel(caminho_arquivo, dt_atualizacao, nu_contrato):
-    """
-    Lê APENAS a primeira tabela da primeira aba do Excel e faz UPSERT
-    em BDG.FIN_TB007_RESUMO_CVS.
-
-    Como o Excel tem uma segunda tabela abaixo da primeira (com ATIVO,
-    Data VNA, VNA, Pu Juros, VNA Total), a leitura é interrompida
-    no primeiro "buraco":
-      - linha TOTAL  → para
-      - linha com ATIVO vazio/NaN → para (separador entre as tabelas)
-
-    Assim a segunda tabela nunca é processada.
-
-    Estrutura esperada da PRIMEIRA tabela (linha 2 do Excel é o cabeçalho):
-      Col A: Ativo
-      Col B: Quantidade (Contrato)
-      Col C: VNA em ...
-      Col D: Financeiro em ...
-      Col E: PU Retroativo de Juros em ...
-      Col F: Financeiro Juros Vencidos em ... (R$)
-      Col G: PU Retroativo de Principal em ...
-      Col H: Financeiro Principal Vencido em ... (R$)
-      Col I: Financeiro Vencido a Pagar em ... (R$)
-      Col J: Financeiro Total (R$)
-
-    Retorna (inseridos, atualizados, ignorados).
-    """
-    import pandas as pd
-
-    # Lê a primeira aba; header na 2ª linha do Excel (índice 1)
-    df = pd.read_excel(
-        caminho_arquivo,
-        sheet_name=0,
-        header=1,
-        engine='openpyxl'
-    )
-
-    if df.empty:
-        raise Exception('Planilha está vazia.')
-
-    # Pega só as 10 primeiras colunas
-    df = df.iloc[:, :10]
-
-    # Renomeia para nomes internos
-    colunas_internas = [
-        'ATIVO',
-        'QTDE',
-        'VNA',
-        'FINANCEIRO',
-        'PU_RETROATIVO_JUROS',
-        'FINANCEIRO_JUROS',
-        'PU_RETROATIVO_PRINC',
-        'FINANCEIRO_PRINC',
-        'FINANCEIRO_VENC_PAGAR',
-        'TOTAL',
+    # Vários arquivos: resumo + situação de cada um
+    resultados = invalidos + [
+        {
+            'arquivo': s['arquivo'],
+            'nu_contrato': s['nu_contrato'],
+            'dt_atualizacao': s['dt_atualizacao'].strftime('%d/%m/%Y'),
+            'inseridos': s['inseridos'],
+            'atualizados': s['atualizados'],
+            'ignorados': s['ignorados'],
+            'erro': s['erro'],
+        }
+        for s in situacoes
     ]
-    if df.shape[1] < len(colunas_internas):
-        raise Exception(
-            f'Planilha tem apenas {df.shape[1]} colunas; '
-            f'são esperadas {len(colunas_internas)}.'
-        )
-    df.columns = colunas_internas
-
-    # Corte da primeira tabela
-    linhas_validas = []
-    for _, row in df.iterrows():
-        ativo_raw = row.get('ATIVO')
-
-        if pd.isna(ativo_raw):
-            break
-
-        ativo = str(ativo_raw).strip()
-        if not ativo:
-            break
-
-        if ativo.upper() == 'TOTAL':
-            break
-
-        linhas_validas.append(row)
-
-    if not linhas_validas:
-        raise Exception(
-            'Nenhuma linha válida encontrada na primeira tabela do Excel.'
-        )
-
-    df = pd.DataFrame(linhas_validas)
-
-    dt_carga = datetime.now().date()
-    inseridos = 0
-    atualizados = 0
-    ignorados = 0
-
-    for _, row in df.iterrows():
-        ativo = str(row['ATIVO']).strip()
-        if not ativo:
-            ignorados += 1
-            continue
-
-        qtde = _to_int(row.get('QTDE'))
-        vna = _to_decimal(row.get('VNA'), casas=8)
-        financeiro = _to_decimal(row.get('FINANCEIRO'), casas=2)
-        pu_juros = _to_decimal(row.get('PU_RETROATIVO_JUROS'), casas=10)
-        fin_juros = _to_decimal(row.get('FINANCEIRO_JUROS'), casas=2)
-        pu_princ = _to_decimal(row.get('PU_RETROATIVO_PRINC'), casas=10)
-        fin_princ = _to_decimal(row.get('FINANCEIRO_PRINC'), casas=2)
-        fin_venc = _to_decimal(row.get('FINANCEIRO_VENC_PAGAR'), casas=2)
-        total = _to_decimal(row.get('TOTAL'), casas=2)
-
-        existente = ResumoCVS.query.filter_by(
-            DT_ATUALIZACAO=dt_atualizacao,
-            NU_CONTRATO=nu_contrato,
-            ATIVO=ativo
-        ).first()
-
-        if existente:
-            existente.EVENTO = 'E'
-            existente.DT_CARGA = dt_carga
-            existente.QTDE = qtde
-            existente.VNA = vna
-            existente.FINANCEIRO = financeiro
-            existente.PU_RETROATIVO_JUROS = pu_juros
-            existente.FINANCEIRO_JUROS = fin_juros
-            existente.PU_RETROATIVO_PRINC = pu_princ
-            existente.FINANCEIRO_PRINC = fin_princ
-            existente.FINANCEIRO_VENC_PAGAR = fin_venc
-            existente.TOTAL = total
-            atualizados += 1
-        else:
-            novo = ResumoCVS(
-                DT_CARGA=dt_carga,
-                DT_ATUALIZACAO=dt_atualizacao,
-                NU_CONTRATO=nu_contrato,
-                ATIVO=ativo,
-                EVENTO='E',
-                QTDE=qtde,
-                VNA=vna,
-                FINANCEIRO=financeiro,
-                PU_RETROATIVO_JUROS=pu_juros,
-                FINANCEIRO_JUROS=fin_juros,
-                PU_RETROATIVO_PRINC=pu_princ,
-                FINANCEIRO_PRINC=fin_princ,
-                FINANCEIRO_VENC_PAGAR=fin_venc,
-                TOTAL=total,
-            )
-            db.session.add(novo)
-            inseridos += 1
-
-    db.session.commit()
-    return inseridos, atualizados, ignorados
-
-
-# =========================================================================
-# HELPERS DE CONVERSÃO
-# =========================================================================
-def _to_decimal(valor, casas=2):
-    """
-    Converte para Decimal com `casas` casas decimais. Retorna None
-    se vazio/NaN/inválido.
-    """
-    if valor is None:
-        return None
-    try:
-        import math
-        if isinstance(valor, float) and math.isnan(valor):
-            return None
-    except Exception:
-        pass
-
-    texto = str(valor).strip()
-    if not texto or texto.lower() in ('nan', 'none', '-'):
-        return None
-
-    # Normaliza padrão brasileiro (se vier "1.234,56")
-    if ',' in texto and '.' in texto:
-        # Tem ambos: assume formato brasileiro (1.234,56)
-        normalizado = texto.replace('.', '').replace(',', '.')
-    elif ',' in texto:
-        # Só vírgula: assume decimal brasileiro
-        normalizado = texto.replace(',', '.')
-    else:
-        normalizado = texto
-
-    try:
-        formato = Decimal('1.' + ('0' * casas)) if casas > 0 else Decimal('1')
-        return Decimal(normalizado).quantize(
-            formato, rounding=ROUND_HALF_UP
-        )
-    except (InvalidOperation, ValueError):
-        return None
-
-
-def _to_int(valor):
-    """Converte para int. Retorna None se inválido/NaN."""
-    if valor is None:
-        return None
-    try:
-        import math
-        if isinstance(valor, float) and math.isnan(valor):
-            return None
-    except Exception:
-        pass
-
-    try:
-        return int(float(str(valor).strip()))
-    except (ValueError, TypeError):
-        return None
+    carregados = [s for s in situacoes if not s['erro']]
+    falhas = len(resultados) - len(carregados)
+
+    return jsonify({
+        'success': bool(carregados),
+        'message': (
+            f'{len(carregados)} de {len(resultados)} planilha(s) carregada(s). '
+            f'{sum(s["inseridos"] for s in carregados)} inserido(s), '
+            f'{sum(s["atualizados"] for s in carregados)} atualizado(s), '
+            f'{sum(s["ignorados"] for s in carregados)} ignorado(s).'
+            + (f' {falhas} com erro.' if falhas else '')
+        ),
+        'evento': 'E',
+        'inseridos': sum(s['inseridos'] for s in carregados),
+        'atualizados': sum(s['atualizados'] for s in carregados),
+        'ignorados': sum(s['ignorados'] for s in carregados),
+        'arquivos': resultados,
+    })
 
 
 # =========================================================================
@@ -1030,68 +872,6 @@ def _ultimo_dia_mes(data_qualquer):
     ultimo = monthrange(data_qualquer.year, data_qualquer.month)[1]
     return data_qualquer.replace(day=ultimo)
 
-def _primeiro_dia_util_mes(dt_qualquer_no_mes):
-    """
-    Retorna o primeiro dia útil do mês de dt_qualquer_no_mes,
-    consultando BDG.PAR_TB020_CALENDARIO.
-
-    Critério: menor [DIA] no mesmo (ano, mês) com [DIA_UTIL] = 1.
-    Se nenhum dia útil for encontrado (cenário improvável), retorna
-    o próprio dia 1 do mês como fallback.
-    """
-    primeiro_do_mes = dt_qualquer_no_mes.replace(day=1)
-    ultimo_do_mes = _ultimo_dia_mes(dt_qualquer_no_mes)
-
-    sql = text("""
-        SELECT TOP 1 [DIA]
-        FROM [BDG].[PAR_TB020_CALENDARIO]
-        WHERE [DIA] BETWEEN :dt_ini AND :dt_fim
-          AND [DIA_UTIL] = 1
-        ORDER BY [DIA] ASC;
-    """)
-    row = db.session.execute(
-        sql,
-        {'dt_ini': primeiro_do_mes, 'dt_fim': ultimo_do_mes}
-    ).fetchone()
-
-    if row and row[0] is not None:
-        valor = row[0]
-        # Pode vir como date ou datetime — normaliza para date
-        if hasattr(valor, 'date'):
-            return valor.date()
-        return valor
-
-    # Fallback: dia 1 (caso o calendário esteja vazio no mês)
-    return primeiro_do_mes
-
-def _proxima_ordem_no_mes(primeiro_dia_mes, ultimo_dia_mes):
-    """Retorna MAX(ORDEM) + 1 dentro do intervalo de datas."""
-    from sqlalchemy import func
-    max_ordem = db.session.query(
-        func.max(ExtratoCVS.ORDEM)
-    ).filter(
-        ExtratoCVS.DT_MOVIMENTACAO >= primeiro_dia_mes,
-        ExtratoCVS.DT_MOVIMENTACAO <= ultimo_dia_mes,
-    ).scalar()
-    return (int(max_ordem) + 1) if max_ordem is not None else 1
-
-
-def _gerar_historico_estorno(historico_original):
-    """
-    Substitui 'Provisão' (ou 'Provisao' sem acento) do início por
-    'Estorno', mantendo o resto do texto intacto.
-    """
-    if not historico_original:
-        return historico_original
-    match = re.match(
-        r'^Provis[ãa]o(.*)$',
-        historico_original,
-        flags=re.IGNORECASE
-    )
-    if match:
-        return 'Estorno' + match.group(1)
-    return historico_original
-
 def _proximo_nu_linha_extrato():
     """
     Retorna MAX(NU_LINHA) + 1 da tabela FIN_TB013_EXTRATO_CVS.
@@ -1198,6 +978,14 @@ def extrato_index():
             _ultimo_dia_mes(mes_filtro)
         )
 
+    # 8. Recuperação de meses em segundo plano (acompanhamento)
+    job = None
+    job_id = request.args.get('job_id', type=int)
+    if job_id:
+        job = obter_job(job_id)
+        if job and job.TIPO != 'extrato_cvs':
+            job = None
+
     response = make_response(render_template(
         'titulo_cvs/extrato.html',
         movimentacoes=movimentacoes,
@@ -1211,6 +999,7 @@ def extrato_index():
         qtd_movimentacoes_destino=qtd_movimentacoes_destino,
         qtd_incorporacoes=qtd_incorporacoes,
         ajuste_pendente=ajuste_pendente,
+        job=job,
     ))
     response.headers['Cache-Control'] = (
         'no-store, no-cache, must-revalidate, max-age=0'
@@ -1222,6 +1011,19 @@ def extrato_index():
 # =========================================================================
 # EXTRATO — PROCESSAR PROVISÕES (gera próximo mês completo)
 # =========================================================================
+def _resumo_etapas_mes(mes):
+    """Texto com as quantidades de cada etapa de um mês processado."""
+    return (
+        f'{mes["estornos_inseridos"]} estorno(s), '
+        f'{mes["incorporacoes_inseridas"]} incorporação(ões), '
+        f'{mes["recebimentos_ir_inseridos"]} recebimento(s) IR, '
+        f'{mes["entrada_pro_rata_inseridas"]} entrada(s) pro rata, '
+        f'{mes["provisao_atm_juros_inseridas"]} provisão(ões) ATM/Juros, '
+        f'{mes["provisao_pro_rata_inseridas"]} provisão(ões) pro rata, '
+        f'{mes["saldos_recalculados"]} saldo(s) recalculado(s).'
+    )
+
+
 @titulo_cvs_bp.route('/extrato/processar-provisoes', methods=['POST'])
 @login_required
 def extrato_processar_provisoes():
@@ -1237,483 +1039,215 @@ def extrato_processar_provisoes():
     ETAPA 6 — Provisão Pro Rata (FIN_VW010) — cada linha vira 2.
     ETAPA 7 — Recálculo de VR_SALDO.
 
+    As etapas rodam set-based no SQL Server
+    (app/utils/extrato_cvs_mensal.py).
+
+    Corpo JSON (opcional):
+      simular: true  → pré-visualização: gera e desfaz, devolvendo as
+                       linhas de cada mês. Nada é gravado.
+      ate: 'AAAA-MM' → recuperação: gera todos os meses pendentes até o
+                       mês informado. Com mais de um mês (e sem simular),
+                       roda em segundo plano (job 'extrato_cvs',
+                       acompanhado por /processos/<job_id>/status).
+
     O AJUSTE de Saldo de Provisão de Juros (FIN_VW011) NÃO é aplicado
     aqui — ele fica na rota separada /extrato/ajustar-saldo, acionada
     pelo botão "Ajustar Saldo" na tela do extrato.
 
     NU_LINHA é IDENTITY (gerado pelo banco).
     """
-    try:
-        # =================================================================
-        # 1. Resolver mês origem e mês destino
-        # =================================================================
-        ultima_data = ExtratoCVS.obter_ultima_data_movimentacao()
-        if not ultima_data:
-            return jsonify({
-                'success': False,
-                'message': (
-                    'A tabela FIN_TB013_EXTRATO_CVS está vazia. '
-                    'Nada para processar.'
-                )
-            }), 400
+    dados = request.get_json(silent=True) or {}
+    simular = bool(dados.get('simular'))
 
-        primeiro_dia_ultimo_mes = ultima_data.replace(day=1)
-        ultimo_dia_ultimo_mes = _ultimo_dia_mes(ultima_data)
-        dt_movimentacao_nova = _proximo_mes_dia_1(ultima_data)
-        ultimo_dia_destino = _ultimo_dia_mes(dt_movimentacao_nova)
-
-        # =================================================================
-        # 2. Já tem coisa no mês destino? Aborta.
-        # =================================================================
-        ja_existe = ExtratoCVS.query.filter(
-            ExtratoCVS.DT_MOVIMENTACAO >= dt_movimentacao_nova,
-            ExtratoCVS.DT_MOVIMENTACAO <= ultimo_dia_destino
-        ).count()
-        if ja_existe > 0:
+    ate = None
+    ate_str = (dados.get('ate') or '').strip()
+    if ate_str:
+        try:
+            ate = datetime.strptime(ate_str, '%Y-%m').date()
+        except ValueError:
             return jsonify({
                 'success': False,
-                'message': (
-                    f'Já existem {ja_existe} movimentação(ões) em '
-                    f'{dt_movimentacao_nova.strftime("%m/%Y")}. '
-                    f'Apague-as primeiro para reprocessar.'
-                )
+                'message': f'Mês inválido: {ate_str}. Use AAAA-MM.'
             }), 400
 
-        # =================================================================
-        # 3. Provisões do último mês
-        # =================================================================
-        provisoes = ExtratoCVS.query.filter(
-            ExtratoCVS.DT_MOVIMENTACAO >= primeiro_dia_ultimo_mes,
-            ExtratoCVS.DT_MOVIMENTACAO <= ultimo_dia_ultimo_mes,
-            db.or_(
-                ExtratoCVS.HISTORICO.like('Provisão%'),
-                ExtratoCVS.HISTORICO.like('Provisao%')
+    # =================================================================
+    # 1. Resolver mês destino (e o intervalo da recuperação)
+    # =================================================================
+    ultima_data = ExtratoCVS.obter_ultima_data_movimentacao()
+    if not ultima_data:
+        return jsonify({
+            'success': False,
+            'message': (
+                'A tabela FIN_TB013_EXTRATO_CVS está vazia. '
+                'Nada para processar.'
             )
-        ).order_by(ExtratoCVS.ORDEM.asc()).all()
-
-        provisoes_para_processar = [p for p in provisoes if p.HISTORICO]
-        provisoes_ja_estornadas = 0  # mantido por compatibilidade
-
-        # =================================================================
-        # 4. Incorporações (FIN_TB014) — filtradas pelo mês/ano destino
-        # =================================================================
-        sql_incorporacoes = text("""
-            SELECT 
-                [TIPO],
-                [HISTORICO],
-                [PERIODO_DE],
-                [PERIODO_ATE],
-                [VR_MOVIMENTACAO]
-            FROM [BDG].[FIN_TB014_INCORPORACOES_MES_CVS]
-            WHERE YEAR([DT_MOVIMENTACAO])  = YEAR(:dt_destino)
-              AND MONTH([DT_MOVIMENTACAO]) = MONTH(:dt_destino)
-            ORDER BY [DT_MOVIMENTACAO], [TIPO];
-        """)
-        incorporacoes = db.session.execute(
-            sql_incorporacoes, {'dt_destino': dt_movimentacao_nova}
-        ).fetchall()
-
-        # =================================================================
-        # 5. Recebimentos IR (FIN_VW006)
-        # =================================================================
-        sql_recebimentos_ir = text("""
-            SELECT
-                [DT_PREV_RECEBIMENTO],
-                [TIPO],
-                [HISTORICO],
-                [PERIODO_DE],
-                [PERIODO_ATE],
-                [MOVIMENTACAO]
-            FROM [BDDASHBOARDBI].[BDG].[FIN_VW006_RECEBIMENTO_IR_CVS]
-            WHERE YEAR([DT_PREV_RECEBIMENTO])  = YEAR(:dt_destino)
-              AND MONTH([DT_PREV_RECEBIMENTO]) = MONTH(:dt_destino)
-            ORDER BY [DT_PREV_RECEBIMENTO], [TIPO];
-        """)
-        recebimentos_ir = db.session.execute(
-            sql_recebimentos_ir, {'dt_destino': dt_movimentacao_nova}
-        ).fetchall()
-
-        # =================================================================
-        # 6. Entrada Títulos Pro Rata (FIN_VW007)
-        # =================================================================
-        sql_entrada_pro_rata = text("""
-            SELECT
-                [DT_ATUALIZACAO],
-                [TIPO],
-                [HISTORICO],
-                [PU_ATU_PRO],
-                [VR_JR_PRORATA],
-                [QTDE_TITULOS]
-            FROM [BDG].[FIN_VW007_ENTRADA_TITULOS_PRORATA_CVS]
-            WHERE YEAR([DT_ATUALIZACAO])  = YEAR(:dt_destino)
-              AND MONTH([DT_ATUALIZACAO]) = MONTH(:dt_destino)
-            ORDER BY [DT_ATUALIZACAO], [TIPO];
-        """)
-        entradas_pro_rata = db.session.execute(
-            sql_entrada_pro_rata, {'dt_destino': dt_movimentacao_nova}
-        ).fetchall()
-
-        # =================================================================
-        # 7. Provisão ATM/Juros (FIN_VW008) — cada linha vira 2 no extrato
-        # =================================================================
-        sql_provisao_atm_juros = text("""
-            SELECT
-                [DT_ATUALIZACAO],
-                [PERIODO_DE],
-                [PERIODO_ATE],
-                [TIPO],
-                [HISTORICO1],
-                [MOVIMENTACAO1],
-                [HISTORICO2],
-                [MOVIMENTACAO2]
-            FROM [BDG].[FIN_VW008_PROVISAO_ATM_JUROS_CVS]
-            WHERE YEAR([DT_ATUALIZACAO])  = YEAR(:dt_destino)
-              AND MONTH([DT_ATUALIZACAO]) = MONTH(:dt_destino)
-            ORDER BY [DT_ATUALIZACAO], [TIPO];
-        """)
-        provisoes_atm_juros = db.session.execute(
-            sql_provisao_atm_juros, {'dt_destino': dt_movimentacao_nova}
-        ).fetchall()
-
-        # =================================================================
-        # 8. Provisão Pro Rata (FIN_VW010) — cada linha vira 2 no extrato
-        # =================================================================
-        sql_provisao_pro_rata = text("""
-            SELECT
-                [DT_ATUALIZACAO],
-                [PERIODO_DE],
-                [PERIODO_ATE],
-                [TIPO],
-                [HISTORICO],
-                [MOVIMENTACAO],
-                [HISTORICO2],
-                [MOVIMENTACAO2]
-            FROM [BDG].[FIN_VW010_PROVISAO_PRORATA_CVS]
-            WHERE YEAR([DT_ATUALIZACAO])  = YEAR(:dt_destino)
-              AND MONTH([DT_ATUALIZACAO]) = MONTH(:dt_destino)
-            ORDER BY [DT_ATUALIZACAO], [TIPO];
-        """)
-        provisoes_pro_rata = db.session.execute(
-            sql_provisao_pro_rata, {'dt_destino': dt_movimentacao_nova}
-        ).fetchall()
+        }), 400
 
-        # =================================================================
-        # 9. Validar que há algo a fazer
-        # =================================================================
-        if (not provisoes_para_processar
-                and not incorporacoes
-                and not recebimentos_ir
-                and not entradas_pro_rata
-                and not provisoes_atm_juros
-                and not provisoes_pro_rata):
+    dt_movimentacao_nova = _proximo_mes_dia_1(ultima_data)
+    qtd_meses = 1
+    if ate:
+        qtd_meses = (
+            (ate.year - dt_movimentacao_nova.year) * 12
+            + ate.month - dt_movimentacao_nova.month + 1
+        )
+        if qtd_meses < 1:
             return jsonify({
                 'success': False,
                 'message': (
-                    'Nenhum dado encontrado para processar em '
-                    f'{dt_movimentacao_nova.strftime("%m/%Y")}. '
-                    '(Provisões, Incorporações, Recebimentos IR, Entrada '
-                    'Pro Rata, Provisão ATM/Juros e Provisão Pro Rata '
-                    'estão todas vazias.)'
+                    f'O extrato já vai até {ultima_data.strftime("%m/%Y")}. '
+                    f'Informe um mês a partir de '
+                    f'{dt_movimentacao_nova.strftime("%m/%Y")}.'
                 )
             }), 400
-
-        # =================================================================
-        # 10. ORDEM inicial e validação de limite smallint
-        # =================================================================
-        proxima_ordem = _proxima_ordem_no_mes(
-            dt_movimentacao_nova, ultimo_dia_destino
-        )
-        total_a_inserir = (
-            len(provisoes_para_processar)
-            + len(incorporacoes)
-            + len(recebimentos_ir)
-            + len(entradas_pro_rata)
-            + (len(provisoes_atm_juros) * 2)
-            + (len(provisoes_pro_rata) * 2)
-        )
-        ordem_final_estimada = proxima_ordem + total_a_inserir
-        if ordem_final_estimada > 32767:
+        if qtd_meses > MAX_MESES_RECUPERACAO:
             return jsonify({
                 'success': False,
                 'message': (
-                    f'ORDEM final estimada ({ordem_final_estimada}) '
-                    f'ultrapassa o limite de smallint (32767).'
+                    f'Recuperação limitada a {MAX_MESES_RECUPERACAO} '
+                    f'meses por vez ({qtd_meses} solicitados).'
                 )
             }), 400
 
-        dt_carga_hoje = datetime.now().date()
-        inseridas_estorno = 0
-        inseridas_incorporacao = 0
-        inseridas_recebimento = 0
-        inseridas_entrada_pro_rata = 0
-        inseridas_provisao_atm_juros = 0
-        inseridas_provisao_pro_rata = 0
-
-        # =================================================================
-        # ETAPA 1 — INSERIR ESTORNOS
-        # DT_MOVIMENTACAO = primeiro dia útil do mês destino, conforme
-        # BDG.PAR_TB020_CALENDARIO (coluna DIA_UTIL = 1).
-        # =================================================================
-        dt_estorno = _primeiro_dia_util_mes(dt_movimentacao_nova)
-        for prov in provisoes_para_processar:
-            historico_estorno = _gerar_historico_estorno(prov.HISTORICO)
-            valor_estorno = (
-                -prov.VR_MOVIMENTACAO
-                if prov.VR_MOVIMENTACAO is not None
-                else None
-            )
-            db.session.add(ExtratoCVS(
-                DT_CARGA=dt_carga_hoje,
-                DT_MOVIMENTACAO=dt_estorno,
-                TIPO=prov.TIPO,
-                ORDEM=proxima_ordem,
-                HISTORICO=historico_estorno,
-                PERIODO_DE=prov.PERIODO_DE,
-                PERIODO_ATE=prov.PERIODO_ATE,
-                VR_MOVIMENTACAO=valor_estorno,
-                VR_SALDO=Decimal('0'),
-            ))
-            proxima_ordem += 1
-            inseridas_estorno += 1
-
-        # =================================================================
-        # ETAPA 2 — INSERIR INCORPORAÇÕES
-        # =================================================================
-        for inc in incorporacoes:
-            db.session.add(ExtratoCVS(
-                DT_CARGA=dt_carga_hoje,
-                DT_MOVIMENTACAO=dt_movimentacao_nova,
-                TIPO=inc.TIPO,
-                ORDEM=proxima_ordem,
-                HISTORICO=inc.HISTORICO,
-                PERIODO_DE=inc.PERIODO_DE,
-                PERIODO_ATE=inc.PERIODO_ATE,
-                VR_MOVIMENTACAO=inc.VR_MOVIMENTACAO,
-                VR_SALDO=Decimal('0'),
-            ))
-            proxima_ordem += 1
-            inseridas_incorporacao += 1
-
-        # =================================================================
-        # ETAPA 3 — INSERIR RECEBIMENTOS IR
-        # =================================================================
-        for rec in recebimentos_ir:
-            db.session.add(ExtratoCVS(
-                DT_CARGA=dt_carga_hoje,
-                DT_MOVIMENTACAO=rec.DT_PREV_RECEBIMENTO,
-                TIPO=rec.TIPO,
-                ORDEM=proxima_ordem,
-                HISTORICO=rec.HISTORICO,
-                PERIODO_DE=rec.PERIODO_DE,
-                PERIODO_ATE=rec.PERIODO_ATE,
-                VR_MOVIMENTACAO=rec.MOVIMENTACAO,
-                VR_SALDO=Decimal('0'),
-            ))
-            proxima_ordem += 1
-            inseridas_recebimento += 1
-
-        # =================================================================
-        # ETAPA 4 — INSERIR ENTRADA TÍTULOS PRO RATA (FIN_VW007)
-        # =================================================================
-        for ent in entradas_pro_rata:
-            vr_movimentacao_entrada = None
-            if (ent.PU_ATU_PRO is not None
-                    and ent.VR_JR_PRORATA is not None
-                    and ent.QTDE_TITULOS is not None):
-                pu = Decimal(str(ent.PU_ATU_PRO))
-                jr = Decimal(str(ent.VR_JR_PRORATA))
-                qtd = Decimal(str(ent.QTDE_TITULOS))
-                vr_movimentacao_entrada = (pu + jr) * qtd
-
-            db.session.add(ExtratoCVS(
-                DT_CARGA=dt_carga_hoje,
-                DT_MOVIMENTACAO=ent.DT_ATUALIZACAO,
-                TIPO=ent.TIPO,
-                ORDEM=proxima_ordem,
-                HISTORICO=ent.HISTORICO,
-                PERIODO_DE=ent.DT_ATUALIZACAO,
-                PERIODO_ATE=ent.DT_ATUALIZACAO,
-                VR_MOVIMENTACAO=vr_movimentacao_entrada,
-                VR_SALDO=Decimal('0'),
-            ))
-            proxima_ordem += 1
-            inseridas_entrada_pro_rata += 1
-
-        # =================================================================
-        # ETAPA 5 — INSERIR PROVISÃO ATM/JUROS (FIN_VW008)
-        # =================================================================
-        for prv in provisoes_atm_juros:
-            db.session.add(ExtratoCVS(
-                DT_CARGA=dt_carga_hoje,
-                DT_MOVIMENTACAO=prv.DT_ATUALIZACAO,
-                TIPO=prv.TIPO,
-                ORDEM=proxima_ordem,
-                HISTORICO=prv.HISTORICO1,
-                PERIODO_DE=prv.PERIODO_DE,
-                PERIODO_ATE=prv.PERIODO_ATE,
-                VR_MOVIMENTACAO=prv.MOVIMENTACAO1,
-                VR_SALDO=Decimal('0'),
-            ))
-            proxima_ordem += 1
-            inseridas_provisao_atm_juros += 1
-
-            db.session.add(ExtratoCVS(
-                DT_CARGA=dt_carga_hoje,
-                DT_MOVIMENTACAO=prv.DT_ATUALIZACAO,
-                TIPO=prv.TIPO,
-                ORDEM=proxima_ordem,
-                HISTORICO=prv.HISTORICO2,
-                PERIODO_DE=prv.PERIODO_DE,
-                PERIODO_ATE=prv.PERIODO_ATE,
-                VR_MOVIMENTACAO=prv.MOVIMENTACAO2,
-                VR_SALDO=Decimal('0'),
-            ))
-            proxima_ordem += 1
-            inseridas_provisao_atm_juros += 1
-
-        # =================================================================
-        # ETAPA 6 — INSERIR PROVISÃO PRO RATA (FIN_VW010)
-        # =================================================================
-        for prv in provisoes_pro_rata:
-            db.session.add(ExtratoCVS(
-                DT_CARGA=dt_carga_hoje,
-                DT_MOVIMENTACAO=prv.DT_ATUALIZACAO,
-                TIPO=prv.TIPO,
-                ORDEM=proxima_ordem,
-                HISTORICO=prv.HISTORICO,
-                PERIODO_DE=prv.PERIODO_DE,
-                PERIODO_ATE=prv.PERIODO_ATE,
-                VR_MOVIMENTACAO=prv.MOVIMENTACAO,
-                VR_SALDO=Decimal('0'),
-            ))
-            proxima_ordem += 1
-            inseridas_provisao_pro_rata += 1
-
-            db.session.add(ExtratoCVS(
-                DT_CARGA=dt_carga_hoje,
-                DT_MOVIMENTACAO=prv.DT_ATUALIZACAO,
-                TIPO=prv.TIPO,
-                ORDEM=proxima_ordem,
-                HISTORICO=prv.HISTORICO2,
-                PERIODO_DE=prv.PERIODO_DE,
-                PERIODO_ATE=prv.PERIODO_ATE,
-                VR_MOVIMENTACAO=prv.MOVIMENTACAO2,
-                VR_SALDO=Decimal('0'),
-            ))
-            proxima_ordem += 1
-            inseridas_provisao_pro_rata += 1
-
-        db.session.flush()
-
-        # =================================================================
-        # ETAPA 7 — RECALCULAR VR_SALDO
-        # =================================================================
-        sql_saldo_inicial = text("""
-            SELECT TOP 1 [VR_SALDO]
-            FROM [BDG].[FIN_TB013_EXTRATO_CVS]
-            WHERE [DT_MOVIMENTACAO] < :dt_destino
-              AND [VR_SALDO] IS NOT NULL
-            ORDER BY [DT_MOVIMENTACAO] DESC, [ORDEM] DESC;
-        """)
-        row_saldo = db.session.execute(
-            sql_saldo_inicial, {'dt_destino': dt_movimentacao_nova}
-        ).fetchone()
-        saldo_anterior = (
-            Decimal(str(row_saldo[0]))
-            if row_saldo and row_saldo[0] is not None
-            else Decimal('0')
+    # =================================================================
+    # 2. Vários meses: job em segundo plano
+    # =================================================================
+    if qtd_meses > 1 and not simular:
+        parametros = {
+            'mes_inicial': dt_movimentacao_nova.strftime('%Y-%m'),
+            'ate': ate.strftime('%Y-%m'),
+        }
+        job_id = submeter_job(
+            'extrato_cvs',
+            processar_extrato,
+            kwargs={'ate': ate},
+            descricao=(
+                f'Extrato CVS - {dt_movimentacao_nova.strftime("%m/%Y")} '
+                f'a {ate.strftime("%m/%Y")}'
+            ),
+            parametros=parametros,
+            recurso_lock=RECURSO_LOCK_EXTRATO
         )
-        saldo_inicial_referencia = saldo_anterior
-
-        linhas_destino = ExtratoCVS.query.filter(
-            ExtratoCVS.DT_MOVIMENTACAO >= dt_movimentacao_nova,
-            ExtratoCVS.DT_MOVIMENTACAO <= ultimo_dia_destino
-        ).order_by(
-            ExtratoCVS.DT_MOVIMENTACAO.asc(),
-            ExtratoCVS.ORDEM.asc()
-        ).all()
-
-        saldos_recalculados = 0
-        for linha in linhas_destino:
-            movimentacao = (
-                Decimal(str(linha.VR_MOVIMENTACAO))
-                if linha.VR_MOVIMENTACAO is not None
-                else Decimal('0')
-            )
-            novo_saldo = saldo_anterior + movimentacao
-            linha.VR_SALDO = novo_saldo
-            saldo_anterior = novo_saldo
-            saldos_recalculados += 1
-
-        # Commit final (toda a transação)
-        db.session.commit()
-
-        # =================================================================
-        # 11. Auditoria
-        # =================================================================
         registrar_log(
             acao='carga',
             entidade='extrato_cvs',
             entidade_id=dt_movimentacao_nova.strftime('%Y-%m-%d'),
             descricao=(
-                f'Processamento completo do mês '
-                f'{dt_movimentacao_nova.strftime("%m/%Y")}: '
-                f'{inseridas_estorno} estorno(s), '
-                f'{inseridas_incorporacao} incorporação(ões), '
-                f'{inseridas_recebimento} recebimento(s) IR, '
-                f'{inseridas_entrada_pro_rata} entrada(s) pro rata, '
-                f'{inseridas_provisao_atm_juros} provisão(ões) ATM/Juros, '
-                f'{inseridas_provisao_pro_rata} provisão(ões) pro rata, '
-                f'{saldos_recalculados} saldo(s) recalculado(s).'
+                f'Recuperação do extrato enviada: {qtd_meses} mês(es), '
+                f'{dt_movimentacao_nova.strftime("%m/%Y")} a '
+                f'{ate.strftime("%m/%Y")}.'
             ),
-            dados_novos={
-                'mes_origem': primeiro_dia_ultimo_mes.strftime('%Y-%m'),
-                'mes_destino': dt_movimentacao_nova.strftime('%Y-%m'),
-                'provisoes_consideradas': len(provisoes),
-                'provisoes_ja_estornadas': provisoes_ja_estornadas,
-                'estornos_inseridos': inseridas_estorno,
-                'incorporacoes_inseridas': inseridas_incorporacao,
-                'recebimentos_ir_inseridos': inseridas_recebimento,
-                'entrada_pro_rata_inseridas': inseridas_entrada_pro_rata,
-                'provisao_atm_juros_inseridas': inseridas_provisao_atm_juros,
-                'provisao_pro_rata_inseridas': inseridas_provisao_pro_rata,
-                'saldos_recalculados': saldos_recalculados,
-                'saldo_inicial': str(saldo_inicial_referencia),
-                'saldo_final': str(saldo_anterior),
-            }
+            dados_novos=dict(parametros, job_id=job_id)
         )
-
         return jsonify({
             'success': True,
+            'job_id': job_id,
+            'status_url': url_for('processo.status_job', job_id=job_id),
             'message': (
-                f'Processamento concluído em '
-                f'{dt_movimentacao_nova.strftime("%d/%m/%Y")}: '
-                f'{inseridas_estorno} estorno(s), '
-                f'{inseridas_incorporacao} incorporação(ões), '
-                f'{inseridas_recebimento} recebimento(s) IR, '
-                f'{inseridas_entrada_pro_rata} entrada(s) pro rata, '
-                f'{inseridas_provisao_atm_juros} provisão(ões) ATM/Juros, '
-                f'{inseridas_provisao_pro_rata} provisão(ões) pro rata, '
-                f'{saldos_recalculados} saldo(s) recalculado(s).'
+                f'Recuperação de {qtd_meses} mês(es) enviada para '
+                f'processamento ({dt_movimentacao_nova.strftime("%m/%Y")} '
+                f'a {ate.strftime("%m/%Y")}).'
             ),
-            'mes_origem': primeiro_dia_ultimo_mes.strftime('%Y-%m'),
-            'mes_destino': dt_movimentacao_nova.strftime('%Y-%m'),
-            'estornos_inseridos': inseridas_estorno,
-            'incorporacoes_inseridas': inseridas_incorporacao,
-            'recebimentos_ir_inseridos': inseridas_recebimento,
-            'entrada_pro_rata_inseridas': inseridas_entrada_pro_rata,
-            'provisao_atm_juros_inseridas': inseridas_provisao_atm_juros,
-            'provisao_pro_rata_inseridas': inseridas_provisao_pro_rata,
-            'saldos_recalculados': saldos_recalculados,
         })
 
-    except Exception as e:
-        db.session.rollback()
+    # =================================================================
+    # 3. Simulação ou mês único
+    # =================================================================
+    erro = None
+    resultado = None
+    if simular:
+        try:
+            resultado = processar_extrato(ate=ate, simular=True)
+        except Exception as e:
+            erro = e
+    else:
+        with lock_exclusivo(RECURSO_LOCK_EXTRATO) as obtido:
+            if obtido:
+                try:
+                    resultado = processar_extrato()
+                except Exception as e:
+                    erro = e
+        if resultado is None and erro is None:
+            return jsonify({
+                'success': False,
+                'message': 'O extrato já está sendo processado por outro usuário.'
+            }), 400
+
+    if erro is not None:
         return jsonify({
             'success': False,
-            'message': f'Erro ao processar mês: {str(e)}'
+            'message': f'Erro ao processar mês: {str(erro)}'
         }), 500
 
+    meses = resultado['meses']
+    if not meses:
+        return jsonify({
+            'success': False,
+            'message': resultado['motivo_parada']
+        }), 400
+
+    if simular:
+        return jsonify({
+            'success': True,
+            'simulado': True,
+            'message': (
+                f'Pré-visualização de {len(meses)} mês(es) — nada foi gravado. '
+                + ' '.join(
+                    f'{m["mes_destino"]}: {_resumo_etapas_mes(m)}'
+                    for m in meses
+                )
+                + (f' {resultado["motivo_parada"]}'
+                   if resultado['motivo_parada'] else '')
+            ),
+            'meses': meses,
+        })
+
+    # =================================================================
+    # 4. Auditoria (mês único)
+    # =================================================================
+    mes = meses[0]
+    primeiro_dia_ultimo_mes = ultima_data.replace(day=1)
+    registrar_log(
+        acao='carga',
+        entidade='extrato_cvs',
+        entidade_id=dt_movimentacao_nova.strftime('%Y-%m-%d'),
+        descricao=(
+            f'Processamento completo do mês '
+            f'{dt_movimentacao_nova.strftime("%m/%Y")}: '
+            f'{_resumo_etapas_mes(mes)}'
+        ),
+        dados_novos={
+            'mes_origem': primeiro_dia_ultimo_mes.strftime('%Y-%m'),
+            'mes_destino': dt_movimentacao_nova.strftime('%Y-%m'),
+            'estornos_inseridos': mes['estornos_inseridos'],
+            'incorporacoes_inseridas': mes['incorporacoes_inseridas'],
+            'recebimentos_ir_inseridos': mes['recebimentos_ir_inseridos'],
+            'entrada_pro_rata_inseridas': mes['entrada_pro_rata_inseridas'],
+            'provisao_atm_juros_inseridas': mes['provisao_atm_juros_inseridas'],
+            'provisao_pro_rata_inseridas': mes['provisao_pro_rata_inseridas'],
+            'saldos_recalculados': mes['saldos_recalculados'],
+            'saldo_inicial': mes['saldo_inicial'],
+            'saldo_final': mes['saldo_final'],
+        }
+    )
+
+    return jsonify({
+        'success': True,
+        'message': (
+            f'Processamento concluído em '
+            f'{dt_movimentacao_nova.strftime("%d/%m/%Y")}: '
+            f'{_resumo_etapas_mes(mes)}'
+        ),
+        'mes_origem': primeiro_dia_ultimo_mes.strftime('%Y-%m'),
+        'mes_destino': dt_movimentacao_nova.strftime('%Y-%m'),
+        'estornos_inseridos': mes['estornos_inseridos'],
+        'incorporacoes_inseridas': mes['incorporacoes_inseridas'],
+        'recebimentos_ir_inseridos': mes['recebimentos_ir_inseridos'],
+        'entrada_pro_rata_inseridas': mes['entrada_pro_rata_inseridas'],
+        'provisao_atm_juros_inseridas': mes['provisao_atm_juros_inseridas'],
+        'provisao_pro_rata_inseridas': mes['provisao_pro_rata_inseridas'],
+        'saldos_recalculados': mes['saldos_recalculados'],
+    })
+
 # =========================================================================
 # EXTRATO — AJUSTAR SALDO (aplica AJUSTE da FIN_VW011 no último mês)
 # =========================================================================
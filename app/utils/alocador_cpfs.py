@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/alocador_cpfs.py
+
+Alocação vetorizada (NumPy) de CPFs às empresas na etapa "demais contratos".
+
+Substitui o CURSOR T-SQL sobre #EmpresasInfo + ORDER BY NEWID():
+  1. calcular_cotas(): cotas por maiores restos (mesma conta de
+     meta_cpfs_inteira / parte_fracionaria / cpfs_extra);
+  2. alocar_cpfs(): embaralha CPFs e empresas com RNG de semente conhecida e
+     entrega blocos consecutivos de CPFs a cada empresa - mesma lógica do
+     cursor, mas reproduzível e em O(CPFs).
+
+Não acessa banco: recebe arrays e devolve arrays.
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+import numpy as np
+
+
+def calcular_cotas(percentuais, cpfs_atuais, total_cpfs):
+    """
+    Quantos CPFs novos cada empresa recebe.
+
+    percentuais -> PERCENTUAL_FINAL de cada empresa (normalizado para somar 100)
+    cpfs_atuais -> CPFs que a empresa já recebeu nas etapas anteriores
+    total_cpfs  -> CPFs restantes no pool (DCA_TB006)
+    """
+    percentuais = np.asarray(percentuais, dtype=np.float64)
+    cpfs_atuais = np.asarray(cpfs_atuais, dtype=np.int64)
+    qtd_empresas = len(percentuais)
+
+    if qtd_empresas == 0 or total_cpfs <= 0:
+        return np.zeros(qtd_empresas, dtype=np.int64)
+
+    # Normalizar percentuais
+    total_percentual = percentuais.sum()
+    if total_percentual <= 0:
+        percentuais = np.full(qtd_empresas, 100.0 / qtd_empresas)
+    elif abs(total_percentual - 100) > 0.01:
+        percentuais = percentuais * 100.0 / total_percentual
+
+    # Metas sobre o total final (já distribuídos + restantes)
+    total_cpfs_final = cpfs_atuais.sum() + total_cpfs
+    meta_cpfs_exata = total_cpfs_final * percentuais / 100.0
+    meta_cpfs_inteira = np.floor(meta_cpfs_exata).astype(np.int64)
+    parte_fracionaria = meta_cpfs_exata - meta_cpfs_inteira
+
+    cpfs_faltantes = np.maximum(meta_cpfs_inteira - cpfs_atuais, 0)
+
+    # CPFs extras para as maiores partes fracionárias (empate: maior percentual)
+    cpfs_nao_alocados = int(total_cpfs - cpfs_faltantes.sum())
+    cpfs_extra = np.zeros(qtd_empresas, dtype=np.int64)
+    if cpfs_nao_alocados > 0:
+        ordem = np.lexsort((-percentuais, -parte_fracionaria))
+        cpfs_extra[ordem[:cpfs_nao_alocados]] = 1
+
+    return cpfs_faltantes + cpfs_extra
+
+
+def alocar_cpfs(cpfs, empresas, cotas, semente):
+    """
+    Atribui CPFs às empresas respeitando as cotas.
+
+    cpfs     -> CPFs distintos do pool, em ordem determinística (ORDER BY NR_CPF_CNPJ)
+    empresas -> ID_EMPRESA na mesma ordem de 'cotas'
+    semente  -> semente do RNG; a mesma semente com a mesma entrada gera a mesma distribuição
+
+    Retorna (cpfs_atribuidos, empresa_de_cada_cpf). Se as cotas somarem menos que
+    o total, os CPFs excedentes ficam sem empresa (permanecem na DCA_TB006).
+    """
+    cpfs = np.asarray(cpfs, dtype=np.int64)
+    empresas = np.asarray(empresas, dtype=np.int64)
+    cotas = np.asarray(cotas, dtype=np.int64)
+
+    rng = np.random.default_rng(semente)
+
+    # Ordem aleatória das empresas (o antigo cursor ORDER BY NEWID())
+    ordem_empresas = rng.permutation(len(empresas))
+    destino = np.repeat(empresas[ordem_empresas], cotas[ordem_empresas])
+
+    # Ordem aleatória dos CPFs (o antigo ROW_NUMBER() OVER (ORDER BY NEWID()))
+    cpfs_embaralhados = cpfs[rng.permutation(len(cpfs))]
+
+    qtd = min(len(cpfs_embaralhados), len(destino))
+    return cpfs_embaralhados[:qtd], destino[:qtd]
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/analitico_distribuicao.py
+
+Relatório analítico da distribuição (TXT de colunas fixas) por empresa.
+
+A leitura usa paginação por chave (keyset) em (NR_CONTRATO, fkContratoSISCTR):
+cada página continua de onde a anterior parou, em vez de OFFSET, que obrigava
+o SQL Server a reler todas as linhas anteriores a cada página. As linhas são
+devolvidas por gerador, prontas para uma resposta em streaming - a memória
+fica constante qualquer que seja o tamanho da carteira.
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+from sqlalchemy import text
+
+from app.utils.log_seguro import log_info
+
+TAMANHO_PAGINA = 10000
+
+# (coluna, largura) na ordem do arquivo; a última coluna não é preenchida
+COLUNAS_ANALITICO = [
+    ('NO_ABREVIADO_PRODUTO', 20),
+    ('NO_ABREVIADO_EMPRESA', 20),
+    ('COD_EMPRESA_COBRANCA', 20),
+    ('NR_CONTRATO', 39),
+    ('NR_CPF_CNPJ', 20),
+    ('VR_SD_DEVEDOR', 39),
+    ('DS_CRITERIO_SELECAO', 100),
+    ('QT_DIAS_ATRASO', 14),
+]
+LARGURAS = dict(COLUNAS_ANALITICO)
+
+_COLUNAS_SQL = """
+        PR.NO_ABREVIADO_PRODUTO,
+        EM.NO_ABREVIADO_EMPRESA,
+        DIS.COD_EMPRESA_COBRANCA,
+        CTR.NR_CONTRATO,
+        DIS.NR_CPF_CNPJ,
+        DIS.VR_SD_DEVEDOR,
+        CR.[DS_CRITERIO_SELECAO],
+        SIT.QT_DIAS_ATRASO,
+        DIS.fkContratoSISCTR
+"""
+
+_ORIGEM_SQL = """
+    FROM [BDG].[DCA_TB005_DISTRIBUICAO] DIS WITH (NOLOCK)
+    INNER JOIN BDG.PAR_TB002_EMPRESA_RESPONSAVEL_COBRANCA EM WITH (NOLOCK)
+        ON DIS.COD_EMPRESA_COBRANCA = EM.pkEmpresaResponsavelCobranca
+    INNER JOIN BDG.COM_TB001_CONTRATO CTR WITH (NOLOCK)
+        ON CTR.fkContratoSISCTR = DIS.fkContratoSISCTR
+    INNER JOIN BDG.PAR_TB001_PRODUTOS PR WITH (NOLOCK)
+        ON PR.pkSistemaOriginario = CTR.COD_PRODUTO
+    INNER JOIN [BDG].[DCA_TB004_CRITERIO_SELECAO] CR WITH (NOLOCK)
+        ON CR.COD = DIS.COD_CRITERIO_SELECAO
+    INNER JOIN BDG.COM_TB007_SITUACAO_CONTRATOS SIT WITH (NOLOCK)
+        ON SIT.fkContratoSISCTR = DIS.fkContratoSISCTR
+    WHERE DIS.ID_PERIODO = :periodo_id
+        AND DIS.ID_EDITAL = :edital_id
+"""
+
+# Uma empresa, uma página
+SQL_ANALITICO = ("SELECT TOP (:tamanho_pagina)" + _COLUNAS_SQL + _ORIGEM_SQL + """
+        AND DIS.COD_EMPRESA_COBRANCA = :empresa_id
+        {continuacao}
+    ORDER BY CTR.NR_CONTRATO, DIS.fkContratoSISCTR
+""")
+
+# Todas as empresas numa única leitura, agrupadas por COD_EMPRESA_COBRANCA (ver analitico_lote)
+SQL_ANALITICO_TODAS = ("SELECT" + _COLUNAS_SQL + _ORIGEM_SQL + """
+    ORDER BY DIS.COD_EMPRESA_COBRANCA, CTR.NR_CONTRATO, DIS.fkContratoSISCTR
+""")
+
+# Continua depois da última linha da página anterior (empate em NR_CONTRATO desempata pelo fk)
+CONTINUACAO = """
+        AND (CTR.NR_CONTRATO > :ultimo_contrato
+             OR (CTR.NR_CONTRATO = :ultimo_contrato AND DIS.fkContratoSISCTR > :ultimo_fk))
+"""
+
+
+def paginas_analitico(connection, edital_id, periodo_id, empresa_id, tamanho_pagina=TAMANHO_PAGINA):
+    """Gera as páginas (listas de linhas) do analítico da empresa, em ordem de NR_CONTRATO."""
+    parametros = {
+        'edital_id': edital_id,
+        'periodo_id': periodo_id,
+        'empresa_id': empresa_id,
+        'tamanho_pagina': tamanho_pagina
+    }
+    primeira = text(SQL_ANALITICO.format(continuacao=''))
+    seguinte = text(SQL_ANALITICO.format(continuacao=CONTINUACAO))
+
+    sql = primeira
+    while True:
+        rows = connection.execute(sql, parametros).fetchall()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < tamanho_pagina:
+            return
+        parametros['ultimo_contrato'] = rows[-1][3]
+        parametros['ultimo_fk'] = rows[-1][8]
+        sql = seguinte
+
+
+def cabecalho_analitico():
+    """Linha de títulos + linha de separação."""
+    titulos = [nome.ljust(largura) for nome, largura in COLUNAS_ANALITICO[:-1]]
+    titulos.append(COLUNAS_ANALITICO[-1][0])
+    separador = ['-' * largura for _, largura in COLUNAS_ANALITICO]
+    return ' '.join(titulos) + '\n' + ' '.join(separador) + '\n'
+
+
+def formatar_linha_analitico(row):
+    """Uma linha de colunas fixas. Retorna (texto, valor do saldo)."""
+    valor = float(row[5]) if row[5] else 0.0
+    linha = [
+        (str(row[0]) if row[0] else '').ljust(LARGURAS['NO_ABREVIADO_PRODUTO']),
+        (str(row[1]) if row[1] else '').ljust(LARGURAS['NO_ABREVIADO_EMPRESA']),
+        str(row[2]).ljust(LARGURAS['COD_EMPRESA_COBRANCA']),
+        (str(row[3]) if row[3] else '').ljust(LARGURAS['NR_CONTRATO']),
+        (str(row[4]) if row[4] else '').ljust(LARGURAS['NR_CPF_CNPJ']),
+        f"{valor:.2f}".ljust(LARGURAS['VR_SD_DEVEDOR']),
+        (str(row[6]) if row[6] else '').ljust(LARGURAS['DS_CRITERIO_SELECAO']),
+        str(row[7]) if row[7] else '',
+    ]
+    return ' '.join(linha) + '\n', valor
+
+
+def rodape_analitico(total_registros, total_saldo):
+    """Linha de TOTAL no final do arquivo."""
+    return ('\n'
+            + ' ' * (LARGURAS['NO_ABREVIADO_PRODUTO'] + 1 +
+                     LARGURAS['NO_ABREVIADO_EMPRESA'] + 1 +
+                     LARGURAS['COD_EMPRESA_COBRANCA'] + 1)
+            + f"TOTAL: {total_registros} contratos".ljust(LARGURAS['NR_CONTRATO'])
+            + ' ' * (LARGURAS['NR_CPF_CNPJ'] + 1)
+            + f"{total_saldo:.2f}".ljust(LARGURAS['VR_SD_DEVEDOR'])
+            + '\n')
+
+
+def nome_arquivo_analitico(nome_empresa_abreviado, edital_id, periodo_id, data_atual):
+    """<EMPRESA>_DISTRIBUICAO_<ddmmaaaa>_<edital>_<periodo>.txt"""
+    return f"{(nome_empresa_abreviado or '').upper()}_DISTRIBUICAO_{data_atual}_{edital_id}_{periodo_id}.txt"
+
+
+def gerar_texto_analitico(paginas, totais):
+    """
+    Gera o arquivo em pedaços (um por página) a partir de paginas_analitico().
+    'totais' (dict) é preenchido com total_registros e total_saldo ao longo da geração.
+    """
+    totais.setdefault('total_registros', 0)
+    totais.setdefault('total_saldo', 0.0)
+
+    yield cabecalho_analitico()
+    for rows in paginas:
+        pedaco = []
+        for row in rows:
+            linha, valor = formatar_linha_analitico(row)
+            pedaco.append(linha)
+            totais['total_saldo'] += valor
+        totais['total_registros'] += len(rows)
+        yield ''.join(pedaco)
+
+        if totais['total_registros'] % 50000 == 0:
+            log_info(f"Analítico: {totais['total_registros']} registros enviados...")
+
+    yield rodape_analitico(totais['total_registros'], totais['total_saldo'])
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/analitico_lote.py
+
+Analíticos de TODAS as empresas de um edital/período num único ZIP.
+
+Antes cada empresa exigia uma consulta pesada própria (N leituras da
+DCA_TB005 + joins). Aqui há UMA leitura ordenada por COD_EMPRESA_COBRANCA;
+as linhas de cada empresa chegam contíguas e são entregues a um pool de
+workers que monta o arquivo (TXT de colunas fixas ou Excel) enquanto a
+leitura continua. Cada arquivo pronto entra no ZIP, que é enviado em
+streaming ao navegador.
+
+Uso (na rota, com stream_with_context):
+    Response(stream_with_context(gerar_zip_analiticos(edital_id, periodo_id, 'txt')),
+             mimetype='application/zip')
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from sqlalchemy import text
+
+from app import db
+from app.utils.analitico_distribuicao import SQL_ANALITICO_TODAS, gerar_texto_analitico, nome_arquivo_analitico
+from app.utils.log_seguro import log_info
+
+# Threads de montagem dos arquivos (a leitura do banco roda em paralelo a elas)
+MAX_WORKERS = 4
+TAMANHO_LOTE_LEITURA = 5000
+
+FORMATOS = ('txt', 'xlsx')
+
+SQL_EXCEL_TODAS = """
+    SELECT
+        PRO.NO_ABREVIADO_PRODUTO AS Produto,
+        DIS.[COD_EMPRESA_COBRANCA] AS COD_EMPRESA,
+        ASS.[NO_ABREVIADO_EMPRESA] AS Assessoria,
+        CTR.NR_CONTRATO AS Nr_Contrato,
+        CTR.[NR_CPF_CNPJ] AS CPF,
+        SIT.QT_DIAS_ATRASO,
+        SIT.[VR_SD_DEVEDOR],
+        CRI.DS_CRITERIO_SELECAO,
+        ASS.nmEmpresaResponsavelCobranca
+    FROM [BDG].[DCA_TB005_DISTRIBUICAO] DIS
+    INNER JOIN [BDG].[COM_TB001_CONTRATO] CTR
+        ON DIS.fkContratoSISCTR = CTR.fkContratoSISCTR
+    INNER JOIN [BDG].[PAR_TB001_PRODUTOS] PRO
+        ON CTR.COD_PRODUTO = PRO.pkSistemaOriginario
+    INNER JOIN [BDG].[PAR_TB002_EMPRESA_RESPONSAVEL_COBRANCA] ASS
+        ON ASS.pkEmpresaResponsavelCobranca = DIS.[COD_EMPRESA_COBRANCA]
+    INNER JOIN [BDG].[COM_TB007_SITUACAO_CONTRATOS] SIT
+        ON DIS.fkContratoSISCTR = SIT.fkContratoSISCTR
+    INNER JOIN [BDG].[DCA_TB004_CRITERIO_SELECAO] CRI
+        ON CRI.[COD] = DIS.COD_CRITERIO_SELECAO
+    WHERE SIT.[fkSituacaoCredito] = 1
+        AND DIS.[ID_PERIODO] = :periodo_id
+        AND DIS.[ID_EDITAL] = :edital_id
+        AND DIS.DELETED_AT IS NULL
+        AND EXISTS (
+            SELECT 1 FROM [BDG].[DCA_TB002_EMPRESAS_PARTICIPANTES] EP
+            WHERE EP.ID_EMPRESA = DIS.COD_EMPRESA_COBRANCA
+              AND EP.ID_EDITAL = :edital_id
+              AND EP.ID_PERIODO = :periodo_id
+              AND EP.DS_CONDICAO <> 'DESCREDENCIADA'
+        )
+    ORDER BY DIS.COD_EMPRESA_COBRANCA, PRO.NO_ABREVIADO_PRODUTO, CTR.NR_CONTRATO
+"""
+
+
+class _SaidaZip(object):
+    """Destino do ZipFile que só acumula bytes; o gerador esvazia a cada arquivo."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = b''.join(self._partes)
+        self._partes = []
+        return dados
+
+
+def _linhas_por_empresa(connection, sql, parametros, indice_empresa):
+    """Lê o resultado em lotes e devolve (cod_empresa, linhas) de cada empresa."""
+    result = connection.execute(text(sql), parametros)
+    empresa_atual = None
+    linhas = []
+    while True:
+        lote = result.fetchmany(TAMANHO_LOTE_LEITURA)
+        if not lote:
+            break
+        for row in lote:
+            cod_empresa = row[indice_empresa]
+            if cod_empresa != empresa_atual and linhas:
+                yield empresa_atual, linhas
+                linhas = []
+            empresa_atual = cod_empresa
+            linhas.append(tuple(row))
+    if linhas:
+        yield empresa_atual, linhas
+
+
+def montar_txt_empresa(linhas, edital_id, periodo_id, data_atual):
+    """TXT de colunas fixas da empresa (mesmo layout de gerar_analitico_distribuicao)."""
+    nome_empresa = next((row[1] for row in linhas if row[1]), '') or ''
+    conteudo = ''.join(gerar_texto_analitico([linhas], {}))
+    return nome_arquivo_analitico(nome_empresa, edital_id, periodo_id, data_atual), conteudo.encode('utf-8')
+
+
+def montar_excel_empresa(linhas, periodo_id):
+    """Excel analítico da empresa (mesmo layout de gerar_excel_empresas)."""
+    import openpyxl
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+
+    nome_abreviado = linhas[0][2] or (linhas[0][8] or '')[:20]
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = f"Período {periodo_id}"
+
+    # Estilos
+    header_font = Font(bold=True, color="FFFFFF", size=11)
+    header_fill = PatternFill(start_color="5893D4", end_color="5893D4", fill_type="solid")
+    header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
+    border_style = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    alinhamento_linha = Alignment(vertical="center")
+
+    # Título
+    ws.merge_cells('A1:H1')
+    cell_titulo = ws['A1']
+    cell_titulo.value = f"Distribuição Analítica - {nome_abreviado} - Período {periodo_id}"
+    cell_titulo.font = Font(bold=True, size=14)
+    cell_titulo.alignment = Alignment(horizontal="center")
+
+    headers = ['Produto', 'Cód. Empresa', 'Assessoria', 'Nº Contrato', 'CPF/CNPJ',
+               'Dias Atraso', 'Saldo Devedor', 'Critério Seleção']
+
+    for col, header in enumerate(headers, start=1):
+        cell = ws.cell(row=3, column=col)
+        cell.value = header
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = border_style
+
+    # Dados (contrato e CPF como texto para evitar notação científica)
+    row_idx = 4
+    total_saldo = 0
+    for produto, cod_empresa, assessoria, contrato, cpf, dias_atraso, saldo, criterio, _ in linhas:
+        saldo = float(saldo or 0)
+        total_saldo += saldo
+        valores = [produto, cod_empresa, assessoria, str(contrato), str(cpf),
+                   int(dias_atraso or 0), saldo, criterio]
+        for col, valor in enumerate(valores, start=1):
+            cell = ws.cell(row=row_idx, column=col, value=valor)
+            cell.border = border_style
+            cell.alignment = alinhamento_linha
+        ws.cell(row=row_idx, column=4).number_format = '@'
+        ws.cell(row=row_idx, column=5).number_format = '@'
+        ws.cell(row=row_idx, column=7).number_format = 'R$ #,##0.00'
+        row_idx += 1
+
+    # Linha de total
+    ws.cell(row=row_idx, column=6, value="TOTAL:")
+    ws.cell(row=row_idx, column=6).font = Font(bold=True)
+    cell_total = ws.cell(row=row_idx, column=7, value=total_saldo)
+    cell_total.font = Font(bold=True)
+    cell_total.number_format = 'R$ #,##0.00'
+    cell_total.fill = PatternFill(start_color="E8F4F8", end_color="E8F4F8", fill_type="solid")
+
+    column_widths = {'A': 15, 'B': 12, 'C': 20, 'D': 18, 'E': 18, 'F': 12, 'G': 18, 'H': 25}
+    for col, width in column_widths.items():
+        ws.column_dimensions[col].width = width
+
+    excel_buffer = BytesIO()
+    wb.save(excel_buffer)
+    nome_arquivo = f"analitico_{nome_abreviado.replace(' ', '_')}_periodo_{periodo_id}.xlsx"
+    return nome_arquivo, excel_buffer.getvalue()
+
+
+def gerar_zip_analiticos(edital_id, periodo_id, formato='txt', max_workers=MAX_WORKERS):
+    """
+    Gera o ZIP em pedaços de bytes: um pedaço a cada arquivo de empresa concluído.
+    formato -> 'txt' (analítico de colunas fixas) ou 'xlsx' (Excel por empresa)
+    """
+    if formato not in FORMATOS:
+        raise ValueError('Formato inválido: {0}'.format(formato))
+
+    parametros = {'edital_id': edital_id, 'periodo_id': periodo_id}
+    data_atual = datetime.now().strftime('%d%m%Y')
+    if formato == 'txt':
+        sql, indice_empresa = SQL_ANALITICO_TODAS, 2
+
+        def montar(linhas):
+            return montar_txt_empresa(linhas, edital_id, periodo_id, data_atual)
+    else:
+        sql, indice_empresa = SQL_EXCEL_TODAS, 1
+
+        def montar(linhas):
+            return montar_excel_empresa(linhas, periodo_id)
+
+    saida = _SaidaZip()
+    qtd_arquivos = 0
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='AnaliticoZip') as executor:
+        with ZipFile(saida, 'w', ZIP_DEFLATED) as zip_file:
+            pendentes = deque()
+
+            def gravar_proximo():
+                nome_arquivo, conteudo = pendentes.popleft().result()
+                zip_file.writestr(nome_arquivo, conteudo)
+                return saida.esvaziar()
+
+            with db.engine.connect() as connection:
+                for _, linhas in _linhas_por_empresa(connection, sql, parametros, indice_empresa):
+                    pendentes.append(executor.submit(montar, linhas))
+                    # Limita empresas em memória: grava as mais antigas antes de ler mais
+                    while len(pendentes) > max_workers or (pendentes and pendentes[0].done()):
+                        yield gravar_proximo()
+                        qtd_arquivos += 1
+
+            while pendentes:
+                yield gravar_proximo()
+                qtd_arquivos += 1
+
+        # Diretório central do ZIP (escrito no close)
+        yield saida.esvaziar()
+
+    log_info("ZIP de analíticos ({0}) gerado: {1} empresas - edital {2}, período {3}".format(
+        formato, qtd_arquivos, edital_id, periodo_id))
@@ -1,16 +1,62 @@
 from app import db
 from app.models.audit_log import AuditLog
+from app.utils.audit_fila import enfileirar
 from flask_login import current_user
-from flask import request
+from flask import request, current_app, has_request_context
 import json
 from datetime import datetime
 from sqlalchemy import text
 
+TAMANHO_DESCRICAO = 255
+
+
+def _montar_log(acao, entidade, entidade_id, descricao, dados_antigos=None, dados_novos=None):
+    """Captura usuário, IP e área/cargo na thread atual e devolve os campos do log."""
+    usuario_id = None
+    usuario_nome = 'Sistema'
+    ip = None
+    area = None
+    cargo = None
+
+    if has_request_context():
+        ip = request.remote_addr
+        if current_user and current_user.is_authenticated:
+            usuario_id = current_user.id
+            usuario_nome = current_user.nome
+            # Dados do empregado carregados no login (dict com area/cargo)
+            area = getattr(current_user, 'area', None)
+            cargo = getattr(current_user, 'cargo', None)
+
+    # Adicionar área e cargo na descrição se disponível
+    if area or cargo:
+        info_adicional = []
+        if area:
+            info_adicional.append(f"Área: {area}")
+        if cargo:
+            info_adicional.append(f"Cargo: {cargo}")
+        descricao = f"{descricao} | {' | '.join(info_adicional)}"
+
+    return {
+        'USUARIO_ID': usuario_id,
+        'USUARIO_NOME': usuario_nome,
+        'ACAO': acao,
+        'ENTIDADE': entidade,
+        'ENTIDADE_ID': entidade_id,
+        'DESCRICAO': (descricao or '')[:TAMANHO_DESCRICAO],
+        'DATA': datetime.utcnow(),
+        'IP': ip,
+        'DADOS_ANTIGOS': json.dumps(dados_antigos, ensure_ascii=False) if dados_antigos else None,
+        'DADOS_NOVOS': json.dumps(dados_novos, ensure_ascii=False) if dados_novos else None
+    }
+
 
 def registrar_log(acao, entidade, entidade_id, descricao, dados_antigos=None, dados_novos=None):
     """
     Registra log de auditoria com dados do empregado
 
+    O log vai para a fila do gravador em segundo plano (utils/audit_fila):
+    não abre transação no request nem faz commit da db.session de quem chamou.
+
     Args:
         acao: Tipo de ação (criar, editar, excluir, login, logout, etc)
         entidade: Nome da entidade afetada
@@ -20,51 +66,26 @@ def registrar_log(acao, entidade, entidade_id, descricao, dados_antigos=None, da
         dados_novos: Dados após a alteração (dict)
     """
     try:
-        # Dados básicos do usuário
-        usuario_id = current_user.id if current_user.is_authenticated else None
-        usuario_nome = current_user.nome if current_user.is_authenticated else 'Sistema'
-
-        # Buscar dados adicionais do empregado se autenticado
-        area = None
-        cargo = None
-
-        if current_user.is_authenticated and hasattr(current_user, 'empregado'):
-            empregado = current_user.empregado
-            if empregado:
-                # Validação adicional para evitar erros se os atributos forem None ou inválidos
-                area = getattr(empregado, 'sgSuperintendencia', None)
-                cargo = getattr(empregado, 'dsCargo', None)
-
-        # Criar log na estrutura existente
-        log = AuditLog(
-            USUARIO_ID=usuario_id,
-            USUARIO_NOME=usuario_nome,
-            ACAO=acao,
-            ENTIDADE=entidade,
-            ENTIDADE_ID=entidade_id,
-            DESCRICAO=descricao,
-            DATA=datetime.utcnow(),
-            IP=request.remote_addr if request else None,
-            DADOS_ANTIGOS=json.dumps(dados_antigos, ensure_ascii=False) if dados_antigos else None,
-            DADOS_NOVOS=json.dumps(dados_novos, ensure_ascii=False) if dados_novos else None
-        )
-
-        # Adicionar área e cargo na descrição se disponível
-        if area or cargo:
-            info_adicional = []
-            if area:
-                info_adicional.append(f"Área: {area}")
-            if cargo:
-                info_adicional.append(f"Cargo: {cargo}")
-            log.DESCRICAO = f"{descricao} | {' | '.join(info_adicional)}"
-
-        db.session.add(log)
-        db.session.commit()
-
+        campos = _montar_log(acao, entidade, entidade_id, descricao, dados_antigos, dados_novos)
+        enfileirar(current_app._get_current_object(), (
+            campos['USUARIO_ID'], campos['USUARIO_NOME'], campos['ACAO'], campos['ENTIDADE'],
+            campos['ENTIDADE_ID'], campos['DESCRICAO'], campos['DATA'], campos['IP'],
+            campos['DADOS_ANTIGOS'], campos['DADOS_NOVOS'], False
+        ))
         return True
     except Exception as e:
         # Usar repr(e) em vez de str(e) para evitar problemas de codificação no console
-        # Alternativamente, use logging para evitar problemas de console
         print(f"Erro ao registrar log: {repr(e)}")
-        db.session.rollback()
-        return False
\ No newline at end of file
+        return False
+
+
+def registrar_log_sincrono(acao, entidade, entidade_id, descricao, dados_antigos=None, dados_novos=None):
+    """
+    Adiciona o log à db.session atual e devolve o AuditLog (com ID após flush).
+    Para quem precisa do ID do log na mesma transação (ex.: reversão).
+    O commit fica com quem chamou.
+    """
+    log = AuditLog(**_montar_log(acao, entidade, entidade_id, descricao, dados_antigos, dados_novos))
+    db.session.add(log)
+    db.session.flush()
+    return log
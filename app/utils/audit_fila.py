@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/audit_fila.py
+
+Gravação assíncrona dos logs de auditoria.
+
+registrar_log só monta a linha (usuário, IP, área/cargo capturados na thread
+do request) e a coloca numa fila em memória limitada. Uma thread de fundo
+grava as linhas em lote na [BDG].[APK_TB001_AUDIT_LOG] com inserir_lote
+(fast_executemany) a cada LOTE_AUDITORIA registros ou INTERVALO_SEGUNDOS, numa
+conexão própria. O request não espera commit de auditoria e a db.session de
+quem chamou não é mais commitada como efeito colateral.
+
+Fila cheia -> a linha é gravada na hora, na thread de quem chamou (nada se perde).
+Encerramento do processo (atexit) -> o que restou na fila é gravado de forma síncrona.
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+import atexit
+import queue
+import threading
+import time
+
+from app import db
+from app.utils.carga_lote import inserir_lote
+from app.utils.log_seguro import log_info, log_erro
+
+TABELA_LOG = '[BDG].[APK_TB001_AUDIT_LOG]'
+COLUNAS_LOG = ['USUARIO_ID', 'USUARIO_NOME', 'ACAO', 'ENTIDADE', 'ENTIDADE_ID', 'DESCRICAO',
+               'DATA', 'IP', 'DADOS_ANTIGOS', 'DADOS_NOVOS', 'REVERTIDO']
+
+MAX_FILA = 10000
+LOTE_AUDITORIA = 200
+INTERVALO_SEGUNDOS = 0.5
+
+_fila = queue.Queue(maxsize=MAX_FILA)
+_iniciar_lock = threading.Lock()
+_gravacao_lock = threading.Lock()
+_parar = threading.Event()
+_thread = None
+_app = None
+
+
+def _gravar(linhas):
+    """Grava um lote; se o lote falhar, tenta linha a linha para não perder as demais."""
+    if not linhas:
+        return 0
+    with _gravacao_lock, _app.app_context():
+        try:
+            with db.engine.begin() as connection:
+                return inserir_lote(connection, TABELA_LOG, COLUNAS_LOG, linhas)
+        except Exception as e:
+            log_erro("Erro ao gravar lote de auditoria ({0} linhas): {1}".format(len(linhas), repr(e)))
+
+        gravadas = 0
+        for linha in linhas:
+            try:
+                with db.engine.begin() as connection:
+                    gravadas += inserir_lote(connection, TABELA_LOG, COLUNAS_LOG, [linha])
+            except Exception as e:
+                log_erro("Log de auditoria descartado ({0} {1} {2}): {3}".format(
+                    linha[2], linha[3], linha[4], repr(e)))
+        return gravadas
+
+
+def _retirar_lote(espera):
+    linhas = []
+    try:
+        linhas.append(_fila.get(timeout=espera))
+    except queue.Empty:
+        return linhas
+    while len(linhas) < LOTE_AUDITORIA:
+        try:
+            linhas.append(_fila.get_nowait())
+        except queue.Empty:
+            break
+    return linhas
+
+
+def _gravador():
+    while not _parar.is_set():
+        limite = time.monotonic() + INTERVALO_SEGUNDOS
+        linhas = _retirar_lote(INTERVALO_SEGUNDOS)
+        # Junta o que chegar até o fim do intervalo ou até completar o lote
+        while linhas and len(linhas) < LOTE_AUDITORIA and not _parar.is_set():
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            linhas.extend(_retirar_lote(restante)[:LOTE_AUDITORIA - len(linhas)])
+        try:
+            _gravar(linhas)
+        except Exception as e:
+            log_erro("Erro no gravador de auditoria: {0}".format(repr(e)))
+
+
+def _iniciar(app):
+    global _thread, _app
+    with _iniciar_lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _app = app
+        _parar.clear()
+        _thread = threading.Thread(target=_gravador, name='AuditoriaGravador', daemon=True)
+        _thread.start()
+        log_info("Gravador de auditoria iniciado")
+
+
+def enfileirar(app, linha):
+    """linha -> tupla na ordem de COLUNAS_LOG."""
+    _iniciar(app)
+    try:
+        _fila.put_nowait(linha)
+    except queue.Full:
+        # Fila cheia: grava na hora em vez de descartar
+        _gravar([linha])
+
+
+def descarregar():
+    """Grava de forma síncrona tudo o que estiver na fila. Retorna a quantidade gravada."""
+    if _app is None:
+        return 0
+    total = 0
+    while True:
+        linhas = []
+        while len(linhas) < LOTE_AUDITORIA:
+            try:
+                linhas.append(_fila.get_nowait())
+            except queue.Empty:
+                break
+        if not linhas:
+            return total
+        total += _gravar(linhas)
+
+
+@atexit.register
+def _encerrar():
+    _parar.set()
+    if _thread is not None:
+        _thread.join(timeout=5)
+    try:
+        qtd = descarregar()
+        if qtd:
+            log_info("Auditoria: {0} logs pendentes gravados no encerramento".format(qtd))
+    except Exception as e:
+        log_erro("Erro ao gravar auditoria pendente no encerramento: {0}".format(repr(e)))
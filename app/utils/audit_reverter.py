@@ -8,7 +8,7 @@ from app.models.periodo import PeriodoAvaliacao
 from app.models.empresa_participante import EmpresaParticipante
 from app.models.meta_avaliacao import MetaAvaliacao
 from app.models.usuario import Usuario
-from app.utils.audit import registrar_log
+from app.utils.audit import registrar_log_sincrono
 from datetime import datetime
 from sqlalchemy import text
 
@@ -98,7 +98,8 @@ class AuditReverter:
 
                 # Registrar a reversão
                 descricao_reversao = f"Revertida ação: {log.DESCRICAO}"
-                novo_log = registrar_log(
+                # Gravado na mesma transação: o ID do novo log é associado ao original
+                novo_log = registrar_log_sincrono(
                     acao='reverter',
                     entidade=log.ENTIDADE,
                     entidade_id=log.ENTIDADE_ID,
@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/auditoria_logs.py
+
+Consulta e arquivamento dos logs de auditoria ([BDG].[APK_TB001_AUDIT_LOG]).
+
+registrar_log é chamado em quase toda ação (inclusive consultas), então a
+tabela cresce sem limite. Aqui:
+
+  - Paginação por chave (keyset) em (DATA, ID): cada página é um TOP (n) a
+    partir do último registro exibido, nunca um OFFSET nem um .all().
+  - Os filtros (usuário, entidade, ação, período) vão para o WHERE e são
+    atendidos pelos índices compostos de INDICES, todos terminando em
+    (DATA DESC, ID DESC); garantir_indices_auditoria() os cria na subida.
+  - Arquivamento mensal: meses anteriores a MESES_ATIVOS saem da tabela viva
+    para [BDG].[APK_TB001_AUDIT_LOG_ARQ_AAAAMM] (DATA_COMPRESSION = PAGE e
+    DADOS_ANTIGOS/DADOS_NOVOS com COMPRESS), em lotes de DELETE ... OUTPUT
+    INTO. Os meses arquivados continuam consultáveis pela mesma tela,
+    escolhendo o mês.
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+import re
+import threading
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+from app import db
+from app.utils.log_seguro import log_info, log_erro
+from app.utils.processo_jobs import concluir_etapa
+
+TABELA_LOG = '[BDG].[APK_TB001_AUDIT_LOG]'
+PREFIXO_ARQUIVO = 'APK_TB001_AUDIT_LOG_ARQ_'
+
+# Meses mantidos na tabela viva (os logs desse período ainda podem ser revertidos)
+MESES_ATIVOS = 6
+LOTE_ARQUIVAMENTO = 5000
+POR_PAGINA = 50
+
+# Recurso de sp_getapplock do job de arquivamento
+RECURSO_ARQUIVAMENTO = 'APK_AUDITORIA_ARQUIVAMENTO'
+
+INDICES = [
+    ('IX_APK_TB001_DATA_ID', '(DATA DESC, ID DESC)'),
+    ('IX_APK_TB001_USUARIO_DATA', '(USUARIO_ID, DATA DESC, ID DESC)'),
+    ('IX_APK_TB001_ENTIDADE_DATA', '(ENTIDADE, ACAO, DATA DESC, ID DESC)'),
+    ('IX_APK_TB001_ACAO_DATA', '(ACAO, DATA DESC, ID DESC)'),
+]
+
+COLUNAS_LISTA = """
+    L.ID, L.USUARIO_ID, L.USUARIO_NOME, L.ACAO, L.ENTIDADE, L.ENTIDADE_ID,
+    L.DESCRICAO, L.DATA, L.REVERTIDO, L.REVERTIDO_EM, L.LOG_REVERSAO_ID,
+    U.NOME AS REVERTIDO_POR_NOME
+"""
+
+SQL_CRIAR_ARQUIVO = """
+    IF OBJECT_ID('BDG.{nome}', 'U') IS NULL
+    BEGIN
+        CREATE TABLE [BDG].[{nome}] (
+            ID INT NOT NULL,
+            USUARIO_ID INT NULL,
+            USUARIO_NOME NVARCHAR(100) NOT NULL,
+            ACAO NVARCHAR(50) NOT NULL,
+            ENTIDADE NVARCHAR(50) NOT NULL,
+            ENTIDADE_ID INT NULL,
+            DESCRICAO NVARCHAR(255) NOT NULL,
+            DATA DATETIME NULL,
+            IP NVARCHAR(50) NULL,
+            DADOS_ANTIGOS VARBINARY(MAX) NULL,
+            DADOS_NOVOS VARBINARY(MAX) NULL,
+            REVERTIDO BIT NULL,
+            REVERTIDO_POR INT NULL,
+            REVERTIDO_EM DATETIME NULL,
+            LOG_REVERSAO_ID INT NULL
+        );
+        CREATE CLUSTERED INDEX CIX_{nome} ON [BDG].[{nome}] (DATA DESC, ID DESC)
+            WITH (DATA_COMPRESSION = PAGE);
+        CREATE INDEX IX_{nome}_USUARIO ON [BDG].[{nome}] (USUARIO_ID, DATA DESC, ID DESC)
+            WITH (DATA_COMPRESSION = PAGE);
+        CREATE INDEX IX_{nome}_ENTIDADE ON [BDG].[{nome}] (ENTIDADE, ACAO, DATA DESC, ID DESC)
+            WITH (DATA_COMPRESSION = PAGE);
+        CREATE INDEX IX_{nome}_ID ON [BDG].[{nome}] (ID)
+            WITH (DATA_COMPRESSION = PAGE);
+    END
+"""
+
+# Linhas apontadas por um LOG_REVERSAO_ID ainda vivo ficam para o próximo lote
+# (a FK da própria tabela impediria o DELETE)
+SQL_MOVER_LOTE = """
+    DELETE TOP (:lote) L
+    OUTPUT DELETED.ID, DELETED.USUARIO_ID, DELETED.USUARIO_NOME, DELETED.ACAO,
+           DELETED.ENTIDADE, DELETED.ENTIDADE_ID, DELETED.DESCRICAO, DELETED.DATA,
+           DELETED.IP,
+           COMPRESS(CAST(DELETED.DADOS_ANTIGOS AS NVARCHAR(MAX))),
+           COMPRESS(CAST(DELETED.DADOS_NOVOS AS NVARCHAR(MAX))),
+           DELETED.REVERTIDO, DELETED.REVERTIDO_POR, DELETED.REVERTIDO_EM,
+           DELETED.LOG_REVERSAO_ID
+    INTO [BDG].[{nome}]
+        (ID, USUARIO_ID, USUARIO_NOME, ACAO, ENTIDADE, ENTIDADE_ID, DESCRICAO, DATA,
+         IP, DADOS_ANTIGOS, DADOS_NOVOS, REVERTIDO, REVERTIDO_POR, REVERTIDO_EM,
+         LOG_REVERSAO_ID)
+    FROM [BDG].[APK_TB001_AUDIT_LOG] AS L
+    WHERE L.DATA >= :inicio AND L.DATA < :fim
+        AND NOT EXISTS (
+            SELECT 1 FROM [BDG].[APK_TB001_AUDIT_LOG] R
+            WHERE R.LOG_REVERSAO_ID = L.ID AND R.ID <> L.ID
+        )
+"""
+
+_verificacao_lock = threading.Lock()
+_mes_verificado = None
+
+
+# ----------------------------------------------------------------------
+# Índices e tabelas de arquivo
+# ----------------------------------------------------------------------
+def garantir_indices_auditoria():
+    """Cria os índices compostos da tabela viva que ainda não existirem."""
+    try:
+        with db.engine.begin() as connection:
+            for nome, colunas in INDICES:
+                connection.execute(text("""
+                    IF NOT EXISTS (
+                        SELECT 1 FROM sys.indexes
+                        WHERE name = '{0}' AND object_id = OBJECT_ID('BDG.APK_TB001_AUDIT_LOG')
+                    )
+                    CREATE INDEX {0} ON {1} {2}
+                """.format(nome, TABELA_LOG, colunas)))
+    except Exception as e:
+        log_erro("Erro ao criar índices da auditoria: {0}".format(repr(e)))
+
+
+def _validar_mes(mes):
+    mes = str(mes or '')
+    if not re.match(r'^\d{6}$', mes) or not 1 <= int(mes[4:]) <= 12:
+        raise ValueError('Mês de arquivo inválido: {0}'.format(mes))
+    return mes
+
+
+def tabela_arquivo(mes):
+    """'AAAAMM' -> nome (sem schema) da tabela de arquivo do mês."""
+    return PREFIXO_ARQUIVO + _validar_mes(mes)
+
+
+def meses_arquivados():
+    """Meses com tabela de arquivo, do mais recente ao mais antigo: ['AAAAMM', ...]."""
+    rows = db.session.execute(text("""
+        SELECT name FROM sys.tables
+        WHERE schema_id = SCHEMA_ID('BDG') AND name LIKE :prefixo
+        ORDER BY name DESC
+    """), {'prefixo': PREFIXO_ARQUIVO + '%'}).fetchall()
+    return [row[0][len(PREFIXO_ARQUIVO):] for row in rows if re.match(r'^\d{6}$', row[0][len(PREFIXO_ARQUIVO):])]
+
+
+# ----------------------------------------------------------------------
+# Consulta paginada (keyset)
+# ----------------------------------------------------------------------
+def codificar_cursor(data, id_log):
+    return '{0:%Y%m%d%H%M%S%f}_{1}'.format(data, id_log)
+
+
+def decodificar_cursor(cursor):
+    """'AAAAMMDDHHMMSSffffff_ID' -> (datetime, id) ou None se inválido."""
+    try:
+        data, id_log = str(cursor).split('_', 1)
+        return datetime.strptime(data, '%Y%m%d%H%M%S%f'), int(id_log)
+    except (ValueError, TypeError):
+        return None
+
+
+def _filtros_sql(filtros):
+    condicoes = ['L.DATA IS NOT NULL']
+    parametros = {}
+    if filtros.get('entidade'):
+        condicoes.append('L.ENTIDADE = :entidade')
+        parametros['entidade'] = filtros['entidade']
+    if filtros.get('acao'):
+        condicoes.append('L.ACAO = :acao')
+        parametros['acao'] = filtros['acao']
+    if filtros.get('usuario_id'):
+        condicoes.append('L.USUARIO_ID = :usuario_id')
+        parametros['usuario_id'] = int(filtros['usuario_id'])
+    if filtros.get('data_inicio'):
+        condicoes.append('L.DATA >= :data_inicio')
+        parametros['data_inicio'] = filtros['data_inicio']
+    if filtros.get('data_fim'):
+        condicoes.append('L.DATA < :data_fim')
+        parametros['data_fim'] = filtros['data_fim']
+    return condicoes, parametros
+
+
+def listar_logs(filtros, mes_arquivo=None, antes=None, depois=None, por_pagina=POR_PAGINA):
+    """
+    Uma página de logs, do mais recente ao mais antigo.
+
+    filtros     -> dict com entidade, acao, usuario_id, data_inicio e data_fim
+                   (datetimes; data_fim exclusiva)
+    mes_arquivo -> 'AAAAMM' para consultar um mês arquivado; None = tabela viva
+    antes       -> (data, id): página seguinte (registros mais antigos)
+    depois      -> (data, id): página anterior (registros mais recentes)
+
+    Retorna (logs, tem_mais_antigos, tem_mais_recentes).
+    """
+    tabela = '[BDG].[{0}]'.format(tabela_arquivo(mes_arquivo)) if mes_arquivo else TABELA_LOG
+    condicoes, parametros = _filtros_sql(filtros)
+    parametros['limite'] = por_pagina + 1
+
+    ordem = 'L.DATA DESC, L.ID DESC'
+    # L.DATA é DATETIME; o cursor chega como datetime2 e .xx3/.xx7 ms não batem sem o CAST
+    if depois:
+        condicoes.append('(L.DATA > CAST(:cursor_data AS DATETIME) '
+                         'OR (L.DATA = CAST(:cursor_data AS DATETIME) AND L.ID > :cursor_id))')
+        parametros['cursor_data'], parametros['cursor_id'] = depois
+        ordem = 'L.DATA ASC, L.ID ASC'
+    elif antes:
+        condicoes.append('(L.DATA < CAST(:cursor_data AS DATETIME) '
+                         'OR (L.DATA = CAST(:cursor_data AS DATETIME) AND L.ID < :cursor_id))')
+        parametros['cursor_data'], parametros['cursor_id'] = antes
+
+    sql = text("""
+        SELECT TOP (:limite) {colunas}
+        FROM {tabela} L
+        LEFT JOIN [BDG].[APK_TB002_USUARIOS] U ON U.ID = L.REVERTIDO_POR
+        WHERE {condicoes}
+        ORDER BY {ordem}
+    """.format(colunas=COLUNAS_LISTA, tabela=tabela, condicoes=' AND '.join(condicoes), ordem=ordem))
+
+    logs = db.session.execute(sql, parametros).fetchall()
+    sobrou = len(logs) > por_pagina
+    logs = logs[:por_pagina]
+
+    if depois:
+        logs.reverse()
+        return logs, True, sobrou
+    return logs, sobrou, antes is not None
+
+
+def obter_log_arquivado(id_log, mes_arquivo=None):
+    """
+    Log de uma tabela de arquivo, com DADOS_ANTIGOS/DADOS_NOVOS descomprimidos.
+    Sem mes_arquivo procura em todos os meses (do mais recente ao mais antigo).
+    Retorna (log, mes) ou (None, None).
+    """
+    meses = [_validar_mes(mes_arquivo)] if mes_arquivo else meses_arquivados()
+    for mes in meses:
+        log = db.session.execute(text("""
+            SELECT L.ID, L.USUARIO_ID, L.USUARIO_NOME, L.ACAO, L.ENTIDADE, L.ENTIDADE_ID,
+                   L.DESCRICAO, L.DATA, L.IP,
+                   CAST(DECOMPRESS(L.DADOS_ANTIGOS) AS NVARCHAR(MAX)) AS DADOS_ANTIGOS,
+                   CAST(DECOMPRESS(L.DADOS_NOVOS) AS NVARCHAR(MAX)) AS DADOS_NOVOS,
+                   L.REVERTIDO, L.REVERTIDO_EM, L.LOG_REVERSAO_ID,
+                   U.NOME AS REVERTIDO_POR_NOME
+            FROM [BDG].[{0}] L
+            LEFT JOIN [BDG].[APK_TB002_USUARIOS] U ON U.ID = L.REVERTIDO_POR
+            WHERE L.ID = :id_log
+        """.format(tabela_arquivo(mes))), {'id_log': id_log}).fetchone()
+        if log:
+            return log, mes
+    return None, None
+
+
+# ----------------------------------------------------------------------
+# Arquivamento mensal
+# ----------------------------------------------------------------------
+def _somar_meses(dia, meses):
+    indice = dia.year * 12 + dia.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def limite_arquivamento(meses_ativos=MESES_ATIVOS, hoje=None):
+    """Primeiro dia do mês mais antigo que continua na tabela viva."""
+    hoje = hoje or date.today()
+    return _somar_meses(date(hoje.year, hoje.month, 1), -meses_ativos)
+
+
+def arquivamento_pendente(meses_ativos=MESES_ATIVOS):
+    """
+    True uma vez por mês (por processo) se houver logs anteriores ao limite.
+    A consulta é um seek no índice de DATA.
+    """
+    global _mes_verificado
+    mes_atual = date.today().strftime('%Y%m')
+    with _verificacao_lock:
+        if _mes_verificado == mes_atual:
+            return False
+        _mes_verificado = mes_atual
+
+    existe = db.session.execute(text("""
+        SELECT TOP 1 1 FROM [BDG].[APK_TB001_AUDIT_LOG] WHERE DATA < :limite
+    """), {'limite': limite_arquivamento(meses_ativos)}).fetchone()
+    return existe is not None
+
+
+def arquivar_logs_antigos(meses_ativos=MESES_ATIVOS, lote=LOTE_ARQUIVAMENTO):
+    """
+    Função do job 'auditoria_arquivamento': move cada mês anterior ao limite
+    para a sua tabela de arquivo, em lotes com transação própria.
+    """
+    limite = limite_arquivamento(meses_ativos)
+    primeira = db.session.execute(text("""
+        SELECT MIN(DATA) FROM [BDG].[APK_TB001_AUDIT_LOG] WHERE DATA < :limite
+    """), {'limite': limite}).scalar()
+    db.session.commit()
+
+    meses = {}
+    if primeira is not None:
+        mes = date(primeira.year, primeira.month, 1)
+        while mes < limite:
+            proximo = _somar_meses(mes, 1)
+            chave = mes.strftime('%Y%m')
+            nome = tabela_arquivo(chave)
+            inicio_etapa = datetime.now()
+
+            with db.engine.begin() as connection:
+                connection.execute(text(SQL_CRIAR_ARQUIVO.format(nome=nome)))
+
+            movidos = 0
+            while True:
+                with db.engine.begin() as connection:
+                    qtd = connection.execute(
+                        text(SQL_MOVER_LOTE.format(nome=nome)),
+                        {'lote': lote, 'inicio': mes, 'fim': proximo}
+                    ).rowcount or 0
+                movidos += qtd
+                if not qtd:
+                    break
+
+            meses[chave] = movidos
+            concluir_etapa('Arquivamento {0:%m/%Y}'.format(mes), retorno=movidos,
+                           decorrido=(datetime.now() - inicio_etapa).total_seconds())
+            mes = proximo
+
+    total = sum(meses.values())
+    log_info("Auditoria: {0} logs arquivados anteriores a {1:%m/%Y}".format(total, limite))
+    return {
+        'qt_registros': total,
+        'limite': limite.strftime('%Y-%m-%d'),
+        'meses': meses,
+    }
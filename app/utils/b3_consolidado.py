@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/b3_consolidado.py
+
+Download do CSV "ConsolidatedTradesDerivatives" (Negócios Consolidados) da B3
+usado pelo bot do Custo de Oportunidade.
+
+Antes, _baixar_csv_b3 tentava até 10 datas uma depois da outra, cada uma com
+um requests.post novo e timeout de 60s, e o CSV era apagado depois do
+processamento. Agora:
+    - as datas candidatas (dias úteis dos últimos 10 dias) são consultadas em
+      paralelo por uma requests.Session compartilhada (pool de conexões);
+      vale a mais recente com arquivo consolidado válido;
+    - todo CSV válido baixado fica num cache local endereçado pelo conteúdo
+      (objetos/<sha256>.csv + pregoes/<AAAA-MM-DD>.txt com o hash):
+      reprocessar ou recuperar um pregão já baixado não usa a rede, e só são
+      consultadas as datas mais recentes que o último pregão em cache;
+    - a camada de rede é o TransporteHttpB3 (URL em B3_URL no config), que
+      pode ser trocada por outro objeto com baixar(data_str) -> (status,
+      conteudo) ou apontada para um servidor local de testes.
+
+Config (opcionais): B3_URL, B3_CACHE_DIR.
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+
+MAX_WORKERS = 4
+DIAS_BUSCA = 10
+TIMEOUT = 60
+TAMANHO_MINIMO = 2000
+
+URL_B3 = 'https://arquivos.b3.com.br/bdi/table/export/csv?lang=pt-BR'
+
+HEADERS_B3 = {
+    'Content-Type': 'application/json',
+    'Accept': 'text/csv, */*',
+    'Origin': 'https://arquivos.b3.com.br',
+    'Referer': 'https://arquivos.b3.com.br/bdi/tabelas?lang=pt-BR',
+    'User-Agent': (
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+        'AppleWebKit/537.36 (KHTML, like Gecko) '
+        'Chrome/120.0.0.0 Safari/537.36'
+    ),
+}
+
+_LOCK_SESSAO = threading.Lock()
+_sessao = {'atual': None}
+
+
+def _sessao_http():
+    """Session única do processo, com pool do tamanho do paralelismo."""
+    with _LOCK_SESSAO:
+        if _sessao['atual'] is None:
+            sessao = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS)
+            sessao.mount('https://', adaptador)
+            sessao.mount('http://', adaptador)
+            sessao.headers.update(HEADERS_B3)
+            # Firewall corporativo da EMGEA intercepta certificados
+            sessao.verify = False
+            _sessao['atual'] = sessao
+        return _sessao['atual']
+
+
+def _pasta_cache_padrao():
+    raiz = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return os.path.join(raiz, 'cache', 'b3')
+
+
+def _config(chave, padrao):
+    try:
+        from flask import current_app
+        return current_app.config.get(chave) or padrao
+    except RuntimeError:
+        # Fora de app context (scripts)
+        return padrao
+
+
+class TransporteHttpB3:
+    """Camada de rede: um POST por data na API de exportação da B3."""
+
+    def __init__(self, url=None, timeout=TIMEOUT):
+        self.url = url or _config('B3_URL', URL_B3)
+        self.timeout = timeout
+
+    def baixar(self, data_str):
+        """Retorna (status_code, conteudo). Erros de rede sobem como RequestException."""
+        payload = {
+            'Name': 'ConsolidatedTradesDerivatives',
+            'ClientId': '',
+            'Date': data_str,
+            'Filters': {},
+            'FinalDate': data_str,
+        }
+        response = _sessao_http().post(self.url, json=payload, timeout=self.timeout)
+        return response.status_code, response.content
+
+
+class CacheConsolidado:
+    """Cache local dos CSVs válidos, endereçado pelo SHA-256 do conteúdo."""
+
+    def __init__(self, pasta=None):
+        self.pasta = pasta or _config('B3_CACHE_DIR', _pasta_cache_padrao())
+        self.pasta_objetos = os.path.join(self.pasta, 'objetos')
+        self.pasta_pregoes = os.path.join(self.pasta, 'pregoes')
+
+    def _indice(self, data):
+        return os.path.join(self.pasta_pregoes, data.strftime('%Y-%m-%d') + '.txt')
+
+    def obter(self, data):
+        """Caminho do CSV do pregão em cache, ou None."""
+        try:
+            with open(self._indice(data), 'r', encoding='ascii') as f:
+                sha = f.read().strip()
+        except OSError:
+            return None
+        caminho = os.path.join(self.pasta_objetos, sha + '.csv')
+        return caminho if os.path.exists(caminho) else None
+
+    def guardar(self, data, conteudo):
+        """Grava o conteúdo (se ainda não existir) e aponta o pregão para ele."""
+        os.makedirs(self.pasta_objetos, exist_ok=True)
+        os.makedirs(self.pasta_pregoes, exist_ok=True)
+
+        sha = hashlib.sha256(conteudo).hexdigest()
+        caminho = os.path.join(self.pasta_objetos, sha + '.csv')
+        sufixo = '.{0}.{1}.tmp'.format(os.getpid(), threading.get_ident())
+
+        # Escrita atômica: nunca deixa arquivo pela metade com o nome final
+        if not os.path.exists(caminho):
+            with open(caminho + sufixo, 'wb') as f:
+                f.write(conteudo)
+            os.replace(caminho + sufixo, caminho)
+
+        indice = self._indice(data)
+        with open(indice + sufixo, 'w', encoding='ascii') as f:
+            f.write(sha)
+        os.replace(indice + sufixo, indice)
+        return caminho
+
+
+def validar_conteudo(conteudo):
+    """Mesmas regras de antes. Retorna None se válido, senão o motivo."""
+    if len(conteudo) < TAMANHO_MINIMO:
+        return 'arquivo pequeno ({0} bytes)'.format(len(conteudo))
+    if b'Instrumento financeiro' not in conteudo:
+        return 'sem cabeçalho de negócios'
+    if b'\nDI1' not in conteudo and b'\rDI1' not in conteudo:
+        return 'sem DI1 (não consolidado)'
+    return None
+
+
+def datas_candidatas(hoje=None, dias=DIAS_BUSCA):
+    """Dias úteis (seg-sex) de hoje para trás, do mais recente ao mais antigo."""
+    hoje = hoje or datetime.now().date()
+    candidatas = (hoje - timedelta(days=n) for n in range(dias))
+    return [d for d in candidatas if d.weekday() < 5]
+
+
+def _consultar(transporte, cache, data):
+    """Baixa e valida uma data; se válida, guarda no cache. Retorna caminho ou None."""
+    data_str = data.strftime('%Y-%m-%d')
+    try:
+        status, conteudo = transporte.baixar(data_str)
+    except requests.RequestException as e:
+        print(f'[CustoOportunidade] Erro de rede em {data_str}: {e}')
+        return None
+
+    if status != 200:
+        print(f'[CustoOportunidade] {data_str}: HTTP {status} - pulando')
+        return None
+
+    motivo = validar_conteudo(conteudo)
+    if motivo:
+        print(f'[CustoOportunidade] {data_str}: {motivo} - pulando')
+        return None
+
+    caminho = cache.guardar(data, conteudo)
+    print(f'[CustoOportunidade] CSV VÁLIDO: {caminho} '
+          f'({len(conteudo)} bytes, pregão de {data_str})')
+    return caminho
+
+
+def obter_pregao(data, transporte=None, cache=None):
+    """CSV de um pregão específico (reprocessamento/backfill): cache ou rede."""
+    cache = cache or CacheConsolidado()
+    caminho = cache.obter(data)
+    if caminho:
+        print(f'[CustoOportunidade] Pregão {data} lido do cache: {caminho}')
+        return caminho
+    return _consultar(transporte or TransporteHttpB3(), cache, data)
+
+
+def baixar_mais_recente(hoje=None, dias=DIAS_BUSCA, transporte=None, cache=None,
+                        max_workers=MAX_WORKERS):
+    """
+    Pregão consolidado mais recente dos últimos `dias`.
+    Retorna (caminho, data) ou (None, None).
+    """
+    transporte = transporte or TransporteHttpB3()
+    cache = cache or CacheConsolidado()
+
+    # Só vale consultar a rede para datas mais novas que o último pregão em cache
+    candidatas = []
+    em_cache = (None, None)
+    for data in datas_candidatas(hoje, dias):
+        caminho = cache.obter(data)
+        if caminho:
+            em_cache = (caminho, data)
+            break
+        candidatas.append(data)
+
+    if candidatas:
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='B3')
+        try:
+            futuros = [executor.submit(_consultar, transporte, cache, d) for d in candidatas]
+            # Consome na ordem das datas: a primeira válida é a mais recente
+            for data, futuro in zip(candidatas, futuros):
+                caminho = futuro.result()
+                if caminho:
+                    return caminho, data
+        finally:
+            # Datas mais antigas ainda na fila não são mais necessárias
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    if em_cache[0]:
+        print(f'[CustoOportunidade] Pregão {em_cache[1]} lido do cache: {em_cache[0]}')
+    return em_cache
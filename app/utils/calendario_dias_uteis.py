@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/calendario_dias_uteis.py
+
+Calendário de dias úteis em memória, compartilhado por todos os calculadores.
+
+Cada tabela de calendário é lida UMA vez e guardada como:
+  - bytearray com 1 byte por dia (1 = útil) a partir da primeira data;
+  - somas acumuladas (prefixo) de dias úteis.
+Assim "dias úteis no mês", "dias úteis entre duas datas" e "é dia útil"
+saem em O(1), sem ida ao banco.
+
+Fontes:
+  calendario_aux() -> [BDG].[AUX_TB004_CALENDARIO] (metas / redistribuição)
+  calendario_par() -> [BDG].[PAR_TB020_CALENDARIO] (teletrabalho)
+  feriados_df()    -> [BDG].[AUX_TB003_FERIADOS] (DF e nacionais)
+
+Atualização: a cada INTERVALO_VERIFICACAO segundos uma consulta leve
+(COUNT + CHECKSUM_AGG) compara a assinatura da tabela; se mudou, recarrega.
+invalidar_calendarios() força a recarga (ex.: após manutenção do calendário).
+
+Datas fora do calendário carregado não contam como úteis (mesmo resultado do
+antigo COUNT(*) ... WHERE E_DIA_UTIL = 1) e eh_dia_util() devolve None.
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+import calendar
+import threading
+import time
+from array import array
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+
+from app import db
+from app.utils.log_seguro import log_info, log_erro
+
+INTERVALO_VERIFICACAO = 300
+
+
+def _como_data(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    return valor
+
+
+class CalendarioDiasUteis(object):
+    """Calendário de uma tabela (coluna de data + indicador de dia útil)."""
+
+    def __init__(self, nome, sql_carga, sql_assinatura):
+        self.nome = nome
+        self._sql_carga = sql_carga
+        self._sql_assinatura = sql_assinatura
+        self._lock = threading.Lock()
+        self._assinatura = None
+        self._verificado_em = 0.0
+        # (primeira data, úteis, presentes, prefixo) - trocado de uma vez na recarga
+        self._estado = (None, bytearray(), bytearray(), array('l', [0]))
+
+    # ------------------------------------------------------------------
+    # Carga e invalidação
+    # ------------------------------------------------------------------
+    def invalidar(self):
+        with self._lock:
+            self._assinatura = None
+            self._verificado_em = 0.0
+
+    def _garantir_carregado(self):
+        agora = time.monotonic()
+        if self._assinatura is not None and agora - self._verificado_em < INTERVALO_VERIFICACAO:
+            return
+        with self._lock:
+            if self._assinatura is not None and agora - self._verificado_em < INTERVALO_VERIFICACAO:
+                return
+            try:
+                assinatura = tuple(db.session.execute(text(self._sql_assinatura)).fetchone() or ())
+                if assinatura != self._assinatura:
+                    self._carregar(assinatura)
+                self._verificado_em = agora
+            except Exception as e:
+                # Mantém o que já estava carregado; tenta de novo na próxima chamada
+                log_erro("Erro ao carregar calendário {0}: {1}".format(self.nome, repr(e)))
+
+    def _carregar(self, assinatura):
+        linhas = db.session.execute(text(self._sql_carga)).fetchall()
+        dias = {}
+        for dia, util in linhas:
+            dia = _como_data(dia)
+            if dia is None:
+                continue
+            dias[dia] = 1 if (util is not None and int(util) == 1) or dias.get(dia) else 0
+
+        if dias:
+            inicio = min(dias)
+            total = (max(dias) - inicio).days + 1
+            uteis = bytearray(total)
+            presentes = bytearray(total)
+            for dia, util in dias.items():
+                indice = (dia - inicio).days
+                uteis[indice] = util
+                presentes[indice] = 1
+        else:
+            inicio, uteis, presentes = None, bytearray(), bytearray()
+
+        prefixo = array('l', [0]) * (len(uteis) + 1)
+        acumulado = 0
+        for indice, util in enumerate(uteis):
+            acumulado += util
+            prefixo[indice + 1] = acumulado
+
+        self._estado = (inicio, uteis, presentes, prefixo)
+        self._assinatura = assinatura
+        log_info("Calendário {0} carregado: {1} dias".format(self.nome, len(dias)))
+
+    # ------------------------------------------------------------------
+    # Consultas O(1)
+    # ------------------------------------------------------------------
+    def dias_uteis_entre(self, dt_inicio, dt_fim):
+        """Dias úteis de dt_inicio a dt_fim, inclusive."""
+        self._garantir_carregado()
+        primeira, uteis, _, prefixo = self._estado
+        if primeira is None or dt_inicio is None or dt_fim is None:
+            return 0
+        inicio = max((_como_data(dt_inicio) - primeira).days, 0)
+        fim = min((_como_data(dt_fim) - primeira).days, len(uteis) - 1)
+        if fim < inicio:
+            return 0
+        return prefixo[fim + 1] - prefixo[inicio]
+
+    def dias_uteis_mes(self, ano, mes):
+        ultimo_dia = calendar.monthrange(ano, mes)[1]
+        return self.dias_uteis_entre(date(ano, mes, 1), date(ano, mes, ultimo_dia))
+
+    def dias_uteis_ate(self, data):
+        """Dias úteis do primeiro dia do mês de 'data' até 'data', inclusive."""
+        data = _como_data(data)
+        return self.dias_uteis_entre(date(data.year, data.month, 1), data)
+
+    def eh_dia_util(self, data):
+        """True/False; None se a data não estiver no calendário."""
+        self._garantir_carregado()
+        primeira, uteis, presentes, _ = self._estado
+        if primeira is None:
+            return None
+        indice = (_como_data(data) - primeira).days
+        if indice < 0 or indice >= len(uteis) or not presentes[indice]:
+            return None
+        return uteis[indice] == 1
+
+    def dias_do_mes(self, ano, mes):
+        """(set de dias úteis, set de dias não úteis) do mês, só datas existentes no calendário."""
+        self._garantir_carregado()
+        primeira, uteis, presentes, _ = self._estado
+        dias_uteis, dias_nao_uteis = set(), set()
+        if primeira is None:
+            return dias_uteis, dias_nao_uteis
+        dia = date(ano, mes, 1)
+        while dia.month == mes:
+            indice = (dia - primeira).days
+            if 0 <= indice < len(uteis) and presentes[indice]:
+                (dias_uteis if uteis[indice] else dias_nao_uteis).add(dia)
+            dia += timedelta(days=1)
+        return dias_uteis, dias_nao_uteis
+
+
+class FeriadosCache(object):
+    """Conjunto de feriados (DF e nacionais) com a mesma regra de atualização."""
+
+    SQL_CARGA = """
+        SELECT ANO, MES, DIA
+        FROM [BDG].[AUX_TB003_FERIADOS]
+        WHERE SG_UF = 'DF' OR SG_UF IS NULL OR SG_UF = ''
+    """
+    SQL_ASSINATURA = """
+        SELECT COUNT(*), CHECKSUM_AGG(BINARY_CHECKSUM(ANO, MES, DIA, SG_UF))
+        FROM [BDG].[AUX_TB003_FERIADOS]
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._assinatura = None
+        self._verificado_em = 0.0
+        self._datas = frozenset()
+
+    def invalidar(self):
+        with self._lock:
+            self._assinatura = None
+            self._verificado_em = 0.0
+
+    def _garantir_carregado(self):
+        agora = time.monotonic()
+        if self._assinatura is not None and agora - self._verificado_em < INTERVALO_VERIFICACAO:
+            return
+        with self._lock:
+            try:
+                assinatura = tuple(db.session.execute(text(self.SQL_ASSINATURA)).fetchone() or ())
+                if assinatura != self._assinatura:
+                    datas = set()
+                    for ano, mes, dia in db.session.execute(text(self.SQL_CARGA)).fetchall():
+                        try:
+                            datas.add(date(int(ano), int(mes), int(dia)))
+                        except ValueError:
+                            continue
+                    self._datas = frozenset(datas)
+                    self._assinatura = assinatura
+                    log_info("Feriados carregados: {0}".format(len(datas)))
+                self._verificado_em = agora
+            except Exception as e:
+                log_erro("Erro ao carregar feriados: {0}".format(repr(e)))
+
+    def eh_feriado(self, data):
+        self._garantir_carregado()
+        return _como_data(data) in self._datas
+
+
+_calendario_aux = CalendarioDiasUteis(
+    'AUX_TB004_CALENDARIO',
+    """
+        SELECT DT_REFERENCIA, CAST(E_DIA_UTIL AS INT)
+        FROM [BDG].[AUX_TB004_CALENDARIO]
+    """,
+    """
+        SELECT COUNT(*), CHECKSUM_AGG(BINARY_CHECKSUM(DT_REFERENCIA, CAST(E_DIA_UTIL AS INT)))
+        FROM [BDG].[AUX_TB004_CALENDARIO]
+    """)
+
+_calendario_par = CalendarioDiasUteis(
+    'PAR_TB020_CALENDARIO',
+    """
+        SELECT DIA, DIA_UTIL
+        FROM [BDG].[PAR_TB020_CALENDARIO]
+    """,
+    """
+        SELECT COUNT(*), CHECKSUM_AGG(BINARY_CHECKSUM(DIA, DIA_UTIL))
+        FROM [BDG].[PAR_TB020_CALENDARIO]
+    """)
+
+_feriados = FeriadosCache()
+
+
+def calendario_aux():
+    return _calendario_aux
+
+
+def calendario_par():
+    return _calendario_par
+
+
+def feriados_df():
+    return _feriados
+
+
+def invalidar_calendarios():
+    """Força a recarga de todos os calendários na próxima consulta."""
+    _calendario_aux.invalidar()
+    _calendario_par.invalidar()
+    _feriados.invalidar()
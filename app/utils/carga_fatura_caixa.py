@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/carga_fatura_caixa.py
+
+Importação set-based do arquivo de prêmios da Caixa Seguradora
+(CNT.GEA.MZ.BFC2.PREMIOS.EMGEA.D*) para [BDG].[SEG_TB002_FATURA_CAIXA].
+
+Antes: uma consulta verificar_duplicata por linha + um objeto ORM por linha.
+Agora:
+    1. o arquivo é lido em blocos de LINHAS_POR_BLOCO linhas, convertidas em
+       tuplas tipadas (mesmas regras de conversão da versão anterior);
+    2. cada bloco vai para a #FaturaCaixaCarga com inserir_lote (fast_executemany);
+    3. um único INSERT ... SELECT com anti-join grava só o que não existe.
+
+Duplicata = mesma chave (NUM_CONTRATO_TERC, NR_CONTRATO, SEQ_PREMIO,
+DTA_INI_REFERENCIA) já gravada e não excluída, ou repetida no próprio arquivo
+(vale a primeira ocorrência). Linhas com alguma parte da chave vazia são
+sempre inseridas, como antes.
+
+Tudo numa transação: erro em qualquer linha desfaz a carga inteira.
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+import time
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import islice
+
+from sqlalchemy import text
+
+from app import db
+from app.utils.carga_lote import inserir_lote
+from app.utils.log_seguro import log_info
+
+LINHAS_POR_BLOCO = 50000
+MINIMO_CAMPOS = 16
+CENTAVOS = Decimal('0.01')
+
+COLUNAS_STAGING = [
+    'LINHA', 'NUM_CONTRATO_TERC', 'NR_CONTRATO', 'SEQ_PREMIO', 'COD_PRODUTO', 'COD_SUBEST',
+    'MIP_DIF', 'IND_TP_PREMIO', 'DTA_ULT_MOVTO', 'DTA_INI_REFERENCIA', 'DTA_FIM_REFERENCIA',
+    'VR_PREMIO', 'IOF_MIP_DIF', 'COD_EVENTO', 'NUM_ORI_CONTRATO', 'SEQ_PREMIO_ORI', 'NUM_ENDOSSO'
+]
+
+SQL_CRIAR_STAGING = """
+    CREATE TABLE #FaturaCaixaCarga (
+        LINHA INT NOT NULL PRIMARY KEY,
+        NUM_CONTRATO_TERC DECIMAL(23, 0) NULL,
+        NR_CONTRATO INT NULL,
+        SEQ_PREMIO INT NULL,
+        COD_PRODUTO INT NULL,
+        COD_SUBEST INT NULL,
+        MIP_DIF INT NULL,
+        IND_TP_PREMIO VARCHAR(1) NULL,
+        DTA_ULT_MOVTO DATE NULL,
+        DTA_INI_REFERENCIA DATE NULL,
+        DTA_FIM_REFERENCIA DATE NULL,
+        VR_PREMIO DECIMAL(10, 2) NULL,
+        IOF_MIP_DIF DECIMAL(10, 2) NULL,
+        COD_EVENTO INT NULL,
+        NUM_ORI_CONTRATO INT NULL,
+        SEQ_PREMIO_ORI INT NULL,
+        NUM_ENDOSSO INT NULL
+    )
+"""
+
+# Índice da chave de duplicidade na tabela final (anti-join sem varrer a tabela)
+SQL_GARANTIR_INDICE = """
+    IF NOT EXISTS (SELECT 1 FROM sys.indexes
+                   WHERE name = 'IX_SEG_TB002_CHAVE_PREMIO'
+                     AND object_id = OBJECT_ID('BDG.SEG_TB002_FATURA_CAIXA'))
+        CREATE INDEX IX_SEG_TB002_CHAVE_PREMIO ON [BDG].[SEG_TB002_FATURA_CAIXA]
+            (NR_CONTRATO, SEQ_PREMIO, DTA_INI_REFERENCIA, NUM_CONTRATO_TERC)
+            INCLUDE (DELETED_AT)
+"""
+
+SQL_GRAVAR = """
+    ;WITH CARGA AS (
+        SELECT S.*,
+               ROW_NUMBER() OVER (
+                   PARTITION BY S.NUM_CONTRATO_TERC, S.NR_CONTRATO, S.SEQ_PREMIO, S.DTA_INI_REFERENCIA
+                   ORDER BY S.LINHA
+               ) AS OCORRENCIA
+        FROM #FaturaCaixaCarga S
+    )
+    INSERT INTO [BDG].[SEG_TB002_FATURA_CAIXA] (
+        NUM_CONTRATO_TERC, NR_CONTRATO, SEQ_PREMIO, COD_PRODUTO, COD_SUBEST, MIP_DIF,
+        IND_TP_PREMIO, DTA_ULT_MOVTO, DTA_INI_REFERENCIA, DTA_FIM_REFERENCIA, VR_PREMIO,
+        IOF_MIP_DIF, COD_EVENTO, NUM_ORI_CONTRATO, SEQ_PREMIO_ORI, NUM_ENDOSSO,
+        DTA_CARGA, USUARIO_CARGA, ARQUIVO_ORIGEM
+    )
+    SELECT C.NUM_CONTRATO_TERC, C.NR_CONTRATO, C.SEQ_PREMIO, C.COD_PRODUTO, C.COD_SUBEST, C.MIP_DIF,
+           C.IND_TP_PREMIO, C.DTA_ULT_MOVTO, C.DTA_INI_REFERENCIA, C.DTA_FIM_REFERENCIA, C.VR_PREMIO,
+           C.IOF_MIP_DIF, C.COD_EVENTO, C.NUM_ORI_CONTRATO, C.SEQ_PREMIO_ORI, C.NUM_ENDOSSO,
+           :dta_carga, :usuario, :arquivo
+    FROM CARGA C
+    WHERE C.NUM_CONTRATO_TERC IS NULL OR C.NR_CONTRATO IS NULL
+       OR C.SEQ_PREMIO IS NULL OR C.DTA_INI_REFERENCIA IS NULL
+       OR (C.OCORRENCIA = 1 AND NOT EXISTS (
+               SELECT 1
+               FROM [BDG].[SEG_TB002_FATURA_CAIXA] F
+               WHERE F.NR_CONTRATO = C.NR_CONTRATO
+                 AND F.SEQ_PREMIO = C.SEQ_PREMIO
+                 AND F.DTA_INI_REFERENCIA = C.DTA_INI_REFERENCIA
+                 AND F.NUM_CONTRATO_TERC = C.NUM_CONTRATO_TERC
+                 AND F.DELETED_AT IS NULL
+           ))
+    ORDER BY C.LINHA
+"""
+
+
+def _inteiro(valor):
+    return int(valor) if valor else None
+
+
+def _data(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+    except ValueError:
+        return None
+
+
+def _decimal(valor):
+    """Valor DECIMAL(10, 2): mesma escala em todas as linhas (fast_executemany tipa pela primeira)."""
+    if not valor:
+        return Decimal('0.00')
+    return Decimal(valor.replace(',', '.')).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+
+
+def converter_linha(numero, campos):
+    """Campos de uma linha do arquivo -> tupla na ordem de COLUNAS_STAGING."""
+    return (
+        numero,
+        Decimal(campos[0]) if campos[0] else None,
+        _inteiro(campos[1]),
+        _inteiro(campos[2]),
+        _inteiro(campos[3]),
+        _inteiro(campos[4]),
+        int(campos[5]) if campos[5] in ('1', '2') else None,
+        campos[6] or None,
+        _data(campos[7]),
+        _data(campos[8]),
+        _data(campos[9]),
+        _decimal(campos[10]),
+        _decimal(campos[11]),
+        _inteiro(campos[12]),
+        _inteiro(campos[13]),
+        _inteiro(campos[14]),
+        _inteiro(campos[15])
+    )
+
+
+def ler_blocos(arquivo_path, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """Gera listas de tuplas tipadas, bloco a bloco (o arquivo nunca fica todo em memória)."""
+    with open(arquivo_path, 'r', encoding='latin-1') as arquivo:
+        numero = 0
+        while True:
+            bruto = list(islice(arquivo, linhas_por_bloco))
+            if not bruto:
+                return
+            bloco = []
+            for linha in bruto:
+                numero += 1
+                linha = linha.strip()
+                if not linha:
+                    continue
+                campos = linha.split(';')
+                if len(campos) >= MINIMO_CAMPOS:
+                    try:
+                        bloco.append(converter_linha(numero, campos))
+                    except (ValueError, ArithmeticError) as e:
+                        raise ValueError("Linha {0} inválida: {1}".format(numero, e))
+            if bloco:
+                yield bloco
+
+
+def importar_arquivo(arquivo_path, usuario, nome_arquivo):
+    """
+    Carrega o arquivo e grava só os registros novos.
+    Retorna (inseridos, duplicados, lidos). Levanta exceção em erro (nada é gravado).
+    """
+    inicio = time.perf_counter()
+    with db.engine.begin() as connection:
+        connection.execute(text(SQL_GARANTIR_INDICE))
+        connection.execute(text(SQL_CRIAR_STAGING))
+
+        lidos = 0
+        for bloco in ler_blocos(arquivo_path):
+            lidos += inserir_lote(connection, '#FaturaCaixaCarga', COLUNAS_STAGING, bloco)
+
+        inseridos = 0
+        if lidos:
+            inseridos = connection.execute(text(SQL_GRAVAR), {
+                'dta_carga': datetime.now(),
+                'usuario': usuario,
+                'arquivo': nome_arquivo
+            }).rowcount
+
+        connection.execute(text("DROP TABLE #FaturaCaixaCarga"))
+
+    log_info("Fatura Caixa {0}: {1} lidos, {2} inseridos, {3} duplicados em {4:.1f}s".format(
+        nome_arquivo, lidos, inseridos, lidos - inseridos, time.perf_counter() - inicio))
+    return inseridos, lidos - inseridos, lidos
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/carga_lote.py
+
+Inserção em lote no SQL Server via pyodbc (fast_executemany).
+Envia milhares de linhas por round-trip em vez de um INSERT por registro.
+
+Usa a MESMA conexão/transação recebida, então funciona com tabelas #temporárias
+criadas antes nessa conexão e respeita o commit/rollback de quem chamou.
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+from app.utils.log_seguro import log_info
+
+TAMANHO_LOTE = 50000
+
+
+def _cursor_dbapi(connection):
+    """Cursor pyodbc da conexão SQLAlchemy (Connection) ou do próprio DBAPI."""
+    dbapi = getattr(connection, 'connection', connection)
+    dbapi = getattr(dbapi, 'dbapi_connection', dbapi)
+    return dbapi.cursor()
+
+
+def inserir_lote(connection, tabela, colunas, linhas, tamanho_lote=TAMANHO_LOTE):
+    """
+    Uso:
+        with db.engine.begin() as connection:
+            inserir_lote(connection, '#AtribuicaoCPF', ['NR_CPF_CNPJ', 'ID_EMPRESA'], pares)
+
+    linhas -> iterável de tuplas/listas na ordem de 'colunas' (tipos Python nativos).
+    Retorna a quantidade de linhas enviadas.
+    """
+    sql = "INSERT INTO {0} ({1}) VALUES ({2})".format(
+        tabela,
+        ', '.join('[{0}]'.format(c) for c in colunas),
+        ', '.join('?' for _ in colunas)
+    )
+
+    cursor = _cursor_dbapi(connection)
+    try:
+        try:
+            cursor.fast_executemany = True
+        except AttributeError:
+            pass
+
+        total = 0
+        lote = []
+        for linha in linhas:
+            lote.append(tuple(linha))
+            if len(lote) >= tamanho_lote:
+                cursor.executemany(sql, lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            cursor.executemany(sql, lote)
+            total += len(lote)
+    finally:
+        cursor.close()
+
+    log_info("Carga em lote: {0} linhas em {1}".format(total, tabela))
+    return total
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/chat_resumo.py
+
+Resumo das conversas do chat ([BDG].[APK_TB013_CONVERSAS_RESUMO]).
+
+A caixa de entrada (chat.index) agrupava a APK_TB003_MENSAGENS inteira do
+usuário e, para cada conversa, fazia Usuario.query.get + COUNT de não lidas:
+2N+1 consultas por página. Agora cada usuário tem uma linha por contato com a
+última mensagem (ID, data, trecho, remetente) e o contador de não lidas, e a
+caixa de entrada é UMA consulta pelo índice (USUARIO_ID, ULTIMA_DATA DESC).
+
+Manutenção incremental, na mesma transação da mensagem:
+    registrar_mensagem -> ao enviar (atualiza as duas pontas; +1 não lida no destinatário)
+    marcar_lidas       -> ao marcar mensagens como lidas (subtrai do contador)
+reconstruir_resumos recalcula tudo de forma set-based a partir das mensagens
+(subida da aplicação), corrigindo qualquer divergência.
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+from sqlalchemy import text
+
+from app import db
+from app.utils.log_seguro import log_info, log_erro
+
+TABELA_RESUMO = '[BDG].[APK_TB013_CONVERSAS_RESUMO]'
+TAMANHO_TRECHO = 200
+
+SQL_REGISTRAR = text("""
+    UPDATE [BDG].[APK_TB013_CONVERSAS_RESUMO] WITH (UPDLOCK, SERIALIZABLE)
+    SET ULTIMA_DATA = CASE WHEN :mensagem_id > ULTIMA_MENSAGEM_ID THEN :data ELSE ULTIMA_DATA END,
+        ULTIMO_TRECHO = CASE WHEN :mensagem_id > ULTIMA_MENSAGEM_ID THEN :trecho ELSE ULTIMO_TRECHO END,
+        ULTIMO_REMETENTE_ID = CASE WHEN :mensagem_id > ULTIMA_MENSAGEM_ID THEN :remetente_id ELSE ULTIMO_REMETENTE_ID END,
+        ULTIMA_MENSAGEM_ID = CASE WHEN :mensagem_id > ULTIMA_MENSAGEM_ID THEN :mensagem_id ELSE ULTIMA_MENSAGEM_ID END,
+        NAO_LIDAS = NAO_LIDAS + :incremento
+    WHERE USUARIO_ID = :usuario_id AND OUTRO_USUARIO_ID = :outro_id;
+
+    IF @@ROWCOUNT = 0
+        INSERT INTO [BDG].[APK_TB013_CONVERSAS_RESUMO]
+            (USUARIO_ID, OUTRO_USUARIO_ID, ULTIMA_MENSAGEM_ID, ULTIMA_DATA, ULTIMO_TRECHO,
+             ULTIMO_REMETENTE_ID, NAO_LIDAS)
+        VALUES (:usuario_id, :outro_id, :mensagem_id, :data, :trecho, :remetente_id, :incremento);
+""")
+
+SQL_MARCAR_LIDAS = text("""
+    UPDATE [BDG].[APK_TB013_CONVERSAS_RESUMO]
+    SET NAO_LIDAS = CASE WHEN NAO_LIDAS > :quantidade THEN NAO_LIDAS - :quantidade ELSE 0 END
+    WHERE USUARIO_ID = :usuario_id AND OUTRO_USUARIO_ID = :outro_id
+""")
+
+# Uma linha por (usuário, contato) nas duas direções; não lidas = recebidas com LIDO = 0
+SQL_RECONSTRUIR = text("""
+    DELETE FROM [BDG].[APK_TB013_CONVERSAS_RESUMO];
+
+    ;WITH PONTAS AS (
+        SELECT REMETENTE_ID AS USUARIO_ID, DESTINATARIO_ID AS OUTRO_USUARIO_ID,
+               ID, CREATED_AT, CONTEUDO, REMETENTE_ID, 0 AS NAO_LIDA
+        FROM [BDG].[APK_TB003_MENSAGENS]
+        UNION ALL
+        SELECT DESTINATARIO_ID, REMETENTE_ID,
+               ID, CREATED_AT, CONTEUDO, REMETENTE_ID,
+               CASE WHEN ISNULL(LIDO, 0) = 0 THEN 1 ELSE 0 END
+        FROM [BDG].[APK_TB003_MENSAGENS]
+        WHERE DESTINATARIO_ID <> REMETENTE_ID
+    ), ORDENADAS AS (
+        SELECT *,
+               ROW_NUMBER() OVER (PARTITION BY USUARIO_ID, OUTRO_USUARIO_ID ORDER BY ID DESC) AS RN,
+               SUM(NAO_LIDA) OVER (PARTITION BY USUARIO_ID, OUTRO_USUARIO_ID) AS NAO_LIDAS
+        FROM PONTAS
+    )
+    INSERT INTO [BDG].[APK_TB013_CONVERSAS_RESUMO]
+        (USUARIO_ID, OUTRO_USUARIO_ID, ULTIMA_MENSAGEM_ID, ULTIMA_DATA, ULTIMO_TRECHO,
+         ULTIMO_REMETENTE_ID, NAO_LIDAS)
+    SELECT USUARIO_ID, OUTRO_USUARIO_ID, ID, ISNULL(CREATED_AT, GETDATE()),
+           LEFT(CAST(CONTEUDO AS VARCHAR(MAX)), 200), REMETENTE_ID, NAO_LIDAS
+    FROM ORDENADAS
+    WHERE RN = 1;
+""")
+
+SQL_LISTAR = text("""
+    SELECT R.OUTRO_USUARIO_ID, U.NOME, U.PERFIL, R.ULTIMA_DATA, R.ULTIMO_TRECHO,
+           R.ULTIMO_REMETENTE_ID, R.NAO_LIDAS
+    FROM [BDG].[APK_TB013_CONVERSAS_RESUMO] R
+    INNER JOIN [BDG].[APK_TB002_USUARIOS] U ON U.ID = R.OUTRO_USUARIO_ID
+    WHERE R.USUARIO_ID = :usuario_id
+    ORDER BY R.ULTIMA_DATA DESC
+""")
+
+
+def registrar_mensagem(mensagem, executor=None):
+    """Atualiza o resumo das duas pontas da mensagem (antes do commit de quem chamou)."""
+    executor = executor if executor is not None else db.session
+    base = {
+        'mensagem_id': mensagem.ID,
+        'data': mensagem.CREATED_AT,
+        'trecho': (mensagem.CONTEUDO or '')[:TAMANHO_TRECHO],
+        'remetente_id': mensagem.REMETENTE_ID
+    }
+    # Remetente: conversa com o destinatário, nada a ler
+    executor.execute(SQL_REGISTRAR, dict(base, usuario_id=mensagem.REMETENTE_ID,
+                                          outro_id=mensagem.DESTINATARIO_ID, incremento=0))
+    if mensagem.DESTINATARIO_ID != mensagem.REMETENTE_ID:
+        executor.execute(SQL_REGISTRAR, dict(base, usuario_id=mensagem.DESTINATARIO_ID,
+                                              outro_id=mensagem.REMETENTE_ID, incremento=1))
+
+
+def marcar_lidas(usuario_id, outro_id, quantidade, executor=None):
+    """Desconta `quantidade` mensagens de outro_id lidas agora por usuario_id."""
+    if quantidade <= 0:
+        return
+    executor = executor if executor is not None else db.session
+    executor.execute(SQL_MARCAR_LIDAS, {'usuario_id': usuario_id, 'outro_id': outro_id,
+                                        'quantidade': quantidade})
+
+
+def listar_conversas(usuario_id, executor=None):
+    """Conversas do usuário, mais recente primeiro (uma consulta)."""
+    executor = executor if executor is not None else db.session
+    linhas = executor.execute(SQL_LISTAR, {'usuario_id': usuario_id}).fetchall()
+    return [{
+        'usuario_id': linha.OUTRO_USUARIO_ID,
+        'nome': linha.NOME,
+        'perfil': linha.PERFIL,
+        'ultima_data': linha.ULTIMA_DATA,
+        'ultimo_trecho': linha.ULTIMO_TRECHO,
+        'ultima_e_minha': linha.ULTIMO_REMETENTE_ID == usuario_id,
+        'nao_lidas': linha.NAO_LIDAS
+    } for linha in linhas]
+
+
+def reconstruir_resumos():
+    """Recalcula todos os resumos a partir das mensagens. Não levanta exceção."""
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(SQL_RECONSTRUIR)
+            total = connection.execute(text("SELECT COUNT(*) FROM " + TABELA_RESUMO)).scalar()
+        log_info("Resumo de conversas do chat reconstruído: {0} linhas".format(total))
+        return total
+    except Exception as e:
+        log_erro("Erro ao reconstruir resumo de conversas do chat: {0}".format(repr(e)))
+        return 0
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/contrato_analitico.py
+
+Busca dos lançamentos da [BDG].[AEX_TB002_ANALITICO] por número de contrato,
+compartilhada por Pendência vs Retenção e Cobrado vs Repassado.
+
+NU_CONTRATO é varchar e chega com formatos diferentes (com/sem zeros à
+esquerda, '123.0'...). As telas montavam sete variações do número num OR e,
+se nada batesse, caíam num LIKE '%n%' que varria a tabela inteira.
+
+Agora a tabela tem a coluna computada PERSISTED NU_CONTRATO_NUM =
+TRY_CONVERT(DECIMAL(30,0), NU_CONTRATO aparado), indexada: a busca é um seek
+de igualdade. Como é computada pelo próprio SQL Server, fica correta em
+qualquer carga, sem manutenção pela aplicação. Valores que não são número
+puro ficam com a chave NULL; para eles o LIKE continua como último recurso,
+mas restrito à faixa NULL do índice (que inclui NU_CONTRATO).
+
+Se a coluna/índice não puderem ser criados (permissão), a busca antiga com
+variações + LIKE é usada.
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+from decimal import Decimal
+
+from sqlalchemy import or_, text
+
+from app import db
+from app.models.pendencia_retencao import AexAnalitico
+from app.utils.log_seguro import log_info, log_erro
+
+SQL_GARANTIR_CHAVE = """
+    IF COL_LENGTH('BDG.AEX_TB002_ANALITICO', 'NU_CONTRATO_NUM') IS NULL
+        ALTER TABLE [BDG].[AEX_TB002_ANALITICO]
+            ADD NU_CONTRATO_NUM AS TRY_CONVERT(DECIMAL(30, 0), LTRIM(RTRIM([NU_CONTRATO]))) PERSISTED;
+"""
+
+SQL_GARANTIR_INDICE = """
+    IF NOT EXISTS (SELECT 1 FROM sys.indexes
+                   WHERE name = 'IX_AEX_TB002_NU_CONTRATO_NUM'
+                     AND object_id = OBJECT_ID('BDG.AEX_TB002_ANALITICO'))
+        CREATE INDEX IX_AEX_TB002_NU_CONTRATO_NUM ON [BDG].[AEX_TB002_ANALITICO]
+            (NU_CONTRATO_NUM) INCLUDE (NU_CONTRATO, VALOR);
+"""
+
+_estado = {'chave_disponivel': None}
+
+
+def garantir_chave_contrato():
+    """Cria a coluna computada e o índice se faltarem (subida da aplicação)."""
+    try:
+        with db.engine.begin() as connection:
+            # Em lotes separados: o índice precisa enxergar a coluna recém-criada
+            connection.execute(text(SQL_GARANTIR_CHAVE))
+        with db.engine.begin() as connection:
+            connection.execute(text(SQL_GARANTIR_INDICE))
+        _estado['chave_disponivel'] = True
+        log_info("Chave normalizada de contrato da AEX_TB002 disponível")
+    except Exception as e:
+        _estado['chave_disponivel'] = False
+        log_erro("Chave normalizada de contrato indisponível, usando busca por variações: {0}".format(repr(e)))
+    return _estado['chave_disponivel']
+
+
+def _filtro_valor(query, sinal):
+    if sinal == 'negativo':
+        return query.filter(AexAnalitico.VALOR < 0)
+    if sinal == 'positivo':
+        return query.filter(AexAnalitico.VALOR > 0)
+    return query
+
+
+def _variacoes_contrato(nu_contrato, nu_contrato_decimal):
+    nu_contrato_int = int(nu_contrato_decimal)
+    variacoes = [
+        str(nu_contrato_int),
+        nu_contrato,
+        nu_contrato.zfill(10),
+        nu_contrato.zfill(15),
+        f"{nu_contrato_int:010d}",
+        f"{nu_contrato_int:015d}",
+        str(nu_contrato_decimal),
+    ]
+    return list(dict.fromkeys(variacoes))
+
+
+def buscar_analiticos(nu_contrato, sinal=None):
+    """
+    Lançamentos do contrato. nu_contrato -> texto digitado (ou Decimal);
+    sinal -> 'negativo' (retidos), 'positivo' (repassados) ou None (todos).
+    """
+    nu_contrato = str(nu_contrato).strip()
+    nu_contrato_decimal = Decimal(nu_contrato)
+    nu_contrato_int = int(nu_contrato_decimal)
+
+    if _estado['chave_disponivel'] is None:
+        garantir_chave_contrato()
+
+    if _estado['chave_disponivel']:
+        analiticos = _filtro_valor(AexAnalitico.query.filter(
+            AexAnalitico.NU_CONTRATO_NUM == nu_contrato_int
+        ), sinal).all()
+        if analiticos:
+            return analiticos
+        # Último recurso só entre os NU_CONTRATO não numéricos (faixa NULL do índice)
+        return _filtro_valor(AexAnalitico.query.filter(
+            AexAnalitico.NU_CONTRATO_NUM == None,
+            AexAnalitico.NU_CONTRATO.like(f'%{nu_contrato_int}%')
+        ), sinal).all()
+
+    analiticos = _filtro_valor(AexAnalitico.query.filter(
+        or_(*[AexAnalitico.NU_CONTRATO == var
+              for var in _variacoes_contrato(nu_contrato, nu_contrato_decimal)])
+    ), sinal).all()
+    if not analiticos:
+        analiticos = _filtro_valor(AexAnalitico.query.filter(
+            AexAnalitico.NU_CONTRATO.like(f'%{nu_contrato_int}%')
+        ), sinal).all()
+    return analiticos
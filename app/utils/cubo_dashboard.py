@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/cubo_dashboard.py
+
+Cubo pré-agregado do dashboard de distribuição (/limites/api/dashboard-data).
+
+A DCA_TB005 é agregada UMA vez por edital/período na [BDG].[DCA_TB022_CUBO_DASHBOARD]
+(empresa x critério x produto, com contratos, CPFs distintos e saldo), sempre
+que a distribuição, a redistribuição ou a homologação termina. A API monta os
+quatro painéis a partir do cubo, com cache em memória (TTL) por edital/período,
+sem consultar a tabela de fatos a cada acesso ou troca de filtro.
+
+CPFs distintos não são somáveis: por isso o cubo guarda também as linhas
+NIVEL = 'EMPRESA' e 'TOTAL' (GROUPING SETS), de onde saem os KPIs.
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+import threading
+import time
+
+from sqlalchemy import text
+
+from app import db
+from app.utils.log_seguro import log_info, log_erro
+
+TTL_SEGUNDOS = 300
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+SQL_RECONSTRUIR = """
+    DELETE FROM [BDG].[DCA_TB022_CUBO_DASHBOARD]
+    WHERE ID_EDITAL = :edital_id AND ID_PERIODO = :periodo_id;
+
+    INSERT INTO [BDG].[DCA_TB022_CUBO_DASHBOARD]
+        (ID_EDITAL, ID_PERIODO, NIVEL, COD_EMPRESA_COBRANCA, NO_EMPRESA,
+         COD_CRITERIO_SELECAO, DS_CRITERIO_SELECAO, NO_PRODUTO,
+         QT_CONTRATOS, QT_CPFS, VR_SALDO, DT_ATUALIZACAO)
+    SELECT
+        :edital_id,
+        :periodo_id,
+        CASE
+            WHEN GROUPING(DIS.COD_EMPRESA_COBRANCA) = 1 THEN 'TOTAL'
+            WHEN GROUPING(DIS.COD_CRITERIO_SELECAO) = 1 THEN 'EMPRESA'
+            ELSE 'DETALHE'
+        END,
+        DIS.COD_EMPRESA_COBRANCA,
+        MAX(EM.NO_ABREVIADO_EMPRESA),
+        DIS.COD_CRITERIO_SELECAO,
+        MAX(CR.DS_CRITERIO_SELECAO),
+        PR.NO_ABREVIADO_PRODUTO,
+        COUNT(DISTINCT DIS.fkContratoSISCTR),
+        COUNT(DISTINCT DIS.NR_CPF_CNPJ),
+        SUM(DIS.VR_SD_DEVEDOR),
+        GETDATE()
+    FROM [BDG].[DCA_TB005_DISTRIBUICAO] DIS
+    LEFT JOIN [BDG].[PAR_TB002_EMPRESA_RESPONSAVEL_COBRANCA] EM
+        ON DIS.COD_EMPRESA_COBRANCA = EM.pkEmpresaResponsavelCobranca
+    LEFT JOIN [BDG].[DCA_TB004_CRITERIO_SELECAO] CR
+        ON DIS.COD_CRITERIO_SELECAO = CR.COD
+    LEFT JOIN [BDG].[COM_TB001_CONTRATO] CTR
+        ON DIS.fkContratoSISCTR = CTR.fkContratoSISCTR
+    LEFT JOIN [BDG].[PAR_TB001_PRODUTOS] PR
+        ON CTR.COD_PRODUTO = PR.pkSistemaOriginario
+    WHERE DIS.ID_EDITAL = :edital_id
+        AND DIS.ID_PERIODO = :periodo_id
+        AND DIS.DELETED_AT IS NULL
+    GROUP BY GROUPING SETS (
+        (DIS.COD_EMPRESA_COBRANCA, DIS.COD_CRITERIO_SELECAO, PR.NO_ABREVIADO_PRODUTO),
+        (DIS.COD_EMPRESA_COBRANCA),
+        ()
+    )
+    HAVING COUNT(*) > 0;
+"""
+
+
+def reconstruir_cubo_dashboard(edital_id, periodo_id):
+    """Recalcula o cubo do edital/período e invalida o cache. Retorna as linhas gravadas."""
+    with db.engine.begin() as connection:
+        connection.execute(text(SQL_RECONSTRUIR), {"edital_id": edital_id, "periodo_id": periodo_id})
+        qtd = connection.execute(text("""
+            SELECT COUNT(*) FROM [BDG].[DCA_TB022_CUBO_DASHBOARD]
+            WHERE ID_EDITAL = :edital_id AND ID_PERIODO = :periodo_id
+        """), {"edital_id": edital_id, "periodo_id": periodo_id}).scalar() or 0
+
+    invalidar_cache_dashboard(edital_id, periodo_id)
+    log_info("Cubo do dashboard reconstruído: edital {0}, período {1} ({2} linhas)".format(
+        edital_id, periodo_id, qtd))
+    return qtd
+
+
+def atualizar_cubo_seguro(edital_id, periodo_id):
+    """Reconstrói o cubo sem interromper quem chamou (fim de distribuição/homologação)."""
+    try:
+        return reconstruir_cubo_dashboard(edital_id, periodo_id)
+    except Exception as e:
+        log_erro("Erro ao reconstruir cubo do dashboard ({0}/{1}): {2}".format(edital_id, periodo_id, repr(e)))
+        return 0
+
+
+def invalidar_cache_dashboard(edital_id=None, periodo_id=None):
+    """Sem argumentos limpa o cache inteiro."""
+    with _cache_lock:
+        if edital_id is None:
+            _cache.clear()
+        else:
+            _cache.pop((edital_id, periodo_id), None)
+
+
+def _linhas_cubo(edital_id, periodo_id):
+    chave = (edital_id, periodo_id)
+    agora = time.monotonic()
+    with _cache_lock:
+        item = _cache.get(chave)
+        if item and item[0] > agora:
+            return item[1]
+
+    sql = text("""
+        SELECT NIVEL, COD_EMPRESA_COBRANCA, NO_EMPRESA, COD_CRITERIO_SELECAO,
+               DS_CRITERIO_SELECAO, NO_PRODUTO, QT_CONTRATOS, QT_CPFS, VR_SALDO
+        FROM [BDG].[DCA_TB022_CUBO_DASHBOARD]
+        WHERE ID_EDITAL = :edital_id AND ID_PERIODO = :periodo_id
+    """)
+    with db.engine.connect() as connection:
+        linhas = connection.execute(sql, {"edital_id": edital_id, "periodo_id": periodo_id}).fetchall()
+
+    if not linhas:
+        # Períodos distribuídos antes do cubo: monta na primeira consulta
+        if reconstruir_cubo_dashboard(edital_id, periodo_id):
+            with db.engine.connect() as connection:
+                linhas = connection.execute(sql, {"edital_id": edital_id, "periodo_id": periodo_id}).fetchall()
+
+    linhas = [tuple(linha) for linha in linhas]
+    with _cache_lock:
+        _cache[chave] = (agora + TTL_SEGUNDOS, linhas)
+    return linhas
+
+
+def _agrupar(detalhes, indice_nome):
+    """Soma contratos e saldo por nome, descartando nome vazio (equivale ao INNER JOIN)."""
+    grupos = {}
+    for linha in detalhes:
+        nome = linha[indice_nome]
+        if nome is None:
+            continue
+        qtde, valor = grupos.get(nome, (0, 0.0))
+        grupos[nome] = (qtde + (linha[6] or 0), valor + float(linha[8] or 0))
+    return [
+        {'nome': nome, 'qtde_contratos': qtde, 'valor_total': valor}
+        for nome, (qtde, valor) in sorted(grupos.items(), key=lambda item: item[1][0], reverse=True)
+    ]
+
+
+def obter_dados_dashboard(edital_id, periodo_id, empresa_id=None):
+    """KPIs e painéis (empresas, critérios, produtos) no formato de api_dashboard_data."""
+    linhas = _linhas_cubo(edital_id, periodo_id)
+
+    detalhes = [l for l in linhas if l[0] == 'DETALHE' and (not empresa_id or l[1] == empresa_id)]
+    if empresa_id:
+        kpi = next((l for l in linhas if l[0] == 'EMPRESA' and l[1] == empresa_id), None)
+    else:
+        kpi = next((l for l in linhas if l[0] == 'TOTAL'), None)
+
+    return {
+        'kpis': {
+            'total_contratos': kpi[6] if kpi else 0,
+            'total_cpfs': kpi[7] if kpi else 0,
+            'total_empresas': len(set(l[1] for l in detalhes if l[1] is not None)),
+            'valor_total': float(kpi[8]) if kpi and kpi[8] else 0,
+            'total_criterios': len(set(l[3] for l in detalhes if l[3] is not None))
+        },
+        'empresas': _agrupar(detalhes, 2),
+        'criterios': _agrupar(detalhes, 4),
+        'produtos': _agrupar(detalhes, 5)
+    }
@@ -1,6 +1,12 @@
 from app import db
 from sqlalchemy import text
 import logging
+from app.utils.processo_jobs import iniciar_etapa, concluir_etapa
+from app.utils.staging_distribuicao import sql_staging, staging_execucao, simulacao_execucao, em_simulacao
+from app.utils.cubo_dashboard import reconstruir_cubo_dashboard
+from app.utils.alocador_cpfs import calcular_cotas, alocar_cpfs
+from app.utils.carga_lote import inserir_lote
+import numpy as np
 
 COD_EMPRESA_SERASA = 223371
 
@@ -24,8 +30,8 @@ def selecionar_contratos_distribuiveis():
             trans = connection.begin()
             try:
                 logging.info("Limpando tabelas...")
-                connection.execute(text("TRUNCATE TABLE [BDG].[DCA_TB006_DISTRIBUIVEIS]"))
-                connection.execute(text("TRUNCATE TABLE [BDG].[DCA_TB007_ARRASTAVEIS]"))
+                connection.execute(text(sql_staging("TRUNCATE TABLE [BDG].[DCA_TB006_DISTRIBUIVEIS]")))
+                connection.execute(text(sql_staging("TRUNCATE TABLE [BDG].[DCA_TB007_ARRASTAVEIS]")))
 
                 # Verificar se a COM_TB082 tem dados
                 verificar_fonte = text("""
@@ -41,7 +47,7 @@ def selecionar_contratos_distribuiveis():
                     trans.rollback()
                     return 0
 
-                insert_sql = text("""
+                insert_sql = text(sql_staging("""
                     -- ================================================================
                     -- PREPARAÇÃO
                     -- ================================================================
@@ -164,13 +170,13 @@ def selecionar_contratos_distribuiveis():
 
                     DROP TABLE #CPFsSerasa;
                     DROP TABLE #CPFsComAcordo;
-                """)
+                """))
 
                 connection.execute(insert_sql)
                 trans.commit()
                 logging.info("*** TRANSAÇÃO COMMITADA COM SUCESSO ***")
 
-                count_sql = text("SELECT COUNT(*) FROM [BDG].[DCA_TB006_DISTRIBUIVEIS]")
+                count_sql = text(sql_staging("SELECT COUNT(*) FROM [BDG].[DCA_TB006_DISTRIBUIVEIS]"))
                 num_contratos = connection.execute(count_sql).scalar()
                 logging.info(f"Total final (pool assessorias): {num_contratos}")
                 return num_contratos
@@ -206,14 +212,14 @@ def distribuir_acordos_vigentes_empresas_permanece(edital_id, periodo_id):
 
         # 1. Limpar a tabela de distribuição apenas para este edital/período
         db.session.execute(text(
-            "DELETE FROM [BDG].[DCA_TB005_DISTRIBUICAO] WHERE ID_EDITAL = :edital_id AND ID_PERIODO = :periodo_id"),
+            sql_staging("DELETE FROM [BDG].[DCA_TB005_DISTRIBUICAO] WHERE ID_EDITAL = :edital_id AND ID_PERIODO = :periodo_id")),
             {"edital_id": edital_id, "periodo_id": periodo_id})
         print("Tabela DCA_TB005_DISTRIBUICAO limpa para este edital/período")
 
         # 2. Inserir contratos com acordos vigentes para empresas que permanecem
         # IMPORTANTE: usar EXISTS para controle de duplicatas
         resultado_acordos = db.session.execute(
-            text("""
+            text(sql_staging("""
                  INSERT INTO [BDG].[DCA_TB005_DISTRIBUICAO]
                  ([DT_REFERENCIA], [ID_EDITAL], [ID_PERIODO], [fkContratoSISCTR],
                      [COD_EMPRESA_COBRANCA], [COD_CRITERIO_SELECAO], [NR_CPF_CNPJ],
@@ -246,7 +252,7 @@ def distribuir_acordos_vigentes_empresas_permanece(edital_id, periodo_id):
                    AND D.ID_EDITAL = :edital_id
                    AND D.ID_PERIODO = :periodo_id
                      )
-                 """),
+                 """)),
             {"edital_id": edital_id, "periodo_id": periodo_id}
         )
         contratos_distribuidos = resultado_acordos.rowcount
@@ -255,7 +261,7 @@ def distribuir_acordos_vigentes_empresas_permanece(edital_id, periodo_id):
         # 3. Remover os contratos inseridos da tabela de distribuíveis - usando DELETE otimizado
         if contratos_distribuidos > 0:
             db.session.execute(
-                text("""
+                text(sql_staging("""
                     DELETE DIS
                     FROM [BDG].[DCA_TB006_DISTRIBUIVEIS] AS DIS
                     WHERE DIS.[FkContratoSISCTR] IN (
@@ -265,7 +271,7 @@ def distribuir_acordos_vigentes_empresas_permanece(edital_id, periodo_id):
                         AND DIST.ID_PERIODO = :periodo_id
                         AND DIST.COD_CRITERIO_SELECAO = 1
                     )
-                """),
+                """)),
                 {"edital_id": edital_id, "periodo_id": periodo_id}
             )
 
@@ -306,7 +312,7 @@ def distribuir_acordos_vigentes_empresas_descredenciadas(edital_id, periodo_id):
         f"Iniciando distribuição (AGRUPADA POR CPF) de acordos de empresas descredenciadas - Edital: {edital_id}, Período: {periodo_id}")
 
     try:
-        sql_script = text("""
+        sql_script = text(sql_staging("""
             SET NOCOUNT ON;
 
             -- Temp tables para evitar recriação
@@ -395,7 +401,7 @@ def distribuir_acordos_vigentes_empresas_descredenciadas(edital_id, periodo_id):
             DROP TABLE #CpfEmpresaMap;
 
             SELECT @ContratosInseridos AS ContratosDistribuidos;
-        """)
+        """))
 
         with db.engine.begin() as connection:
             result = connection.execute(sql_script, {"edital_id": edital_id, "periodo_id": periodo_id})
@@ -430,7 +436,7 @@ def aplicar_regra_arrasto_acordos(edital_id, periodo_id):
 
         # CORREÇÃO: Buscar apenas CPFs com acordos que ainda têm contratos para distribuir
         acordos_count = db.session.execute(
-            text("""
+            text(sql_staging("""
                  SELECT COUNT(DISTINCT D.NR_CPF_CNPJ)
                  FROM [BDG].[DCA_TB005_DISTRIBUICAO] D
                  WHERE D.ID_EDITAL = :edital
@@ -443,7 +449,7 @@ def aplicar_regra_arrasto_acordos(edital_id, periodo_id):
                      FROM [BDG].[DCA_TB006_DISTRIBUIVEIS] DIS
                      WHERE DIS.NR_CPF_CNPJ = D.NR_CPF_CNPJ
                      )
-                 """),
+                 """)),
             {"edital": edital_id, "periodo": periodo_id}
         ).scalar()
 
@@ -455,7 +461,7 @@ def aplicar_regra_arrasto_acordos(edital_id, periodo_id):
 
         # CORREÇÃO: Buscar CPFs/CNPJs com acordos que ainda têm contratos para distribuir
         cpfs_acordos = db.session.execute(
-            text("""
+            text(sql_staging("""
                  SELECT DISTINCT D.NR_CPF_CNPJ, D.COD_EMPRESA_COBRANCA
                  FROM [BDG].[DCA_TB005_DISTRIBUICAO] D
                  WHERE D.ID_EDITAL = :edital
@@ -468,7 +474,7 @@ def aplicar_regra_arrasto_acordos(edital_id, periodo_id):
                      FROM [BDG].[DCA_TB006_DISTRIBUIVEIS] DIS
                      WHERE DIS.NR_CPF_CNPJ = D.NR_CPF_CNPJ
                      )
-                 """),
+                 """)),
             {"edital": edital_id, "periodo": periodo_id}
         ).fetchall()
 
@@ -479,11 +485,11 @@ def aplicar_regra_arrasto_acordos(edital_id, periodo_id):
 
             # Buscar contratos distribuíveis para este CPF/CNPJ
             contratos = db.session.execute(
-                text("""
+                text(sql_staging("""
                      SELECT FkContratoSISCTR, VR_SD_DEVEDOR
                      FROM [BDG].[DCA_TB006_DISTRIBUIVEIS]
                      WHERE NR_CPF_CNPJ = :cpf_cnpj
-                     """),
+                     """)),
                 {"cpf_cnpj": cpf_cnpj}
             ).fetchall()
 
@@ -494,20 +500,20 @@ def aplicar_regra_arrasto_acordos(edital_id, periodo_id):
 
                 # Verificar se já foi distribuído
                 ja_distribuido = db.session.execute(
-                    text("""
+                    text(sql_staging("""
                          SELECT COUNT(*)
                          FROM [BDG].[DCA_TB005_DISTRIBUICAO]
                          WHERE fkContratoSISCTR = :contrato_id
                            AND ID_EDITAL = :edital_id
                            AND ID_PERIODO = :periodo_id
-                         """),
+                         """)),
                     {"contrato_id": contrato_id, "edital_id": edital_id, "periodo_id": periodo_id}
                 ).scalar()
 
                 if ja_distribuido == 0:  # Se não foi distribuído
                     # Inserir na distribuição
                     db.session.execute(
-                        text("""
+                        text(sql_staging("""
                              INSERT INTO [BDG].[DCA_TB005_DISTRIBUICAO]
                              ([DT_REFERENCIA], [ID_EDITAL], [ID_PERIODO], [fkContratoSISCTR],
                                  [COD_EMPRESA_COBRANCA], [COD_CRITERIO_SELECAO], [NR_CPF_CNPJ],
@@ -516,7 +522,7 @@ def aplicar_regra_arrasto_acordos(edital_id, periodo_id):
                                  GETDATE(), :edital_id, :periodo_id, :contrato_id, :empresa_cobranca, 6, -- Código 6: Regra de Arrasto
                                  :cpf_cnpj, :valor_sd, GETDATE()
                                  )
-                             """),
+                             """)),
                         {
                             "edital_id": edital_id,
                             "periodo_id": periodo_id,
@@ -529,11 +535,11 @@ def aplicar_regra_arrasto_acordos(edital_id, periodo_id):
 
                     # Remover da tabela de distribuíveis
                     db.session.execute(
-                        text("""
+                        text(sql_staging("""
                              DELETE
                              FROM [BDG].[DCA_TB006_DISTRIBUIVEIS]
                              WHERE FkContratoSISCTR = :contrato_id
-                             """),
+                             """)),
                         {"contrato_id": contrato_id}
                     )
 
@@ -573,7 +579,7 @@ def aplicar_regra_arrasto_sem_acordo(edital_id, periodo_id):
 
     try:
         with db.engine.begin() as connection:
-            sql_script = text("""
+            sql_script = text(sql_staging("""
                 SET NOCOUNT ON;
 
                 -- ETAPA 1: Identificar e numerar aleatoriamente os CPFs que se enquadram na regra.
@@ -698,7 +704,7 @@ def aplicar_regra_arrasto_sem_acordo(edital_id, periodo_id):
                 DROP TABLE #ArrastoMapping;
 
                 SELECT @ContratosInseridos AS ContratosInseridos;
-            """)
+            """))
 
             result = connection.execute(sql_script, {"edital_id": edital_id, "periodo_id": periodo_id})
             contratos_distribuidos = result.scalar_one_or_none() or 0
@@ -713,9 +719,136 @@ def aplicar_regra_arrasto_sem_acordo(edital_id, periodo_id):
         return 0
 
 
-def distribuir_demais_contratos(edital_id, periodo_id):
+def distribuir_demais_contratos(edital_id, periodo_id, semente=None):
+    """
+    Distribui os contratos restantes entre as empresas, AGRUPANDO POR CPF.
+    Implementa o item 1.1.5 dos requisitos: Demais contratos sem acordo.
+
+    Versão vetorizada: lê os CPFs da DCA_TB006 uma vez, calcula as cotas por maiores
+    restos e sorteia CPF -> empresa em memória (alocador_cpfs), gravando tudo com
+    um único INSERT ... SELECT. A mesma 'semente' reproduz a mesma distribuição;
+    sem semente, uma é sorteada e registrada no log.
+    """
+    contratos_distribuidos = 0
+
+    try:
+        if semente is None:
+            semente = int(np.random.SeedSequence().entropy % (2 ** 32))
+        print(f"Iniciando distribuição dos demais contratos (vetorizada) - Edital: {edital_id}, "
+              f"Período: {periodo_id}, Semente: {semente}")
+
+        with db.engine.begin() as connection:
+            # Empresas receptoras, percentual e CPFs já recebidos (uma consulta)
+            empresas = connection.execute(text(sql_staging("""
+                SELECT
+                    EP.ID_EMPRESA,
+                    COALESCE(LD.PERCENTUAL_FINAL, 0) AS percentual,
+                    COALESCE(DIST.cpfs_atuais, 0) AS cpfs_atuais
+                FROM [BDG].[DCA_TB002_EMPRESAS_PARTICIPANTES] EP
+                LEFT JOIN [BDG].[DCA_TB003_LIMITES_DISTRIBUICAO] LD
+                    ON EP.ID_EMPRESA = LD.ID_EMPRESA
+                    AND EP.ID_EDITAL = LD.ID_EDITAL
+                    AND EP.ID_PERIODO = LD.ID_PERIODO
+                LEFT JOIN (
+                    SELECT COD_EMPRESA_COBRANCA, COUNT(DISTINCT NR_CPF_CNPJ) AS cpfs_atuais
+                    FROM [BDG].[DCA_TB005_DISTRIBUICAO]
+                    WHERE ID_EDITAL = :edital_id AND ID_PERIODO = :periodo_id
+                    GROUP BY COD_EMPRESA_COBRANCA
+                ) DIST ON DIST.COD_EMPRESA_COBRANCA = EP.ID_EMPRESA
+                WHERE EP.ID_EDITAL = :edital_id
+                  AND EP.ID_PERIODO = :periodo_id
+                  AND EP.DS_CONDICAO <> 'DESCREDENCIADA'
+                  AND EP.ID_EMPRESA <> 223371
+                ORDER BY EP.ID_EMPRESA
+            """)), {"edital_id": edital_id, "periodo_id": periodo_id}).fetchall()
+
+            if not empresas:
+                print("Nenhuma empresa participante encontrada.")
+                return 0
+
+            # CPFs restantes no pool (ordem fixa: a aleatoriedade vem só da semente)
+            cpfs = np.fromiter(
+                (row[0] for row in connection.execute(text(sql_staging("""
+                    SELECT NR_CPF_CNPJ
+                    FROM [BDG].[DCA_TB006_DISTRIBUIVEIS]
+                    GROUP BY NR_CPF_CNPJ
+                    ORDER BY NR_CPF_CNPJ
+                """)))),
+                dtype=np.int64
+            )
+
+            if len(cpfs) == 0:
+                print("Nenhum CPF restante no pool.")
+                return 0
+
+            ids_empresas = np.array([row[0] for row in empresas], dtype=np.int64)
+            cotas = calcular_cotas(
+                [float(row[1] or 0) for row in empresas],
+                [int(row[2] or 0) for row in empresas],
+                len(cpfs)
+            )
+            cpfs_atribuidos, empresas_atribuidas = alocar_cpfs(cpfs, ids_empresas, cotas, semente)
+
+            print(f"CPFs no pool: {len(cpfs)} | CPFs atribuídos: {len(cpfs_atribuidos)}")
+            for id_empresa, cota in zip(ids_empresas, cotas):
+                print(f"  Empresa {id_empresa}: {cota} CPFs")
+
+            if len(cpfs_atribuidos) == 0:
+                return 0
+
+            # Gravar a atribuição de uma vez e aplicar em conjunto
+            connection.execute(text("""
+                IF OBJECT_ID('tempdb..#AtribuicaoCPF') IS NOT NULL DROP TABLE #AtribuicaoCPF;
+                CREATE TABLE #AtribuicaoCPF (NR_CPF_CNPJ BIGINT PRIMARY KEY, ID_EMPRESA INT NOT NULL);
+            """))
+            inserir_lote(connection, '#AtribuicaoCPF', ['NR_CPF_CNPJ', 'ID_EMPRESA'],
+                         zip(cpfs_atribuidos.tolist(), empresas_atribuidas.tolist()))
+
+            resultado = connection.execute(text(sql_staging("""
+                INSERT INTO [BDG].[DCA_TB005_DISTRIBUICAO]
+                (
+                    [DT_REFERENCIA], [ID_EDITAL], [ID_PERIODO], [fkContratoSISCTR],
+                    [COD_EMPRESA_COBRANCA], [COD_CRITERIO_SELECAO], [NR_CPF_CNPJ],
+                    [VR_SD_DEVEDOR], [CREATED_AT]
+                )
+                SELECT
+                    GETDATE(),
+                    :edital_id,
+                    :periodo_id,
+                    D.[FkContratoSISCTR],
+                    A.ID_EMPRESA,
+                    4, -- Código 4: Demais Contratos Sem Acordo
+                    D.[NR_CPF_CNPJ],
+                    D.[VR_SD_DEVEDOR],
+                    GETDATE()
+                FROM [BDG].[DCA_TB006_DISTRIBUIVEIS] D
+                INNER JOIN #AtribuicaoCPF A ON D.NR_CPF_CNPJ = A.NR_CPF_CNPJ
+            """)), {"edital_id": edital_id, "periodo_id": periodo_id})
+            contratos_distribuidos = resultado.rowcount or 0
+
+            # Remover contratos distribuídos
+            connection.execute(text(sql_staging("""
+                DELETE D
+                FROM [BDG].[DCA_TB006_DISTRIBUIVEIS] D
+                INNER JOIN #AtribuicaoCPF A ON A.NR_CPF_CNPJ = D.NR_CPF_CNPJ;
+
+                DROP TABLE #AtribuicaoCPF;
+            """)))
+
+        print(f"Distribuição dos demais contratos (vetorizada) concluída: {contratos_distribuidos} "
+              f"contratos distribuídos (semente {semente})")
+
+    except Exception as e:
+        print(f"Erro ao distribuir demais contratos: {str(e)}")
+        import traceback
+        print(traceback.format_exc())
+
+    return contratos_distribuidos
+
+
+def distribuir_demais_contratos_cursor(edital_id, periodo_id):
     """
-    [VERSÃO CORRIGIDA - RESPEITA REGRA DE ARRASTO]
+    [VERSÃO ANTERIOR - CURSOR T-SQL, mantida para comparação/benchmark]
     Distribui os contratos restantes entre as empresas, AGRUPANDO POR CPF.
     Implementa o item 1.1.5 dos requisitos: Demais contratos sem acordo.
     """
@@ -726,7 +859,7 @@ def distribuir_demais_contratos(edital_id, periodo_id):
 
         # Verificar se existem empresas e contratos antes de iniciar o processamento
         empresas_count = db.session.execute(
-            text("""
+            text(sql_staging("""
                  SELECT COUNT(*)
                  FROM [BDG].[DCA_TB002_EMPRESAS_PARTICIPANTES] EP
                      LEFT JOIN [BDG].[DCA_TB003_LIMITES_DISTRIBUICAO] LD
@@ -738,7 +871,7 @@ def distribuir_demais_contratos(edital_id, periodo_id):
                    AND EP.DS_CONDICAO <> 'DESCREDENCIADA'
                    AND EP.ID_EMPRESA <> 223371
                    AND (LD.PERCENTUAL_FINAL > 0 OR LD.PERCENTUAL_FINAL IS NULL)
-                 """),
+                 """)),
             {"edital_id": edital_id, "periodo_id": periodo_id}
         ).scalar()
 
@@ -748,7 +881,7 @@ def distribuir_demais_contratos(edital_id, periodo_id):
 
         # Executar o script SQL principal
         db.session.execute(
-            text("""
+            text(sql_staging("""
             -- Declaração de variáveis
             DECLARE @contratos_distribuidos INT = 0;
 
@@ -967,17 +1100,17 @@ def distribuir_demais_contratos(edital_id, periodo_id):
             IF OBJECT_ID('tempdb..#CPFsRestantes') IS NOT NULL DROP TABLE #CPFsRestantes;
             IF OBJECT_ID('tempdb..#EmpresasInfo') IS NOT NULL DROP TABLE #EmpresasInfo;
             IF OBJECT_ID('tempdb..#AtribuicaoCPF') IS NOT NULL DROP TABLE #AtribuicaoCPF;
-            """),
+            """)),
             {"edital_id": edital_id, "periodo_id": periodo_id}
         )
 
         # Recuperar resultado
-        result = db.session.execute(text("SELECT contratos_distribuidos FROM ##ResultadoDemaisContratos")).scalar()
+        result = db.session.execute(text(sql_staging("SELECT contratos_distribuidos FROM ##ResultadoDemaisContratos"))).scalar()
         contratos_distribuidos = result if result is not None else 0
 
         # Limpar tabela temporária global
         db.session.execute(text(
-            "IF OBJECT_ID('tempdb..##ResultadoDemaisContratos') IS NOT NULL DROP TABLE ##ResultadoDemaisContratos"))
+            sql_staging("IF OBJECT_ID('tempdb..##ResultadoDemaisContratos') IS NOT NULL DROP TABLE ##ResultadoDemaisContratos")))
 
         print(f"Distribuição dos demais contratos (AGRUPADO POR CPF) concluída: {contratos_distribuidos} contratos distribuídos")
 
@@ -985,12 +1118,12 @@ def distribuir_demais_contratos(edital_id, periodo_id):
         db.session.rollback()
         # Limpeza em caso de erro
         try:
-            db.session.execute(text("""
+            db.session.execute(text(sql_staging("""
                 IF OBJECT_ID('tempdb..#CPFsRestantes') IS NOT NULL DROP TABLE #CPFsRestantes;
                 IF OBJECT_ID('tempdb..#EmpresasInfo') IS NOT NULL DROP TABLE #EmpresasInfo;
                 IF OBJECT_ID('tempdb..#AtribuicaoCPF') IS NOT NULL DROP TABLE #AtribuicaoCPF;
                 IF OBJECT_ID('tempdb..##ResultadoDemaisContratos') IS NOT NULL DROP TABLE ##ResultadoDemaisContratos;
-            """))
+            """)))
             db.session.commit()
         except:
             pass
@@ -1016,7 +1149,7 @@ def atualizar_limites_distribuicao(edital_id, periodo_id):
 
         # 1. Estatísticas por empresa (DCA_TB005) - AQUI a coluna é COD_EMPRESA_COBRANCA
         estatisticas = db.session.execute(
-            text("""
+            text(sql_staging("""
                  SELECT COD_EMPRESA_COBRANCA,
                         COUNT(*)           as quantidade,
                         SUM(VR_SD_DEVEDOR) as valor_total
@@ -1026,27 +1159,27 @@ def atualizar_limites_distribuicao(edital_id, periodo_id):
                    AND COD_EMPRESA_COBRANCA <> 223371
                    AND DELETED_AT IS NULL
                  GROUP BY COD_EMPRESA_COBRANCA
-                 """),
+                 """)),
             {"edital_id": edital_id, "periodo_id": periodo_id}
         ).fetchall()
 
         for empresa_id, qtde, valor_total in estatisticas:
             # 2. Verificar limite existente (DCA_TB003) - AQUI a coluna é ID_EMPRESA
             limite_existente = db.session.execute(
-                text("""
+                text(sql_staging("""
                      SELECT ID, PERCENTUAL_FINAL
                      FROM [BDG].[DCA_TB003_LIMITES_DISTRIBUICAO]
                      WHERE ID_EDITAL = :edital_id
                        AND ID_PERIODO = :periodo_id
                        AND ID_EMPRESA = :empresa_id
                        AND DELETED_AT IS NULL
-                     """),
+                     """)),
                 {"edital_id": edital_id, "periodo_id": periodo_id, "empresa_id": empresa_id}
             ).fetchone()
 
             if not limite_existente:
                 db.session.execute(
-                    text("""
+                    text(sql_staging("""
                          INSERT INTO [BDG].[DCA_TB003_LIMITES_DISTRIBUICAO]
                          (ID_EDITAL, ID_PERIODO, ID_EMPRESA, COD_CRITERIO_SELECAO,
                           QTDE_MAXIMA, VALOR_MAXIMO, PERCENTUAL_FINAL,
@@ -1056,7 +1189,7 @@ def atualizar_limites_distribuicao(edital_id, periodo_id):
                              :qtde, :valor_total, 0,
                              :valor_total, GETDATE(), GETDATE()
                              )
-                         """),
+                         """)),
                     {
                         "edital_id": edital_id,
                         "periodo_id": periodo_id,
@@ -1067,7 +1200,7 @@ def atualizar_limites_distribuicao(edital_id, periodo_id):
                 )
             else:
                 db.session.execute(
-                    text("""
+                    text(sql_staging("""
                          UPDATE [BDG].[DCA_TB003_LIMITES_DISTRIBUICAO]
                          SET VR_ARRECADACAO = :valor_total,
                              QTDE_MAXIMA    = :qtde,
@@ -1077,7 +1210,7 @@ def atualizar_limites_distribuicao(edital_id, periodo_id):
                          WHERE ID_EDITAL = :edital_id
                            AND ID_PERIODO = :periodo_id
                            AND ID_EMPRESA = :empresa_id
-                         """),
+                         """)),
                     {
                         "edital_id": edital_id,
                         "periodo_id": periodo_id,
@@ -1091,14 +1224,14 @@ def atualizar_limites_distribuicao(edital_id, periodo_id):
         print("Atualização dos limites de distribuição concluída com sucesso")
 
         limites = db.session.execute(
-            text("""
+            text(sql_staging("""
                  SELECT ID_EMPRESA, VR_ARRECADACAO, QTDE_MAXIMA, VALOR_MAXIMO, PERCENTUAL_FINAL
                  FROM [BDG].[DCA_TB003_LIMITES_DISTRIBUICAO]
                  WHERE ID_EDITAL = :edital_id
                    AND ID_PERIODO = :periodo_id
                    AND DELETED_AT IS NULL
                  ORDER BY PERCENTUAL_FINAL DESC
-                 """),
+                 """)),
             {"edital_id": edital_id, "periodo_id": periodo_id}
         ).fetchall()
 
@@ -1137,7 +1270,7 @@ def obter_resultados_finais_distribuicao(edital_id, periodo_id):
     try:
         print(f"Obtendo resultados finais da distribuição - Edital: {edital_id}, Período: {periodo_id}")
 
-        query = text("""
+        query = text(sql_staging("""
                      SELECT
                         DIS.[COD_EMPRESA_COBRANCA],
                         COALESCE(
@@ -1159,7 +1292,7 @@ def obter_resultados_finais_distribuicao(edital_id, periodo_id):
                        AND DIS.DELETED_AT IS NULL
                      GROUP BY DIS.[COD_EMPRESA_COBRANCA]
                      ORDER BY NO_EMPRESA_ABREVIADA
-                     """)
+                     """))
 
         resultados = db.session.execute(query, {"edital_id": edital_id, "periodo_id": periodo_id}).fetchall()
 
@@ -1285,7 +1418,7 @@ def distribuir_contratos_descredenciada_igualitariamente_especifica(edital_id, p
         print(f"--- EXECUTANDO VERSÃO CORRIGIDA (AGRUPADA POR CPF) ---")
         print(f"Iniciando distribuição igualitária para empresa {empresa_descredenciada_id}")
 
-        sql_script = text("""
+        sql_script = text(sql_staging("""
             SET NOCOUNT ON;
 
             IF OBJECT_ID('tempdb..#CPFsParaDistribuir') IS NOT NULL DROP TABLE #CPFsParaDistribuir;
@@ -1369,7 +1502,7 @@ def distribuir_contratos_descredenciada_igualitariamente_especifica(edital_id, p
             DROP TABLE #CpfEmpresaMap;
 
             SELECT @ContratosInseridos AS ContratosDistribuidos;
-        """)
+        """))
 
         params = {
             "empresa_id": empresa_descredenciada_id,
@@ -1403,15 +1536,32 @@ def distribuir_contratos_descredenciada_igualitariamente_especifica(edital_id, p
 
 
 def processar_distribuicao_completa(edital_id, periodo_id, usar_distribuicao_igualitaria=False,
-                                    empresa_descredenciada_id=None, data_fim_periodo_anterior=None):
+                                    empresa_descredenciada_id=None, data_fim_periodo_anterior=None,
+                                    staging_isolado=False, semente=None):
     """
     Executa todo o processo de distribuição em ordem, com DIAGNÓSTICO e RASTREAMENTO DE ERROS.
     Cada etapa é isolada: se falhar, o erro real é impresso no console e registrado em
     resultados['erros'], em vez de ser engolido silenciosamente.
     A SERASA (223371) é alocada por regra fixa e NÃO participa do rateio das assessorias.
+
+    staging_isolado=True usa DCA_TB006/DCA_TB007 próprias desta execução (ver
+    staging_distribuicao), permitindo rodar em paralelo com outros editais/períodos.
+    semente fixa o sorteio dos demais contratos; a usada volta em resultados['semente'].
     """
+    if staging_isolado:
+        with staging_execucao():
+            return processar_distribuicao_completa(
+                edital_id, periodo_id,
+                usar_distribuicao_igualitaria=usar_distribuicao_igualitaria,
+                empresa_descredenciada_id=empresa_descredenciada_id,
+                data_fim_periodo_anterior=data_fim_periodo_anterior,
+                semente=semente)
+
     import time
 
+    if semente is None:
+        semente = int(np.random.SeedSequence().entropy % (2 ** 32))
+
     resultados = {
         'contratos_distribuiveis': 0,
         'acordos_empresas_permanece': 0,
@@ -1423,17 +1573,20 @@ def processar_distribuicao_completa(edital_id, periodo_id, usar_distribuicao_igu
         'total_distribuido': 0,
         'contratos_restantes': 0,
         'erros': [],
-        'usou_distribuicao_igualitaria': usar_distribuicao_igualitaria
+        'usou_distribuicao_igualitaria': usar_distribuicao_igualitaria,
+        'semente': semente
     }
 
     def _etapa(nome, funcao, *args, **kwargs):
         """Executa uma etapa isolada, medindo tempo e capturando o erro real."""
         print(f"\n>>> INICIANDO ETAPA: {nome}")
+        iniciar_etapa(nome)
         inicio = time.time()
         try:
             retorno = funcao(*args, **kwargs)
             decorrido = time.time() - inicio
             print(f"<<< ETAPA '{nome}' OK: {retorno} em {decorrido:.2f}s")
+            concluir_etapa(nome, retorno=retorno, decorrido=decorrido)
             return retorno
         except Exception as e:
             decorrido = time.time() - inicio
@@ -1442,6 +1595,7 @@ def processar_distribuicao_completa(edital_id, periodo_id, usar_distribuicao_igu
             import traceback
             traceback.print_exc()
             resultados['erros'].append(msg)
+            concluir_etapa(nome, erro=e, decorrido=decorrido)
             return 0
 
     try:
@@ -1508,7 +1662,7 @@ def processar_distribuicao_completa(edital_id, periodo_id, usar_distribuicao_igu
             'Arrasto SEM acordo', aplicar_regra_arrasto_sem_acordo, edital_id, periodo_id)
 
         resultados['demais_contratos'] = _etapa(
-            'Demais contratos', distribuir_demais_contratos, edital_id, periodo_id)
+            'Demais contratos', distribuir_demais_contratos, edital_id, periodo_id, semente=semente)
 
         # ============================================================
         # TOTAIS
@@ -1524,13 +1678,15 @@ def processar_distribuicao_completa(edital_id, periodo_id, usar_distribuicao_igu
 
         try:
             resultados['contratos_restantes'] = db.session.execute(
-                text("SELECT COUNT(*) FROM [BDG].[DCA_TB006_DISTRIBUIVEIS]")).scalar()
+                text(sql_staging("SELECT COUNT(*) FROM [BDG].[DCA_TB006_DISTRIBUIVEIS]"))).scalar()
         except Exception as e:
             print(f"!!! Erro ao contar restantes: {e}")
 
         _etapa('Atualizar limites', atualizar_limites_distribuicao, edital_id, periodo_id)
         resultados['resultados_finais'] = _etapa(
             'Resultados finais', obter_resultados_finais_distribuicao, edital_id, periodo_id)
+        if not em_simulacao():
+            _etapa('Cubo do dashboard', reconstruir_cubo_dashboard, edital_id, periodo_id)
 
         # ============================================================
         # RESUMO NO CONSOLE
@@ -1563,6 +1719,66 @@ def processar_distribuicao_completa(edital_id, periodo_id, usar_distribuicao_igu
         resultados['erros'].append(msg)
         return resultados
 
+def simular_distribuicao(edital_id, periodo_id, percentuais=None, usar_distribuicao_igualitaria=False,
+                         empresa_descredenciada_id=None, data_fim_periodo_anterior=None, semente=None):
+    """
+    Executa a distribuição completa em MODO SIMULAÇÃO: todas as etapas rodam
+    sobre cópias da DCA_TB005/DCA_TB003 desta execução (ver simulacao_execucao)
+    e nada é gravado nas tabelas de produção. Não exige o lock da distribuição.
+
+    percentuais -> {ID_EMPRESA: PERCENTUAL_FINAL} do cenário a testar
+    Retorna o mesmo dicionário de processar_distribuicao_completa com
+    'simulacao': True e 'limites' (percentual, quantidade e saldo por empresa).
+    """
+    with simulacao_execucao(edital_id, periodo_id, percentuais):
+        resultados = processar_distribuicao_completa(
+            edital_id, periodo_id,
+            usar_distribuicao_igualitaria=usar_distribuicao_igualitaria,
+            empresa_descredenciada_id=empresa_descredenciada_id,
+            data_fim_periodo_anterior=data_fim_periodo_anterior,
+            semente=semente)
+        resultados['limites'] = _obter_limites_simulacao(edital_id, periodo_id)
+
+    resultados['simulacao'] = True
+    resultados['percentuais_simulados'] = {str(k): float(v) for k, v in (percentuais or {}).items()}
+    return resultados
+
+
+def _obter_limites_simulacao(edital_id, periodo_id):
+    """PERCENTUAL_FINAL do cenário x quantidade/saldo obtidos, por empresa."""
+    try:
+        limites = db.session.execute(text(sql_staging("""
+            SELECT LD.ID_EMPRESA,
+                   COALESCE(MAX(EMP.NO_EMPRESA_ABREVIADA), CAST(LD.ID_EMPRESA AS VARCHAR(20))) AS NO_EMPRESA_ABREVIADA,
+                   MAX(LD.PERCENTUAL_FINAL) AS PERCENTUAL_FINAL,
+                   MAX(LD.QTDE_MAXIMA)      AS QTDE,
+                   MAX(LD.VALOR_MAXIMO)     AS SALDO
+            FROM [BDG].[DCA_TB003_LIMITES_DISTRIBUICAO] LD
+            LEFT JOIN [BDG].[DCA_TB002_EMPRESAS_PARTICIPANTES] EMP
+                ON EMP.ID_EMPRESA = LD.ID_EMPRESA
+                AND EMP.ID_EDITAL = LD.ID_EDITAL
+                AND EMP.ID_PERIODO = LD.ID_PERIODO
+            WHERE LD.ID_EDITAL = :edital_id
+              AND LD.ID_PERIODO = :periodo_id
+              AND LD.DELETED_AT IS NULL
+            GROUP BY LD.ID_EMPRESA
+            ORDER BY PERCENTUAL_FINAL DESC
+        """)), {"edital_id": edital_id, "periodo_id": periodo_id}).fetchall()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao obter limites da simulação: {str(e)}")
+        return []
+
+    return [{
+        'id_empresa': row[0],
+        'empresa_abrev': row[1],
+        'percentual_final': float(row[2] or 0),
+        'qtde': int(row[3] or 0),
+        'saldo': float(row[4] or 0)
+    } for row in limites]
+
+
 def distribuir_contratos_serasa(edital_id, periodo_id):
     """
     Aloca para a SERASA (empresa 223371) os contratos dos CPFs marcados como SERASA
@@ -1587,7 +1803,7 @@ def distribuir_contratos_serasa(edital_id, periodo_id):
     try:
         print(f"Iniciando distribuição SERASA (223371) - Edital: {edital_id}, Período: {periodo_id}")
 
-        sql_script = text("""
+        sql_script = text(sql_staging("""
             SET NOCOUNT ON;
 
             -- CPFs base SERASA (<= 1.000)
@@ -1654,7 +1870,7 @@ def distribuir_contratos_serasa(edital_id, periodo_id):
             DROP TABLE #CPFsAcordoPermanece;
 
             SELECT @ContratosSerasa AS ContratosSerasa;
-        """)
+        """))
 
         with db.engine.begin() as connection:
             result = connection.execute(sql_script, {
@@ -1686,7 +1902,7 @@ def diagnosticar_distribuicao(edital_id, periodo_id):
     problemas = []
 
     def _scalar(sql, params=None):
-        return db.session.execute(text(sql), params or {}).scalar()
+        return db.session.execute(text(sql_staging(sql)), params or {}).scalar()
 
     try:
         # 1) Fonte de dados
@@ -1732,12 +1948,12 @@ def diagnosticar_distribuicao(edital_id, periodo_id):
             problemas.append("Existem empresas, mas NENHUMA elegível a receber contratos.")
 
         # 4) Limites
-        limites = db.session.execute(text("""
+        limites = db.session.execute(text(sql_staging("""
             SELECT ID_EMPRESA, PERCENTUAL_FINAL
             FROM [BDG].[DCA_TB003_LIMITES_DISTRIBUICAO]
             WHERE ID_EDITAL = :e AND ID_PERIODO = :p AND DELETED_AT IS NULL
             ORDER BY ID_EMPRESA
-        """), {"e": edital_id, "p": periodo_id}).fetchall()
+        """)), {"e": edital_id, "p": periodo_id}).fetchall()
         print(f"[4] Limites em DCA_TB003.....................: {len(limites)}")
         soma_pct = 0.0
         for lim in limites:
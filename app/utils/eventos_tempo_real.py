@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/eventos_tempo_real.py
+
+Pub/sub em processo para empurrar eventos (chat e notificações) aos navegadores
+via Server-Sent Events (rota /eventos/stream).
+
+Antes, chat/conversa.html consultava /chat/novas a cada 5 s e toda página
+chamava /notificacoes/obter-nao-lidas. Agora quem grava uma Mensagem ou ativa
+uma Notificacao chama publicar(...) e o evento chega pela conexão SSE aberta;
+as rotas antigas ficam só como fallback (navegador sem EventSource ou limite
+de conexões atingido).
+
+Canais:
+    'usuario:<id>'  -> eventos de um usuário (nova mensagem de chat)
+    'todos'         -> eventos para todos os logados (nova notificação)
+
+Backends (EVENTOS_BROKER no config):
+    ausente          -> BackendMemoria: um processo só (Waitress multi-thread)
+    'host:porta'     -> BackendBrokerLocal: vários processos trocam eventos por
+                        um broker local, cada processo entrega aos seus
+                        assinantes em memória
+
+Broker: python -m app.utils.eventos_tempo_real [host:]porta [chave]
+(host padrão 127.0.0.1; chave no argumento ou em EVENTOS_BROKER_CHAVE no
+ambiente). O app usa a mesma chave em EVENTOS_BROKER_CHAVE no config; sem
+chave, nem o broker nem o backend sobem.
+
+Protocolo: socket TCP simples, quadros JSON com prefixo de tamanho (4 bytes,
+big-endian). Ao conectar, o broker manda um desafio aleatório e o processo
+responde com HMAC-SHA256(chave, desafio); o broker confirma e só então
+os dois trocam eventos. Nada é desserializado com pickle.
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import queue
+import secrets
+import socket
+import struct
+import threading
+import time
+
+from app.utils.log_seguro import log_info, log_erro
+
+CANAL_TODOS = 'todos'
+MAX_FILA_ASSINANTE = 100
+HOST_BROKER_PADRAO = '127.0.0.1'
+TAMANHO_MAXIMO_QUADRO = 1024 * 1024
+TIMEOUT_AUTENTICACAO = 10
+
+
+def canal_usuario(usuario_id):
+    return 'usuario:{0}'.format(int(usuario_id))
+
+
+def _chave_bytes(chave):
+    if not chave:
+        raise RuntimeError('EVENTOS_BROKER_CHAVE não configurada: o broker de eventos exige uma chave.')
+    return chave.encode('utf-8') if isinstance(chave, str) else chave
+
+
+def _enviar_quadro(sock, objeto):
+    corpo = json.dumps(objeto, ensure_ascii=False, default=str).encode('utf-8')
+    sock.sendall(struct.pack('>I', len(corpo)) + corpo)
+
+
+def _receber_exato(sock, tamanho):
+    partes = []
+    while tamanho:
+        parte = sock.recv(min(tamanho, 65536))
+        if not parte:
+            raise EOFError('conexão encerrada')
+        partes.append(parte)
+        tamanho -= len(parte)
+    return b''.join(partes)
+
+
+def _receber_quadro(sock):
+    (tamanho,) = struct.unpack('>I', _receber_exato(sock, 4))
+    if tamanho > TAMANHO_MAXIMO_QUADRO:
+        raise ValueError('quadro de {0} bytes excede o limite'.format(tamanho))
+    return json.loads(_receber_exato(sock, tamanho).decode('utf-8'))
+
+
+def _assinar_desafio(chave, desafio):
+    return hmac.new(chave, desafio.encode('ascii'), hashlib.sha256).hexdigest()
+
+
+def _conectar_broker(endereco, chave):
+    """Conecta e responde ao desafio do broker. Retorna o socket autenticado."""
+    sock = socket.create_connection(endereco, timeout=TIMEOUT_AUTENTICACAO)
+    try:
+        desafio = _receber_quadro(sock)['desafio']
+        _enviar_quadro(sock, {'resposta': _assinar_desafio(chave, desafio)})
+        if not _receber_quadro(sock).get('autenticado'):
+            raise PermissionError('chave recusada pelo broker')
+        sock.settimeout(None)
+        return sock
+    except Exception:
+        sock.close()
+        raise
+
+
+def _autenticar_processo(sock, chave):
+    """Lado do broker: True se o processo provar que conhece a chave."""
+    desafio = secrets.token_hex(32)
+    sock.settimeout(TIMEOUT_AUTENTICACAO)
+    _enviar_quadro(sock, {'desafio': desafio})
+    resposta = _receber_quadro(sock).get('resposta')
+    autenticado = isinstance(resposta, str) and hmac.compare_digest(resposta, _assinar_desafio(chave, desafio))
+    _enviar_quadro(sock, {'autenticado': autenticado})
+    sock.settimeout(None)
+    return autenticado
+
+
+class Assinatura(object):
+    """Fila de eventos de uma conexão SSE."""
+
+    def __init__(self, canais):
+        self.canais = tuple(canais)
+        self.fila = queue.Queue(maxsize=MAX_FILA_ASSINANTE)
+
+    def entregar(self, evento):
+        try:
+            self.fila.put_nowait(evento)
+        except queue.Full:
+            # Cliente lento/parado: descarta o evento (o fallback recupera no próximo carregamento)
+            pass
+
+    def proximo(self, timeout):
+        """Próximo evento ou None se nada chegar em `timeout` segundos."""
+        try:
+            return self.fila.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class BackendMemoria(object):
+    """Entrega direta aos assinantes do próprio processo."""
+
+    def __init__(self):
+        self._canais = {}
+        self._lock = threading.Lock()
+
+    def assinar(self, canais):
+        assinatura = Assinatura(canais)
+        with self._lock:
+            for canal in assinatura.canais:
+                self._canais.setdefault(canal, set()).add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura):
+        with self._lock:
+            for canal in assinatura.canais:
+                assinantes = self._canais.get(canal)
+                if assinantes is not None:
+                    assinantes.discard(assinatura)
+                    if not assinantes:
+                        del self._canais[canal]
+
+    def entregar_local(self, canal, evento):
+        with self._lock:
+            assinantes = list(self._canais.get(canal, ()))
+        for assinatura in assinantes:
+            assinatura.entregar(evento)
+        return len(assinantes)
+
+    def publicar(self, canal, evento):
+        return self.entregar_local(canal, evento)
+
+    def total_assinantes(self):
+        with self._lock:
+            return len(set().union(*self._canais.values())) if self._canais else 0
+
+
+class BackendBrokerLocal(BackendMemoria):
+    """
+    Publica no broker local, que repassa a todos os processos conectados
+    (inclusive o que publicou); cada processo entrega aos seus assinantes.
+    Broker fora do ar -> entrega só no processo local e tenta reconectar.
+    """
+
+    ESPERA_RECONEXAO = 5
+
+    def __init__(self, endereco, chave):
+        BackendMemoria.__init__(self)
+        self.endereco = endereco
+        self.chave = _chave_bytes(chave)
+        self._conexao = None
+        self._envio_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._receber, name='EventosBroker', daemon=True)
+        self._thread.start()
+
+    def _receber(self):
+        while True:
+            try:
+                conexao = _conectar_broker(self.endereco, self.chave)
+                with self._envio_lock:
+                    self._conexao = conexao
+                log_info("Eventos: conectado ao broker {0}:{1}".format(*self.endereco))
+                while True:
+                    mensagem = _receber_quadro(conexao)
+                    self.entregar_local(mensagem['canal'], mensagem['evento'])
+            except Exception as e:
+                with self._envio_lock:
+                    if self._conexao is not None:
+                        self._conexao.close()
+                    self._conexao = None
+                log_erro("Eventos: broker {0}:{1} indisponível ({2})".format(
+                    self.endereco[0], self.endereco[1], repr(e)))
+                time.sleep(self.ESPERA_RECONEXAO)
+
+    def publicar(self, canal, evento):
+        with self._envio_lock:
+            conexao = self._conexao
+            if conexao is not None:
+                try:
+                    _enviar_quadro(conexao, {'canal': canal, 'evento': evento})
+                    return None
+                except Exception as e:
+                    log_erro("Eventos: falha ao publicar no broker: {0}".format(repr(e)))
+                    conexao.close()
+                    self._conexao = None
+        return self.entregar_local(canal, evento)
+
+
+_backend = BackendMemoria()
+
+
+def configurar_eventos(app):
+    """
+    Escolhe o backend conforme EVENTOS_BROKER ('host:porta') no config.
+    Com broker, EVENTOS_BROKER_CHAVE é obrigatória (RuntimeError sem ela).
+    """
+    global _backend
+    endereco = app.config.get('EVENTOS_BROKER')
+    if not endereco:
+        return _backend
+    host, porta = endereco.rsplit(':', 1)
+    if isinstance(_backend, BackendBrokerLocal) and _backend.endereco == (host, int(porta)):
+        return _backend
+    _backend = BackendBrokerLocal((host, int(porta)), app.config.get('EVENTOS_BROKER_CHAVE'))
+    return _backend
+
+
+def publicar(canal, tipo, dados):
+    """Publica um evento {'tipo', 'dados'}; nunca levanta (o fallback cobre falhas)."""
+    try:
+        _backend.publicar(canal, {'tipo': tipo, 'dados': dados})
+    except Exception as e:
+        log_erro("Erro ao publicar evento {0} em {1}: {2}".format(tipo, canal, repr(e)))
+
+
+def publicar_usuario(usuario_id, tipo, dados):
+    publicar(canal_usuario(usuario_id), tipo, dados)
+
+
+def publicar_todos(tipo, dados):
+    publicar(CANAL_TODOS, tipo, dados)
+
+
+def assinar(canais):
+    return _backend.assinar(canais)
+
+
+def cancelar(assinatura):
+    _backend.cancelar(assinatura)
+
+
+def total_assinantes():
+    return _backend.total_assinantes()
+
+
+def executar_broker(endereco, chave):
+    """Broker local: repassa cada {'canal', 'evento'} recebido a todos os processos conectados."""
+    chave = _chave_bytes(chave)
+    conexoes = set()
+    lock = threading.Lock()
+    envio_lock = threading.Lock()  # sendall de várias threads intercalaria os quadros
+
+    def atender(conexao, origem):
+        try:
+            if not _autenticar_processo(conexao, chave):
+                log_erro("Broker de eventos: chave inválida de {0}:{1}".format(*origem))
+                return
+            with lock:
+                conexoes.add(conexao)
+            while True:
+                mensagem = _receber_quadro(conexao)
+                if not isinstance(mensagem, dict) or 'canal' not in mensagem or 'evento' not in mensagem:
+                    continue
+                with lock:
+                    destinos = list(conexoes)
+                with envio_lock:
+                    for destino in destinos:
+                        try:
+                            _enviar_quadro(destino, mensagem)
+                        except OSError:
+                            with lock:
+                                conexoes.discard(destino)
+        except (EOFError, OSError, ValueError) as e:
+            if not isinstance(e, EOFError):
+                log_erro("Broker de eventos: conexão {0}:{1} encerrada ({2})".format(
+                    origem[0], origem[1], repr(e)))
+        finally:
+            with lock:
+                conexoes.discard(conexao)
+            conexao.close()
+
+    servidor = socket.create_server(endereco)
+    log_info("Broker de eventos ouvindo em {0}:{1}".format(*endereco))
+    while True:
+        try:
+            conexao, origem = servidor.accept()
+        except OSError as e:
+            log_erro("Broker de eventos: falha ao aceitar conexão ({0})".format(repr(e)))
+            continue
+        threading.Thread(target=atender, args=(conexao, origem[:2]), daemon=True).start()
+
+
+if __name__ == '__main__':
+    import sys
+
+    alvo = sys.argv[1] if len(sys.argv) > 1 else '6390'
+    host_broker, _, porta_broker = alvo.rpartition(':')
+    chave_broker = sys.argv[2] if len(sys.argv) > 2 else os.environ.get('EVENTOS_BROKER_CHAVE')
+    if not chave_broker:
+        sys.exit('Informe a chave (2º argumento ou EVENTOS_BROKER_CHAVE no ambiente); '
+                 'a mesma de EVENTOS_BROKER_CHAVE no config do app.')
+    executar_broker((host_broker or HOST_BROKER_PADRAO, int(porta_broker)), chave_broker)
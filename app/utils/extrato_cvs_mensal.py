@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/extrato_cvs_mensal.py
+
+Geração set-based do próximo mês do Extrato CVS ([BDG].[FIN_TB013_EXTRATO_CVS]).
+
+Antes, /extrato/processar-provisoes lia cada fonte para a memória, criava um
+ExtratoCVS por linha e recalculava o VR_SALDO linha a linha em Python.
+Agora cada mês é montado no SQL Server:
+    1. um único INSERT ... SELECT (UNION ALL) monta a #ExtratoNovo com as seis
+       etapas - Estornos das provisões do mês anterior, Incorporações
+       (FIN_TB014), Recebimentos IR (FIN_VW006), Entrada Títulos Pro Rata
+       (FIN_VW007), Provisão ATM/Juros (FIN_VW008) e Provisão Pro Rata
+       (FIN_VW010), estas duas com duas linhas por registro;
+    2. ORDEM = ROW_NUMBER() na ordem das etapas (a mesma de antes);
+    3. um INSERT ... SELECT grava o mês, com VR_SALDO calculado por
+       SUM() OVER (ORDER BY DT_MOVIMENTACAO, ORDEM) a partir do saldo anterior.
+
+processar_extrato encadeia meses (recuperação de vários meses pendentes, cada
+um na sua transação) ou simula (executa tudo e desfaz: pré-visualização).
+O AJUSTE da FIN_VW011 continua fora daqui (/extrato/ajustar-saldo).
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from app import db
+from app.utils.log_seguro import log_info
+from app.utils.processo_jobs import concluir_etapa
+
+TABELA_EXTRATO = '[BDG].[FIN_TB013_EXTRATO_CVS]'
+
+# sp_getapplock: um processamento do extrato por vez
+RECURSO_LOCK = 'FIN_TB013_EXTRATO_CVS'
+
+# Limite de meses numa recuperação (evita laço longo por engano no "até")
+MAX_MESES_RECUPERACAO = 36
+
+LIMITE_ORDEM = 32767
+
+# (etapa na #ExtratoNovo, chave no resultado)
+ETAPAS = [
+    (1, 'estornos_inseridos'),
+    (2, 'incorporacoes_inseridas'),
+    (3, 'recebimentos_ir_inseridos'),
+    (4, 'entrada_pro_rata_inseridas'),
+    (5, 'provisao_atm_juros_inseridas'),
+    (6, 'provisao_pro_rata_inseridas'),
+]
+
+SQL_ULTIMA_DATA = "SELECT MAX([DT_MOVIMENTACAO]) FROM {extrato}"
+
+SQL_PRIMEIRO_DIA_UTIL = """
+    SELECT TOP 1 [DIA]
+    FROM [BDG].[PAR_TB020_CALENDARIO]
+    WHERE [DIA] BETWEEN :dt_ini AND :dt_fim
+      AND [DIA_UTIL] = 1
+    ORDER BY [DIA] ASC
+"""
+
+SQL_PROXIMA_ORDEM = """
+    SELECT ISNULL(MAX([ORDEM]), 0) + 1
+    FROM {extrato}
+    WHERE [DT_MOVIMENTACAO] >= :ini_destino AND [DT_MOVIMENTACAO] < :ini_seguinte
+"""
+
+SQL_SALDO_ANTERIOR = """
+    SELECT TOP 1 [VR_SALDO]
+    FROM {extrato}
+    WHERE [DT_MOVIMENTACAO] < :dt_limite
+      AND [VR_SALDO] IS NOT NULL
+    ORDER BY [DT_MOVIMENTACAO] DESC, [ORDEM] DESC
+"""
+
+SQL_CRIAR_STAGING = """
+    IF OBJECT_ID('tempdb..#ExtratoNovo') IS NOT NULL DROP TABLE #ExtratoNovo;
+    CREATE TABLE #ExtratoNovo (
+        ETAPA TINYINT NOT NULL,
+        SEQ_ORIGEM INT NOT NULL,
+        SUB TINYINT NOT NULL,
+        DT_MOVIMENTACAO DATE NOT NULL,
+        TIPO NVARCHAR(3) NULL,
+        HISTORICO NVARCHAR(150) NULL,
+        PERIODO_DE DATE NULL,
+        PERIODO_ATE DATE NULL,
+        VR_MOVIMENTACAO DECIMAL(18, 2) NULL
+    );
+"""
+
+# SEQ_ORIGEM reproduz o ORDER BY de cada fonte; SUB separa as duas linhas
+# geradas por registro da FIN_VW008/FIN_VW010.
+SQL_MONTAR_MES = """
+    INSERT INTO #ExtratoNovo
+        (ETAPA, SEQ_ORIGEM, SUB, DT_MOVIMENTACAO, TIPO, HISTORICO, PERIODO_DE, PERIODO_ATE, VR_MOVIMENTACAO)
+
+    -- 1. Estornos das provisões do mês anterior ('Provisão...' -> 'Estorno...')
+    SELECT 1, ROW_NUMBER() OVER (ORDER BY E.[ORDEM]), 1, :dt_estorno, E.[TIPO],
+           N'Estorno' + SUBSTRING(E.[HISTORICO], 9, 150),
+           E.[PERIODO_DE], E.[PERIODO_ATE], -E.[VR_MOVIMENTACAO]
+    FROM {extrato} E
+    WHERE E.[DT_MOVIMENTACAO] >= :ini_origem AND E.[DT_MOVIMENTACAO] < :ini_destino
+      AND (E.[HISTORICO] LIKE N'Provisão%' OR E.[HISTORICO] LIKE N'Provisao%')
+
+    UNION ALL
+    -- 2. Incorporações (FIN_TB014)
+    SELECT 2, ROW_NUMBER() OVER (ORDER BY I.[DT_MOVIMENTACAO], I.[TIPO]), 1, :ini_destino, I.[TIPO],
+           I.[HISTORICO], I.[PERIODO_DE], I.[PERIODO_ATE], I.[VR_MOVIMENTACAO]
+    FROM [BDG].[FIN_TB014_INCORPORACOES_MES_CVS] I
+    WHERE I.[DT_MOVIMENTACAO] >= :ini_destino AND I.[DT_MOVIMENTACAO] < :ini_seguinte
+
+    UNION ALL
+    -- 3. Recebimentos IR (FIN_VW006)
+    SELECT 3, ROW_NUMBER() OVER (ORDER BY R.[DT_PREV_RECEBIMENTO], R.[TIPO]), 1, R.[DT_PREV_RECEBIMENTO], R.[TIPO],
+           R.[HISTORICO], R.[PERIODO_DE], R.[PERIODO_ATE], R.[MOVIMENTACAO]
+    FROM [BDDASHBOARDBI].[BDG].[FIN_VW006_RECEBIMENTO_IR_CVS] R
+    WHERE R.[DT_PREV_RECEBIMENTO] >= :ini_destino AND R.[DT_PREV_RECEBIMENTO] < :ini_seguinte
+
+    UNION ALL
+    -- 4. Entrada Títulos Pro Rata (FIN_VW007): (PU + juros pro rata) x quantidade
+    SELECT 4, ROW_NUMBER() OVER (ORDER BY P.[DT_ATUALIZACAO], P.[TIPO]), 1, P.[DT_ATUALIZACAO], P.[TIPO],
+           P.[HISTORICO], P.[DT_ATUALIZACAO], P.[DT_ATUALIZACAO],
+           (P.[PU_ATU_PRO] + P.[VR_JR_PRORATA]) * P.[QTDE_TITULOS]
+    FROM [BDG].[FIN_VW007_ENTRADA_TITULOS_PRORATA_CVS] P
+    WHERE P.[DT_ATUALIZACAO] >= :ini_destino AND P.[DT_ATUALIZACAO] < :ini_seguinte
+
+    UNION ALL
+    -- 5. Provisão ATM/Juros (FIN_VW008): duas linhas por registro
+    SELECT 5, A.SEQ_ORIGEM, L.SUB, A.[DT_ATUALIZACAO], A.[TIPO],
+           L.HISTORICO, A.[PERIODO_DE], A.[PERIODO_ATE], L.MOVIMENTACAO
+    FROM (
+        SELECT V.*, ROW_NUMBER() OVER (ORDER BY V.[DT_ATUALIZACAO], V.[TIPO]) AS SEQ_ORIGEM
+        FROM [BDG].[FIN_VW008_PROVISAO_ATM_JUROS_CVS] V
+        WHERE V.[DT_ATUALIZACAO] >= :ini_destino AND V.[DT_ATUALIZACAO] < :ini_seguinte
+    ) A
+    CROSS APPLY (VALUES
+        (1, A.[HISTORICO1], A.[MOVIMENTACAO1]),
+        (2, A.[HISTORICO2], A.[MOVIMENTACAO2])
+    ) L (SUB, HISTORICO, MOVIMENTACAO)
+
+    UNION ALL
+    -- 6. Provisão Pro Rata (FIN_VW010): duas linhas por registro
+    SELECT 6, B.SEQ_ORIGEM, L.SUB, B.[DT_ATUALIZACAO], B.[TIPO],
+           L.HISTORICO, B.[PERIODO_DE], B.[PERIODO_ATE], L.MOVIMENTACAO
+    FROM (
+        SELECT V.*, ROW_NUMBER() OVER (ORDER BY V.[DT_ATUALIZACAO], V.[TIPO]) AS SEQ_ORIGEM
+        FROM [BDG].[FIN_VW010_PROVISAO_PRORATA_CVS] V
+        WHERE V.[DT_ATUALIZACAO] >= :ini_destino AND V.[DT_ATUALIZACAO] < :ini_seguinte
+    ) B
+    CROSS APPLY (VALUES
+        (1, B.[HISTORICO], B.[MOVIMENTACAO]),
+        (2, B.[HISTORICO2], B.[MOVIMENTACAO2])
+    ) L (SUB, HISTORICO, MOVIMENTACAO);
+"""
+
+SQL_CONTAR_ETAPAS = "SELECT ETAPA, COUNT(*) FROM #ExtratoNovo GROUP BY ETAPA"
+
+# Saldo corrente por window function (mesma ordem do recálculo antigo)
+SQL_GRAVAR_MES = """
+    INSERT INTO {extrato}
+        ([DT_MOVIMENTACAO], [ORDEM], [DT_CARGA], [TIPO], [HISTORICO],
+         [PERIODO_DE], [PERIODO_ATE], [VR_MOVIMENTACAO], [VR_SALDO])
+    SELECT N.DT_MOVIMENTACAO, N.ORDEM, :dt_carga, N.TIPO, N.HISTORICO,
+           N.PERIODO_DE, N.PERIODO_ATE, N.VR_MOVIMENTACAO,
+           CAST(:saldo_anterior AS DECIMAL(18, 2)) + SUM(ISNULL(N.VR_MOVIMENTACAO, 0)) OVER (
+               ORDER BY N.DT_MOVIMENTACAO, N.ORDEM
+               ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+           )
+    FROM (
+        SELECT S.*,
+               :ordem_inicial - 1 + ROW_NUMBER() OVER (ORDER BY S.ETAPA, S.SEQ_ORIGEM, S.SUB) AS ORDEM
+        FROM #ExtratoNovo S
+    ) N
+"""
+
+SQL_LINHAS_MES = """
+    SELECT [DT_MOVIMENTACAO], [ORDEM], [TIPO], [HISTORICO], [PERIODO_DE], [PERIODO_ATE],
+           [VR_MOVIMENTACAO], [VR_SALDO]
+    FROM {extrato}
+    WHERE [DT_MOVIMENTACAO] >= :ini_destino AND [DT_MOVIMENTACAO] < :ini_seguinte
+    ORDER BY [DT_MOVIMENTACAO], [ORDEM]
+"""
+
+
+def _como_data(valor):
+    """date ou datetime -> date."""
+    return valor.date() if hasattr(valor, 'date') else valor
+
+
+def _mes_seguinte(data_qualquer):
+    """Primeiro dia do mês seguinte à data informada."""
+    if data_qualquer.month == 12:
+        return date(data_qualquer.year + 1, 1, 1)
+    return date(data_qualquer.year, data_qualquer.month + 1, 1)
+
+
+def proximo_mes(connection, tabela_extrato=TABELA_EXTRATO):
+    """Primeiro dia do mês a gerar (mês seguinte ao último do extrato); None se vazio."""
+    ultima_data = connection.execute(text(SQL_ULTIMA_DATA.format(extrato=tabela_extrato))).scalar()
+    return _mes_seguinte(_como_data(ultima_data)) if ultima_data else None
+
+
+def _primeiro_dia_util(connection, ini_destino, ini_seguinte):
+    dia = connection.execute(text(SQL_PRIMEIRO_DIA_UTIL), {
+        'dt_ini': ini_destino,
+        'dt_fim': ini_seguinte - timedelta(days=1)
+    }).scalar()
+    # Sem calendário no mês: dia 1, como antes
+    return _como_data(dia) if dia is not None else ini_destino
+
+
+def _linha_para_dict(linha):
+    return {
+        'dt_movimentacao': linha.DT_MOVIMENTACAO.strftime('%Y-%m-%d'),
+        'ordem': linha.ORDEM,
+        'tipo': linha.TIPO,
+        'historico': linha.HISTORICO,
+        'periodo_de': linha.PERIODO_DE.strftime('%Y-%m-%d') if linha.PERIODO_DE else None,
+        'periodo_ate': linha.PERIODO_ATE.strftime('%Y-%m-%d') if linha.PERIODO_ATE else None,
+        'vr_movimentacao': float(linha.VR_MOVIMENTACAO) if linha.VR_MOVIMENTACAO is not None else None,
+        'vr_saldo': float(linha.VR_SALDO) if linha.VR_SALDO is not None else None,
+    }
+
+
+def processar_mes(connection, dt_carga=None, incluir_linhas=False, tabela_extrato=TABELA_EXTRATO):
+    """
+    Gera o próximo mês do extrato na connection informada (sem commit).
+    Retorna o resumo do mês, ou None se nenhuma etapa tiver dados.
+    Levanta ValueError se o extrato estiver vazio ou a ORDEM estourar o smallint.
+    """
+    ini_destino = proximo_mes(connection, tabela_extrato)
+    if ini_destino is None:
+        raise ValueError('A tabela FIN_TB013_EXTRATO_CVS está vazia. Nada para processar.')
+
+    ini_origem = (ini_destino - timedelta(days=1)).replace(day=1)
+    ini_seguinte = _mes_seguinte(ini_destino)
+    intervalo = {'ini_destino': ini_destino, 'ini_seguinte': ini_seguinte}
+
+    connection.execute(text(SQL_CRIAR_STAGING))
+    connection.execute(text(SQL_MONTAR_MES.format(extrato=tabela_extrato)), dict(
+        intervalo,
+        ini_origem=ini_origem,
+        dt_estorno=_primeiro_dia_util(connection, ini_destino, ini_seguinte)
+    ))
+    por_etapa = dict(connection.execute(text(SQL_CONTAR_ETAPAS)).fetchall())
+    total = sum(por_etapa.values())
+
+    if not total:
+        connection.execute(text("DROP TABLE #ExtratoNovo"))
+        return None
+
+    ordem_inicial = connection.execute(
+        text(SQL_PROXIMA_ORDEM.format(extrato=tabela_extrato)), intervalo).scalar()
+    if ordem_inicial + total > LIMITE_ORDEM:
+        connection.execute(text("DROP TABLE #ExtratoNovo"))
+        raise ValueError(
+            f'ORDEM final estimada ({ordem_inicial + total}) '
+            f'ultrapassa o limite de smallint ({LIMITE_ORDEM}).'
+        )
+
+    saldo_anterior = connection.execute(
+        text(SQL_SALDO_ANTERIOR.format(extrato=tabela_extrato)), {'dt_limite': ini_destino}).scalar() or 0
+
+    connection.execute(text(SQL_GRAVAR_MES.format(extrato=tabela_extrato)), {
+        'dt_carga': dt_carga or date.today(),
+        'saldo_anterior': saldo_anterior,
+        'ordem_inicial': ordem_inicial
+    })
+    connection.execute(text("DROP TABLE #ExtratoNovo"))
+
+    saldo_final = connection.execute(
+        text(SQL_SALDO_ANTERIOR.format(extrato=tabela_extrato)), {'dt_limite': ini_seguinte}).scalar() or 0
+
+    resultado = {
+        'mes_origem': ini_origem.strftime('%Y-%m'),
+        'mes_destino': ini_destino.strftime('%Y-%m'),
+        'saldos_recalculados': total,
+        'saldo_inicial': str(saldo_anterior),
+        'saldo_final': str(saldo_final),
+    }
+    for etapa, chave in ETAPAS:
+        resultado[chave] = por_etapa.get(etapa, 0)
+
+    if incluir_linhas:
+        resultado['linhas'] = [
+            _linha_para_dict(linha)
+            for linha in connection.execute(text(SQL_LINHAS_MES.format(extrato=tabela_extrato)), intervalo)
+        ]
+    return resultado
+
+
+def processar_extrato(ate=None, simular=False, max_meses=MAX_MESES_RECUPERACAO):
+    """
+    Gera os meses pendentes do extrato.
+    ate     -> primeiro dia do último mês a gerar; None = só o próximo mês.
+    simular -> executa tudo numa transação desfeita no final (nada é gravado);
+               cada mês traz as linhas geradas em 'linhas'.
+    Sem simular, cada mês é gravado na sua transação: se um falhar, os
+    anteriores ficam. Para no primeiro mês sem dados em nenhuma etapa.
+    Retorna {'meses': [...], 'simulado', 'motivo_parada', 'qt_registros'}.
+    """
+    dt_carga = date.today()
+    meses = []
+    motivo_parada = None
+
+    def _gerar_proximo(connection):
+        ini_destino = proximo_mes(connection)
+        if meses and (ate is None or ini_destino is None or ini_destino > ate):
+            return ini_destino, False, None
+        return ini_destino, True, processar_mes(connection, dt_carga=dt_carga, incluir_linhas=simular)
+
+    connection = db.engine.connect()
+    transacao_simulacao = connection.begin() if simular else None
+    try:
+        while len(meses) < max_meses:
+            inicio = time.perf_counter()
+            if simular:
+                ini_destino, continuar, resultado = _gerar_proximo(connection)
+            else:
+                with connection.begin():
+                    ini_destino, continuar, resultado = _gerar_proximo(connection)
+            decorrido = time.perf_counter() - inicio
+
+            if not continuar:
+                break
+            if resultado is None:
+                motivo_parada = (
+                    'Nenhum dado encontrado para processar em '
+                    f'{ini_destino.strftime("%m/%Y")}. '
+                    '(Provisões, Incorporações, Recebimentos IR, Entrada '
+                    'Pro Rata, Provisão ATM/Juros e Provisão Pro Rata '
+                    'estão todas vazias.)'
+                )
+                break
+
+            resultado['decorrido'] = round(decorrido, 2)
+            meses.append(resultado)
+            concluir_etapa('Mês {0:%m/%Y}'.format(ini_destino),
+                           retorno=resultado['saldos_recalculados'], decorrido=decorrido)
+            log_info("Extrato CVS {0:%m/%Y}{1}: {2} linhas em {3:.2f}s".format(
+                ini_destino, ' (simulação)' if simular else '', resultado['saldos_recalculados'], decorrido))
+    finally:
+        if transacao_simulacao is not None:
+            transacao_simulacao.rollback()
+        connection.close()
+
+    return {
+        'meses': meses,
+        'simulado': simular,
+        'motivo_parada': motivo_parada,
+        'qt_registros': sum(m['saldos_recalculados'] for m in meses),
+    }
@@ -5,6 +5,8 @@ app/utils/lock_processo.py
 Lock de aplicação baseado em sp_getapplock (SQL Server).
 Garante execução exclusiva de processos que usam tabelas temporárias
 globais como [BDG].[DCA_TB006_DISTRIBUIVEIS] e [BDG].[DCA_TB007_ARRASTAVEIS].
+Execuções com staging isolado (staging_distribuicao) travam apenas o próprio
+edital/período - ver staging_distribuicao.recurso_lock().
 
 Compatível com Python 3.9 e 3.12.
 """
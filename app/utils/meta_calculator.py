@@ -5,6 +5,8 @@ from dateutil.relativedelta import relativedelta
 from sqlalchemy import text
 from app import db
 from app.models.meta_avaliacao import MetaAvaliacao, MetaSemestral
+from app.utils.calendario_dias_uteis import calendario_aux
+from app.utils.metas_siscor import metas_siscor_meses
 import calendar
 
 
@@ -116,33 +118,12 @@ class MetaCalculator:
         return meses
 
     def _calcular_dias_uteis_todos_meses(self):
-        """Calcula dias úteis de todos os meses do período"""
+        """Calcula dias úteis de todos os meses do período (calendário em memória)"""
         self.total_dias_uteis_periodo = 0
+        calendario = calendario_aux()
 
         for mes in self.meses_periodo:
-            sql_total = text("""
-                SELECT COUNT(*) as QTDE_DIAS_UTEIS
-                FROM BDG.AUX_TB004_CALENDARIO
-                WHERE ANO = :ano 
-                AND MES = :mes
-                AND E_DIA_UTIL = 1
-            """)
-
-            result_total = db.session.execute(sql_total, {
-                'ano': mes['ano'],
-                'mes': mes['mes']
-            }).fetchone()
-
-            dias_uteis_total = result_total[0] if result_total and result_total[0] else 22
-
-            sql_periodo = text("""
-                SELECT COUNT(*) as QTDE_DIAS_UTEIS
-                FROM BDG.AUX_TB004_CALENDARIO
-                WHERE ANO = :ano 
-                AND MES = :mes
-                AND E_DIA_UTIL = 1
-                AND DT_REFERENCIA BETWEEN :dt_inicio AND :dt_fim
-            """)
+            dias_uteis_total = calendario.dias_uteis_mes(mes['ano'], mes['mes']) or 22
 
             primeiro_dia_mes = date(mes['ano'], mes['mes'], 1)
             ultimo_dia_mes = date(mes['ano'], mes['mes'], calendar.monthrange(mes['ano'], mes['mes'])[1])
@@ -150,14 +131,7 @@ class MetaCalculator:
             dt_inicio_calc = max(self.periodo_info['dt_inicio'], primeiro_dia_mes)
             dt_fim_calc = min(self.periodo_info['dt_fim'], ultimo_dia_mes)
 
-            result_periodo = db.session.execute(sql_periodo, {
-                'ano': mes['ano'],
-                'mes': mes['mes'],
-                'dt_inicio': dt_inicio_calc,
-                'dt_fim': dt_fim_calc
-            }).fetchone()
-
-            dias_uteis_periodo = result_periodo[0] if result_periodo and result_periodo[0] else 0
+            dias_uteis_periodo = calendario.dias_uteis_entre(dt_inicio_calc, dt_fim_calc)
             self.total_dias_uteis_periodo += dias_uteis_periodo
 
             self.dias_uteis_periodo[mes['ano_mes']] = {
@@ -169,29 +143,11 @@ class MetaCalculator:
         """Obtém metas SISCOR de todos os meses"""
         self.total_meta_siscor = Decimal('0')
 
+        metas = metas_siscor_meses((mes['ano'], mes['mes']) for mes in self.meses_periodo)
+
         for mes in self.meses_periodo:
-            sql = text("""
-                WITH FaseAtual AS (
-                    SELECT MAX(ID_TIPO_FASE_ORC) as FASE
-                    FROM BDG.COR_TB002_REPROGRAMACAO_ORCAMENTARIA_SISCOR
-                    WHERE DT_PREVISAO_ORCAMENTO/100 = :ano
-                )
-                SELECT SUM(VR_PREVISAO_ORCAMENTO) as META_TOTAL
-                FROM BDG.COR_TB002_REPROGRAMACAO_ORCAMENTARIA_SISCOR, FaseAtual
-                WHERE ID_NATUREZA = 3
-                AND UNIDADE = 'SUPEC'
-                AND DT_PREVISAO_ORCAMENTO/100 = :ano
-                AND DT_PREVISAO_ORCAMENTO - (DT_PREVISAO_ORCAMENTO/100 * 100) = :mes
-                AND ID_TIPO_FASE_ORC = FaseAtual.FASE
-            """)
-
-            result = db.session.execute(sql, {
-                'ano': mes['ano'],
-                'mes': mes['mes']
-            }).fetchone()
-
-            meta_valor = Decimal(str(result[0])) if result and result[0] else Decimal('0')
-            self.metas_siscor[mes['ano_mes']] = meta_valor  # AQUI ESTAVA O ERRO - COLCHETE CORRIGIDO
+            meta_valor = metas[mes['ano_mes']]
+            self.metas_siscor[mes['ano_mes']] = meta_valor
             self.total_meta_siscor += meta_valor
 
     def _calcular_metas_periodo_novo(self):
@@ -239,23 +195,7 @@ class MetaCalculator:
             dt_inicio = data_corte + relativedelta(days=1)
             dt_fim = date(ano, mes, calendar.monthrange(ano, mes)[1])
 
-        sql = text("""
-            SELECT COUNT(*) as QTDE_DIAS_UTEIS
-            FROM BDG.AUX_TB004_CALENDARIO
-            WHERE ANO = :ano 
-            AND MES = :mes
-            AND E_DIA_UTIL = 1
-            AND DT_REFERENCIA BETWEEN :dt_inicio AND :dt_fim
-        """)
-
-        result = db.session.execute(sql, {
-            'ano': ano,
-            'mes': mes,
-            'dt_inicio': dt_inicio,
-            'dt_fim': dt_fim
-        }).fetchone()
-
-        return result[0] if result and result[0] else 0
+        return calendario_aux().dias_uteis_entre(dt_inicio, dt_fim)
 
     def _executar_calculo_proporcional(self):
         """
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/metas_siscor.py
+
+Metas SISCOR (SUPEC, natureza 3) de vários meses numa única consulta.
+
+A [BDG].[COR_TB002_REPROGRAMACAO_ORCAMENTARIA_SISCOR] guarda, para cada ano,
+uma linha por fase orçamentária; vale sempre a maior fase do ano
+(MAX(ID_TIPO_FASE_ORC)). Antes cada mês do período era uma consulta com o
+próprio CTE de fase. Aqui:
+  1. uma consulta leve devolve a fase atual de cada ano envolvido;
+  2. os anos cuja fase já está no cache saem da memória;
+  3. os demais são carregados juntos (todos os meses, agrupados por mês).
+
+O cache é indexado por (ano, fase): quando uma nova fase é publicada a chave
+muda e o ano é recarregado sozinho, sem TTL.
+
+Uso:
+    metas = metas_siscor_meses([(2025, 1), (2025, 2)])
+    metas['2025-01']  -> Decimal
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+import threading
+from decimal import Decimal
+
+from sqlalchemy import text
+
+from app import db
+from app.utils.log_seguro import log_info
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+SQL_FASES = """
+    SELECT DT_PREVISAO_ORCAMENTO / 100 AS ANO, MAX(ID_TIPO_FASE_ORC) AS FASE
+    FROM BDG.COR_TB002_REPROGRAMACAO_ORCAMENTARIA_SISCOR
+    WHERE DT_PREVISAO_ORCAMENTO BETWEEN :ano_inicio * 100 AND :ano_fim * 100 + 99
+    GROUP BY DT_PREVISAO_ORCAMENTO / 100
+"""
+
+SQL_METAS = """
+    WITH FaseAtual AS (
+        SELECT DT_PREVISAO_ORCAMENTO / 100 AS ANO, MAX(ID_TIPO_FASE_ORC) AS FASE
+        FROM BDG.COR_TB002_REPROGRAMACAO_ORCAMENTARIA_SISCOR
+        WHERE DT_PREVISAO_ORCAMENTO BETWEEN :ano_inicio * 100 AND :ano_fim * 100 + 99
+        GROUP BY DT_PREVISAO_ORCAMENTO / 100
+    )
+    SELECT
+        FA.ANO,
+        FA.FASE,
+        SIS.DT_PREVISAO_ORCAMENTO % 100 AS MES,
+        SUM(SIS.VR_PREVISAO_ORCAMENTO) AS META_TOTAL
+    FROM BDG.COR_TB002_REPROGRAMACAO_ORCAMENTARIA_SISCOR SIS
+    INNER JOIN FaseAtual FA
+        ON SIS.DT_PREVISAO_ORCAMENTO / 100 = FA.ANO
+        AND SIS.ID_TIPO_FASE_ORC = FA.FASE
+    WHERE SIS.ID_NATUREZA = 3
+        AND SIS.UNIDADE = 'SUPEC'
+        AND SIS.DT_PREVISAO_ORCAMENTO BETWEEN :ano_inicio * 100 AND :ano_fim * 100 + 99
+    GROUP BY FA.ANO, FA.FASE, SIS.DT_PREVISAO_ORCAMENTO % 100
+"""
+
+
+def _chave_mes(ano, mes):
+    return '{0:04d}-{1:02d}'.format(ano, mes)
+
+
+def _fases_atuais(ano_inicio, ano_fim):
+    rows = db.session.execute(text(SQL_FASES), {'ano_inicio': ano_inicio, 'ano_fim': ano_fim}).fetchall()
+    return {int(row[0]): row[1] for row in rows}
+
+
+def _carregar_anos(anos):
+    """Carrega todos os meses dos anos informados; grava no cache por (ano, fase)."""
+    rows = db.session.execute(text(SQL_METAS), {'ano_inicio': min(anos), 'ano_fim': max(anos)}).fetchall()
+
+    carregados = {}
+    for ano, fase, mes, valor in rows:
+        ano = int(ano)
+        if ano not in anos:
+            continue
+        _, meses = carregados.setdefault(ano, (fase, {}))
+        meses[int(mes)] = Decimal(str(valor)) if valor else Decimal('0')
+
+    with _cache_lock:
+        for ano, (fase, meses) in carregados.items():
+            _cache[(ano, fase)] = meses
+
+    log_info("Metas SISCOR carregadas: anos {0}".format(sorted(carregados)))
+    return {ano: meses for ano, (fase, meses) in carregados.items()}
+
+
+def metas_siscor_meses(meses):
+    """
+    meses -> iterável de (ano, mes)
+    Retorna {'AAAA-MM': Decimal} com todos os meses pedidos (Decimal('0') quando não há meta).
+    """
+    meses = [(int(ano), int(mes)) for ano, mes in meses]
+    if not meses:
+        return {}
+
+    anos = set(ano for ano, _ in meses)
+    fases = _fases_atuais(min(anos), max(anos))
+
+    por_ano = {}
+    faltantes = set()
+    with _cache_lock:
+        for ano in anos:
+            if ano not in fases:
+                por_ano[ano] = {}
+                continue
+            meses_ano = _cache.get((ano, fases[ano]))
+            if meses_ano is None:
+                faltantes.add(ano)
+            else:
+                por_ano[ano] = meses_ano
+
+    if faltantes:
+        carregados = _carregar_anos(faltantes)
+        for ano in faltantes:
+            por_ano[ano] = carregados.get(ano, {})
+
+    return {
+        _chave_mes(ano, mes): por_ano.get(ano, {}).get(mes, Decimal('0'))
+        for ano, mes in meses
+    }
+
+
+def metas_siscor_ano(ano):
+    """Os 12 meses do ano: {'AAAA-MM': Decimal}."""
+    return metas_siscor_meses([(ano, mes) for mes in range(1, 13)])
+
+
+def invalidar_cache_siscor():
+    with _cache_lock:
+        _cache.clear()
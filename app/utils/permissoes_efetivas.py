@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/permissoes_efetivas.py
+
+Matriz de permissões efetivas (usuário x sistema) por área.
+
+verificar_acesso_com_area resolvia cada checagem com até quatro consultas em
+sequência: usuário, permissão individual e depois setor -> superintendência ->
+diretoria em PermissaoArea. A mesma regra agora é aplicada de uma vez, em SQL,
+e gravada em [DEV].[APK_TB007_PERMISSOES_EFETIVAS] com a ORIGEM da decisão:
+
+  perfil       -> admin/moderador (acesso total)
+  individual   -> PermissaoSistema com PERMISSAO_INDIVIDUAL = 1
+  setor / superintendencia / diretoria -> PermissaoArea da área do empregado
+  padrao       -> nenhuma regra: acesso permitido
+
+Reconstrução incremental:
+  reconstruir_permissoes([ids])        -> usuários informados (permissão individual, perfil)
+  reconstruir_permissoes_area(tipo, a) -> usuários cujo empregado está na área
+  reconstruir_permissoes()             -> todos (subida do portal)
+
+A matriz fica em memória ({usuario_id: {sistema: (tem_acesso, origem, area)}});
+a cada INTERVALO_VERIFICACAO segundos uma consulta leve (COUNT + MAX da data
+de atualização) detecta reconstruções feitas por outro processo.
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+import threading
+import time
+
+from sqlalchemy import text, bindparam
+
+from app import db
+from app.utils.log_seguro import log_info, log_erro
+
+INTERVALO_VERIFICACAO = 300
+
+TIPOS_AREA = {
+    'setor': 'sgSetor',
+    'superintendencia': 'sgSuperintendencia',
+    'diretoria': 'sgDiretoria',
+}
+
+# Mesma ordem de precedência de verificar_acesso_com_area: vale a primeira linha
+# (menor ID) de cada regra, e uma regra existente com TEM_ACESSO nulo nega o acesso.
+SQL_RECONSTRUIR = """
+    DELETE FROM [DEV].[APK_TB007_PERMISSOES_EFETIVAS] {filtro_delete};
+
+    INSERT INTO [DEV].[APK_TB007_PERMISSOES_EFETIVAS]
+        (USUARIO_ID, SISTEMA, TEM_ACESSO, ORIGEM, AREA, ATUALIZADO_EM)
+    SELECT
+        U.ID,
+        S.SISTEMA,
+        CASE
+            WHEN U.PERFIL IN ('admin', 'moderador') THEN 1
+            WHEN IND.PERMISSAO_INDIVIDUAL = 1 THEN ISNULL(IND.TEM_ACESSO, 0)
+            WHEN PSE.ID IS NOT NULL THEN ISNULL(PSE.TEM_ACESSO, 0)
+            WHEN PSU.ID IS NOT NULL THEN ISNULL(PSU.TEM_ACESSO, 0)
+            WHEN PDI.ID IS NOT NULL THEN ISNULL(PDI.TEM_ACESSO, 0)
+            ELSE 1
+        END,
+        CASE
+            WHEN U.PERFIL IN ('admin', 'moderador') THEN 'perfil'
+            WHEN IND.PERMISSAO_INDIVIDUAL = 1 THEN 'individual'
+            WHEN PSE.ID IS NOT NULL THEN 'setor'
+            WHEN PSU.ID IS NOT NULL THEN 'superintendencia'
+            WHEN PDI.ID IS NOT NULL THEN 'diretoria'
+            ELSE 'padrao'
+        END,
+        CASE
+            WHEN U.PERFIL IN ('admin', 'moderador') OR IND.PERMISSAO_INDIVIDUAL = 1 THEN NULL
+            WHEN PSE.ID IS NOT NULL THEN E.sgSetor
+            WHEN PSU.ID IS NOT NULL THEN E.sgSuperintendencia
+            WHEN PDI.ID IS NOT NULL THEN E.sgDiretoria
+        END,
+        GETDATE()
+    FROM [BDG].[APK_TB002_USUARIOS] U
+    CROSS JOIN ({sistemas}) S (SISTEMA)
+    OUTER APPLY (
+        SELECT TOP 1 EMP.sgSetor, EMP.sgSuperintendencia, EMP.sgDiretoria
+        FROM [BDG].[PES_TB001_EMPREGADOS] EMP
+        WHERE EMP.pkPessoa = U.FK_PESSOA
+    ) E
+    OUTER APPLY (
+        SELECT TOP 1 P.TEM_ACESSO, P.PERMISSAO_INDIVIDUAL
+        FROM [DEV].[APK_TB005_PERMISSOES_SISTEMA] P
+        WHERE P.USUARIO_ID = U.ID AND P.SISTEMA = S.SISTEMA AND P.DELETED_AT IS NULL
+        ORDER BY P.ID
+    ) IND
+    OUTER APPLY (
+        SELECT TOP 1 A.ID, A.TEM_ACESSO
+        FROM [DEV].[APK_TB006_PERMISSOES_AREA] A
+        WHERE A.AREA = E.sgSetor AND E.sgSetor <> '' AND A.TIPO_AREA = 'setor'
+            AND A.SISTEMA = S.SISTEMA AND A.DELETED_AT IS NULL
+        ORDER BY A.ID
+    ) PSE
+    OUTER APPLY (
+        SELECT TOP 1 A.ID, A.TEM_ACESSO
+        FROM [DEV].[APK_TB006_PERMISSOES_AREA] A
+        WHERE A.AREA = E.sgSuperintendencia AND E.sgSuperintendencia <> '' AND A.TIPO_AREA = 'superintendencia'
+            AND A.SISTEMA = S.SISTEMA AND A.DELETED_AT IS NULL
+        ORDER BY A.ID
+    ) PSU
+    OUTER APPLY (
+        SELECT TOP 1 A.ID, A.TEM_ACESSO
+        FROM [DEV].[APK_TB006_PERMISSOES_AREA] A
+        WHERE A.AREA = E.sgDiretoria AND E.sgDiretoria <> '' AND A.TIPO_AREA = 'diretoria'
+            AND A.SISTEMA = S.SISTEMA AND A.DELETED_AT IS NULL
+        ORDER BY A.ID
+    ) PDI
+    WHERE U.DELETED_AT IS NULL {filtro_insert};
+"""
+
+_lock = threading.Lock()
+_matriz = {}
+_assinatura = None
+_verificado_em = 0.0
+
+
+def _sistemas():
+    from app.models.permissao_sistema import PermissaoSistema
+    return list(PermissaoSistema.SISTEMAS_DISPONIVEIS.keys())
+
+
+def _montar_sql(usuario_ids):
+    sistemas = _sistemas()
+    valores = ' UNION ALL '.join('SELECT :sistema_{0}'.format(i) for i in range(len(sistemas)))
+    parametros = {'sistema_{0}'.format(i): sistema for i, sistema in enumerate(sistemas)}
+
+    if usuario_ids is None:
+        sql = text(SQL_RECONSTRUIR.format(sistemas=valores, filtro_delete='', filtro_insert=''))
+    else:
+        sql = text(SQL_RECONSTRUIR.format(
+            sistemas=valores,
+            filtro_delete='WHERE USUARIO_ID IN :ids',
+            filtro_insert='AND U.ID IN :ids'
+        )).bindparams(bindparam('ids', expanding=True))
+        parametros['ids'] = [int(usuario_id) for usuario_id in usuario_ids]
+    return sql, parametros
+
+
+def _carregar_linhas(connection, usuario_ids=None):
+    sql = """
+        SELECT USUARIO_ID, SISTEMA, TEM_ACESSO, ORIGEM, AREA
+        FROM [DEV].[APK_TB007_PERMISSOES_EFETIVAS]
+    """
+    if usuario_ids is None:
+        linhas = connection.execute(text(sql)).fetchall()
+    else:
+        linhas = connection.execute(
+            text(sql + " WHERE USUARIO_ID IN :ids").bindparams(bindparam('ids', expanding=True)),
+            {'ids': list(usuario_ids)}
+        ).fetchall()
+
+    matriz = {}
+    for usuario_id, sistema, tem_acesso, origem, area in linhas:
+        matriz.setdefault(usuario_id, {})[sistema] = (bool(tem_acesso), origem, area)
+    return matriz
+
+
+def _ler_assinatura(connection):
+    return tuple(connection.execute(text("""
+        SELECT COUNT(*), MAX(ATUALIZADO_EM) FROM [DEV].[APK_TB007_PERMISSOES_EFETIVAS]
+    """)).fetchone() or ())
+
+
+def reconstruir_permissoes(usuario_ids=None):
+    """
+    Recalcula a matriz dos usuários informados (None = todos) e atualiza a
+    memória. Não levanta exceção: quem chamou já gravou a alteração de origem.
+    Retorna as linhas gravadas.
+    """
+    global _assinatura, _verificado_em
+    if usuario_ids is not None:
+        usuario_ids = sorted(set(int(usuario_id) for usuario_id in usuario_ids))
+        if not usuario_ids:
+            return 0
+
+    try:
+        sql, parametros = _montar_sql(usuario_ids)
+        with db.engine.begin() as connection:
+            connection.execute(sql, parametros)
+            novas = _carregar_linhas(connection, usuario_ids)
+            assinatura = _ler_assinatura(connection)
+    except Exception as e:
+        log_erro("Erro ao reconstruir permissões efetivas: {0}".format(repr(e)))
+        invalidar_permissoes_efetivas()
+        return 0
+
+    with _lock:
+        if usuario_ids is None:
+            _matriz.clear()
+        _matriz.update(novas)
+        if usuario_ids is not None:
+            # Usuário sem linhas (excluído/inexistente) fica registrado como sem acesso
+            for usuario_id in usuario_ids:
+                _matriz.setdefault(usuario_id, {})
+        _assinatura = assinatura
+        _verificado_em = time.monotonic()
+
+    qtd = sum(len(sistemas) for sistemas in novas.values())
+    log_info("Permissões efetivas reconstruídas: {0} usuários, {1} linhas".format(
+        'todos' if usuario_ids is None else len(usuario_ids), qtd))
+    return qtd
+
+
+def usuarios_da_area(tipo_area, area):
+    """IDs dos usuários cujo empregado pertence à área."""
+    coluna = TIPOS_AREA.get(tipo_area)
+    if not coluna or not area:
+        return []
+    rows = db.session.execute(text("""
+        SELECT DISTINCT U.ID
+        FROM [BDG].[APK_TB002_USUARIOS] U
+        INNER JOIN [BDG].[PES_TB001_EMPREGADOS] E ON E.pkPessoa = U.FK_PESSOA
+        WHERE U.DELETED_AT IS NULL AND E.{0} = :area
+    """.format(coluna)), {'area': area}).fetchall()
+    return [row[0] for row in rows]
+
+
+def reconstruir_permissoes_area(tipo_area, area):
+    """Após atualizar_permissoes_area: só os usuários da área mudam."""
+    try:
+        usuario_ids = usuarios_da_area(tipo_area, area)
+    except Exception as e:
+        log_erro("Erro ao buscar usuários da área {0}: {1}".format(area, repr(e)))
+        return 0
+    return reconstruir_permissoes(usuario_ids)
+
+
+def invalidar_permissoes_efetivas():
+    """Força a releitura da matriz na próxima consulta."""
+    global _assinatura, _verificado_em
+    with _lock:
+        _assinatura = None
+        _verificado_em = 0.0
+
+
+def _garantir_carregada():
+    global _assinatura, _verificado_em
+    agora = time.monotonic()
+    if _assinatura is not None and agora - _verificado_em < INTERVALO_VERIFICACAO:
+        return
+    with _lock:
+        if _assinatura is not None and agora - _verificado_em < INTERVALO_VERIFICACAO:
+            return
+        try:
+            with db.engine.connect() as connection:
+                assinatura = _ler_assinatura(connection)
+                if assinatura != _assinatura:
+                    matriz = _carregar_linhas(connection)
+                    _matriz.clear()
+                    _matriz.update(matriz)
+                    _assinatura = assinatura
+            _verificado_em = agora
+        except Exception as e:
+            # Mantém o que já estava carregado; tenta de novo na próxima chamada
+            log_erro("Erro ao carregar permissões efetivas: {0}".format(repr(e)))
+
+
+def permissoes_usuario(usuario_id):
+    """{sistema: (tem_acesso, origem, area)} do usuário; calcula na hora se ainda não estiver na matriz."""
+    _garantir_carregada()
+    usuario_id = int(usuario_id)
+    permissoes = _matriz.get(usuario_id)
+    if permissoes is None:
+        reconstruir_permissoes([usuario_id])
+        permissoes = _matriz.get(usuario_id, {})
+    return permissoes
+
+
+def permissao_efetiva(usuario_id, sistema):
+    """(tem_acesso, origem, area); (False, None, None) para usuário inexistente."""
+    permissoes = permissoes_usuario(usuario_id)
+    if not permissoes:
+        return False, None, None
+    return permissoes.get(sistema, (True, 'padrao', None))
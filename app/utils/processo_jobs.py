@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/processo_jobs.py
+
+Execução de processos longos (distribuição, redistribuição...) em segundo plano.
+O request apenas registra o job em [BDG].[APK_TB012_PROCESSOS_JOB] e retorna;
+um pool pequeno de threads executa o processo e grava o andamento (etapa atual,
+tempo de cada etapa, registros) na própria tabela, consultada por polling.
+
+Assim as threads do Waitress não ficam presas por minutos em uma distribuição.
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
+from decimal import Decimal
+
+from flask import current_app
+from flask_login import current_user
+from sqlalchemy import text
+
+from app import db
+from app.models.processo_job import ProcessoJob
+from app.utils.lock_processo import lock_exclusivo
+from app.utils.log_seguro import log_info, log_erro, log_excecao
+
+# Poucos workers: cada processo já é pesado no SQL Server
+MAX_WORKERS = 2
+
+# Tempo máximo que um job espera na fila pelo lock do recurso (30 minutos)
+TIMEOUT_LOCK_MS = 30 * 60 * 1000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Job em execução na thread atual (as funções de negócio reportam etapas por aqui)
+_contexto = threading.local()
+
+
+def _obter_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='ProcessoJob')
+        return _executor
+
+
+def _json_default(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _para_json(valor):
+    return json.dumps(valor, ensure_ascii=False, default=_json_default)
+
+
+def _atualizar_job(job_id, **campos):
+    """
+    Atualiza o job em transação própria, sem interferir na db.session
+    usada pelo processo (que faz seus próprios commits).
+    """
+    if not campos:
+        return
+    atribuicoes = ', '.join('[{0}] = :{0}'.format(coluna) for coluna in campos)
+    parametros = dict(campos)
+    parametros['job_id'] = job_id
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(
+                text("UPDATE [BDG].[APK_TB012_PROCESSOS_JOB] SET {0} WHERE ID = :job_id".format(atribuicoes)),
+                parametros
+            )
+    except Exception as e:
+        log_erro("Erro ao atualizar job {0}: {1}".format(job_id, repr(e)))
+
+
+def submeter_job(tipo, funcao, args=(), kwargs=None, descricao=None, parametros=None, recurso_lock=None):
+    """
+    Registra o job e o envia ao pool. Retorna o ID imediatamente.
+
+    Uso:
+        job_id = submeter_job('distribuicao', processar_distribuicao_completa,
+                              args=(edital_id, periodo_id),
+                              recurso_lock='DCA_DISTRIBUICAO_CONTRATOS')
+
+    recurso_lock -> nome do sp_getapplock; jobs com o mesmo recurso executam um por vez.
+    """
+    job = ProcessoJob(
+        TIPO=tipo,
+        DESCRICAO=descricao,
+        STATUS=ProcessoJob.STATUS_FILA,
+        ETAPA='Aguardando execução',
+        PARAMETROS=_para_json(parametros or {}),
+        USUARIO_ID=current_user.id if current_user and current_user.is_authenticated else None,
+        CREATED_AT=datetime.utcnow()
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    _obter_executor().submit(_executar_job, app, job.ID, funcao, tuple(args), dict(kwargs or {}), recurso_lock)
+
+    log_info("Job {0} ({1}) enviado para a fila".format(job.ID, tipo))
+    return job.ID
+
+
+def _executar_job(app, job_id, funcao, args, kwargs, recurso_lock):
+    with app.app_context():
+        _contexto.job_id = job_id
+        _contexto.etapas = []
+        _contexto.inicio_etapa = None
+        try:
+            if recurso_lock:
+                _atualizar_job(job_id, ETAPA='Aguardando liberação de {0}'.format(recurso_lock))
+                with lock_exclusivo(recurso_lock, timeout_ms=TIMEOUT_LOCK_MS) as obtido:
+                    if not obtido:
+                        _atualizar_job(
+                            job_id,
+                            STATUS=ProcessoJob.STATUS_ERRO,
+                            ERRO='Recurso {0} ocupado por outro processo.'.format(recurso_lock),
+                            FINISHED_AT=datetime.utcnow()
+                        )
+                        return
+                    _rodar(job_id, funcao, args, kwargs)
+            else:
+                _rodar(job_id, funcao, args, kwargs)
+        finally:
+            _contexto.job_id = None
+            _contexto.etapas = []
+            _contexto.inicio_etapa = None
+
+
+def _rodar(job_id, funcao, args, kwargs):
+    """Executa o processo; nunca deixa a exceção escapar (o lock_exclusivo não a suporta)."""
+    _atualizar_job(job_id, STATUS=ProcessoJob.STATUS_EXECUTANDO, ETAPA='Iniciando',
+                   STARTED_AT=datetime.utcnow())
+    log_info("Job {0} iniciado".format(job_id))
+    try:
+        resultado = funcao(*args, **kwargs)
+        _fechar_etapa_aberta()
+        _atualizar_job(
+            job_id,
+            STATUS=ProcessoJob.STATUS_CONCLUIDO,
+            ETAPA='Concluído',
+            ETAPAS=_para_json(_contexto.etapas),
+            RESULTADO=_para_json(resultado),
+            QT_REGISTROS=_extrair_qt_registros(resultado),
+            FINISHED_AT=datetime.utcnow()
+        )
+        log_info("Job {0} concluído".format(job_id))
+    except Exception as e:
+        log_excecao("Job {0} falhou".format(job_id), e)
+        _fechar_etapa_aberta(erro=str(e))
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        _atualizar_job(
+            job_id,
+            STATUS=ProcessoJob.STATUS_ERRO,
+            ETAPAS=_para_json(_contexto.etapas),
+            ERRO=str(e),
+            FINISHED_AT=datetime.utcnow()
+        )
+
+
+def _extrair_qt_registros(resultado):
+    if isinstance(resultado, dict):
+        for chave in ('total_distribuido', 'total_redistribuido', 'qt_registros'):
+            valor = resultado.get(chave)
+            if isinstance(valor, (int, float)):
+                return int(valor)
+    if isinstance(resultado, int):
+        return resultado
+    return 0
+
+
+# ============================================================
+# Reporte de etapas (chamado pelas funções de negócio)
+# ============================================================
+
+def job_atual():
+    """ID do job em execução nesta thread (None fora de um job)."""
+    return getattr(_contexto, 'job_id', None)
+
+
+def iniciar_etapa(nome):
+    """Marca o início de uma etapa. Fecha a anterior, se ainda estiver aberta. Fora de job, não faz nada."""
+    job_id = job_atual()
+    if job_id is None:
+        return
+    _fechar_etapa_aberta()
+    _contexto.etapas.append({'nome': nome, 'status': ProcessoJob.STATUS_EXECUTANDO,
+                             'decorrido': None, 'retorno': None})
+    _contexto.inicio_etapa = time.time()
+    _atualizar_job(job_id, ETAPA=nome[:200], ETAPAS=_para_json(_contexto.etapas))
+
+
+def concluir_etapa(nome, retorno=None, erro=None, decorrido=None):
+    """Registra o fim de uma etapa com o tempo medido e o retorno (quantidade de registros)."""
+    job_id = job_atual()
+    if job_id is None:
+        return
+    etapa = _etapa_aberta()
+    if etapa is None or etapa['nome'] != nome:
+        iniciar_etapa(nome)
+        etapa = _etapa_aberta()
+    _finalizar(etapa, retorno=retorno, erro=erro, decorrido=decorrido)
+    _atualizar_job(job_id, ETAPAS=_para_json(_contexto.etapas))
+
+
+def _etapa_aberta():
+    etapas = getattr(_contexto, 'etapas', None) or []
+    if etapas and etapas[-1]['status'] == ProcessoJob.STATUS_EXECUTANDO:
+        return etapas[-1]
+    return None
+
+
+def _finalizar(etapa, retorno=None, erro=None, decorrido=None):
+    if decorrido is None:
+        inicio = getattr(_contexto, 'inicio_etapa', None)
+        decorrido = time.time() - inicio if inicio else 0.0
+    etapa['decorrido'] = round(decorrido, 2)
+    etapa['retorno'] = retorno if isinstance(retorno, (int, float)) else None
+    etapa['status'] = ProcessoJob.STATUS_ERRO if erro else 'OK'
+    if erro:
+        etapa['erro'] = str(erro)
+    _contexto.inicio_etapa = None
+
+
+def _fechar_etapa_aberta(erro=None):
+    etapa = _etapa_aberta()
+    if etapa is not None:
+        _finalizar(etapa, erro=erro)
+
+
+# ============================================================
+# Consulta
+# ============================================================
+
+def obter_job(job_id):
+    return ProcessoJob.query.get(job_id)
+
+
+def marcar_jobs_interrompidos():
+    """
+    Jobs em FILA/EXECUTANDO ao subir a aplicação ficaram órfãos (o processo
+    que os executava morreu). Marca-os como ERRO para não ficarem eternamente "rodando".
+    """
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(text("""
+                UPDATE [BDG].[APK_TB012_PROCESSOS_JOB]
+                SET STATUS = :erro,
+                    ERRO = 'Processo interrompido pela reinicialização do servidor.',
+                    FINISHED_AT = GETUTCDATE()
+                WHERE STATUS IN (:fila, :executando)
+            """), {
+                "erro": ProcessoJob.STATUS_ERRO,
+                "fila": ProcessoJob.STATUS_FILA,
+                "executando": ProcessoJob.STATUS_EXECUTANDO
+            })
+    except Exception as e:
+        log_erro("Erro ao marcar jobs interrompidos: {0}".format(repr(e)))
@@ -4,6 +4,8 @@ from dateutil.relativedelta import relativedelta
 from sqlalchemy import text
 from app import db
 from app.models.metas_redistribuicao import MetasPercentuaisDistribuicao, Metas, MetasPeriodoAvaliativo
+from app.utils.calendario_dias_uteis import calendario_aux
+from app.utils.metas_siscor import metas_siscor_meses
 import calendar
 
 
@@ -120,6 +122,12 @@ class RedistribuicaoCalculator:
                 'dias_uteis': row[2] or 0
             }
 
+        # Meses sem TB013: metas SISCOR numa única consulta
+        metas_siscor = metas_siscor_meses(
+            (mes['ano'], mes['mes']) for mes in self.meses_periodo
+            if mes['competencia'] not in metas_tb013
+        )
+
         # Para cada mês do período, usar TB013 ou calcular do SISCOR
         for mes in self.meses_periodo:
             competencia = mes['competencia']
@@ -133,7 +141,7 @@ class RedistribuicaoCalculator:
                 }
             else:
                 # Buscar do SISCOR
-                meta_siscor = self._buscar_meta_siscor(mes['ano'], mes['mes'])
+                meta_siscor = metas_siscor[competencia]
                 dias_uteis = self._calcular_dias_uteis_mes(mes['ano'], mes['mes'])
 
                 self.metas_mensais[competencia] = {
@@ -147,38 +155,9 @@ class RedistribuicaoCalculator:
 
         print(f"Metas carregadas para: {list(self.metas_mensais.keys())}")
 
-    def _buscar_meta_siscor(self, ano, mes):
-        """Busca meta SISCOR para um mês específico"""
-        sql = text("""
-            WITH FaseAtual AS (
-                SELECT MAX(ID_TIPO_FASE_ORC) as FASE
-                FROM BDG.COR_TB002_REPROGRAMACAO_ORCAMENTARIA_SISCOR
-                WHERE DT_PREVISAO_ORCAMENTO/100 = :ano
-            )
-            SELECT SUM(VR_PREVISAO_ORCAMENTO) as META_TOTAL
-            FROM BDG.COR_TB002_REPROGRAMACAO_ORCAMENTARIA_SISCOR, FaseAtual
-            WHERE ID_NATUREZA = 3
-            AND UNIDADE = 'SUPEC'
-            AND DT_PREVISAO_ORCAMENTO/100 = :ano
-            AND DT_PREVISAO_ORCAMENTO - (DT_PREVISAO_ORCAMENTO/100 * 100) = :mes
-            AND ID_TIPO_FASE_ORC = FaseAtual.FASE
-        """)
-
-        result = db.session.execute(sql, {'ano': ano, 'mes': mes}).fetchone()
-        return Decimal(str(result[0])) if result and result[0] else Decimal('0')
-
     def _calcular_dias_uteis_mes(self, ano, mes):
         """Calcula dias úteis totais de um mês"""
-        sql = text("""
-            SELECT COUNT(*) as QTDE_DIAS_UTEIS
-            FROM BDG.AUX_TB004_CALENDARIO
-            WHERE ANO = :ano 
-            AND MES = :mes
-            AND E_DIA_UTIL = 1
-        """)
-
-        result = db.session.execute(sql, {'ano': ano, 'mes': mes}).fetchone()
-        return result[0] if result and result[0] else 0
+        return calendario_aux().dias_uteis_mes(ano, mes)
 
     def _carregar_distribuicoes(self):
         """Carrega distribuições da TB015 com informações das empresas"""
@@ -467,26 +446,7 @@ class RedistribuicaoCalculator:
 
     def _calcular_dias_uteis_ate_data(self, ano, mes, data):
         """Calcula dias úteis do início do mês até a data especificada"""
-        sql = text("""
-            SELECT COUNT(*) as QTDE_DIAS_UTEIS
-            FROM BDG.AUX_TB004_CALENDARIO
-            WHERE ANO = :ano 
-            AND MES = :mes
-            AND E_DIA_UTIL = 1
-            AND DT_REFERENCIA BETWEEN :dt_inicio AND :dt_fim
-        """)
-
-        dt_inicio = date(ano, mes, 1)
-        dt_fim = data
-
-        result = db.session.execute(sql, {
-            'ano': ano,
-            'mes': mes,
-            'dt_inicio': dt_inicio,
-            'dt_fim': dt_fim
-        }).fetchone()
-
-        return result[0] if result and result[0] else 0
+        return calendario_aux().dias_uteis_entre(date(ano, mes, 1), data)
 
     def _formatar_resultado_tabela(self, metas_por_empresa, total_sd_inicial):
         """Formata o resultado no formato esperado para a tabela"""
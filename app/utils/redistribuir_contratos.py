@@ -2,6 +2,9 @@ from app import db
 from sqlalchemy import text
 import logging
 from datetime import datetime
+from app.utils.processo_jobs import iniciar_etapa
+from app.utils.staging_distribuicao import sql_staging, staging_execucao
+from app.utils.cubo_dashboard import atualizar_cubo_seguro
 
 
 def selecionar_contratos_para_redistribuicao(empresa_id):
@@ -33,11 +36,11 @@ def selecionar_contratos_para_redistribuicao(empresa_id):
             logging.info("Limpando tabelas temporárias...")
 
             # Limpar apenas a tabela temporária (isso é seguro, pois não afeta dados históricos)
-            truncate_sql = text("TRUNCATE TABLE [BDG].[DCA_TB006_DISTRIBUIVEIS]")
+            truncate_sql = text(sql_staging("TRUNCATE TABLE [BDG].[DCA_TB006_DISTRIBUIVEIS]"))
             connection.execute(truncate_sql)
             print("Tabela DCA_TB006_DISTRIBUIVEIS limpa para nova operação")
 
-            truncate_arrastaveis_sql = text("TRUNCATE TABLE [BDG].[DCA_TB007_ARRASTAVEIS]")
+            truncate_arrastaveis_sql = text(sql_staging("TRUNCATE TABLE [BDG].[DCA_TB007_ARRASTAVEIS]"))
             connection.execute(truncate_arrastaveis_sql)
             print("Tabela DCA_TB007_ARRASTAVEIS limpa para nova operação")
 
@@ -125,7 +128,7 @@ def selecionar_contratos_para_redistribuicao(empresa_id):
                     "Usando tabela de distribuição como fonte alternativa devido a 0 contratos na fonte primária")
 
                 # Inserir da tabela de distribuição para distribuíveis
-                insert_alt_sql = text("""
+                insert_alt_sql = text(sql_staging("""
                 INSERT INTO [BDG].[DCA_TB006_DISTRIBUIVEIS]
                 SELECT 
                     D.fkContratoSISCTR,
@@ -137,7 +140,7 @@ def selecionar_contratos_para_redistribuicao(empresa_id):
                 FROM [BDG].[DCA_TB005_DISTRIBUICAO] D
                 WHERE D.[COD_EMPRESA_COBRANCA] = :empresa_id
                 AND D.DELETED_AT IS NULL
-                """)
+                """))
 
                 result = connection.execute(insert_alt_sql, {"empresa_id": empresa_id})
                 contratos_inseridos = result.rowcount
@@ -145,7 +148,7 @@ def selecionar_contratos_para_redistribuicao(empresa_id):
                 logging.info(f"Inseridos {contratos_inseridos} contratos da tabela de distribuição")
             else:
                 # CORREÇÃO: Consulta ajustada para selecionar contratos ativos com as condições corretas
-                insert_sql = text("""
+                insert_sql = text(sql_staging("""
                 INSERT INTO [BDG].[DCA_TB006_DISTRIBUIVEIS]
                 SELECT
                     ECA.fkContratoSISCTR,
@@ -168,7 +171,7 @@ def selecionar_contratos_para_redistribuicao(empresa_id):
                     AND SDJ.fkContratoSISCTR IS NULL -- Sem suspensão judicial
                     AND SIT.VR_SD_DEVEDOR > 0        -- Com saldo devedor
                     AND ECA.fkContratoSISCTR IS NOT NULL -- Garante que contratos são válidos
-                """)
+                """))
 
                 result = connection.execute(insert_sql, {"empresa_id": empresa_id})
                 contratos_inseridos = result.rowcount
@@ -178,7 +181,7 @@ def selecionar_contratos_para_redistribuicao(empresa_id):
                 # Se ainda não encontrou contratos, tente uma abordagem mais flexível
                 if contratos_inseridos == 0:
                     print("TENTATIVA ADICIONAL: Consulta flexibilizada para encontrar contratos")
-                    insert_flexible_sql = text("""
+                    insert_flexible_sql = text(sql_staging("""
                     INSERT INTO [BDG].[DCA_TB006_DISTRIBUIVEIS]
                     SELECT
                         ECA.fkContratoSISCTR,
@@ -199,7 +202,7 @@ def selecionar_contratos_para_redistribuicao(empresa_id):
                             SELECT fkContratoSISCTR 
                             FROM [BDG].[COM_TB013_SUSPENSO_DECISAO_JUDICIAL]
                         )
-                    """)
+                    """))
 
                     result = connection.execute(insert_flexible_sql, {"empresa_id": empresa_id})
                     contratos_inseridos = result.rowcount
@@ -207,7 +210,7 @@ def selecionar_contratos_para_redistribuicao(empresa_id):
                     logging.info(f"Inseridos {contratos_inseridos} contratos da consulta flexibilizada")
 
             # Contar contratos selecionados no final
-            count_sql = text("SELECT COUNT(*) FROM [BDG].[DCA_TB006_DISTRIBUIVEIS] WHERE DELETED_AT IS NULL")
+            count_sql = text(sql_staging("SELECT COUNT(*) FROM [BDG].[DCA_TB006_DISTRIBUIVEIS] WHERE DELETED_AT IS NULL"))
             result = connection.execute(count_sql)
             num_contratos = result.scalar() or 0
 
@@ -650,12 +653,12 @@ def redistribuir_percentuais(edital_id, periodo_id, criterio_id, empresa_id, per
                         f"Empresa {id_empresa}: {percentual_original:.2f}% + {percentual_unitario:.2f}% = {percentual_final:.2f}% (Arrec: {vr_arrecadacao:.2f})")
 
                 # 9. Contar contratos e atualizar quantidades
-                count_sql = text("""
+                count_sql = text(sql_staging("""
                 SELECT 
                     COUNT(*) AS QTDE_CONTRATOS,
                     COALESCE(SUM(VR_SD_DEVEDOR), 0) AS VALOR_TOTAL
                 FROM [BDG].[DCA_TB006_DISTRIBUIVEIS]
-                """)
+                """))
 
                 count_result = connection.execute(count_sql).fetchone()
                 qtde_registros = count_result[0] if count_result else 0
@@ -806,13 +809,13 @@ def processar_contratos_arrastaveis(edital_id, periodo_id, criterio_id):
 
             try:
                 # 1. Limpar tabela arrastáveis
-                truncate_sql = text("""TRUNCATE TABLE [BDG].[DCA_TB007_ARRASTAVEIS]""")
+                truncate_sql = text(sql_staging("""TRUNCATE TABLE [BDG].[DCA_TB007_ARRASTAVEIS]"""))
                 connection.execute(truncate_sql)
                 print("Tabela DCA_TB007_ARRASTAVEIS truncada com sucesso")
 
                 # 2. Identificar e inserir contratos arrastáveis (mesmo CPF/CNPJ)
                 # CORREÇÃO: Remover a coluna VR_SD_DEVEDOR que não existe na tabela
-                insert_arrastaveis_sql = text("""
+                insert_arrastaveis_sql = text(sql_staging("""
                 WITH arrastaveis AS (
                     SELECT
                         ID,
@@ -849,14 +852,14 @@ def processar_contratos_arrastaveis(edital_id, periodo_id, criterio_id):
                     cpfArrastaveis AS CAR
                     INNER JOIN [BDG].[DCA_TB006_DISTRIBUIVEIS] AS DIS
                         ON CAR.[NR_CPF_CNPJ] = DIS.[NR_CPF_CNPJ]
-                """)
+                """))
 
                 connection.execute(insert_arrastaveis_sql)
 
                 # 3. Verificar número de contratos arrastáveis inseridos
-                count_sql = text("""
+                count_sql = text(sql_staging("""
                 SELECT COUNT(*) FROM [BDG].[DCA_TB007_ARRASTAVEIS]
-                """)
+                """))
 
                 count_result = connection.execute(count_sql).fetchone()
                 qtde_arrastaveis = count_result[0] if count_result else 0
@@ -869,13 +872,13 @@ def processar_contratos_arrastaveis(edital_id, periodo_id, criterio_id):
                     return 0, True
 
                 # 4. Remover contratos arrastáveis da tabela de distribuíveis
-                delete_sql = text("""
+                delete_sql = text(sql_staging("""
                 DELETE FROM [BDG].[DCA_TB006_DISTRIBUIVEIS]
                 WHERE [FkContratoSISCTR] IN (
                     SELECT [FkContratoSISCTR]
                     FROM [BDG].[DCA_TB007_ARRASTAVEIS]
                 )
-                """)
+                """))
 
                 delete_result = connection.execute(delete_sql)
                 print(f"Contratos arrastáveis removidos da tabela de distribuíveis: {delete_result.rowcount}")
@@ -941,14 +944,14 @@ def processar_contratos_arrastaveis(edital_id, periodo_id, criterio_id):
                         emp["qtde_disponivel_ajustada"] = emp["qtde_disponivel"]
 
                 # 6. Agrupar contratos por CPF/CNPJ - CORRIGIDA
-                cpf_group_sql = text("""
+                cpf_group_sql = text(sql_staging("""
                 SELECT 
                     ARR.NR_CPF_CNPJ,
                     COUNT(*) AS NUM_CONTRATOS
                 FROM [BDG].[DCA_TB007_ARRASTAVEIS] ARR
                 GROUP BY ARR.NR_CPF_CNPJ
                 ORDER BY COUNT(*) DESC
-                """)
+                """))
 
                 cpf_groups = connection.execute(cpf_group_sql).fetchall()
 
@@ -1002,7 +1005,7 @@ def processar_contratos_arrastaveis(edital_id, periodo_id, criterio_id):
                         f"Empresa {emp['id_empresa']}: {len(emp['cpfs_atribuidos'])} CPFs, estimativa de {emp['qtde_atual']} contratos")
 
                 # 9. Excluir registros antigos antes de inserir
-                delete_existing_sql = text("""
+                delete_existing_sql = text(sql_staging("""
                 DELETE FROM [BDG].[DCA_TB005_DISTRIBUICAO]
                 WHERE [ID_EDITAL] = :edital_id
                   AND [ID_PERIODO] = :periodo_id
@@ -1010,7 +1013,7 @@ def processar_contratos_arrastaveis(edital_id, periodo_id, criterio_id):
                       SELECT [FkContratoSISCTR]
                       FROM [BDG].[DCA_TB007_ARRASTAVEIS]
                   )
-                """)
+                """))
 
                 connection.execute(delete_existing_sql, {
                     "edital_id": edital_id,
@@ -1020,7 +1023,7 @@ def processar_contratos_arrastaveis(edital_id, periodo_id, criterio_id):
                 # 10. Inserir na tabela final
                 contratos_inseridos = 0
                 for cpf, empresa_id in cpfs_distribuidos.items():
-                    insert_sql = text("""
+                    insert_sql = text(sql_staging("""
                     INSERT INTO [BDG].[DCA_TB005_DISTRIBUICAO] (
                         [DT_REFERENCIA],
                         [ID_EDITAL],
@@ -1048,7 +1051,7 @@ def processar_contratos_arrastaveis(edital_id, periodo_id, criterio_id):
                             ON ARR.[FkContratoSISCTR] = SIT.[fkContratoSISCTR]
                     WHERE
                         ARR.[NR_CPF_CNPJ] = :cpf
-                    """)
+                    """))
 
                     result = connection.execute(insert_sql, {
                         "edital_id": edital_id,
@@ -1063,7 +1066,7 @@ def processar_contratos_arrastaveis(edital_id, periodo_id, criterio_id):
                 print(f"Contratos arrastáveis inseridos na tabela de distribuição: {contratos_inseridos}")
 
                 # 11. Verificar resultados finais
-                results_sql = text("""
+                results_sql = text(sql_staging("""
                 SELECT 
                     COD_EMPRESA_COBRANCA,
                     COUNT(*) AS QTDE,
@@ -1078,7 +1081,7 @@ def processar_contratos_arrastaveis(edital_id, periodo_id, criterio_id):
                   )
                 GROUP BY COD_EMPRESA_COBRANCA
                 ORDER BY COD_EMPRESA_COBRANCA
-                """)
+                """))
 
                 check_results = connection.execute(results_sql, {
                     "edital_id": edital_id,
@@ -1123,9 +1126,9 @@ def processar_demais_contratos(edital_id, periodo_id, criterio_id, empresa_redis
 
             try:
                 # 1. Verificar contratos restantes na tabela
-                count_sql = text("""
+                count_sql = text(sql_staging("""
                 SELECT COUNT(*) FROM [BDG].[DCA_TB006_DISTRIBUIVEIS]
-                """)
+                """))
 
                 count_result = connection.execute(count_sql).fetchone()
                 qtde_contratos_restantes = count_result[0] if count_result else 0
@@ -1206,7 +1209,7 @@ def processar_demais_contratos(edital_id, periodo_id, criterio_id, empresa_redis
                           f"Disponível: {emp['qtde_disponivel']}, Ajustado: {emp['qtde_disponivel_ajustada']}")
 
                 # 4. Excluir registros antigos antes de inserir
-                delete_existing_sql = text("""
+                delete_existing_sql = text(sql_staging("""
                 DELETE FROM [BDG].[DCA_TB005_DISTRIBUICAO]
                 WHERE [ID_EDITAL] = :edital_id
                   AND [ID_PERIODO] = :periodo_id
@@ -1214,7 +1217,7 @@ def processar_demais_contratos(edital_id, periodo_id, criterio_id, empresa_redis
                       SELECT [FkContratoSISCTR]
                       FROM [BDG].[DCA_TB006_DISTRIBUIVEIS]
                   )
-                """)
+                """))
 
                 connection.execute(delete_existing_sql, {
                     "edital_id": edital_id,
@@ -1222,14 +1225,14 @@ def processar_demais_contratos(edital_id, periodo_id, criterio_id, empresa_redis
                 })
 
                 # 5. Buscar contratos a distribuir
-                contratos_sql = text("""
+                contratos_sql = text(sql_staging("""
                 SELECT 
                     [FkContratoSISCTR],
                     [NR_CPF_CNPJ],
                     [VR_SD_DEVEDOR]
                 FROM [BDG].[DCA_TB006_DISTRIBUIVEIS]
                 ORDER BY NEWID()  -- Ordenar aleatoriamente
-                """)
+                """))
 
                 contratos = connection.execute(contratos_sql).fetchall()
 
@@ -1348,7 +1351,7 @@ def processar_demais_contratos(edital_id, periodo_id, criterio_id, empresa_redis
 
                 # 9. Limpar tabela de distribuíveis após processamento
                 if contratos_inseridos > 0:
-                    connection.execute(text("TRUNCATE TABLE [BDG].[DCA_TB006_DISTRIBUIVEIS]"))
+                    connection.execute(text(sql_staging("TRUNCATE TABLE [BDG].[DCA_TB006_DISTRIBUIVEIS]")))
                     print("Tabela de distribuíveis limpa após processamento")
 
                 transaction.commit()
@@ -1370,11 +1373,16 @@ def processar_demais_contratos(edital_id, periodo_id, criterio_id, empresa_redis
         return 0, False
 
 
-def processar_redistribuicao_contratos(edital_id, periodo_id, empresa_id, cod_criterio):
+def processar_redistribuicao_contratos(edital_id, periodo_id, empresa_id, cod_criterio, staging_isolado=False):
     """
     Executa o processo completo de redistribuição de contratos.
     MODIFICADO: Redistribui valores de arrecadação e percentuais para visualização correta no template
+    staging_isolado=True usa DCA_TB006/DCA_TB007 próprias desta execução.
     """
+    if staging_isolado:
+        with staging_execucao():
+            return processar_redistribuicao_contratos(edital_id, periodo_id, empresa_id, cod_criterio)
+
     # Configuração básica de logging
     import logging
     import sys
@@ -1466,6 +1474,7 @@ def processar_redistribuicao_contratos(edital_id, periodo_id, empresa_id, cod_cr
 
         # ETAPA 1: Selecionar contratos a redistribuir
         print("\n----- ETAPA 1: SELEÇÃO DE CONTRATOS -----")
+        iniciar_etapa('Seleção de contratos')
         num_contratos = selecionar_contratos_para_redistribuicao(empresa_id)
         print(f"Total de contratos selecionados: {num_contratos}")
 
@@ -1478,6 +1487,7 @@ def processar_redistribuicao_contratos(edital_id, periodo_id, empresa_id, cod_cr
 
         # ETAPA 2: Calcular percentuais para redistribuição
         print("\n----- ETAPA 2: CÁLCULO DE PERCENTUAIS -----")
+        iniciar_etapa('Cálculo de percentuais')
         percentual_redistribuido, total_arrecadacao, empresas_dados = calcular_percentuais_redistribuicao(
             edital_id, periodo_id, empresa_id)
 
@@ -1501,6 +1511,7 @@ def processar_redistribuicao_contratos(edital_id, periodo_id, empresa_id, cod_cr
 
         # ETAPA 3: Redistribuir percentuais entre empresas remanescentes
         print("\n----- ETAPA 3: REDISTRIBUIÇÃO DE PERCENTUAIS -----")
+        iniciar_etapa('Redistribuição de percentuais')
         redistribuicao_ok = redistribuir_percentuais(
             edital_id,
             periodo_id,
@@ -1519,6 +1530,7 @@ def processar_redistribuicao_contratos(edital_id, periodo_id, empresa_id, cod_cr
 
         # ETAPA 4: Redistribuição de contratos arrastáveis
         print("\n----- ETAPA 4: REDISTRIBUIÇÃO DE CONTRATOS ARRASTÁVEIS -----")
+        iniciar_etapa('Contratos arrastáveis')
         contratos_arrastados, arrastaveis_ok = processar_contratos_arrastaveis(
             edital_id,
             periodo_id,
@@ -1535,6 +1547,7 @@ def processar_redistribuicao_contratos(edital_id, periodo_id, empresa_id, cod_cr
 
         # ETAPA 5: Redistribuição dos demais contratos
         print("\n----- ETAPA 5: REDISTRIBUIÇÃO DOS DEMAIS CONTRATOS -----")
+        iniciar_etapa('Demais contratos')
 
         contratos_restantes, restantes_ok = processar_demais_contratos(
             edital_id,
@@ -1564,6 +1577,7 @@ def processar_redistribuicao_contratos(edital_id, periodo_id, empresa_id, cod_cr
 
             # ETAPA 6: Buscar resultado final por empresa
         print("\n----- ETAPA 6: BUSCANDO RESULTADO FINAL POR EMPRESA -----")
+        iniciar_etapa('Resultado final por empresa')
 
         with db.engine.connect() as connection:
             # Buscar informações sobre a empresa que está saindo
@@ -1710,6 +1724,8 @@ def processar_redistribuicao_contratos(edital_id, periodo_id, empresa_id, cod_cr
         print("PROCESSO DE REDISTRIBUIÇÃO CONCLUÍDO COM SUCESSO!")
         print("=" * 80)
 
+        atualizar_cubo_seguro(edital_id, periodo_id)
+
         return resultados
 
     except Exception as e:
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/resumo_cvs_carga.py
+
+Carga das planilhas "AAAA-MM-DD_Planilhas Resumo CVS - Contrato NNN.xlsx"
+em [BDG].[FIN_TB007_RESUMO_CVS].
+
+Antes: dois df.iterrows() (corte da primeira tabela e upsert) e um
+ResumoCVS.query...first() + add/update por linha.
+Agora:
+    - o fim da primeira tabela é achado de forma vetorizada (primeiro ATIVO
+      vazio/NaN ou "TOTAL");
+    - a conversão de tipos é feita por coluna (mesmas regras de
+      _to_decimal/_to_int da rota: padrão brasileiro "1.234,56", arredondamento
+      ROUND_HALF_UP nas casas da coluna);
+    - as linhas vão para a #ResumoCVSCarga com inserir_lote e um único MERGE
+      grava tudo, devolvendo inseridos/atualizados pelo OUTPUT $action.
+ATIVO repetido na mesma planilha: vale a última linha (como antes, quando a
+última sobrescrevia as anteriores); as repetições contam como ignoradas.
+
+carregar_varios processa vários arquivos em paralelo (threads, cada uma com
+app context e conexão próprios).
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+from sqlalchemy import text
+
+from app import db
+from app.utils.carga_lote import inserir_lote
+from app.utils.log_seguro import log_info
+
+MAX_WORKERS = 4
+
+COLUNAS_PLANILHA = [
+    'ATIVO',
+    'QTDE',
+    'VNA',
+    'FINANCEIRO',
+    'PU_RETROATIVO_JUROS',
+    'FINANCEIRO_JUROS',
+    'PU_RETROATIVO_PRINC',
+    'FINANCEIRO_PRINC',
+    'FINANCEIRO_VENC_PAGAR',
+    'TOTAL',
+]
+
+# Casas decimais de cada coluna numérica (iguais às da tabela)
+CASAS_DECIMAIS = {
+    'VNA': 8,
+    'FINANCEIRO': 2,
+    'PU_RETROATIVO_JUROS': 10,
+    'FINANCEIRO_JUROS': 2,
+    'PU_RETROATIVO_PRINC': 10,
+    'FINANCEIRO_PRINC': 2,
+    'FINANCEIRO_VENC_PAGAR': 2,
+    'TOTAL': 2,
+}
+
+SQL_CRIAR_STAGING = """
+    CREATE TABLE #ResumoCVSCarga (
+        ATIVO VARCHAR(20) NOT NULL PRIMARY KEY,
+        QTDE INT NULL,
+        VNA DECIMAL(18, 8) NULL,
+        FINANCEIRO DECIMAL(18, 2) NULL,
+        PU_RETROATIVO_JUROS DECIMAL(18, 10) NULL,
+        FINANCEIRO_JUROS DECIMAL(18, 2) NULL,
+        PU_RETROATIVO_PRINC DECIMAL(18, 10) NULL,
+        FINANCEIRO_PRINC DECIMAL(18, 2) NULL,
+        FINANCEIRO_VENC_PAGAR DECIMAL(18, 2) NULL,
+        TOTAL DECIMAL(18, 2) NULL
+    )
+"""
+
+SQL_MERGE = """
+    SET NOCOUNT ON;
+
+    DECLARE @acoes TABLE (ACAO NVARCHAR(10));
+
+    MERGE [BDG].[FIN_TB007_RESUMO_CVS] WITH (HOLDLOCK) AS T
+    USING #ResumoCVSCarga AS S
+       ON T.DT_ATUALIZACAO = :dt_atualizacao
+      AND T.NU_CONTRATO = :nu_contrato
+      AND T.ATIVO = S.ATIVO
+    WHEN MATCHED THEN UPDATE SET
+        EVENTO = 'E',
+        DT_CARGA = :dt_carga,
+        QTDE = S.QTDE,
+        VNA = S.VNA,
+        FINANCEIRO = S.FINANCEIRO,
+        PU_RETROATIVO_JUROS = S.PU_RETROATIVO_JUROS,
+        FINANCEIRO_JUROS = S.FINANCEIRO_JUROS,
+        PU_RETROATIVO_PRINC = S.PU_RETROATIVO_PRINC,
+        FINANCEIRO_PRINC = S.FINANCEIRO_PRINC,
+        FINANCEIRO_VENC_PAGAR = S.FINANCEIRO_VENC_PAGAR,
+        TOTAL = S.TOTAL
+    WHEN NOT MATCHED BY TARGET THEN INSERT (
+        DT_CARGA, DT_ATUALIZACAO, NU_CONTRATO, ATIVO, EVENTO, QTDE, VNA, FINANCEIRO,
+        PU_RETROATIVO_JUROS, FINANCEIRO_JUROS, PU_RETROATIVO_PRINC, FINANCEIRO_PRINC,
+        FINANCEIRO_VENC_PAGAR, TOTAL
+    ) VALUES (
+        :dt_carga, :dt_atualizacao, :nu_contrato, S.ATIVO, 'E', S.QTDE, S.VNA, S.FINANCEIRO,
+        S.PU_RETROATIVO_JUROS, S.FINANCEIRO_JUROS, S.PU_RETROATIVO_PRINC, S.FINANCEIRO_PRINC,
+        S.FINANCEIRO_VENC_PAGAR, S.TOTAL
+    )
+    OUTPUT $action INTO @acoes;
+
+    SELECT
+        SUM(CASE WHEN ACAO = 'INSERT' THEN 1 ELSE 0 END) AS INSERIDOS,
+        SUM(CASE WHEN ACAO = 'UPDATE' THEN 1 ELSE 0 END) AS ATUALIZADOS
+    FROM @acoes;
+"""
+
+
+def _texto_numerico(serie):
+    """Normaliza a coluna para texto numérico com ponto decimal; vazio/inválido -> NaN."""
+    texto = serie.astype(str).str.strip()
+    vazio = serie.isna() | texto.str.lower().isin(['', 'nan', 'none', '-'])
+
+    # "1.234,56" (tem ponto e vírgula): ponto é milhar; depois vírgula vira ponto
+    ambos = texto.str.contains(',', regex=False) & texto.str.contains('.', regex=False)
+    texto = texto.where(~ambos, texto.str.replace('.', '', regex=False))
+    texto = texto.str.replace(',', '.', regex=False)
+
+    numeros = pd.to_numeric(texto, errors='coerce')
+    valido = numeros.notna() & np.isfinite(numeros.fillna(0)) & ~vazio
+    return texto.where(valido)
+
+
+def coluna_decimal(serie, casas):
+    """Coluna -> lista de Decimal quantizados em `casas` (None onde vazio/inválido)."""
+    formato = Decimal('1.' + ('0' * casas)) if casas > 0 else Decimal('1')
+    return [
+        Decimal(valor).quantize(formato, rounding=ROUND_HALF_UP) if isinstance(valor, str) else None
+        for valor in _texto_numerico(serie).tolist()
+    ]
+
+
+def coluna_inteira(serie):
+    """Coluna -> lista de int (truncado, como int(float(x))) ou None."""
+    numeros = pd.to_numeric(serie.astype(str).str.strip(), errors='coerce')
+    numeros = numeros.where(np.isfinite(numeros))
+    return [None if pd.isna(valor) else int(valor) for valor in np.trunc(numeros).tolist()]
+
+
+def ler_primeira_tabela(origem):
+    """
+    Lê a primeira aba (cabeçalho na 2ª linha) e corta a primeira tabela.
+    origem -> caminho ou bytes. Retorna DataFrame com COLUNAS_PLANILHA.
+    """
+    if isinstance(origem, (bytes, bytearray)):
+        origem = BytesIO(origem)
+
+    df = pd.read_excel(origem, sheet_name=0, header=1, engine='openpyxl')
+    if df.empty:
+        raise Exception('Planilha está vazia.')
+
+    df = df.iloc[:, :len(COLUNAS_PLANILHA)]
+    if df.shape[1] < len(COLUNAS_PLANILHA):
+        raise Exception(
+            f'Planilha tem apenas {df.shape[1]} colunas; '
+            f'são esperadas {len(COLUNAS_PLANILHA)}.'
+        )
+    df.columns = COLUNAS_PLANILHA
+
+    # Corte vetorizado: para no primeiro ATIVO vazio/NaN ou "TOTAL"
+    ativo = df['ATIVO'].astype(str).str.strip()
+    fim = df['ATIVO'].isna() | ativo.eq('') | ativo.str.upper().eq('TOTAL')
+    limite = int(np.argmax(fim.values)) if fim.any() else len(df)
+    df = df.iloc[:limite].copy()
+
+    if df.empty:
+        raise Exception('Nenhuma linha válida encontrada na primeira tabela do Excel.')
+
+    df['ATIVO'] = ativo.iloc[:limite]
+    return df
+
+
+def montar_linhas(df):
+    """DataFrame cortado -> (linhas na ordem de COLUNAS_PLANILHA, ignorados por ATIVO repetido)."""
+    total = len(df)
+    df = df.drop_duplicates(subset='ATIVO', keep='last')
+
+    colunas = [df['ATIVO'].tolist(), coluna_inteira(df['QTDE'])]
+    colunas.extend(coluna_decimal(df[nome], CASAS_DECIMAIS[nome]) for nome in COLUNAS_PLANILHA[2:])
+    return list(zip(*colunas)), total - len(df)
+
+
+def carregar_resumo(origem, dt_atualizacao, nu_contrato):
+    """Lê a planilha e faz o MERGE numa transação. Retorna (inseridos, atualizados, ignorados)."""
+    inicio = time.perf_counter()
+    linhas, ignorados = montar_linhas(ler_primeira_tabela(origem))
+
+    with db.engine.begin() as connection:
+        connection.execute(text(SQL_CRIAR_STAGING))
+        inserir_lote(connection, '#ResumoCVSCarga', COLUNAS_PLANILHA, linhas)
+        resultado = connection.execute(text(SQL_MERGE), {
+            'dt_atualizacao': dt_atualizacao,
+            'nu_contrato': nu_contrato,
+            'dt_carga': datetime.now().date()
+        }).fetchone()
+        connection.execute(text("DROP TABLE #ResumoCVSCarga"))
+
+    inseridos = int(resultado.INSERIDOS or 0)
+    atualizados = int(resultado.ATUALIZADOS or 0)
+    log_info("Resumo CVS contrato {0} ({1}): {2} inseridos, {3} atualizados, {4} ignorados em {5:.2f}s".format(
+        nu_contrato, dt_atualizacao, inseridos, atualizados, ignorados, time.perf_counter() - inicio))
+    return inseridos, atualizados, ignorados
+
+
+def _carregar_no_contexto(app, item):
+    with app.app_context():
+        inicio = time.perf_counter()
+        situacao = dict(item, inseridos=0, atualizados=0, ignorados=0, erro=None)
+        situacao.pop('conteudo', None)
+        try:
+            situacao['inseridos'], situacao['atualizados'], situacao['ignorados'] = carregar_resumo(
+                item['conteudo'], item['dt_atualizacao'], item['nu_contrato'])
+        except Exception as e:
+            situacao['erro'] = str(e)
+        situacao['decorrido'] = round(time.perf_counter() - inicio, 2)
+        return situacao
+
+
+def carregar_varios(itens, max_workers=MAX_WORKERS):
+    """
+    itens -> lista de dicts com arquivo, conteudo (bytes), dt_atualizacao, nu_contrato.
+    Cada arquivo tem transação própria: um erro não desfaz os demais.
+    Retorna a situação de cada arquivo, na ordem recebida.
+    """
+    app = current_app._get_current_object()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ResumoCVS') as executor:
+        return list(executor.map(lambda item: _carregar_no_contexto(app, item), itens))
@@ -7,7 +7,10 @@ from app.models.siscalculo import (
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
 from decimal import Decimal
-from sqlalchemy import text
+import numpy as np
+from bisect import bisect_left, bisect_right
+from sqlalchemy import text, bindparam
+from app.utils.carga_lote import inserir_lote
 
 
 def truncar(valor, casas=4):
@@ -50,6 +53,72 @@ def arredondar(valor, casas=2):
     return valor.quantize(quantizador, rounding=ROUND_HALF_UP)
 
 
+def _mes_str(data):
+    """Primeiro dia do mês de 'data' no formato de chDTInicio (AAAAMMDD)"""
+    return date(data.year, data.month, 1).strftime('%Y%m%d')
+
+
+def carregar_series_indices(ids_indices, dt_atualizacao):
+    """
+    Busca numa única consulta as séries dos índices até o mês da data de
+    atualização e monta, para cada índice, os fatores acumulados de trás
+    para frente:
+
+        fatores[i] = (1 + indice[i]/100) × (1 + indice[i+1]/100) × ... × (1 + indice[n-1]/100)
+
+    Como todas as parcelas terminam no mesmo mês (o da atualização), o
+    fator de uma parcela é fatores[i], com i = primeiro índice a partir
+    do mês do vencimento (busca binária).
+
+    IMPORTANTE: INCLUI o índice do mês da data de atualização
+    Exemplo: Se data de atualização é 01/02/2018, INCLUI o índice de fevereiro/2018
+
+    Retorna {id_indice: (datas, índices, fatores)}.
+    """
+    ids_indices = [int(id_indice) for id_indice in ids_indices]
+    dt_fim_str = _mes_str(dt_atualizacao)
+    series = {id_indice: ([], []) for id_indice in ids_indices}
+
+    try:
+        sql = text("""
+            SELECT idTipoIndicadorEconomico, chDTInicio, numIndicadorEconomico
+            FROM [DBPRDINDICADORECONOMICO].[dbo].[tblIndicadorEconomico]
+            WHERE idTipoIndicadorEconomico IN :ids
+                AND chDTInicio <= :dt_fim
+            ORDER BY idTipoIndicadorEconomico, chDTInicio
+        """).bindparams(bindparam('ids', expanding=True))
+
+        for row in db.session.execute(sql, {'ids': ids_indices, 'dt_fim': dt_fim_str}):
+            datas, indices = series[int(row[0])]
+            datas.append(str(row[1]).strip())
+            indices.append(Decimal(str(row[2])))
+
+        print(f"    [DEBUG ÍNDICES] Séries até {dt_fim_str}: "
+              f"{', '.join(f'{i}={len(series[i][1])}' for i in ids_indices)} registros")
+
+    except Exception as e:
+        print(f"    [ERRO] Erro ao buscar séries de índices: {e}")
+        import traceback
+        traceback.print_exc()
+        series = {id_indice: ([], []) for id_indice in ids_indices}
+
+    resultado = {}
+    for id_indice, (datas, indices) in series.items():
+        fatores = [Decimal('1.0')] * (len(indices) + 1)
+        for i in range(len(indices) - 1, -1, -1):
+            fatores[i] = (Decimal('1.0') + (indices[i] / Decimal('100'))) * fatores[i + 1]
+        resultado[id_indice] = (datas, indices, fatores)
+    return resultado
+
+
+TABELA_CALCULOS = '[BDG].[MOV_TB031_SISCALCULO_CALCULOS]'
+COLUNAS_CALCULOS = [
+    'IMOVEL', 'DT_VENCIMENTO', 'VR_COTA', 'DT_ATUALIZACAO', 'ID_INDICE_ECONOMICO',
+    'TEMPO_ATRASO', 'PERC_ATUALIZACAO', 'ATM', 'VR_JUROS', 'VR_MULTA', 'VR_DESCONTO',
+    'VR_TOTAL', 'PERC_HONORARIOS', 'ID_TIPO', 'PRESCRITO'
+]
+
+
 class CalculadorSiscalculo:
     """Classe responsável pelos cálculos do SISCalculo"""
 
@@ -66,6 +135,7 @@ class CalculadorSiscalculo:
         self.perc_honorarios = perc_honorarios  # NOVO: Percentual de honorários personalizável
         self.imovel = imovel
         self.dados_processados = []
+        self._serie_indices = None  # (datas, índices, fatores acumulados) - ver _carregar_serie_indices
 
     def calcular(self):
         """Executa os cálculos para todas as parcelas importadas"""
@@ -124,35 +194,17 @@ class CalculadorSiscalculo:
 
             print(f"\n[3] Processando {len(dados)} parcelas válidas...")
 
+            linhas_calculos = []
             for idx, dado in enumerate(dados, 1):
                 try:
-                    print(f"\n[3.{idx}] Processando parcela {idx}/{len(dados)}: Vencimento {dado.DT_VENCIMENTO}")
                     resultado_parcela = self.calcular_parcela_completa(dado)
                     if not resultado_parcela:
-                        print(f"  [AVISO] Erro ao calcular parcela")
+                        print(f"  [AVISO] Erro ao calcular parcela {idx} (vencimento {dado.DT_VENCIMENTO})")
                         continue
 
-                    novo_calculo = SiscalculoCalculos(
-                        IMOVEL=dado.IMOVEL or '',
-                        DT_VENCIMENTO=dado.DT_VENCIMENTO,
-                        VR_COTA=dado.VR_COTA,
-                        DT_ATUALIZACAO=self.dt_atualizacao,
-                        ID_INDICE_ECONOMICO=self.id_indice,
-                        TEMPO_ATRASO=resultado_parcela['meses_atraso_total'],
-                        PERC_ATUALIZACAO=resultado_parcela['percentual_total'],
-                        ATM=resultado_parcela['atm'],
-                        VR_JUROS=resultado_parcela['total_juros'],
-                        VR_MULTA=resultado_parcela['total_multa'],
-                        VR_DESCONTO=resultado_parcela['total_desconto'],
-                        VR_TOTAL=resultado_parcela['valor_total'],
-                        PERC_HONORARIOS=self.perc_honorarios,
-                        ID_TIPO=dado.ID_TIPO,
-                        PRESCRITO=False  # ✅ NOVO: Marcada como válida
-                    )
-                    db.session.add(novo_calculo)
+                    linhas_calculos.append(self._linha_calculo(dado, resultado_parcela, prescrito=False))
                     total_processado += resultado_parcela['valor_total']
                     registros_calculados += 1
-                    print(f"  [RESULTADO] Total da parcela: R$ {resultado_parcela['valor_total']}")
 
                 except Exception as e:
                     print(f"  [ERRO] Erro ao processar parcela {idx}: {str(e)}")
@@ -160,8 +212,9 @@ class CalculadorSiscalculo:
                     traceback.print_exc()
                     continue
 
-            print(f"\n[4] Realizando commit de {registros_calculados} registros válidos...")
+            print(f"\n[4] Gravando em lote {registros_calculados} registros válidos...")
             try:
+                inserir_lote(db.session.connection(), TABELA_CALCULOS, COLUNAS_CALCULOS, linhas_calculos)
                 db.session.commit()
                 print("[4] Commit realizado com sucesso!")
             except Exception as e:
@@ -191,11 +244,9 @@ class CalculadorSiscalculo:
             if prescricoes:
                 print(f"[5] Encontradas {len(prescricoes)} parcelas prescritas para calcular.")
 
+                linhas_prescritas = []
                 for i, prescricao in enumerate(prescricoes, 1):
                     try:
-                        print(
-                            f"\n[5.{i}] Parcela prescrita {i}/{len(prescricoes)}: Vencimento {prescricao.DT_VENCIMENTO}")
-
                         # Criar objeto temporário com a mesma interface de SiscalculoDados
                         # para reutilizar calcular_parcela_completa() sem modificá-la
                         class DadoTemporario:
@@ -210,28 +261,11 @@ class CalculadorSiscalculo:
                         resultado_parcela = self.calcular_parcela_completa(dado_temp)
 
                         if resultado_parcela:
-                            calculo_prescrito = SiscalculoCalculos(
-                                IMOVEL=prescricao.IMOVEL or '',
-                                DT_VENCIMENTO=prescricao.DT_VENCIMENTO,
-                                VR_COTA=prescricao.VR_COTA,
-                                DT_ATUALIZACAO=self.dt_atualizacao,
-                                ID_INDICE_ECONOMICO=self.id_indice,
-                                TEMPO_ATRASO=resultado_parcela['meses_atraso_total'],
-                                PERC_ATUALIZACAO=resultado_parcela['percentual_total'],
-                                ATM=resultado_parcela['atm'],
-                                VR_JUROS=resultado_parcela['total_juros'],
-                                VR_MULTA=resultado_parcela['total_multa'],
-                                VR_DESCONTO=resultado_parcela['total_desconto'],
-                                VR_TOTAL=resultado_parcela['valor_total'],
-                                PERC_HONORARIOS=self.perc_honorarios,
-                                ID_TIPO=getattr(prescricao, 'ID_TIPO', None),
-                                PRESCRITO=True  # ✅ Marcada como prescrita
-                            )
-                            db.session.add(calculo_prescrito)
+                            linhas_prescritas.append(
+                                self._linha_calculo(dado_temp, resultado_parcela, prescrito=True))  # ✅ Marcada como prescrita
                             registros_prescritos += 1
-                            print(f"  ✅ Prescrita calculada - VR_TOTAL: R$ {resultado_parcela['valor_total']}")
                         else:
-                            print(f"  [AVISO] Parcela prescrita sem resultado")
+                            print(f"  [AVISO] Parcela prescrita {prescricao.DT_VENCIMENTO} sem resultado")
 
                     except Exception as e:
                         print(f"  [ERRO] Prescrita {prescricao.DT_VENCIMENTO}: {e}")
@@ -240,6 +274,7 @@ class CalculadorSiscalculo:
                         continue
 
                 try:
+                    inserir_lote(db.session.connection(), TABELA_CALCULOS, COLUNAS_CALCULOS, linhas_prescritas)
                     db.session.commit()
                     print(f"\n[5] ✅ {registros_prescritos} prescritas calculadas e salvas com PRESCRITO=True.")
                 except Exception as e:
@@ -273,6 +308,30 @@ class CalculadorSiscalculo:
             db.session.rollback()
             return {'sucesso': False, 'erro': f'Erro crítico: {str(e)}'}
 
+    def _linha_calculo(self, dado, resultado_parcela, prescrito):
+        """
+        Linha da MOV_TB031 na ordem de COLUNAS_CALCULOS.
+        Decimais já na escala da coluna: no fast_executemany o tipo do parâmetro
+        vem do primeiro registro e todas as linhas precisam ter a mesma escala.
+        """
+        return (
+            dado.IMOVEL or '',
+            dado.DT_VENCIMENTO,
+            arredondar(Decimal(str(dado.VR_COTA)), 2),
+            self.dt_atualizacao,
+            self.id_indice,
+            resultado_parcela['meses_atraso_total'],
+            arredondar(resultado_parcela['percentual_total'], 4),
+            arredondar(resultado_parcela['atm'], 2),
+            arredondar(resultado_parcela['total_juros'], 2),
+            arredondar(resultado_parcela['total_multa'], 2),
+            arredondar(resultado_parcela['total_desconto'], 2),
+            arredondar(resultado_parcela['valor_total'], 2),
+            arredondar(Decimal(str(self.perc_honorarios)), 2),
+            getattr(dado, 'ID_TIPO', None),
+            1 if prescrito else 0
+        )
+
     def calcular_parcela_completa(self, dado):
         """
         Calcula UMA parcela com TODAS as etapas de arredondamento
@@ -283,14 +342,8 @@ class CalculadorSiscalculo:
         3. Cálculo correto de meses considerando apenas ano e mês (ignora dia)
         """
         try:
-            print(f"\n=== CALCULANDO PARCELA ===")
-            print(f"Imóvel: {dado.IMOVEL}")
-            print(f"Vencimento: {dado.DT_VENCIMENTO}")
-            print(f"Atualização: {self.dt_atualizacao}")
-
             # 1. ARREDONDAR VR_COTA (2 casas decimais)
             vr_cota_arredondado = arredondar(dado.VR_COTA, 2)
-            print(f"    VR_COTA arredondado: R$ {vr_cota_arredondado}")
 
             # 2. MESES DE ATRASO - Calcular diferença em meses
             delta = relativedelta(self.dt_atualizacao, dado.DT_VENCIMENTO)
@@ -301,11 +354,8 @@ class CalculadorSiscalculo:
             if meses_atraso == 0 and self.dt_atualizacao > dado.DT_VENCIMENTO:
                 meses_atraso = 1
 
-            print(f"    Meses de atraso: {meses_atraso}")
-
             # ✅ CORREÇÃO: Se meses <= 0, zerar TUDO
             if meses_atraso <= 0:
-                print(f"    [AVISO] Meses de atraso <= 0: Zerando todos os encargos")
                 return {
                     'meses_atraso_total': meses_atraso,
                     'percentual_total': Decimal('0'),
@@ -316,22 +366,12 @@ class CalculadorSiscalculo:
                     'valor_total': vr_cota_arredondado
                 }
 
-            # 3. Buscar índices do período e calcular FATOR ACUMULADO
-            indices_periodo = self._obter_indices_periodo(dado.DT_VENCIMENTO, self.dt_atualizacao)
-
-            # Calcular fator acumulado (juros compostos)
-            fator_acumulado = Decimal('1.0')
-            for indice in indices_periodo:
-                fator_mes = Decimal('1.0') + (indice / Decimal('100'))
-                fator_acumulado = fator_acumulado * fator_mes
+            # 3. FATOR ACUMULADO (juros compostos) do mês do vencimento até o da atualização
+            fator_acumulado, _ = self._fator_acumulado(dado.DT_VENCIMENTO)
 
             # Percentual = (Fator - 1)
             percentual_correcao = (fator_acumulado - Decimal('1.0'))
 
-            print(f"    Total de índices aplicados: {len(indices_periodo)}")
-            print(f"    Fator acumulado: {fator_acumulado}")
-            print(f"    Percentual de correção: {(percentual_correcao * Decimal('100')):.4f}%")
-
             # 4. VR_Atual = VR_COTA × Fator_Acumulado
             vr_atual_calculado = vr_cota_arredondado * fator_acumulado
             vr_atual_arredondado = arredondar(vr_atual_calculado, 2)
@@ -340,9 +380,6 @@ class CalculadorSiscalculo:
             atm = vr_atual_arredondado - vr_cota_arredondado
             atm_arredondado = arredondar(atm, 2)
 
-            print(f"    Valor Atualizado: R$ {vr_atual_arredondado}")
-            print(f"    ATM: R$ {atm_arredondado}")
-
             # 6. JUROS = VR_Atual × (Taxa × Meses)
             valor_juros_calculado = vr_atual_arredondado * self.TAXA_JUROS_MENSAL * Decimal(str(meses_atraso))
             juros_arredondado = arredondar(valor_juros_calculado, 4)
@@ -363,10 +400,6 @@ class CalculadorSiscalculo:
             soma = vr_atual_arredondado + juros_arredondado + multa_arredondada - valor_desconto
             soma_final = arredondar(soma, 2)
 
-            print(f"    Juros: R$ {juros_arredondado}")
-            print(f"    Multa: R$ {multa_arredondada}")
-            print(f"    SOMA: R$ {soma_final}")
-
             return {
                 'meses_atraso_total': meses_atraso,
                 'percentual_total': percentual_correcao,
@@ -383,66 +416,31 @@ class CalculadorSiscalculo:
             traceback.print_exc()
             return None
 
-    def _obter_indices_periodo(self, dt_inicio, dt_fim):
+    def _carregar_serie_indices(self):
         """
-        Busca TODOS os índices do período (mês a mês)
-        Retorna lista com os percentuais
-
-        Exemplo de retorno: [0.25, 0.57, 0.42, ...]
-
-        IMPORTANTE: INCLUI o índice do mês da data de atualização
-
-        Exemplo: Se data de atualização é 01/02/2018, INCLUI o índice de fevereiro/2018
+        Busca UMA vez a série do índice (ver carregar_series_indices) - sem
+        consulta por parcela.
         """
-        try:
-            # Primeiro dia do mês de início
-            dt_inicio_mes = date(dt_inicio.year, dt_inicio.month, 1)
-
-            # ✅ CORREÇÃO DEFINITIVA: Incluir o mês da data de atualização
-            # Se dt_fim = 01/02/2018, pega até 01/02/2018 (INCLUI fevereiro)
-            dt_fim_mes_atual = date(dt_fim.year, dt_fim.month, 1)
-
-            dt_inicio_str = dt_inicio_mes.strftime('%Y%m%d')
-            dt_fim_str = dt_fim_mes_atual.strftime('%Y%m%d')
-
-            print(f"    [DEBUG ÍNDICES] Período: {dt_inicio_str} até {dt_fim_str}")
-
-            # Query simples já que IPCA (id=9) tem apenas 1 registro por mês
-            sql = text("""
-                SELECT numIndicadorEconomico
-                FROM [DBPRDINDICADORECONOMICO].[dbo].[tblIndicadorEconomico]
-                WHERE idTipoIndicadorEconomico = :id_tipo
-                    AND chDTInicio >= :dt_inicio
-                    AND chDTInicio <= :dt_fim
-                ORDER BY chDTInicio
-            """)
-
-            resultado = db.session.execute(
-                sql,
-                {
-                    'id_tipo': self.id_indice,
-                    'dt_inicio': dt_inicio_str,
-                    'dt_fim': dt_fim_str
-                }
-            )
+        if self._serie_indices is None:
+            self._serie_indices = carregar_series_indices([self.id_indice], self.dt_atualizacao)[self.id_indice]
+        return self._serie_indices
 
-            # Retorna lista de Decimals
-            indices = [Decimal(str(row[0])) for row in resultado.fetchall()]
+    def _fator_acumulado(self, dt_inicio):
+        """(fator acumulado, quantidade de índices) do mês de dt_inicio até o mês da atualização"""
+        datas, _, fatores = self._carregar_serie_indices()
+        posicao = bisect_left(datas, _mes_str(dt_inicio))
 
-            if len(indices) > 0:
-                print(f"    [DEBUG] Total de índices retornados: {len(indices)}")
-                print(f"    [DEBUG] Primeiros 3 índices: {indices[:3]}")
-                print(f"    [DEBUG] Últimos 3 índices: {indices[-3:]}")
-            else:
-                print(f"    [AVISO] Nenhum índice encontrado para o período!")
+        return fatores[posicao], len(datas) - posicao
 
-            return indices
+    def _obter_indices_periodo(self, dt_inicio, dt_fim):
+        """
+        Índices do período (mês a mês), lidos da série já carregada.
+        dt_fim é sempre o mês da data de atualização (limite da série).
 
-        except Exception as e:
-            print(f"    [ERRO] Erro ao buscar índices do período: {e}")
-            import traceback
-            traceback.print_exc()
-            return []
+        Exemplo de retorno: [0.25, 0.57, 0.42, ...]
+        """
+        datas, indices, _ = self._carregar_serie_indices()
+        return indices[bisect_left(datas, _mes_str(dt_inicio)):bisect_right(datas, _mes_str(dt_fim))]
 
     def gerar_resumo(self):
         """Gera resumo dos cálculos processados"""
@@ -467,4 +465,185 @@ class CalculadorSiscalculo:
             'honorarios': float(honorarios),
             'total_final': float(total_final),
             'quantidade_cotas': len(self.dados_processados)
-        }
\ No newline at end of file
+        }
+
+class CalculadorMultiIndice:
+    """
+    Calcula as parcelas importadas de um imóvel para VÁRIOS índices de uma vez.
+
+    As parcelas são lidas uma vez e o cálculo é feito como matriz NumPy
+    parcelas × índices: o fator acumulado de cada célula sai da tabela de
+    fatores do índice (searchsorted pelo mês do vencimento) e as etapas de
+    arredondamento de calcular_parcela_completa são aplicadas à matriz
+    inteira. As células são Decimal (dtype=object), então os valores são
+    idênticos aos do cálculo índice a índice. Todos os resultados são
+    gravados juntos (um DELETE + um inserir_lote).
+    """
+
+    def __init__(self, dt_atualizacao, ids_indices, usuario, perc_honorarios=Decimal('10.00'), imovel=None):
+        self.dt_atualizacao = dt_atualizacao
+        self.ids_indices = [int(id_indice) for id_indice in ids_indices]
+        self.usuario = usuario
+        self.perc_honorarios = perc_honorarios
+        self.imovel = imovel
+
+    def _parcelas(self):
+        """(parcelas válidas, parcelas prescritas) do imóvel na data de atualização"""
+        from app.models.siscalculo import SiscalculoPrescricoes
+
+        dados = SiscalculoDados.query.filter_by(
+            DT_ATUALIZACAO=self.dt_atualizacao,
+            IMOVEL=self.imovel
+        ).order_by(
+            SiscalculoDados.DT_VENCIMENTO,
+            SiscalculoDados.ID_TIPO
+        ).all()
+
+        prescricoes = SiscalculoPrescricoes.query.filter_by(
+            DT_ATUALIZACAO=self.dt_atualizacao,
+            IMOVEL=self.imovel
+        ).order_by(SiscalculoPrescricoes.DT_VENCIMENTO).all()
+
+        # Sobras de execuções anteriores sob outro índice repetiriam os vencimentos
+        # (e a chave da MOV_TB031): vale só o índice da gravação mais recente
+        if prescricoes:
+            recente = max(prescricoes, key=lambda p: (p.DT_PROCESSAMENTO, p.ID_PRESCRICAO))
+            prescricoes = [p for p in prescricoes if p.ID_INDICE_ECONOMICO == recente.ID_INDICE_ECONOMICO]
+
+        return dados, prescricoes
+
+    def _matriz_fatores(self, vencimentos, series):
+        """Matriz (parcelas × índices) de fatores acumulados Decimal"""
+        meses = np.array([_mes_str(dt) for dt in vencimentos])
+        fatores = np.empty((len(vencimentos), len(self.ids_indices)), dtype=object)
+        for coluna, id_indice in enumerate(self.ids_indices):
+            datas, _, fatores_indice = series[id_indice]
+            posicoes = np.searchsorted(np.array(datas, dtype=str), meses, side='left')
+            fatores[:, coluna] = np.array(fatores_indice, dtype=object)[posicoes]
+        return fatores
+
+    def _calcular_matriz(self, parcelas, series):
+        """
+        Mesmas etapas de calcular_parcela_completa, em matriz.
+        Retorna as linhas da MOV_TB031 (ordem de COLUNAS_CALCULOS) sem a coluna PRESCRITO.
+        """
+        if not parcelas:
+            return []
+
+        dt_atualizacao = self.dt_atualizacao
+        vr_cota = np.array([arredondar(p.VR_COTA, 2) for p in parcelas], dtype=object)
+
+        meses_atraso = []
+        for p in parcelas:
+            delta = relativedelta(dt_atualizacao, p.DT_VENCIMENTO)
+            meses = delta.years * 12 + delta.months
+            if meses == 0 and dt_atualizacao > p.DT_VENCIMENTO:
+                meses = 1
+            meses_atraso.append(meses)
+        meses_atraso = np.array(meses_atraso)
+        sem_atraso = (meses_atraso <= 0)[:, None]
+
+        taxa_multa = np.array([
+            CalculadorSiscalculo.MULTA_ANTIGA if p.DT_VENCIMENTO <= CalculadorSiscalculo.DATA_MUDANCA_MULTA
+            else CalculadorSiscalculo.MULTA_NOVA
+            for p in parcelas
+        ], dtype=object)[:, None]
+
+        arred2 = np.frompyfunc(lambda valor: arredondar(valor, 2), 1, 1)
+        arred4 = np.frompyfunc(lambda valor: arredondar(valor, 4), 1, 1)
+
+        fator = self._matriz_fatores([p.DT_VENCIMENTO for p in parcelas], series)
+        cota = vr_cota[:, None]
+        # Mesma escala em todas as linhas (fast_executemany, ver _linha_calculo)
+        zero = Decimal('0.00')
+
+        percentual = np.where(sem_atraso, Decimal('0'), fator - Decimal('1.0'))
+        vr_atual = arred2(cota * fator)
+        atm = np.where(sem_atraso, zero, arred2(vr_atual - cota))
+        juros = np.where(
+            sem_atraso, zero,
+            arred4(vr_atual * CalculadorSiscalculo.TAXA_JUROS_MENSAL
+                   * np.array([Decimal(str(m)) for m in meses_atraso], dtype=object)[:, None]))
+        multa = np.where(sem_atraso, zero, arred2(vr_atual * taxa_multa / Decimal('100')))
+        total = np.where(sem_atraso, cota, arred2(vr_atual + juros + multa))
+
+        perc_honorarios = arredondar(Decimal(str(self.perc_honorarios)), 2)
+        linhas = []
+        for coluna, id_indice in enumerate(self.ids_indices):
+            for i, p in enumerate(parcelas):
+                linhas.append((
+                    p.IMOVEL or '',
+                    p.DT_VENCIMENTO,
+                    arredondar(Decimal(str(p.VR_COTA)), 2),
+                    dt_atualizacao,
+                    id_indice,
+                    int(meses_atraso[i]),
+                    arredondar(percentual[i, coluna], 4),
+                    atm[i, coluna],
+                    arredondar(juros[i, coluna], 2),
+                    multa[i, coluna],
+                    zero,
+                    total[i, coluna],
+                    perc_honorarios,
+                    getattr(p, 'ID_TIPO', None),
+                ))
+        return linhas
+
+    def calcular(self):
+        """Calcula e grava todos os índices. Retorna o resumo por índice."""
+        try:
+            print("=" * 80)
+            print(f"SISCALCULO MULTI-ÍNDICE - Imóvel {self.imovel}, DT {self.dt_atualizacao}, "
+                  f"índices {self.ids_indices}")
+            print("=" * 80)
+
+            dados, prescricoes = self._parcelas()
+            if not dados:
+                return {'sucesso': False, 'erro': 'Nenhum dado encontrado para processar'}
+
+            series = carregar_series_indices(self.ids_indices, self.dt_atualizacao)
+
+            linhas = [linha + (0,) for linha in self._calcular_matriz(dados, series)]
+            linhas += [linha + (1,) for linha in self._calcular_matriz(prescricoes, series)]
+
+            db.session.execute(text("""
+                DELETE FROM [BDG].[MOV_TB031_SISCALCULO_CALCULOS]
+                WHERE DT_ATUALIZACAO = :dt_atualizacao
+                    AND IMOVEL = :imovel
+                    AND ID_INDICE_ECONOMICO IN :ids
+            """).bindparams(bindparam('ids', expanding=True)), {
+                'dt_atualizacao': self.dt_atualizacao,
+                'imovel': self.imovel,
+                'ids': self.ids_indices
+            })
+            inserir_lote(db.session.connection(), TABELA_CALCULOS, COLUNAS_CALCULOS, linhas)
+            db.session.commit()
+
+            resumo = {}
+            for linha in linhas:
+                item = resumo.setdefault(linha[4], {'registros_processados': 0, 'valor_total': Decimal('0'),
+                                                    'registros_prescritos': 0})
+                if linha[-1]:
+                    item['registros_prescritos'] += 1
+                else:
+                    item['registros_processados'] += 1
+                    item['valor_total'] += linha[11]
+
+            for id_indice, item in resumo.items():
+                item['valor_total'] = float(item['valor_total'])
+                print(f"[MULTI-ÍNDICE] Índice {id_indice}: {item['registros_processados']} válidas, "
+                      f"{item['registros_prescritos']} prescritas, R$ {item['valor_total']:,.2f}")
+
+            return {
+                'sucesso': True,
+                'registros_processados': len(dados),
+                'registros_prescritos': len(prescricoes),
+                'indices': resumo
+            }
+
+        except Exception as e:
+            print(f"[ERRO CRÍTICO] SISCalculo multi-índice: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            db.session.rollback()
+            return {'sucesso': False, 'erro': f'Erro crítico: {str(e)}'}
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/siscalculo_importacao.py
+
+Importação da planilha do SISCalculo em lote.
+
+A planilha inteira é validada e convertida de uma vez (colunas do DataFrame,
+sem iterrows) e gravada com inserir_lote (fast_executemany), em vez de um
+objeto ORM + db.session.add por parcela.
+
+Regras (as mesmas da importação linha a linha):
+  - DATA VENCIMENTO vazia             -> linha ignorada
+  - data: serial do Excel (dias desde 1899-12-30), datetime, ou texto em
+    dd/mm/aaaa, dd-mm-aaaa ou mm/dd/aaaa (nessa ordem de prioridade)
+  - data não convertida, ano > atual + 2 ou ano < 1990 -> rejeitada (erro)
+  - VALOR COTA vazio ou <= 0          -> linha ignorada; texto não numérico -> erro
+  - TIPO DA PARCELA vazio/inválido/fora de 1..5 -> 1 (Cota Condomínio)
+  - vencimento dentro do período de prescrição -> MOV_TB032 (prescritas)
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+import io
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+import pandas as pd
+
+from app.utils.carga_lote import inserir_lote
+from app.utils.log_seguro import log_info
+
+BASE_SERIAL_EXCEL = pd.Timestamp('1899-12-30')
+MAIOR_SERIAL_EXCEL = 2958465  # 31/12/9999
+
+FORMATOS_DATA = [
+    '%d/%m/%Y',  # 02/10/2022 (FORMATO BRASILEIRO - PRIORIDADE)
+    '%d-%m-%Y',  # 02-10-2022
+    '%m/%d/%Y',  # 10/02/2022 (formato americano como fallback)
+]
+
+TIPOS_PARCELA = [1, 2, 3, 4, 5]
+CENTAVOS = Decimal('0.01')  # escala de VR_COTA (NUMERIC(18,2)), igual em todas as linhas do lote
+ANO_MINIMO = 1990
+
+COLUNAS_DADOS = ['IMOVEL', 'NOME_CONDOMINIO', 'DT_VENCIMENTO', 'VR_COTA', 'DT_ATUALIZACAO', 'ID_TIPO']
+COLUNAS_PRESCRICOES = ['IMOVEL', 'NOME_CONDOMINIO', 'DT_VENCIMENTO', 'VR_COTA', 'DT_ATUALIZACAO',
+                       'ID_INDICE_ECONOMICO', 'PERIODO_PRESCRICAO', 'DT_PROCESSAMENTO', 'USUARIO', 'ID_TIPO']
+
+
+def ler_planilha(arquivo):
+    """
+    Lê a planilha do SISCalculo (arquivo, caminho ou bytes).
+    B1 = número do imóvel, B2 = nome do condomínio, dados a partir da linha 3.
+    Retorna (numero_imovel, nome_condominio, df, tem_coluna_tipo).
+    """
+    if isinstance(arquivo, (bytes, bytearray)):
+        def origem():
+            return io.BytesIO(arquivo)
+    else:
+        def origem():
+            if hasattr(arquivo, 'seek'):
+                arquivo.seek(0)
+            return arquivo
+
+    cabecalho = pd.read_excel(origem(), header=None, nrows=2)
+    numero_imovel = str(int(cabecalho.iloc[0, 1]))
+    nome_condominio = str(cabecalho.iloc[1, 1]) if pd.notna(cabecalho.iloc[1, 1]) else ''
+
+    df = pd.read_excel(origem(), header=2)
+    tem_coluna_tipo = 'TIPO DA PARCELA' in df.columns
+    if not tem_coluna_tipo:
+        df['TIPO DA PARCELA'] = 1  # Padrão: Cota Condomínio
+
+    return numero_imovel, nome_condominio, df, tem_coluna_tipo
+
+
+def limpar_processamento(imovel, dt_atualizacao, ids_indices):
+    """
+    Remove os dados importados e os cálculos/prescrições anteriores do imóvel
+    na data de atualização para os índices informados (sem commit).
+    """
+    from app.models.siscalculo import SiscalculoDados, SiscalculoCalculos, SiscalculoPrescricoes
+
+    SiscalculoDados.query.filter_by(IMOVEL=imovel, DT_ATUALIZACAO=dt_atualizacao).delete()
+    SiscalculoCalculos.query.filter(
+        SiscalculoCalculos.IMOVEL == imovel,
+        SiscalculoCalculos.DT_ATUALIZACAO == dt_atualizacao,
+        SiscalculoCalculos.ID_INDICE_ECONOMICO.in_(ids_indices)
+    ).delete(synchronize_session=False)
+    SiscalculoPrescricoes.query.filter(
+        SiscalculoPrescricoes.IMOVEL == imovel,
+        SiscalculoPrescricoes.DT_ATUALIZACAO == dt_atualizacao,
+        SiscalculoPrescricoes.ID_INDICE_ECONOMICO.in_(ids_indices)
+    ).delete(synchronize_session=False)
+
+
+def _eh_numero(valor):
+    return isinstance(valor, (int, float, np.integer, np.floating)) and not isinstance(valor, bool)
+
+
+def _serial_excel(serie):
+    serie = serie.astype(float)
+    serie = serie.where((serie >= 0) & (serie <= MAIOR_SERIAL_EXCEL))
+    return BASE_SERIAL_EXCEL + pd.to_timedelta(serie, unit='D')
+
+
+def converter_datas_vencimento(serie):
+    """Converte a coluna DATA VENCIMENTO para datetime64; o que não converter vira NaT."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return pd.to_datetime(serie)
+    if pd.api.types.is_numeric_dtype(serie):
+        return _serial_excel(serie)
+
+    resultado = pd.Series(pd.NaT, index=serie.index, dtype='datetime64[ns]')
+
+    numeros = serie.map(_eh_numero)
+    if numeros.any():
+        resultado[numeros] = _serial_excel(serie[numeros])
+
+    datas = serie.map(lambda valor: isinstance(valor, datetime))
+    if datas.any():
+        resultado[datas] = pd.to_datetime(serie[datas])
+
+    textos = serie.map(lambda valor: isinstance(valor, str))
+    for formato in FORMATOS_DATA:
+        pendentes = textos & resultado.isna()
+        if not pendentes.any():
+            break
+        resultado[pendentes] = pd.to_datetime(serie[pendentes], format=formato, errors='coerce')
+
+    return resultado
+
+
+def preparar_parcelas(df, prescricao=None):
+    """
+    df         -> DataFrame lido a partir da linha 3 da planilha
+    prescricao -> None ou (ano_inicio, mes_inicio, ano_fim, mes_fim)
+
+    Retorna (parcelas, resumo): 'parcelas' tem DT_VENCIMENTO (date), VR_COTA (Decimal),
+    ID_TIPO (int) e PRESCRITA (bool) só das linhas aceitas; 'resumo' traz as contagens.
+    """
+    brutas = df['DATA VENCIMENTO']
+    vazias = brutas.isna()
+    datas = converter_datas_vencimento(brutas)
+
+    ano_atual = datetime.now().year
+    anos = datas.dt.year
+    datas_rejeitadas = ~vazias & (datas.isna() | (anos > ano_atual + 2) | (anos < ANO_MINIMO))
+
+    valores = pd.to_numeric(df['VALOR COTA'], errors='coerce')
+    valor_texto = df['VALOR COTA'].notna() & valores.isna()
+
+    candidatas = ~vazias & ~datas_rejeitadas
+    erros = datas_rejeitadas | (candidatas & valor_texto)
+    aceitas = candidatas & ~valor_texto & (valores > 0)
+
+    if 'TIPO DA PARCELA' in df.columns:
+        tipos = np.trunc(pd.to_numeric(df['TIPO DA PARCELA'], errors='coerce'))
+        tipos = tipos.where(tipos.isin(TIPOS_PARCELA), 1).astype(int)
+    else:
+        tipos = pd.Series(1, index=df.index)
+
+    parcelas = pd.DataFrame({
+        'DT_VENCIMENTO': datas[aceitas].dt.date,
+        'VR_COTA': [Decimal(str(valor)).quantize(CENTAVOS, rounding=ROUND_HALF_UP) for valor in valores[aceitas]],
+        'ID_TIPO': tipos[aceitas],
+    }, index=df.index[aceitas])
+
+    if prescricao:
+        ano_inicio, mes_inicio, ano_fim, mes_fim = prescricao
+        chave = anos[aceitas] * 100 + datas[aceitas].dt.month
+        parcelas['PRESCRITA'] = chave.between(ano_inicio * 100 + mes_inicio, ano_fim * 100 + mes_fim)
+    else:
+        parcelas['PRESCRITA'] = False
+
+    resumo = {
+        'total_linhas': len(df),
+        'ignoradas': int((~aceitas & ~erros).sum()),
+        'erros': int(erros.sum()),
+        'validas': int((~parcelas['PRESCRITA']).sum()),
+        'prescritas': int(parcelas['PRESCRITA'].sum()),
+    }
+    return parcelas, resumo
+
+
+def gravar_parcelas(connection, parcelas, imovel, nome_condominio, dt_atualizacao,
+                    id_indice=None, periodo_prescricao=None, usuario=None):
+    """
+    Grava as parcelas válidas na MOV_TB030 e as prescritas na MOV_TB032 na
+    conexão/transação recebida (commit fica com quem chamou).
+    Retorna (válidas gravadas, prescritas gravadas).
+    """
+    validas = parcelas[~parcelas['PRESCRITA']]
+    prescritas = parcelas[parcelas['PRESCRITA']]
+
+    qtd_validas = inserir_lote(
+        connection, '[BDG].[MOV_TB030_SISCALCULO_DADOS]', COLUNAS_DADOS,
+        ((imovel, nome_condominio, dt_venc, vr_cota, dt_atualizacao, int(tipo))
+         for dt_venc, vr_cota, tipo in zip(validas['DT_VENCIMENTO'], validas['VR_COTA'], validas['ID_TIPO']))
+    ) if len(validas) else 0
+
+    qtd_prescritas = 0
+    if len(prescritas):
+        dt_processamento = datetime.utcnow()
+        qtd_prescritas = inserir_lote(
+            connection, '[BDG].[MOV_TB032_SISCALCULO_PRESCRICOES]', COLUNAS_PRESCRICOES,
+            ((imovel, nome_condominio, dt_venc, vr_cota, dt_atualizacao, id_indice,
+              periodo_prescricao, dt_processamento, usuario, int(tipo))
+             for dt_venc, vr_cota, tipo in zip(prescritas['DT_VENCIMENTO'], prescritas['VR_COTA'],
+                                               prescritas['ID_TIPO']))
+        )
+
+    log_info("SISCalculo - imóvel {0}: {1} parcelas importadas, {2} prescritas".format(
+        imovel, qtd_validas, qtd_prescritas))
+    return qtd_validas, qtd_prescritas
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/siscalculo_lote.py
+
+SISCalculo em lote: várias planilhas (upload múltiplo e/ou ZIP) com a mesma
+data de atualização, processadas num único job em segundo plano
+(utils/processo_jobs).
+
+Cada planilha é um imóvel (B1 = imóvel, B2 = condomínio). Um pool de threads
+lê, importa e calcula os imóveis em paralelo - cada worker com seu próprio
+app context, logo com sua própria sessão/conexão. O job registra uma etapa
+por planilha (situação, parcelas, tempo) e devolve o resumo por imóvel, usado
+na página do lote e na exportação consolidada.
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+from zipfile import ZipFile, BadZipFile
+
+from flask import current_app
+
+from app import db
+from app.utils.log_seguro import log_info
+from app.utils.processo_jobs import concluir_etapa
+from app.utils.siscalculo_calc import CalculadorMultiIndice
+from app.utils.siscalculo_importacao import ler_planilha, limpar_processamento, preparar_parcelas, gravar_parcelas
+
+# Imóveis processados ao mesmo tempo (cada um usa uma conexão do pool)
+MAX_WORKERS = 4
+MAX_ARQUIVOS = 300
+
+EXTENSOES_PLANILHA = ('.xlsx', '.xlsm', '.xls')
+
+STATUS_OK = 'OK'
+STATUS_SEM_PARCELAS = 'SEM PARCELAS'
+STATUS_DUPLICADO = 'DUPLICADO'
+STATUS_ERRO = 'ERRO'
+
+
+def _eh_planilha(nome):
+    base = os.path.basename(nome)
+    return bool(base) and not base.startswith('~$') and base.lower().endswith(EXTENSOES_PLANILHA)
+
+
+def extrair_planilhas(uploads):
+    """
+    uploads -> lista de (nome do arquivo, bytes); ZIPs são abertos e só as
+    planilhas de dentro são consideradas. Retorna lista de (nome, bytes).
+    """
+    planilhas = []
+    for nome, conteudo in uploads:
+        if nome.lower().endswith('.zip'):
+            try:
+                with ZipFile(BytesIO(conteudo)) as zip_file:
+                    for info in zip_file.infolist():
+                        if info.is_dir() or info.filename.startswith('__MACOSX') or not _eh_planilha(info.filename):
+                            continue
+                        planilhas.append((os.path.basename(info.filename), zip_file.read(info)))
+            except BadZipFile:
+                raise ValueError('Arquivo ZIP inválido: {0}'.format(nome))
+        elif _eh_planilha(nome):
+            planilhas.append((os.path.basename(nome), conteudo))
+
+    if len(planilhas) > MAX_ARQUIVOS:
+        raise ValueError('Máximo de {0} planilhas por lote ({1} enviadas).'.format(MAX_ARQUIVOS, len(planilhas)))
+    return planilhas
+
+
+def _processar_planilha(app, nome, conteudo, parametros, imoveis_vistos, lock_vistos):
+    """Lê, importa e calcula uma planilha. Nunca levanta exceção: devolve a situação do imóvel."""
+    inicio = time.time()
+    situacao = {
+        'arquivo': nome,
+        'imovel': None,
+        'condominio': '',
+        'status': STATUS_ERRO,
+        'erro': None,
+        'parcelas': 0,
+        'prescritas': 0,
+        'rejeitadas': 0,
+        'totais': {},
+    }
+
+    with app.app_context():
+        try:
+            imovel, condominio, df, _ = ler_planilha(conteudo)
+            situacao['imovel'] = imovel
+            situacao['condominio'] = condominio
+
+            with lock_vistos:
+                repetido = imovel in imoveis_vistos
+                imoveis_vistos.add(imovel)
+            if repetido:
+                situacao['status'] = STATUS_DUPLICADO
+                situacao['erro'] = 'Imóvel {0} já consta em outra planilha do lote.'.format(imovel)
+                return situacao
+
+            dt_atualizacao = parametros['dt_atualizacao']
+            ids_indices = parametros['ids_indices']
+
+            limpar_processamento(imovel, dt_atualizacao, ids_indices)
+            parcelas, resumo = preparar_parcelas(df, parametros['prescricao'])
+            validas, prescritas = gravar_parcelas(
+                db.session.connection(),
+                parcelas,
+                imovel=imovel,
+                nome_condominio=condominio,
+                dt_atualizacao=dt_atualizacao,
+                id_indice=ids_indices[0],
+                periodo_prescricao=parametros['periodo_prescricao'],
+                usuario=parametros['usuario']
+            )
+            db.session.commit()
+
+            situacao['parcelas'] = validas
+            situacao['prescritas'] = prescritas
+            situacao['rejeitadas'] = resumo['erros']
+
+            if not validas:
+                situacao['status'] = STATUS_SEM_PARCELAS
+                return situacao
+
+            resultado = CalculadorMultiIndice(
+                dt_atualizacao=dt_atualizacao,
+                ids_indices=ids_indices,
+                usuario=parametros['usuario'],
+                perc_honorarios=parametros['perc_honorarios'],
+                imovel=imovel
+            ).calcular()
+
+            if not resultado['sucesso']:
+                situacao['erro'] = resultado.get('erro', 'Erro desconhecido')
+                return situacao
+
+            situacao['totais'] = {
+                str(id_indice): item['valor_total'] for id_indice, item in resultado['indices'].items()
+            }
+            situacao['status'] = STATUS_OK
+
+        except Exception as e:
+            db.session.rollback()
+            situacao['erro'] = str(e)
+
+        finally:
+            situacao['decorrido'] = round(time.time() - inicio, 2)
+
+    return situacao
+
+
+def processar_lote_siscalculo(planilhas, dt_atualizacao, ids_indices, perc_honorarios, usuario,
+                              prescricao=None, periodo_prescricao=None, max_workers=MAX_WORKERS):
+    """
+    Função do job 'siscalculo_lote'.
+    planilhas  -> lista de (nome, bytes) de extrair_planilhas
+    prescricao -> None ou (ano_inicio, mes_inicio, ano_fim, mes_fim)
+    """
+    app = current_app._get_current_object()
+    parametros = {
+        'dt_atualizacao': dt_atualizacao,
+        'ids_indices': [int(id_indice) for id_indice in ids_indices],
+        'perc_honorarios': perc_honorarios,
+        'usuario': usuario,
+        'prescricao': prescricao,
+        'periodo_prescricao': periodo_prescricao,
+    }
+    imoveis_vistos = set()
+    lock_vistos = threading.Lock()
+
+    imoveis = []
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='SiscalculoLote') as executor:
+        futuros = [
+            executor.submit(_processar_planilha, app, nome, conteudo, parametros, imoveis_vistos, lock_vistos)
+            for nome, conteudo in planilhas
+        ]
+        for futuro in as_completed(futuros):
+            situacao = futuro.result()
+            imoveis.append(situacao)
+            concluir_etapa(
+                '{0} - imóvel {1}: {2}'.format(situacao['arquivo'], situacao['imovel'] or '?', situacao['status']),
+                retorno=situacao['parcelas'],
+                erro=situacao['erro'] if situacao['status'] in (STATUS_ERRO, STATUS_DUPLICADO) else None,
+                decorrido=situacao['decorrido']
+            )
+
+    imoveis.sort(key=lambda situacao: situacao['arquivo'])
+    processados = [situacao for situacao in imoveis if situacao['status'] == STATUS_OK]
+
+    log_info("SISCalculo em lote: {0} planilhas, {1} imóveis calculados".format(len(planilhas), len(processados)))
+    return {
+        'qt_registros': sum(situacao['parcelas'] for situacao in processados),
+        'dt_atualizacao': dt_atualizacao.strftime('%Y-%m-%d'),
+        'ids_indices': parametros['ids_indices'],
+        'perc_honorarios': perc_honorarios,
+        'qt_arquivos': len(planilhas),
+        'qt_processados': len(processados),
+        'qt_erros': len(imoveis) - len(processados),
+        'imoveis': imoveis,
+    }
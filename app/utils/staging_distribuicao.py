@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/staging_distribuicao.py
+
+Área de trabalho (staging) da distribuição: [BDG].[DCA_TB006_DISTRIBUIVEIS] e
+[BDG].[DCA_TB007_ARRASTAVEIS].
+
+Por padrão as rotinas usam as tabelas globais, que são truncadas a cada execução
+e por isso exigem lock exclusivo no portal inteiro. Dentro de staging_execucao()
+cada execução ganha cópias próprias dessas tabelas (mesma estrutura, sufixo
+_EXEC_<id>), de modo que simulações e distribuições de editais/períodos
+diferentes rodam em paralelo. Ao final as cópias são descartadas com DROP TABLE.
+
+As rotinas montam o SQL com sql_staging(), que troca o nome das tabelas globais
+pelo da execução corrente (thread atual). Fora de staging_execucao() nada muda.
+
+simulacao_execucao() vai além: clona também [BDG].[DCA_TB005_DISTRIBUICAO] (vazia)
+e as linhas do edital/período de [BDG].[DCA_TB003_LIMITES_DISTRIBUICAO], com os
+PERCENTUAL_FINAL do cenário. As etapas da distribuição rodam sem alteração e
+nenhuma linha de produção é gravada.
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+from app import db
+from app.utils.log_seguro import log_info, log_erro
+
+TABELA_DISTRIBUIVEIS = '[BDG].[DCA_TB006_DISTRIBUIVEIS]'
+TABELA_ARRASTAVEIS = '[BDG].[DCA_TB007_ARRASTAVEIS]'
+TEMP_RESULTADO_DEMAIS = '##ResultadoDemaisContratos'
+TABELA_DISTRIBUICAO = '[BDG].[DCA_TB005_DISTRIBUICAO]'
+TABELA_LIMITES = '[BDG].[DCA_TB003_LIMITES_DISTRIBUICAO]'
+
+# Recurso de sp_getapplock de quem usa as tabelas globais
+RECURSO_DISTRIBUICAO = 'DCA_DISTRIBUICAO_CONTRATOS'
+
+# Cópias esquecidas por uma queda do servidor são removidas após este prazo
+HORAS_STAGING_ORFAO = 24
+
+_contexto = threading.local()
+
+
+def execucao_atual():
+    """ID da execução isolada nesta thread (None = tabelas globais)."""
+    return getattr(_contexto, 'execucao_id', None)
+
+
+def tabela_distribuiveis():
+    execucao_id = execucao_atual()
+    if execucao_id is None:
+        return TABELA_DISTRIBUIVEIS
+    return '[BDG].[DCA_TB006_DISTRIBUIVEIS_EXEC_{0}]'.format(execucao_id)
+
+
+def tabela_arrastaveis():
+    execucao_id = execucao_atual()
+    if execucao_id is None:
+        return TABELA_ARRASTAVEIS
+    return '[BDG].[DCA_TB007_ARRASTAVEIS_EXEC_{0}]'.format(execucao_id)
+
+
+def em_simulacao():
+    """True dentro de simulacao_execucao() (DCA_TB005/DCA_TB003 também são cópias)."""
+    return execucao_atual() is not None and getattr(_contexto, 'simulacao', False)
+
+
+def tabela_distribuicao():
+    if not em_simulacao():
+        return TABELA_DISTRIBUICAO
+    return '[BDG].[DCA_TB005_DISTRIBUICAO_EXEC_{0}]'.format(execucao_atual())
+
+
+def tabela_limites():
+    if not em_simulacao():
+        return TABELA_LIMITES
+    return '[BDG].[DCA_TB003_LIMITES_DISTRIBUICAO_EXEC_{0}]'.format(execucao_atual())
+
+
+def sql_staging(sql):
+    """Troca as tabelas de staging globais pelas da execução corrente."""
+    execucao_id = execucao_atual()
+    if execucao_id is None:
+        return sql
+    sql = (sql
+           .replace(TABELA_DISTRIBUIVEIS, tabela_distribuiveis())
+           .replace(TABELA_ARRASTAVEIS, tabela_arrastaveis())
+           .replace(TEMP_RESULTADO_DEMAIS, '{0}_{1}'.format(TEMP_RESULTADO_DEMAIS, execucao_id)))
+    if em_simulacao():
+        sql = (sql
+               .replace(TABELA_DISTRIBUICAO, tabela_distribuicao())
+               .replace(TABELA_LIMITES, tabela_limites()))
+    return sql
+
+
+def recurso_lock(edital_id=None, periodo_id=None):
+    """
+    Nome do lock para o processo.
+    Execuções isoladas só disputam a DCA_TB005 do próprio edital/período.
+    """
+    if edital_id is None:
+        return RECURSO_DISTRIBUICAO
+    return '{0}_{1}_{2}'.format(RECURSO_DISTRIBUICAO, edital_id, periodo_id)
+
+
+@contextmanager
+def staging_execucao(execucao_id=None):
+    """
+    Uso:
+        with staging_execucao():
+            processar_distribuicao_completa(...)   # usa DCA_TB006/007 próprias
+
+    Aninhado (já dentro de uma execução isolada) apenas reaproveita as tabelas.
+    """
+    if execucao_atual() is not None:
+        yield execucao_atual()
+        return
+
+    execucao_id = execucao_id or uuid.uuid4().hex[:12]
+    if not re.match(r'^[A-Za-z0-9]+$', str(execucao_id)):
+        raise ValueError('ID de execução inválido: {0}'.format(execucao_id))
+
+    _limpar_staging_orfaos()
+
+    _contexto.execucao_id = str(execucao_id)
+    try:
+        _criar_tabelas()
+        log_info("Staging isolado criado: execução {0}".format(execucao_id))
+        yield execucao_id
+    finally:
+        try:
+            _remover_tabelas()
+            log_info("Staging isolado removido: execução {0}".format(execucao_id))
+        finally:
+            _contexto.execucao_id = None
+
+
+@contextmanager
+def simulacao_execucao(edital_id, periodo_id, percentuais=None):
+    """
+    Uso:
+        with simulacao_execucao(edital_id, periodo_id, {101: 35.5, 102: 64.5}):
+            processar_distribuicao_completa(edital_id, periodo_id)
+
+    percentuais -> {ID_EMPRESA: PERCENTUAL_FINAL} do cenário; empresas omitidas
+    mantêm o percentual cadastrado na DCA_TB003.
+    """
+    if em_simulacao():
+        yield execucao_atual()
+        return
+    if execucao_atual() is not None:
+        raise RuntimeError('Simulação não pode ser aberta dentro de uma execução real')
+
+    with staging_execucao() as execucao_id:
+        _contexto.simulacao = True
+        try:
+            _criar_tabelas_simulacao(edital_id, periodo_id, percentuais or {})
+            log_info("Simulação criada: execução {0} (edital {1}, período {2})".format(
+                execucao_id, edital_id, periodo_id))
+            yield execucao_id
+        finally:
+            try:
+                _remover_tabelas_simulacao()
+            finally:
+                _contexto.simulacao = False
+
+
+def _criar_tabelas_simulacao(edital_id, periodo_id, percentuais):
+    distribuicao = tabela_distribuicao()
+    limites = tabela_limites()
+    sufixo = execucao_atual()
+    with db.engine.begin() as connection:
+        connection.execute(text("""
+            SELECT TOP 0 * INTO {distribuicao} FROM {base_distribuicao};
+            CREATE INDEX IX_EDITAL_CPF_{sufixo} ON {distribuicao} (ID_EDITAL, ID_PERIODO, NR_CPF_CNPJ);
+            CREATE INDEX IX_CONTRATO_{sufixo} ON {distribuicao} (fkContratoSISCTR);
+            SELECT * INTO {limites} FROM {base_limites}
+            WHERE ID_EDITAL = :edital_id AND ID_PERIODO = :periodo_id;
+        """.format(distribuicao=distribuicao, limites=limites, sufixo=sufixo,
+                   base_distribuicao=TABELA_DISTRIBUICAO, base_limites=TABELA_LIMITES)),
+            {"edital_id": edital_id, "periodo_id": periodo_id})
+
+        for empresa_id, percentual in percentuais.items():
+            parametros = {"edital_id": edital_id, "periodo_id": periodo_id,
+                          "empresa_id": int(empresa_id), "percentual": float(percentual)}
+            atualizados = connection.execute(text("""
+                UPDATE {0}
+                SET PERCENTUAL_FINAL = :percentual
+                WHERE ID_EDITAL = :edital_id AND ID_PERIODO = :periodo_id
+                  AND ID_EMPRESA = :empresa_id AND DELETED_AT IS NULL
+            """.format(limites)), parametros).rowcount
+            if not atualizados:
+                connection.execute(text("""
+                    INSERT INTO {0}
+                    (ID_EDITAL, ID_PERIODO, ID_EMPRESA, COD_CRITERIO_SELECAO, PERCENTUAL_FINAL, CREATED_AT)
+                    VALUES (:edital_id, :periodo_id, :empresa_id, 4, :percentual, GETDATE())
+                """.format(limites)), parametros)
+
+
+def _remover_tabelas_simulacao():
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(text("""
+                DROP TABLE IF EXISTS {0};
+                DROP TABLE IF EXISTS {1};
+            """.format(tabela_distribuicao(), tabela_limites())))
+    except Exception as e:
+        log_erro("Erro ao remover simulação da execução {0}: {1}".format(execucao_atual(), repr(e)))
+
+
+def _criar_tabelas():
+    distribuiveis = tabela_distribuiveis()
+    arrastaveis = tabela_arrastaveis()
+    sufixo = execucao_atual()
+    # SELECT TOP 0 ... INTO copia colunas e IDENTITY: os INSERTs sem lista de colunas continuam válidos
+    with db.engine.begin() as connection:
+        connection.execute(text("""
+            SELECT TOP 0 * INTO {distribuiveis} FROM {base_distribuiveis};
+            SELECT TOP 0 * INTO {arrastaveis} FROM {base_arrastaveis};
+            CREATE INDEX IX_CONTRATO_{sufixo} ON {distribuiveis} (FkContratoSISCTR);
+            CREATE INDEX IX_CPF_{sufixo} ON {distribuiveis} (NR_CPF_CNPJ);
+            CREATE INDEX IX_CONTRATO_{sufixo} ON {arrastaveis} (FkContratoSISCTR);
+            CREATE INDEX IX_CPF_{sufixo} ON {arrastaveis} (NR_CPF_CNPJ);
+        """.format(distribuiveis=distribuiveis, arrastaveis=arrastaveis, sufixo=sufixo,
+                   base_distribuiveis=TABELA_DISTRIBUIVEIS, base_arrastaveis=TABELA_ARRASTAVEIS)))
+
+
+def _remover_tabelas():
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(text("""
+                DROP TABLE IF EXISTS {0};
+                DROP TABLE IF EXISTS {1};
+            """.format(tabela_distribuiveis(), tabela_arrastaveis())))
+    except Exception as e:
+        log_erro("Erro ao remover staging da execução {0}: {1}".format(execucao_atual(), repr(e)))
+
+
+def _limpar_staging_orfaos():
+    """Remove cópias de execuções que não terminaram (queda do servidor)."""
+    try:
+        with db.engine.begin() as connection:
+            orfas = connection.execute(text("""
+                SELECT T.name
+                FROM sys.tables T
+                INNER JOIN sys.schemas S ON S.schema_id = T.schema_id
+                WHERE S.name = 'BDG'
+                  AND (T.name LIKE 'DCA[_]TB006[_]DISTRIBUIVEIS[_]EXEC[_]%'
+                       OR T.name LIKE 'DCA[_]TB007[_]ARRASTAVEIS[_]EXEC[_]%'
+                       OR T.name LIKE 'DCA[_]TB005[_]DISTRIBUICAO[_]EXEC[_]%'
+                       OR T.name LIKE 'DCA[_]TB003[_]LIMITES[_]DISTRIBUICAO[_]EXEC[_]%')
+                  AND T.create_date < DATEADD(HOUR, -:horas, GETDATE())
+            """), {"horas": HORAS_STAGING_ORFAO}).fetchall()
+            for (nome,) in orfas:
+                connection.execute(text("DROP TABLE IF EXISTS [BDG].[{0}]".format(nome)))
+                log_info("Staging órfão removido: {0}".format(nome))
+    except Exception as e:
+        log_erro("Erro ao limpar staging órfão: {0}".format(repr(e)))
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+app/utils/vinculacao_pendencias.py
+
+Gravação set-based das vinculações pendência x lançamento analítico
+(Pendência vs Retenção -> PEN_TB010, Cobrado vs Repassado -> PEN_TB011).
+
+Antes, salvar_vinculacao fazia um SELECT COUNT + um INSERT para cada par
+pendência x analítico. Agora o conjunto desejado de pares vai de uma vez para
+a #VinculacaoDesejada (inserir_lote) e, na mesma transação da db.session:
+    - um DELETE remove os vínculos atuais das pendências informadas que não
+      estão no conjunto (só com substituir=True);
+    - um INSERT ... SELECT com anti-join grava só os pares que ainda não existem.
+O commit fica com quem chamou: ou grava tudo, ou nada (sem estado parcial).
+
+Compatível com Python 3.9 e 3.12.
+"""
+
+from datetime import datetime
+from itertools import product
+
+from sqlalchemy import text
+
+from app import db
+from app.utils.carga_lote import inserir_lote
+
+TABELAS_VINCULACAO = {
+    'retido': '[BDG].[PEN_TB010_RELACIONA_VLR_RETIDO]',
+    'repassado': '[BDG].[PEN_TB011_RELACIONA_VLR_REPASSADO]'
+}
+
+COLUNAS_VINCULACAO = ['ID_PENDENCIA', 'ID_ARREC_EXT_SISTEMA', 'OBS', 'NO_RSPONSAVEL', 'DT_ANALISE']
+
+SQL_CRIAR_DESEJADA = """
+    IF OBJECT_ID('tempdb..#VinculacaoDesejada') IS NOT NULL DROP TABLE #VinculacaoDesejada;
+    CREATE TABLE #VinculacaoDesejada (
+        ID_PENDENCIA INT NULL,
+        ID_ARREC_EXT_SISTEMA BIGINT NOT NULL
+    );
+"""
+
+# Vínculos (com analítico) das pendências informadas que saíram do conjunto desejado
+SQL_REMOVER = """
+    DELETE R
+    FROM {tabela} R
+    WHERE R.ID_PENDENCIA IN (SELECT D.ID_PENDENCIA FROM #VinculacaoDesejada D)
+      AND R.ID_ARREC_EXT_SISTEMA IS NOT NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM #VinculacaoDesejada D
+          WHERE D.ID_PENDENCIA = R.ID_PENDENCIA
+            AND D.ID_ARREC_EXT_SISTEMA = R.ID_ARREC_EXT_SISTEMA
+      )
+"""
+
+SQL_INSERIR = """
+    INSERT INTO {tabela} (ID_PENDENCIA, ID_ARREC_EXT_SISTEMA, OBS, NO_RSPONSAVEL, DT_ANALISE)
+    SELECT D.ID_PENDENCIA, D.ID_ARREC_EXT_SISTEMA, :obs, :responsavel, :dt_analise
+    FROM (SELECT DISTINCT ID_PENDENCIA, ID_ARREC_EXT_SISTEMA FROM #VinculacaoDesejada) D
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {tabela} R WITH (UPDLOCK, HOLDLOCK)
+        WHERE R.ID_ARREC_EXT_SISTEMA = D.ID_ARREC_EXT_SISTEMA
+          AND (R.ID_PENDENCIA = D.ID_PENDENCIA
+               OR (R.ID_PENDENCIA IS NULL AND D.ID_PENDENCIA IS NULL))
+    )
+"""
+
+
+def gravar_vinculacoes(tipo, ids_pendencias, ids_analiticos, observacao, responsavel, substituir=False):
+    """
+    tipo -> 'retido' ou 'repassado'.
+    Conjunto desejado = ids_pendencias x ids_analiticos (sem pendências: ID_PENDENCIA NULL).
+    substituir=True também remove os vínculos dessas pendências fora do conjunto.
+    Retorna (inseridos, removidos). Não faz commit.
+    """
+    tabela = TABELAS_VINCULACAO[tipo]
+    pendencias = [int(p) for p in ids_pendencias] or [None]
+    pares = list(product(pendencias, [int(a) for a in ids_analiticos]))
+    if not pares:
+        return 0, 0
+
+    connection = db.session.connection()
+    connection.execute(text(SQL_CRIAR_DESEJADA))
+    inserir_lote(connection, '#VinculacaoDesejada', ['ID_PENDENCIA', 'ID_ARREC_EXT_SISTEMA'], pares)
+
+    removidos = 0
+    if substituir and ids_pendencias:
+        removidos = connection.execute(text(SQL_REMOVER.format(tabela=tabela))).rowcount
+
+    inseridos = connection.execute(text(SQL_INSERIR.format(tabela=tabela)), {
+        'obs': observacao,
+        'responsavel': responsavel,
+        'dt_analise': datetime.now()
+    }).rowcount
+
+    connection.execute(text("DROP TABLE #VinculacaoDesejada"))
+    return inseridos, removidos
+
+
+def registrar_observacao(tipo, ids_pendencias, observacao, responsavel):
+    """Observação sem analítico: uma linha por pendência (ou uma só, sem pendência). Não faz commit."""
+    agora = datetime.now()
+    linhas = [(int(p), None, observacao, responsavel, agora) for p in ids_pendencias] \
+        or [(None, None, observacao, responsavel, agora)]
+    return inserir_lote(db.session.connection(), TABELAS_VINCULACAO[tipo], COLUNAS_VINCULACAO, linhas)
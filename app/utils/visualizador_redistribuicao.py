@@ -3,6 +3,7 @@ from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
 from sqlalchemy import text
 from app import db
+from app.utils.calendario_dias_uteis import calendario_aux
 import calendar
 
 
@@ -171,18 +172,10 @@ class VisualizadorRedistribuicao:
 
     def _buscar_dias_uteis_mes(self, ano, mes):
         """Busca dias úteis totais do mês"""
-        sql = text("""
-            SELECT COUNT(*) as QTDE_DIAS_UTEIS
-            FROM BDG.AUX_TB004_CALENDARIO
-            WHERE ANO = :ano 
-            AND MES = :mes
-            AND E_DIA_UTIL = 1
-        """)
+        dias_uteis = calendario_aux().dias_uteis_mes(ano, mes)
 
-        result = db.session.execute(sql, {'ano': ano, 'mes': mes}).fetchone()
-
-        # Se não encontrar no banco, usar valores padrão do Excel
-        if not result or not result[0]:
+        # Se não encontrar no calendário, usar valores padrão do Excel
+        if not dias_uteis:
             dias_padrao = {
                 (2025, 1): 22,
                 (2025, 2): 20,
@@ -194,7 +187,7 @@ class VisualizadorRedistribuicao:
             }
             return dias_padrao.get((ano, mes), 22)
 
-        return result[0]
+        return dias_uteis
 
     def _calcular_dias_uteis_periodo(self, ano, mes, periodo_info):
         """Calcula dias úteis do mês dentro do período"""
@@ -204,24 +197,10 @@ class VisualizadorRedistribuicao:
         dt_inicio = max(periodo_info['dt_inicio'], primeiro_dia)
         dt_fim = min(periodo_info['dt_fim'], ultimo_dia)
 
-        sql = text("""
-            SELECT COUNT(*) as QTDE_DIAS_UTEIS
-            FROM BDG.AUX_TB004_CALENDARIO
-            WHERE ANO = :ano 
-            AND MES = :mes
-            AND E_DIA_UTIL = 1
-            AND DT_REFERENCIA BETWEEN :dt_inicio AND :dt_fim
-        """)
-
-        result = db.session.execute(sql, {
-            'ano': ano,
-            'mes': mes,
-            'dt_inicio': dt_inicio,
-            'dt_fim': dt_fim
-        }).fetchone()
+        dias_uteis = calendario_aux().dias_uteis_entre(dt_inicio, dt_fim)
 
-        # Se não encontrar no banco, usar valores padrão do Excel
-        if not result or not result[0]:
+        # Se não encontrar no calendário, usar valores padrão do Excel
+        if not dias_uteis:
             dias_padrao = {
                 (2025, 1): 13,  # 15/01 até 31/01
                 (2025, 2): 20,
@@ -233,7 +212,7 @@ class VisualizadorRedistribuicao:
             }
             return dias_padrao.get((ano, mes), 20)
 
-        return result[0]
+        return dias_uteis
 
     def _calcular_meta_periodo(self, mes, dados_periodo, todos_meses):
         """Calcula meta do período para o mês"""
@@ -726,32 +705,16 @@ class VisualizadorRedistribuicao:
 
     def _calcular_dias_uteis_ate_data(self, ano, mes, data):
         """Calcula dias úteis do início do mês até a data especificada"""
-        sql = text("""
-            SELECT COUNT(*) as QTDE_DIAS_UTEIS
-            FROM BDG.AUX_TB004_CALENDARIO
-            WHERE ANO = :ano 
-            AND MES = :mes
-            AND E_DIA_UTIL = 1
-            AND DT_REFERENCIA BETWEEN :dt_inicio AND :dt_fim
-        """)
-
-        dt_inicio = date(ano, mes, 1)
-
-        result = db.session.execute(sql, {
-            'ano': ano,
-            'mes': mes,
-            'dt_inicio': dt_inicio,
-            'dt_fim': data
-        }).fetchone()
+        dias_uteis = calendario_aux().dias_uteis_entre(date(ano, mes, 1), data)
 
-        # Se não encontrar no banco, usar valores padrão
-        if not result or not result[0]:
+        # Se não encontrar no calendário, usar valores padrão
+        if not dias_uteis:
             if ano == 2025 and mes == 3 and data == self.data_redistrib_real:
                 return 16  # Valor do Excel
             elif ano == 2025 and mes == 5 and data == self.data_redistrib_hcosta:
                 return 11  # Valor do Excel
 
-        return result[0] if result and result[0] else 0
+        return dias_uteis
 
     def _calcular_detalhes_real(self, tabela1):
         """Calcula os detalhes específicos da redistribuição da Real"""
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+benchmark_b3_consolidado.py
+
+Compara a busca do CSV de Negócios Consolidados da B3 contra um servidor
+local que imita a API de exportação (latência configurável, só uma data
+"consolidada"):
+  - versão antiga: uma data por vez, requests.post novo a cada tentativa;
+  - versão nova: baixar_mais_recente (app/utils/b3_consolidado.py), datas em
+    paralelo pela Session compartilhada;
+  - versão nova com cache: segunda chamada, sem rede.
+
+Uso:
+    python benchmark_b3_consolidado.py [--latencia 0.5] [--dias-atras 4]
+
+Nada acessa a B3 nem o banco; o cache vai para uma pasta temporária.
+"""
+
+import argparse
+import json
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from app.utils.b3_consolidado import (
+    CacheConsolidado, TransporteHttpB3, baixar_mais_recente, datas_candidatas, validar_conteudo,
+)
+
+
+def _csv_sintetico(data_str):
+    linhas = ['Negócios Consolidados;{0}'.format(data_str), '',
+              'Instrumento financeiro;Preço médio']
+    linhas += ['DI1F{0:02d};{1},{2:03d}'.format(n % 100, 10 + n % 5, n) for n in range(200)]
+    return '\n'.join(linhas).encode('utf-8')
+
+
+def _servidor(latencia, data_valida):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            corpo = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            time.sleep(latencia)
+            conteudo = _csv_sintetico(corpo['Date']) if corpo['Date'] == data_valida else b'vazio'
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(conteudo)))
+            self.end_headers()
+            self.wfile.write(conteudo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def _busca_antiga(url, hoje):
+    for dias_atras in range(0, 10):
+        data_str = (hoje - timedelta(days=dias_atras)).strftime('%Y-%m-%d')
+        response = requests.post(url, json={'Date': data_str}, timeout=60)
+        if response.status_code == 200 and validar_conteudo(response.content) is None:
+            return data_str
+    return None
+
+
+def benchmark(latencia, dias_atras):
+    hoje = datetime.now().date()
+    # Dias úteis são os que a versão nova consulta; a data válida é um deles
+    data_valida = datas_candidatas(hoje)[dias_atras]
+    servidor = _servidor(latencia, data_valida.strftime('%Y-%m-%d'))
+    url = 'http://127.0.0.1:{0}/bdi/table/export/csv'.format(servidor.server_address[1])
+    pasta = tempfile.mkdtemp(prefix='b3_cache_')
+    try:
+        transporte = TransporteHttpB3(url=url)
+        cache = CacheConsolidado(pasta)
+
+        inicio = time.perf_counter()
+        antiga = _busca_antiga(url, hoje)
+        t_antiga = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        _, nova = baixar_mais_recente(hoje, transporte=transporte, cache=cache)
+        t_nova = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        _, em_cache = baixar_mais_recente(hoje, transporte=transporte, cache=cache)
+        t_cache = time.perf_counter() - inicio
+
+        print("{0:<22} | {1:>10} | {2:>9}".format('Versão', 'Pregão', 'Tempo (s)'))
+        print("-" * 47)
+        print("{0:<22} | {1:>10} | {2:>9.2f}".format('Antiga (sequencial)', str(antiga), t_antiga))
+        print("{0:<22} | {1:>10} | {2:>9.2f}".format('Nova (paralela)', str(nova), t_nova))
+        print("{0:<22} | {1:>10} | {2:>9.2f}".format('Nova (cache)', str(em_cache), t_cache))
+        if str(nova) != antiga or em_cache != nova:
+            print("  divergência entre as versões")
+    finally:
+        servidor.shutdown()
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark do download do consolidado da B3')
+    parser.add_argument('--latencia', type=float, default=0.5, help='segundos por resposta do servidor local')
+    parser.add_argument('--dias-atras', type=int, default=4, help='dias úteis até o pregão válido')
+    args = parser.parse_args()
+
+    benchmark(args.latencia, args.dias_atras)
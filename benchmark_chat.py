@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+benchmark_chat.py
+
+Compara a montagem da caixa de entrada do chat:
+  - versão antiga: GROUP BY nas mensagens + Usuario.get e COUNT de não lidas por conversa (2N+1 consultas)
+  - versão com resumo: uma consulta na APK_TB013_CONVERSAS_RESUMO (listar_conversas)
+
+Uso:
+    python benchmark_chat.py [--conversas 100 300 1000] [--mensagens 20] [--repeticoes 5]
+
+Tudo roda numa transação que é desfeita ao final (usuários e mensagens sintéticos
+não ficam gravados). ATENÇÃO: a reconstrução do resumo dentro da transação
+bloqueia a APK_TB013 enquanto a rodada dura - use o banco de HOMOLOGAÇÃO.
+"""
+
+import argparse
+import time
+
+from sqlalchemy import text
+
+CONVERSAS_PADRAO = [100, 300, 1000]
+EMAIL_SINTETICO = 'benchmark.chat.{0}@invalido.local'
+
+
+def _criar_cenario(connection, conversas, mensagens):
+    """Usuário principal + `conversas` contatos, `mensagens` por conversa (metade não lida)."""
+    connection.execute(text("""
+        ;WITH N AS (
+            SELECT TOP (:total) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) - 1 AS i
+            FROM sys.all_objects A CROSS JOIN sys.all_objects B
+        )
+        INSERT INTO [BDG].[APK_TB002_USUARIOS] (NOME, EMAIL, SENHA_HASH, ATIVO, PERFIL, CREATED_AT)
+        SELECT 'Benchmark Chat ' + CAST(i AS VARCHAR(10)),
+               'benchmark.chat.' + CAST(i AS VARCHAR(10)) + '@invalido.local',
+               'x', 1, CASE WHEN i = 0 THEN 'admin' ELSE 'usuario' END, GETDATE()
+        FROM N
+    """), {'total': conversas + 1})
+
+    usuario_id = connection.execute(text(
+        "SELECT ID FROM [BDG].[APK_TB002_USUARIOS] WHERE EMAIL = :email"
+    ), {'email': EMAIL_SINTETICO.format(0)}).scalar()
+
+    connection.execute(text("""
+        ;WITH M AS (
+            SELECT TOP (:mensagens) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS j
+            FROM sys.all_objects
+        )
+        INSERT INTO [BDG].[APK_TB003_MENSAGENS]
+            (REMETENTE_ID, DESTINATARIO_ID, CONTEUDO, CREATED_AT, LIDO)
+        SELECT CASE WHEN M.j % 2 = 0 THEN :usuario_id ELSE U.ID END,
+               CASE WHEN M.j % 2 = 0 THEN U.ID ELSE :usuario_id END,
+               'Mensagem sintética ' + CAST(M.j AS VARCHAR(10)),
+               DATEADD(MINUTE, M.j, DATEADD(HOUR, -U.ID % 500, GETDATE())),
+               CASE WHEN M.j > :mensagens / 2 THEN 0 ELSE 1 END
+        FROM [BDG].[APK_TB002_USUARIOS] U
+        CROSS JOIN M
+        WHERE U.EMAIL LIKE 'benchmark.chat.%@invalido.local' AND U.ID <> :usuario_id
+    """), {'mensagens': mensagens, 'usuario_id': usuario_id})
+    return usuario_id
+
+
+def _caixa_antiga(connection, usuario_id):
+    """Mesma sequência de consultas do chat.index antes do resumo."""
+    consultas = 1
+    conversas = connection.execute(text("""
+        SELECT MAX(CREATED_AT) AS ultima_data, REMETENTE_ID, DESTINATARIO_ID
+        FROM [BDG].[APK_TB003_MENSAGENS]
+        WHERE REMETENTE_ID = :usuario_id OR DESTINATARIO_ID = :usuario_id
+        GROUP BY REMETENTE_ID, DESTINATARIO_ID
+        ORDER BY ultima_data DESC
+    """), {'usuario_id': usuario_id}).fetchall()
+
+    vistos = set()
+    resultado = []
+    for conversa in conversas:
+        outro = conversa.DESTINATARIO_ID if conversa.REMETENTE_ID == usuario_id else conversa.REMETENTE_ID
+        if outro in vistos:
+            continue
+        vistos.add(outro)
+        nome = connection.execute(text(
+            "SELECT NOME FROM [BDG].[APK_TB002_USUARIOS] WHERE ID = :id"), {'id': outro}).scalar()
+        nao_lidas = connection.execute(text("""
+            SELECT COUNT(*) FROM [BDG].[APK_TB003_MENSAGENS]
+            WHERE REMETENTE_ID = :outro AND DESTINATARIO_ID = :usuario_id AND LIDO = 0
+        """), {'outro': outro, 'usuario_id': usuario_id}).scalar()
+        consultas += 2
+        resultado.append((outro, nome, conversa.ultima_data, nao_lidas))
+    return resultado, consultas
+
+
+def _medir(funcao, repeticoes):
+    melhor = None
+    retorno = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        retorno = funcao()
+        decorrido = time.perf_counter() - inicio
+        melhor = decorrido if melhor is None else min(melhor, decorrido)
+    return melhor, retorno
+
+
+def benchmark(tamanhos, mensagens, repeticoes):
+    from app import create_app, db
+    from app.utils.chat_resumo import SQL_RECONSTRUIR, listar_conversas
+
+    app = create_app()
+    with app.app_context():
+        print("{0:>9} | {1:>9} | {2:>11} | {3:>12} | {4:>12} | {5:>8}".format(
+            'Conversas', 'Consultas', 'Antiga (ms)', 'Resumo (ms)', 'Rebuild (s)', 'Ganho'))
+        print("-" * 76)
+        for conversas in tamanhos:
+            connection = db.engine.connect()
+            transacao = connection.begin()
+            try:
+                usuario_id = _criar_cenario(connection, conversas, mensagens)
+
+                inicio = time.perf_counter()
+                connection.execute(SQL_RECONSTRUIR)
+                reconstrucao = time.perf_counter() - inicio
+
+                antiga, (lista_antiga, consultas) = _medir(
+                    lambda: _caixa_antiga(connection, usuario_id), repeticoes)
+                nova, lista_nova = _medir(
+                    lambda: listar_conversas(usuario_id, executor=connection), repeticoes)
+
+                if len(lista_antiga) != len(lista_nova):
+                    print("  divergência: antiga={0} resumo={1}".format(len(lista_antiga), len(lista_nova)))
+
+                print("{0:>9,} | {1:>9,} | {2:>11.1f} | {3:>12.1f} | {4:>12.2f} | {5:>7.1f}x".format(
+                    conversas, consultas, antiga * 1000, nova * 1000, reconstrucao,
+                    antiga / nova if nova else 0))
+            finally:
+                transacao.rollback()
+                connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark da caixa de entrada do chat')
+    parser.add_argument('--conversas', type=int, nargs='+', default=CONVERSAS_PADRAO)
+    parser.add_argument('--mensagens', type=int, default=20, help='mensagens por conversa')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    benchmark(args.conversas, args.mensagens, args.repeticoes)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+benchmark_distribuicao.py
+
+Compara a etapa "demais contratos" da distribuição:
+  - versão CURSOR T-SQL (distribuir_demais_contratos_cursor)
+  - versão vetorizada NumPy (distribuir_demais_contratos)
+
+Uso:
+    python benchmark_distribuicao.py memoria
+        Mede só o alocador em memória (sem banco) com 100 mil, 1 milhão e 5 milhões de contratos.
+
+    python benchmark_distribuicao.py banco --edital 99 --periodo 99 [--tamanhos 100000 1000000]
+        Roda as duas versões no SQL Server com um pool sintético em staging isolado.
+        ATENÇÃO: use edital/período de HOMOLOGAÇÃO - os contratos sintéticos (faixa
+        900000000000+) são gravados na DCA_TB005 e apagados ao final de cada rodada.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+TAMANHOS_PADRAO = [100000, 1000000, 5000000]
+CONTRATOS_POR_CPF = 1.5
+QTD_EMPRESAS = 12
+BASE_CONTRATO_SINTETICO = 900000000000
+
+
+def benchmark_memoria(tamanhos):
+    from app.utils.alocador_cpfs import calcular_cotas, alocar_cpfs
+
+    print("{0:>12} | {1:>10} | {2:>12}".format('Contratos', 'CPFs', 'Alocação (s)'))
+    print("-" * 42)
+    rng = np.random.default_rng(1)
+    percentuais = rng.random(QTD_EMPRESAS) * 10
+    empresas = np.arange(1, QTD_EMPRESAS + 1)
+
+    for tamanho in tamanhos:
+        cpfs = np.arange(int(tamanho / CONTRATOS_POR_CPF), dtype=np.int64)
+        inicio = time.perf_counter()
+        cotas = calcular_cotas(percentuais, np.zeros(QTD_EMPRESAS), len(cpfs))
+        alocar_cpfs(cpfs, empresas, cotas, semente=42)
+        decorrido = time.perf_counter() - inicio
+        print("{0:>12,} | {1:>10,} | {2:>12.3f}".format(tamanho, len(cpfs), decorrido))
+
+
+def _preencher_pool(tamanho):
+    from sqlalchemy import text
+    from app import db
+    from app.utils.staging_distribuicao import sql_staging
+
+    with db.engine.begin() as connection:
+        connection.execute(text(sql_staging("TRUNCATE TABLE [BDG].[DCA_TB006_DISTRIBUIVEIS]")))
+        connection.execute(text(sql_staging("""
+            ;WITH N AS (
+                SELECT TOP (:tamanho) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS i
+                FROM sys.all_objects A CROSS JOIN sys.all_objects B CROSS JOIN sys.all_objects C
+            )
+            INSERT INTO [BDG].[DCA_TB006_DISTRIBUIVEIS]
+            SELECT :base + i, 10000000000 + (i % :qtd_cpfs), 1000.00, GETDATE(), NULL, NULL
+            FROM N
+        """)), {"tamanho": tamanho, "base": BASE_CONTRATO_SINTETICO,
+                "qtd_cpfs": int(tamanho / CONTRATOS_POR_CPF)})
+
+
+def _limpar_distribuicao(edital_id, periodo_id):
+    from sqlalchemy import text
+    from app import db
+
+    with db.engine.begin() as connection:
+        connection.execute(text("""
+            DELETE FROM [BDG].[DCA_TB005_DISTRIBUICAO]
+            WHERE ID_EDITAL = :edital_id AND ID_PERIODO = :periodo_id
+              AND fkContratoSISCTR >= :base
+        """), {"edital_id": edital_id, "periodo_id": periodo_id, "base": BASE_CONTRATO_SINTETICO})
+
+
+def benchmark_banco(edital_id, periodo_id, tamanhos):
+    from app import create_app, db
+    from app.utils.staging_distribuicao import staging_execucao
+    from app.utils.distribuir_contratos import distribuir_demais_contratos, distribuir_demais_contratos_cursor
+
+    app = create_app()
+    with app.app_context(), staging_execucao():
+        print("{0:>12} | {1:>12} | {2:>12} | {3:>8}".format('Contratos', 'Cursor (s)', 'NumPy (s)', 'Ganho'))
+        print("-" * 54)
+        for tamanho in tamanhos:
+            tempos = []
+            for funcao, kwargs in ((distribuir_demais_contratos_cursor, {}),
+                                   (distribuir_demais_contratos, {'semente': 42})):
+                _preencher_pool(tamanho)
+                inicio = time.perf_counter()
+                funcao(edital_id, periodo_id, **kwargs)
+                db.session.commit()
+                tempos.append(time.perf_counter() - inicio)
+                _limpar_distribuicao(edital_id, periodo_id)
+
+            print("{0:>12,} | {1:>12.2f} | {2:>12.2f} | {3:>7.1f}x".format(
+                tamanho, tempos[0], tempos[1], tempos[0] / tempos[1] if tempos[1] else 0))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark da etapa demais contratos')
+    parser.add_argument('modo', choices=['memoria', 'banco'])
+    parser.add_argument('--edital', type=int)
+    parser.add_argument('--periodo', type=int)
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO)
+    args = parser.parse_args()
+
+    if args.modo == 'memoria':
+        benchmark_memoria(args.tamanhos)
+    else:
+        if not args.edital or not args.periodo:
+            parser.error('modo banco exige --edital e --periodo (de homologação)')
+        benchmark_banco(args.edital, args.periodo, args.tamanhos)
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+benchmark_extrato_cvs.py
+
+Compara a geração do próximo mês do Extrato CVS sobre um histórico sintético
+de vários anos:
+  - versão antiga: lê as fontes para a memória, um INSERT por linha e o
+    VR_SALDO recalculado em Python com um UPDATE por linha (como o flush do ORM);
+  - versão set-based: processar_mes (app/utils/extrato_cvs_mensal.py), com
+    montagem em um INSERT ... SELECT e saldo por window function.
+
+Uso:
+    python benchmark_extrato_cvs.py [--anos 1 5 10] [--linhas-mes 400] [--provisoes-mes 150]
+
+O histórico fica numa #ExtratoSintetico (mesmas colunas da FIN_TB013) com datas
+a partir de 2200, para que FIN_TB014 e as views não devolvam nada; tudo roda numa
+transação desfeita ao final. Nada é gravado nas tabelas reais.
+"""
+
+import argparse
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sqlalchemy import text
+
+ANOS_PADRAO = [1, 5, 10]
+INICIO_SINTETICO = date(2200, 1, 1)
+TABELA = '#ExtratoSintetico'
+
+SQL_CRIAR = """
+    CREATE TABLE #ExtratoSintetico (
+        DT_MOVIMENTACAO DATE NOT NULL,
+        ORDEM SMALLINT NOT NULL,
+        NU_LINHA INT IDENTITY(1, 1) NOT NULL,
+        DT_CARGA DATE NOT NULL,
+        TIPO VARCHAR(3) NULL,
+        HISTORICO VARCHAR(150) NULL,
+        PERIODO_DE DATE NULL,
+        PERIODO_ATE DATE NULL,
+        VR_MOVIMENTACAO DECIMAL(18, 2) NULL,
+        VR_SALDO DECIMAL(18, 2) NULL,
+        PRIMARY KEY (DT_MOVIMENTACAO, ORDEM, NU_LINHA)
+    )
+"""
+
+# `linhas_mes` linhas por mês; as `provisoes_mes` primeiras são provisões
+SQL_POPULAR = """
+    ;WITH M AS (
+        SELECT TOP (:meses) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) - 1 AS m
+        FROM sys.all_objects
+    ), L AS (
+        SELECT TOP (:linhas_mes) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS l
+        FROM sys.all_objects A CROSS JOIN sys.all_objects B
+    )
+    INSERT INTO #ExtratoSintetico
+        (DT_MOVIMENTACAO, ORDEM, DT_CARGA, TIPO, HISTORICO, PERIODO_DE, PERIODO_ATE, VR_MOVIMENTACAO)
+    SELECT DATEADD(DAY, L.l % 28, DATEADD(MONTH, M.m, :inicio)),
+           L.l, GETDATE(),
+           CASE L.l % 3 WHEN 0 THEN 'A' WHEN 1 THEN 'B' ELSE 'C' END,
+           CASE WHEN L.l <= :provisoes_mes
+                THEN 'Provisão Juros Sintética ' + CAST(L.l AS VARCHAR(10))
+                ELSE 'Movimentação Sintética ' + CAST(L.l AS VARCHAR(10)) END,
+           DATEADD(MONTH, M.m, :inicio), EOMONTH(DATEADD(MONTH, M.m, :inicio)),
+           CAST(((L.l * 7919 + M.m * 104729) % 200000 - 100000) / 100.0 AS DECIMAL(18, 2))
+    FROM M CROSS JOIN L
+"""
+
+SQL_SALDOS_HISTORICO = """
+    ;WITH S AS (
+        SELECT VR_SALDO,
+               SUM(VR_MOVIMENTACAO) OVER (ORDER BY DT_MOVIMENTACAO, ORDEM
+                                          ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS SALDO
+        FROM #ExtratoSintetico
+    )
+    UPDATE S SET VR_SALDO = SALDO
+"""
+
+
+def _mes_antigo(connection, ini_origem, ini_destino, ini_seguinte):
+    """Mesma sequência do processar-provisoes antigo (só estornos têm dados no cenário)."""
+    provisoes = connection.execute(text("""
+        SELECT TIPO, HISTORICO, PERIODO_DE, PERIODO_ATE, VR_MOVIMENTACAO
+        FROM #ExtratoSintetico
+        WHERE DT_MOVIMENTACAO >= :ini AND DT_MOVIMENTACAO < :fim
+          AND (HISTORICO LIKE 'Provisão%' OR HISTORICO LIKE 'Provisao%')
+        ORDER BY ORDEM
+    """), {'ini': ini_origem, 'fim': ini_destino}).fetchall()
+
+    # As demais fontes também eram lidas para a memória
+    for fonte, coluna in (
+        ('[BDG].[FIN_TB014_INCORPORACOES_MES_CVS]', 'DT_MOVIMENTACAO'),
+        ('[BDDASHBOARDBI].[BDG].[FIN_VW006_RECEBIMENTO_IR_CVS]', 'DT_PREV_RECEBIMENTO'),
+        ('[BDG].[FIN_VW007_ENTRADA_TITULOS_PRORATA_CVS]', 'DT_ATUALIZACAO'),
+        ('[BDG].[FIN_VW008_PROVISAO_ATM_JUROS_CVS]', 'DT_ATUALIZACAO'),
+        ('[BDG].[FIN_VW010_PROVISAO_PRORATA_CVS]', 'DT_ATUALIZACAO'),
+    ):
+        connection.execute(text(
+            "SELECT * FROM {0} WHERE YEAR({1}) = YEAR(:d) AND MONTH({1}) = MONTH(:d)".format(fonte, coluna)
+        ), {'d': ini_destino}).fetchall()
+
+    ordem = 1
+    for prov in provisoes:
+        connection.execute(text("""
+            INSERT INTO #ExtratoSintetico
+                (DT_MOVIMENTACAO, ORDEM, DT_CARGA, TIPO, HISTORICO, PERIODO_DE, PERIODO_ATE, VR_MOVIMENTACAO, VR_SALDO)
+            VALUES (:dt, :ordem, GETDATE(), :tipo, :historico, :de, :ate, :valor, 0)
+        """), {'dt': ini_destino, 'ordem': ordem, 'tipo': prov.TIPO,
+               'historico': 'Estorno' + prov.HISTORICO[8:], 'de': prov.PERIODO_DE,
+               'ate': prov.PERIODO_ATE, 'valor': -prov.VR_MOVIMENTACAO})
+        ordem += 1
+
+    saldo = connection.execute(text("""
+        SELECT TOP 1 VR_SALDO FROM #ExtratoSintetico
+        WHERE DT_MOVIMENTACAO < :dt AND VR_SALDO IS NOT NULL
+        ORDER BY DT_MOVIMENTACAO DESC, ORDEM DESC
+    """), {'dt': ini_destino}).scalar() or Decimal('0')
+
+    linhas = connection.execute(text("""
+        SELECT NU_LINHA, VR_MOVIMENTACAO FROM #ExtratoSintetico
+        WHERE DT_MOVIMENTACAO >= :ini AND DT_MOVIMENTACAO < :fim
+        ORDER BY DT_MOVIMENTACAO, ORDEM
+    """), {'ini': ini_destino, 'fim': ini_seguinte}).fetchall()
+    for linha in linhas:
+        saldo += linha.VR_MOVIMENTACAO or Decimal('0')
+        connection.execute(text(
+            "UPDATE #ExtratoSintetico SET VR_SALDO = :saldo WHERE NU_LINHA = :nu"
+        ), {'saldo': saldo, 'nu': linha.NU_LINHA})
+    return len(linhas), saldo
+
+
+def _desfazer_mes(connection, ini_destino):
+    connection.execute(text("DELETE FROM #ExtratoSintetico WHERE DT_MOVIMENTACAO >= :dt"), {'dt': ini_destino})
+
+
+def benchmark(tamanhos, linhas_mes, provisoes_mes):
+    from app import create_app, db
+    from app.utils.extrato_cvs_mensal import processar_mes
+
+    app = create_app()
+    with app.app_context():
+        print("{0:>5} | {1:>10} | {2:>10} | {3:>11} | {4:>12} | {5:>8}".format(
+            'Anos', 'Histórico', 'Linhas mês', 'Antiga (s)', 'Set-based (s)', 'Ganho'))
+        print("-" * 72)
+        for anos in tamanhos:
+            connection = db.engine.connect()
+            transacao = connection.begin()
+            try:
+                meses = anos * 12
+                connection.execute(text(SQL_CRIAR))
+                connection.execute(text(SQL_POPULAR), {
+                    'meses': meses, 'linhas_mes': linhas_mes,
+                    'provisoes_mes': provisoes_mes, 'inicio': INICIO_SINTETICO
+                })
+                connection.execute(text(SQL_SALDOS_HISTORICO))
+
+                # Mês seguinte ao último do histórico
+                total = INICIO_SINTETICO.month - 1 + meses
+                ini_destino = date(INICIO_SINTETICO.year + total // 12, total % 12 + 1, 1)
+                ini_origem = (ini_destino - timedelta(days=1)).replace(day=1)
+                ini_seguinte = (ini_destino + timedelta(days=32)).replace(day=1)
+
+                inicio = time.perf_counter()
+                linhas_antiga, saldo_antigo = _mes_antigo(connection, ini_origem, ini_destino, ini_seguinte)
+                antiga = time.perf_counter() - inicio
+                _desfazer_mes(connection, ini_destino)
+
+                inicio = time.perf_counter()
+                resultado = processar_mes(connection, tabela_extrato=TABELA)
+                nova = time.perf_counter() - inicio
+
+                if (resultado is None or resultado['saldos_recalculados'] != linhas_antiga
+                        or Decimal(resultado['saldo_final']) != saldo_antigo):
+                    print("  divergência: antiga=({0}, {1}) set-based={2}".format(
+                        linhas_antiga, saldo_antigo,
+                        resultado and (resultado['saldos_recalculados'], resultado['saldo_final'])))
+
+                print("{0:>5} | {1:>10,} | {2:>10,} | {3:>11.2f} | {4:>12.2f} | {5:>7.1f}x".format(
+                    anos, meses * linhas_mes, linhas_antiga, antiga, nova, antiga / nova if nova else 0))
+            finally:
+                transacao.rollback()
+                connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark da geração mensal do Extrato CVS')
+    parser.add_argument('--anos', type=int, nargs='+', default=ANOS_PADRAO, help='anos de histórico')
+    parser.add_argument('--linhas-mes', type=int, default=400, help='linhas por mês no histórico')
+    parser.add_argument('--provisoes-mes', type=int, default=150, help='provisões por mês (viram estornos)')
+    args = parser.parse_args()
+
+    benchmark(args.anos, args.linhas_mes, args.provisoes_mes)
@@ -22,8 +22,8 @@ if __name__ == '__main__':
             app,
             host='0.0.0.0',
             port=5001,
-            threads=12,
-            channel_timeout=900,      # processos longos (distribuição) não caem
+            threads=48,               # até 32 ficam em conexões SSE (/eventos/stream); o resto atende páginas
+            channel_timeout=900,      # exportações longas não caem (distribuição roda em job)
             connection_limit=200,
             ident='PortalGEINC'
         )